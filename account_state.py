@@ -0,0 +1,310 @@
+# account_state.py
+"""
+Локальное состояние фьючерсного счёта: позиции, балансы, открытые ордера.
+
+Состояние обновляется событиями user-data stream (ACCOUNT_UPDATE,
+ORDER_TRADE_UPDATE, ACCOUNT_CONFIG_UPDATE) и периодически сверяется с REST
+(futures_account + открытые ордера). Пока stream подключен и сверка свежая,
+BinanceClient.get_positions() / get_balance() отвечают из памяти.
+
+Позиция бота, закрытая на бирже в обход бота (вручную, ликвидацией), снимается
+из user_data_cache["positions"] и передаётся подписчикам add_close_listener -
+logger записывает для неё CLOSE. Закрытия самого бота (флаг "closing") и
+защитных ордеров (их записывает protective_orders) сюда не попадают.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import ACCOUNT_STALE_AFTER
+from data_store import user_data_cache
+from models import Order
+from rate_limiter import rate_limiter
+
+OPEN_ORDER_STATUSES = {"NEW", "PARTIALLY_FILLED"}
+
+
+def _f(value, default=0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class AccountState:
+    """Позиции и балансы счёта в памяти (формат как у BinanceClient.get_positions)"""
+
+    def __init__(self, cache: dict = user_data_cache):
+        self.cache = cache
+        self._lock = threading.RLock()
+        self.positions: Dict[str, dict] = {}
+        self.balances: Dict[str, dict] = {}
+        self.open_orders: Dict[str, Dict[int, Order]] = {}
+        self.leverage: Dict[str, int] = {}
+        self.stream_alive = False
+        self.last_reconcile = 0.0   # time.time() последней успешной сверки
+        self._event_ms: Dict[str, int] = {}  # время последнего события по ключу
+        self.events_applied = 0
+        # Позиции бота, закрытые на бирже не ботом: (symbol, запись, последний mark price)
+        self._close_listeners: List[Callable[[str, dict, Optional[float]], None]] = []
+        self._closed: List[tuple] = []
+
+        # Позиции и балансы с биржи доступны через user_data_cache
+        cache["real_positions"] = self.positions
+        cache["balances"] = self.balances
+
+    # ---------- Чтение ----------
+
+    def is_live(self) -> bool:
+        """Можно ли отвечать из памяти вместо REST"""
+        return (self.stream_alive and self.last_reconcile > 0
+                and time.time() - self.last_reconcile < ACCOUNT_STALE_AFTER)
+
+    def get_positions(self) -> List[dict]:
+        with self._lock:
+            return [dict(p) for p in self.positions.values()]
+
+    def get_position(self, symbol: str) -> Optional[dict]:
+        with self._lock:
+            pos = self.positions.get(symbol)
+            return dict(pos) if pos else None
+
+    def get_balance(self, asset: str = 'USDT') -> float:
+        with self._lock:
+            bal = self.balances.get(asset.upper())
+            return bal["available"] if bal else 0.0
+
+    def get_open_orders(self, symbol: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            if symbol is not None:
+                return [o.to_rest() for o in self.open_orders.get(symbol, {}).values()]
+            return [o.to_rest() for orders in self.open_orders.values() for o in orders.values()]
+
+    # ---------- Состояние stream ----------
+
+    def set_stream_alive(self, alive: bool):
+        with self._lock:
+            self.stream_alive = alive
+            if not alive:
+                # Пропущенные события восстановит только новая сверка
+                self.last_reconcile = 0.0
+
+    def add_close_listener(self, listener: Callable[[str, dict, Optional[float]], None]):
+        """listener(symbol, bot_pos, mark) - позиция бота закрыта на бирже в обход бота"""
+        self._close_listeners.append(listener)
+
+    def _publish_closed(self):
+        """Вызов подписчиков вне блокировки: они пишут журнал и шлют уведомления"""
+        with self._lock:
+            closed, self._closed = self._closed, []
+        for symbol, bot_pos, mark in closed:
+            for listener in self._close_listeners:
+                try:
+                    listener(symbol, bot_pos, mark)
+                except Exception as e:
+                    print(f"❌ Ошибка обработчика закрытия {symbol}: {e}")
+
+    # ---------- События user-data stream ----------
+
+    def _set_position(self, symbol: str, amt: float, entry: float, unrealized: float,
+                      mark: Optional[float] = None):
+        if amt == 0:
+            gone = self.positions.pop(symbol, None)
+            self._sync_bot_position(symbol, None, gone['mark_price'] if gone else None)
+            return
+        if mark is None:
+            # В ACCOUNT_UPDATE нет mark price - восстанавливаем из нереализованного PnL
+            mark = entry + unrealized / amt
+        pos = {
+            'symbol': symbol,
+            'side': 'BUY' if amt > 0 else 'SELL',
+            'quantity': abs(amt),
+            'entry_price': entry,
+            'mark_price': mark,
+            'unrealized_pnl': unrealized,
+            'leverage': self.leverage.get(symbol, 0),
+        }
+        self.positions[symbol] = pos
+        self._sync_bot_position(symbol, pos)
+
+    def _sync_bot_position(self, symbol: str, pos: Optional[dict],
+                           last_mark: Optional[float] = None):
+        """Обновление позиции бота в user_data_cache["positions"] без потери TP/SL"""
+        bot_positions = self.cache.setdefault("positions", {})
+        bot_pos = bot_positions.get(symbol)
+        if bot_pos is None or not str(bot_pos.get("source", "")).startswith("binance_real"):
+            return
+        if pos is None:
+            if bot_pos.get("protective_orders"):
+                # Закрыта защитным ордером: запись снимет protective_orders по
+                # ORDER_TRADE_UPDATE, который может прийти позже этого события
+                return
+            if bot_pos.get("closing"):
+                return  # закрывает сам бот, CLOSE запишет close_position
+            bot_positions.pop(symbol, None)
+            self._closed.append((symbol, bot_pos, last_mark))
+            return
+        bot_pos.update({
+            "side": pos["side"],
+            "qty": pos["quantity"],
+            "entry": pos["entry_price"],
+            "current_price": pos["mark_price"],
+            "unrealized_pnl": pos["unrealized_pnl"],
+        })
+        if bot_pos.get("status") == "PENDING":
+            bot_pos["status"] = "OPEN"
+            bot_pos["source"] = "binance_real"
+
+    def _newer(self, key: str, event_ms: int) -> bool:
+        if event_ms < self._event_ms.get(key, 0):
+            return False
+        self._event_ms[key] = event_ms
+        return True
+
+    def apply_account_update(self, msg: dict):
+        """ACCOUNT_UPDATE: изменения балансов и позиций"""
+        event_ms = msg.get("E", _now_ms())
+        data = msg.get("a", {})
+        with self._lock:
+            for b in data.get("B", []):
+                asset = b.get("a")
+                if not asset or not self._newer("B:" + asset, event_ms):
+                    continue
+                wallet = _f(b.get("wb"))
+                cross = _f(b.get("cw"))
+                bal = self.balances.get(asset)
+                if bal is None:
+                    bal = self.balances[asset] = {"wallet": wallet, "cross_wallet": cross,
+                                                  "available": cross}
+                else:
+                    # Доступный баланс есть только в REST: сдвигаем его на изменение кошелька
+                    bal["available"] += cross - bal["cross_wallet"]
+                    bal["wallet"], bal["cross_wallet"] = wallet, cross
+
+            for p in data.get("P", []):
+                symbol = p.get("s")
+                if not symbol or p.get("ps", "BOTH") != "BOTH":
+                    continue
+                if not self._newer("P:" + symbol, event_ms):
+                    continue
+                self._set_position(symbol, _f(p.get("pa")), _f(p.get("ep")), _f(p.get("up")))
+            self.events_applied += 1
+        self._publish_closed()
+
+    def apply_order_update(self, msg: dict):
+        """ORDER_TRADE_UPDATE: учёт открытых ордеров"""
+        o = msg.get("o", {})
+        symbol, order_id = o.get("s"), o.get("i")
+        if not symbol or order_id is None:
+            return
+        with self._lock:
+            orders = self.open_orders.setdefault(symbol, {})
+            if o.get("X") in OPEN_ORDER_STATUSES:
+                orders[order_id] = Order.from_event(o)
+            else:
+                orders.pop(order_id, None)
+                if not orders:
+                    self.open_orders.pop(symbol, None)
+            self.events_applied += 1
+
+    def apply_config_update(self, msg: dict):
+        """ACCOUNT_CONFIG_UPDATE: смена плеча"""
+        ac = msg.get("ac")
+        if not ac or "s" not in ac:
+            return
+        with self._lock:
+            self.leverage[ac["s"]] = int(_f(ac.get("l")))
+            if ac["s"] in self.positions:
+                self.positions[ac["s"]]['leverage'] = self.leverage[ac["s"]]
+
+    def update_mark(self, symbol: str, price: float):
+        """Пересчёт нереализованного PnL по цене из потока свечей"""
+        with self._lock:
+            pos = self.positions.get(symbol)
+            if pos is None:
+                return
+            direction = 1 if pos['side'] == 'BUY' else -1
+            pos['mark_price'] = price
+            pos['unrealized_pnl'] = (price - pos['entry_price']) * pos['quantity'] * direction
+
+    # ---------- Сверка с REST ----------
+
+    def fetch_snapshot(self, client) -> Optional[dict]:
+        """REST-снимок для сверки (блокирующий вызов, состояние не меняет - можно в потоке)"""
+        started_ms = _now_ms()
+        account = client.get_account_info()
+        if not account:
+            return None
+        try:
+            rate_limiter.acquire_endpoint('futures_get_open_orders')
+            open_orders = client.client.futures_get_open_orders()
+        except Exception as e:
+            print(f"⚠️  Сверка: не удалось получить открытые ордера: {e}")
+            open_orders = None
+        return {"started_ms": started_ms, "account": account, "open_orders": open_orders}
+
+    def reconcile(self, client) -> bool:
+        """Сверка с futures_account и открытыми ордерами (блокирующий вызов)"""
+        snapshot = self.fetch_snapshot(client)
+        if snapshot is None:
+            return False
+        self.apply_snapshot(snapshot)
+        return True
+
+    def apply_snapshot(self, snapshot: dict):
+        """Применение снимка fetch_snapshot; из async-кода - в event loop, как и события stream"""
+        started_ms = snapshot["started_ms"]
+        account, open_orders = snapshot["account"], snapshot["open_orders"]
+        with self._lock:
+            for a in account.get("assets", []):
+                asset = a.get("asset")
+                if self._event_ms.get("B:" + asset, 0) > started_ms:
+                    continue  # событие stream новее снимка REST
+                self.balances[asset] = {
+                    "wallet": _f(a.get("walletBalance")),
+                    "cross_wallet": _f(a.get("crossWalletBalance")),
+                    "available": _f(a.get("availableBalance")),
+                }
+
+            seen = set()
+            for p in account.get("positions", []):
+                symbol = p.get("symbol")
+                if p.get("positionSide", "BOTH") != "BOTH":
+                    continue
+                if p.get("leverage") is not None:
+                    self.leverage[symbol] = int(_f(p.get("leverage")))
+                if self._event_ms.get("P:" + symbol, 0) > started_ms:
+                    seen.add(symbol)
+                    continue
+                amt = _f(p.get("positionAmt"))
+                if amt == 0:
+                    continue
+                seen.add(symbol)
+                notional = _f(p.get("notional"))
+                mark = abs(notional / amt) if notional else None
+                self._set_position(symbol, amt, _f(p.get("entryPrice")),
+                                   _f(p.get("unrealizedProfit")), mark)
+
+            for symbol in [s for s in self.positions if s not in seen]:
+                self._set_position(symbol, 0.0, 0.0, 0.0)
+
+            if open_orders is not None:
+                self.open_orders.clear()
+                for o in open_orders:
+                    self.apply_order_update({"o": {
+                        "s": o.get("symbol"), "i": o.get("orderId"), "c": o.get("clientOrderId"),
+                        "S": o.get("side"), "o": o.get("type"), "X": o.get("status"),
+                        "q": o.get("origQty"), "z": o.get("executedQty"), "p": o.get("price"),
+                        "sp": o.get("stopPrice"), "R": o.get("reduceOnly"),
+                    }})
+
+            self.last_reconcile = time.time()
+        self._publish_closed()
+
+
+# Глобальное состояние счёта
+account_state = AccountState()
@@ -0,0 +1,321 @@
+# async_binance_client.py
+"""
+Асинхронный REST-клиент Binance Futures на httpx.
+
+Один долгоживущий httpx.AsyncClient с пулом keep-alive соединений вместо
+AsyncClient.create() / close_connection() на каждый запрос. Подпись HMAC
+SHA256 считается локально, вес запросов учитывается общим rate_limiter
+(async acquire), ошибки API поднимаются как BinanceAPIException - как у
+python-binance. Методы повторяют BinanceClient, но их можно await-ить
+параллельно из event loop.
+"""
+import asyncio
+import hashlib
+import hmac
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+from binance.exceptions import BinanceAPIException
+
+from account_state import account_state
+from config import (
+    API_KEY, API_SECRET, TRADING_MODE,
+    ASYNC_HTTP_MAX_CONNECTIONS, ASYNC_HTTP_TIMEOUT,
+)
+from rate_limiter import (
+    rate_limiter, endpoint_weight, ORDER_ENDPOINTS,
+    PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW,
+)
+from symbol_registry import symbol_registry
+
+FUTURES_REST_URL = "https://fapi.binance.com"
+FUTURES_TESTNET_REST_URL = "https://testnet.binancefuture.com"
+RECV_WINDOW = 5000
+
+
+class AsyncBinanceClient:
+    """Асинхронный клиент Binance Futures с общим пулом соединений"""
+
+    def __init__(self, api_key: str = API_KEY, api_secret: str = API_SECRET,
+                 testnet: bool = TRADING_MODE != 'real', limiter=rate_limiter,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key
+        self.api_secret = api_secret or ""
+        self.testnet = testnet
+        self.base_url = FUTURES_TESTNET_REST_URL if testnet else FUTURES_REST_URL
+        self.limiter = limiter
+        self.transport = transport    # подмена транспорта (тесты)
+        self.time_offset = 0          # serverTime - локальное время, ms
+        self.requests = 0
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop = None
+
+    # ---------- Транспорт ----------
+
+    def _session(self) -> httpx.AsyncClient:
+        """Пул соединений привязан к event loop; после asyncio.run() заново создаётся"""
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop or self._http.is_closed:
+            headers = {"X-MBX-APIKEY": self.api_key} if self.api_key else {}
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=ASYNC_HTTP_TIMEOUT,
+                transport=self.transport,
+                limits=httpx.Limits(
+                    max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+            )
+            self._loop = loop
+        return self._http
+
+    def _sign(self, params: Dict) -> str:
+        params["timestamp"] = int(time.time() * 1000) + self.time_offset
+        params["recvWindow"] = RECV_WINDOW
+        query = urlencode(params)
+        signature = hmac.new(self.api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+        return f"{query}&signature={signature}"
+
+    async def _request(self, method: str, path: str, endpoint: str, params: Dict = None,
+                       signed: bool = False, priority: int = PRIORITY_NORMAL):
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        weight = endpoint_weight(endpoint, **params)
+        await self.limiter.acquire(weight, priority, 1 if endpoint in ORDER_ENDPOINTS else 0)
+
+        query = self._sign(params) if signed else urlencode(params)
+        url = f"{path}?{query}" if query else path
+        response = await self._session().request(method, url)
+        self.requests += 1
+
+        self.limiter.update_from_headers(response.headers)
+        if response.status_code in (418, 429):
+            retry_after = response.headers.get("Retry-After")
+            self.limiter.backoff(float(retry_after) if retry_after else 60.0)
+        if not 200 <= response.status_code < 300:
+            raise BinanceAPIException(response, response.status_code, response.text)
+        return response.json()
+
+    async def close(self):
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    def is_connected(self) -> bool:
+        return bool(self.api_key and self.api_secret)
+
+    def get_mode(self) -> str:
+        return 'dryrun' if self.testnet else 'real'
+
+    # ---------- Служебные ----------
+
+    async def sync_time(self) -> bool:
+        """Смещение локального времени относительно сервера (для подписи)"""
+        try:
+            started = int(time.time() * 1000)
+            data = await self._request("GET", "/fapi/v1/time", "futures_time", priority=PRIORITY_LOW)
+            finished = int(time.time() * 1000)
+            self.time_offset = data["serverTime"] - (started + finished) // 2
+            return True
+        except Exception as e:
+            print(f"⚠️  Ошибка синхронизации времени: {e}")
+            return False
+
+    async def test_connection(self) -> bool:
+        try:
+            await self._request("GET", "/fapi/v1/ping", "futures_ping", priority=PRIORITY_LOW)
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка подключения к Binance: {e}")
+            return False
+
+    async def get_exchange_info(self) -> Optional[dict]:
+        try:
+            return await self._request("GET", "/fapi/v1/exchangeInfo", "futures_exchange_info",
+                                       priority=PRIORITY_LOW)
+        except Exception as e:
+            print(f"❌ Ошибка получения exchange info: {e}")
+            return None
+
+    async def get_symbol_info(self, symbol: str) -> Optional[dict]:
+        """Информация о символе из symbol_registry (загрузка без блокировки loop)"""
+        if symbol_registry.expired():
+            exchange_info = await self.get_exchange_info()
+            if exchange_info:
+                symbol_registry.load(exchange_info)
+        filters = symbol_registry.get(symbol)
+        return filters.as_dict() if filters else None
+
+    # ---------- Счёт и позиции ----------
+
+    async def get_account_info(self) -> Optional[dict]:
+        try:
+            return await self._request("GET", "/fapi/v2/account", "futures_account", signed=True)
+        except Exception as e:
+            print(f"❌ Ошибка получения информации об аккаунте: {e}")
+            return None
+
+    async def get_balance(self, asset: str = 'USDT', fresh: bool = False) -> float:
+        """Доступный баланс (из user-data stream, если он жив)"""
+        if not fresh and account_state.is_live():
+            return account_state.get_balance(asset)
+        account = await self.get_account_info()
+        if not account:
+            return 0.0
+        if asset.upper() == 'USDT':
+            return float(account.get('availableBalance', 0))
+        for bal in account.get('assets', []):
+            if bal['asset'] == asset.upper():
+                return float(bal['availableBalance'])
+        return 0.0
+
+    async def get_positions(self, fresh: bool = False, strict: bool = False) -> List[dict]:
+        """Открытые позиции в формате BinanceClient.get_positions.
+        strict=True - ошибка запроса поднимается, а не превращается в пустой список
+        """
+        if not fresh and account_state.is_live():
+            return account_state.get_positions()
+        try:
+            positions = await self._request("GET", "/fapi/v2/positionRisk",
+                                            "futures_position_information", signed=True)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"❌ Ошибка получения позиций: {e}")
+            return []
+        return [{
+            'symbol': pos['symbol'],
+            'side': 'BUY' if float(pos['positionAmt']) > 0 else 'SELL',
+            'quantity': abs(float(pos['positionAmt'])),
+            'entry_price': float(pos['entryPrice']),
+            'mark_price': float(pos['markPrice']),
+            'unrealized_pnl': float(pos['unRealizedProfit']),
+            'leverage': int(float(pos['leverage'])),
+        } for pos in positions if float(pos['positionAmt']) != 0]
+
+    async def get_open_orders(self, symbol: Optional[str] = None) -> List[dict]:
+        try:
+            return await self._request("GET", "/fapi/v1/openOrders", "futures_get_open_orders",
+                                       {"symbol": symbol}, signed=True)
+        except Exception as e:
+            print(f"❌ Ошибка получения открытых ордеров: {e}")
+            return []
+
+    # ---------- Ордера ----------
+
+    async def place_order(self, side: str, quantity, symbol: str, order_type: str = 'MARKET',
+                          price=None, client_order_id: Optional[str] = None,
+                          reduce_only: bool = False) -> dict:
+        """Размещение ордера (ответ RESULT); ошибки API поднимаются"""
+        params = {
+            'symbol': symbol,
+            'side': side,
+            'type': order_type,
+            'quantity': quantity,
+            'newOrderRespType': 'RESULT',
+            'newClientOrderId': client_order_id,
+        }
+        if order_type == 'LIMIT' and price:
+            params['price'] = price
+            params['timeInForce'] = 'GTC'
+        if reduce_only:
+            params['reduceOnly'] = 'true'
+        return await self._request("POST", "/fapi/v1/order", "futures_create_order", params,
+                                   signed=True, priority=PRIORITY_HIGH if reduce_only else PRIORITY_NORMAL)
+
+    async def close_position(self, symbol: str, side: str, quantity,
+                             client_order_id: Optional[str] = None) -> dict:
+        """Закрытие позиции reduce-only рыночным ордером"""
+        close_side = 'SELL' if side.upper() == 'BUY' else 'BUY'
+        return await self.place_order(close_side, quantity, symbol, client_order_id=client_order_id,
+                                      reduce_only=True)
+
+    async def get_order_status(self, symbol: str, order_id) -> Optional[dict]:
+        try:
+            return await self._request("GET", "/fapi/v1/order", "futures_get_order",
+                                       {"symbol": symbol, "orderId": order_id}, signed=True)
+        except Exception as e:
+            print(f"❌ Ошибка получения статуса ордера {order_id}: {e}")
+            return None
+
+    async def cancel_order(self, symbol: str, order_id) -> Optional[dict]:
+        try:
+            result = await self._request("DELETE", "/fapi/v1/order", "futures_cancel_order",
+                                         {"symbol": symbol, "orderId": order_id}, signed=True)
+            print(f"✅ Ордер {order_id} отменен")
+            return result
+        except Exception as e:
+            print(f"❌ Ошибка отмены ордера {order_id}: {e}")
+            return None
+
+    # ---------- Рыночные данные ----------
+
+    async def get_klines(self, symbol: str, interval: str = '5m', limit: int = 500) -> list:
+        try:
+            return await self._request("GET", "/fapi/v1/klines", "futures_klines",
+                                       {"symbol": symbol, "interval": interval, "limit": limit},
+                                       priority=PRIORITY_LOW)
+        except Exception as e:
+            print(f"❌ Ошибка получения свечей для {symbol}: {e}")
+            return []
+
+    async def get_ticker_price(self, symbol: str) -> float:
+        try:
+            ticker = await self._request("GET", "/fapi/v1/ticker/price", "futures_symbol_ticker",
+                                         {"symbol": symbol}, priority=PRIORITY_LOW)
+            return float(ticker['price'])
+        except Exception as e:
+            print(f"❌ Ошибка получения цены для {symbol}: {e}")
+            return 0.0
+
+    async def get_ticker_24h(self, strict: bool = False) -> list:
+        """24h статистика по всем символам (futures_ticker).
+        strict=True - ошибка запроса поднимается, а не превращается в пустой список
+        """
+        try:
+            return await self._request("GET", "/fapi/v1/ticker/24hr", "futures_ticker",
+                                       priority=PRIORITY_LOW)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"❌ Ошибка получения тикеров: {e}")
+            return []
+
+    async def get_income_history(self, symbol: Optional[str] = None, limit: int = 100) -> list:
+        try:
+            return await self._request("GET", "/fapi/v1/income", "futures_income_history",
+                                       {"symbol": symbol, "limit": limit}, signed=True,
+                                       priority=PRIORITY_LOW)
+        except Exception as e:
+            print(f"❌ Ошибка получения истории доходов: {e}")
+            return []
+
+    async def get_funding_rate(self, symbol: str) -> float:
+        try:
+            funding = await self._request("GET", "/fapi/v1/fundingRate", "futures_funding_rate",
+                                          {"symbol": symbol, "limit": 1}, priority=PRIORITY_LOW)
+            return float(funding[0]['fundingRate']) if funding else 0.0
+        except Exception as e:
+            print(f"❌ Ошибка получения ставки финансирования для {symbol}: {e}")
+            return 0.0
+
+    # ---------- listenKey для user-data stream ----------
+
+    async def new_listen_key(self) -> str:
+        data = await self._request("POST", "/fapi/v1/listenKey", "futures_stream_get_listen_key")
+        return data["listenKey"]
+
+    async def keepalive_listen_key(self, listen_key: str):
+        return await self._request("PUT", "/fapi/v1/listenKey", "futures_stream_keepalive",
+                                   {"listenKey": listen_key})
+
+    async def close_listen_key(self, listen_key: str):
+        return await self._request("DELETE", "/fapi/v1/listenKey", "futures_stream_keepalive",
+                                   {"listenKey": listen_key})
+
+
+# Глобальный асинхронный клиент
+async_client = AsyncBinanceClient()
@@ -0,0 +1,75 @@
+"""
+Пропускная способность журнала сделок: прежняя запись (open/append/close на
+каждую запись) против очереди journal.Journal.
+
+    python bench_journal.py [количество записей]
+
+Для журнала отдельно показано, сколько стоит вызов для вызывающего кода
+(только постановка в очередь) и сколько - запись всего объёма на диск.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from journal import Journal
+
+
+def _entry(i: int) -> dict:
+    return {
+        "timestamp": "2024-01-01T00:00:00.000000",
+        "action": "CLOSE" if i % 2 else "OPEN",
+        "symbol": "BTCUSDT",
+        "side": "BUY",
+        "price": 30000.0 + i,
+        "qty": 0.001,
+        "pnl": 0.5 if i % 2 else 0.0,
+        "total_equity": 1000.0,
+        "account_balance": 1000.0,
+        "trading_mode": "dryrun",
+        "reason": "DRY_RUN",
+        "exit_reason": None,
+        "tp": 30600.0,
+        "sl": 29700.0,
+    }
+
+
+def bench_sync(path: str, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(_entry(i), ensure_ascii=False) + "\n")
+    return time.perf_counter() - start
+
+
+def bench_journal(path: str, n: int):
+    journal = Journal(path)
+    journal.start()
+    start = time.perf_counter()
+    for i in range(n):
+        journal.append(_entry(i))
+    enqueue = time.perf_counter() - start
+    journal.flush(timeout=60)
+    total = time.perf_counter() - start
+    journal.close()
+    return enqueue, total, journal.batches, journal.fsyncs
+
+
+def main(n: int = 20000):
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_path, journal_path = os.path.join(tmp, "sync.jsonl"), os.path.join(tmp, "journal.jsonl")
+        sync_time = bench_sync(sync_path, n)
+        enqueue, total, batches, fsyncs = bench_journal(journal_path, n)
+        with open(journal_path, encoding="utf-8") as f:
+            assert sum(1 for _ in f) == n
+
+    print(f"📊 Журнал сделок, {n} записей")
+    print(f"   open/append/close:      {n / sync_time:>12,.0f} записей/с")
+    print(f"   journal (постановка):   {n / enqueue:>12,.0f} записей/с")
+    print(f"   journal (до диска):     {n / total:>12,.0f} записей/с "
+          f"({batches} пачек, {fsyncs} fsync)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
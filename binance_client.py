@@ -8,6 +8,9 @@ from binance.client import Client
 from binance.exceptions import BinanceAPIException
 from binance.enums import *
 import config
+from rate_limiter import rate_limiter, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from account_state import account_state
+from symbol_registry import symbol_registry
 
 
 class BinanceClient:
@@ -17,9 +20,6 @@ class BinanceClient:
         """Инициализация клиента Binance"""
         self.client = None
         self.initialized = False
-        self.last_api_call = time.time()
-        self.api_call_count = 0
-        self.last_reset_time = time.time()
         self.testnet = config.TRADING_MODE != 'real'
         
         print(f"{'='*60}")
@@ -37,44 +37,12 @@ class BinanceClient:
             print(f"⚠️  Ошибка при инициализации: {e}")
             print("   Работаем в минимальном режиме")
 
-    def _rate_limit(self):
-        """Ограничение частоты запросов к API
-        Binance Futures лимит: 1200 запросов в минуту
-        Этот лимитер обеспечивает безопасное использование без бана
+    def _rate_limit(self, endpoint, priority=PRIORITY_LOW, **params):
+        """Ожидание веса запроса в общем лимитере (rate_limiter.py).
+        Заголовки X-MBX-USED-WEIGHT-1M каждого ответа синхронизируют лимитер
+        через хук сессии requests (см. initialize_client)
         """
-        import time
-        
-        current_time = time.time()
-        
-        # 1. Сбрасываем счетчик каждую минуту
-        if current_time - self.last_reset_time > 60:
-            if self.api_call_count > 0:
-                print(f"📊 API запросов за последнюю минуту: {self.api_call_count}")
-            self.api_call_count = 0
-            self.last_reset_time = current_time
-        
-        # 2. Основная задержка между запросами
-        # 0.1 секунды = макс 10 запросов/сек = 600/мин (безопасно)
-        time_since_last = current_time - self.last_api_call
-        if time_since_last < 0.1:
-            sleep_time = 0.1 - time_since_last
-            time.sleep(sleep_time)
-        
-        # 3. Обновляем временные метки
-        self.last_api_call = time.time()
-        self.api_call_count += 1
-        
-        # 4. Предупреждение при достижении 500 запросов
-        if self.api_call_count > 500:
-            print(f"⚠️  Внимание: {self.api_call_count}/600 запросов к API за минуту")
-        
-        # 5. Аварийное торможение при 1100+ запросах
-        # (Binance лимит 1200, оставляем запас 100)
-        if self.api_call_count > 1100:
-            sleep_time = 60 - (current_time - self.last_reset_time)
-            if sleep_time > 0:
-                print(f"🚨 Лимит API! Ждем {sleep_time:.1f} секунд...")
-                time.sleep(sleep_time)
+        rate_limiter.acquire_endpoint(endpoint, priority, **params)
    
     def initialize_client(self):
         """Инициализация клиента Binance"""
@@ -99,6 +67,9 @@ class BinanceClient:
                     api_secret=config.API_SECRET
                 )
             
+            # Лимитер видит фактический расход веса по заголовкам каждого ответа
+            self.client.session.hooks['response'].append(rate_limiter.on_response)
+            
             # Синхронизируем время
             if not self.sync_time():
                 print("⚠️  Внимание: время не синхронизировано!")
@@ -158,7 +129,7 @@ class BinanceClient:
     
     def sync_time(self):
         """Синхронизация времени с сервером Binance с коррекцией"""
-        self._rate_limit()
+        self._rate_limit('get_server_time')
     
         try:
             # Получаем время сервера несколько раз для точности
@@ -202,7 +173,7 @@ class BinanceClient:
     
     def test_connection(self):
         """Тестирование подключения к Binance"""
-        self._rate_limit()
+        self._rate_limit('futures_exchange_info')
         
         try:
             # Проверяем доступ к API
@@ -222,7 +193,7 @@ class BinanceClient:
     
     def get_account_info(self):
         """Получение информации об аккаунте"""
-        self._rate_limit()
+        self._rate_limit('futures_account', PRIORITY_NORMAL)
         
         try:
             account_info = self.client.futures_account()
@@ -236,13 +207,16 @@ class BinanceClient:
             print(f"❌ Ошибка при запросе аккаунта: {e}")
             return None
     
-    def get_balance(self, asset='USDT'):
-        """Получение баланса"""
+    def get_balance(self, asset='USDT', fresh=False):
+        """Получение баланса (из user-data stream, если он жив; fresh=True - всегда REST)"""
         if not self.initialized:
             print("⚠️  Клиент не инициализирован")
             return 0.0
         
-        self._rate_limit()
+        if not fresh and account_state.is_live():
+            return account_state.get_balance(asset)
+        
+        self._rate_limit('futures_account', PRIORITY_NORMAL)
         
         try:
             if asset.upper() == 'USDT':
@@ -267,13 +241,20 @@ class BinanceClient:
             print(f"❌ Ошибка получения баланса {asset}: {e}")
             return 0.0
     
-    def get_positions(self):
-        """Получение текущих позиций"""
+    def get_positions(self, fresh=False, strict=False):
+        """Получение текущих позиций (из user-data stream, если он жив; fresh=True - всегда REST).
+        strict=True - ошибка запроса поднимается, а не превращается в пустой список
+        """
         if not self.initialized:
+            if strict:
+                raise RuntimeError("Клиент не инициализирован")
             print("⚠️  Клиент не инициализирован")
             return []
         
-        self._rate_limit()
+        if not fresh and account_state.is_live():
+            return account_state.get_positions()
+        
+        self._rate_limit('futures_position_information', PRIORITY_NORMAL)
         
         try:
             positions = self.client.futures_position_information()
@@ -295,47 +276,17 @@ class BinanceClient:
             return open_positions
             
         except Exception as e:
+            if strict:
+                raise
             print(f"❌ Ошибка получения позиций: {e}")
             return []
     
     def get_symbol_info(self, symbol):
-        """Получение информации о символе"""
-        self._rate_limit()
-        
+        """Получение информации о символе (из кеша exchange info, см. symbol_registry.py)"""
         try:
-            exchange_info = self.client.futures_exchange_info()
-            
-            for sym_info in exchange_info['symbols']:
-                if sym_info['symbol'] == symbol:
-                    info = {
-                        'symbol': symbol,
-                        'status': sym_info['status'],
-                        'baseAsset': sym_info['baseAsset'],
-                        'quoteAsset': sym_info['quoteAsset'],
-                        'filters': {}
-                    }
-                    
-                    # Извлекаем фильтры
-                    for filt in sym_info['filters']:
-                        filter_type = filt['filterType']
-                        info['filters'][filter_type] = filt
-                    
-                    # Упрощенные поля для удобства
-                    lot_size = info['filters'].get('LOT_SIZE', {})
-                    price_filter = info['filters'].get('PRICE_FILTER', {})
-                    min_notional = info['filters'].get('MIN_NOTIONAL', {})
-                    
-                    info['min_qty'] = float(lot_size.get('minQty', 0))
-                    info['max_qty'] = float(lot_size.get('maxQty', 0))
-                    info['step_size'] = float(lot_size.get('stepSize', 0.001))
-                    
-                    info['min_price'] = float(price_filter.get('minPrice', 0))
-                    info['max_price'] = float(price_filter.get('maxPrice', 0))
-                    info['tick_size'] = float(price_filter.get('tickSize', 0.01))
-                    
-                    info['min_notional'] = float(min_notional.get('minNotional', 5))
-                    
-                    return info
+            filters = symbol_registry.get(symbol)
+            if filters:
+                return filters.as_dict()
             
             print(f"⚠️  Символ {symbol} не найден")
             return None
@@ -344,12 +295,13 @@ class BinanceClient:
             print(f"❌ Ошибка получения информации о символе {symbol}: {e}")
             return None
     
-    def place_order(self, side, quantity, symbol, order_type=ORDER_TYPE_MARKET, price=None):
-        """Размещение ордера"""
+    def place_order(self, side, quantity, symbol, order_type=ORDER_TYPE_MARKET, price=None,
+                    client_order_id=None, reduce_only=False):
+        """Размещение ордера (ответ RESULT: статус, исполненное количество и средняя цена)"""
         if not self.initialized:
             raise Exception("Клиент не инициализирован")
         
-        self._rate_limit()
+        self._rate_limit('futures_create_order', PRIORITY_HIGH if reduce_only else PRIORITY_NORMAL)
         
         try:
             print(f"\n{'='*40}")
@@ -369,8 +321,13 @@ class BinanceClient:
                 'symbol': symbol,
                 'side': side,
                 'type': order_type,
-                'quantity': quantity
+                'quantity': quantity,
+                'newOrderRespType': 'RESULT'
             }
+            if client_order_id:
+                order_params['newClientOrderId'] = client_order_id
+            if reduce_only:
+                order_params['reduceOnly'] = True
             
             # Для лимитных ордеров добавляем цену
             if order_type == ORDER_TYPE_LIMIT and price:
@@ -405,12 +362,12 @@ class BinanceClient:
             print(f"\n❌ Общая ошибка при размещении ордера: {e}")
             raise
 
-    def close_position(self, symbol, side, quantity):
+    def close_position(self, symbol, side, quantity, client_order_id=None):
         """Закрытие позиции"""
         if not self.initialized:
             raise Exception("Клиент не инициализирован")
     
-        self._rate_limit()
+        self._rate_limit('futures_create_order', PRIORITY_HIGH)
     
         try:    
             # Определяем сторону для закрытия (противоположная)
@@ -439,7 +396,9 @@ class BinanceClient:
                 side=close_side,
                 type=ORDER_TYPE_MARKET,
                 quantity=quantity,
-                reduceOnly=True  # Только уменьшение позиции
+                reduceOnly=True,  # Только уменьшение позиции
+                newOrderRespType='RESULT',
+                **({'newClientOrderId': client_order_id} if client_order_id else {})
             )
             
             print(f"\n✅ Позиция успешно закрыта!")
@@ -456,11 +415,13 @@ class BinanceClient:
                 print(f"⚠️  Номинал ордера меньше минимального. Пробую без reduceOnly...")
                 try:
                     # Пробуем без reduceOnly
+                    self._rate_limit('futures_create_order', PRIORITY_HIGH)
                     order = self.client.futures_create_order(
                         symbol=symbol,
                         side=close_side,
                         type=ORDER_TYPE_MARKET,
-                        quantity=quantity
+                        quantity=quantity,
+                        newOrderRespType='RESULT'
                         # Без reduceOnly
                     )
                     print(f"✅ Закрыто без reduceOnly")
@@ -477,7 +438,7 @@ class BinanceClient:
     
     def get_klines(self, symbol, interval='5m', limit=500):
         """Получение исторических свечей"""
-        self._rate_limit()
+        self._rate_limit('futures_klines', limit=limit)
         
         try:
             klines = self.client.futures_klines(
@@ -493,7 +454,7 @@ class BinanceClient:
     
     def get_ticker_price(self, symbol):
         """Получение текущей цены"""
-        self._rate_limit()
+        self._rate_limit('futures_symbol_ticker', symbol=symbol)
         
         try:
             ticker = self.client.futures_symbol_ticker(symbol=symbol)
@@ -505,7 +466,7 @@ class BinanceClient:
     
     def get_order_status(self, symbol, order_id):
         """Получение статуса ордера"""
-        self._rate_limit()
+        self._rate_limit('futures_get_order', PRIORITY_NORMAL)
         
         try:
             order = self.client.futures_get_order(
@@ -520,7 +481,7 @@ class BinanceClient:
     
     def cancel_order(self, symbol, order_id):
         """Отмена ордера"""
-        self._rate_limit()
+        self._rate_limit('futures_cancel_order', PRIORITY_NORMAL)
         
         try:
             result = self.client.futures_cancel_order(
@@ -533,10 +494,60 @@ class BinanceClient:
         except Exception as e:
             print(f"❌ Ошибка отмены ордера {order_id}: {e}")
             return None
+
+    def get_open_orders(self, symbol=None):
+        """Открытые ордера (по символу или все)"""
+        params = {'symbol': symbol} if symbol else {}
+        self._rate_limit('futures_get_open_orders', PRIORITY_NORMAL, **params)
+        
+        try:
+            return self.client.futures_get_open_orders(**params)
+            
+        except Exception as e:
+            print(f"❌ Ошибка получения открытых ордеров: {e}")
+            return []
+    
+    def place_stop_order(self, symbol, side, order_type, quantity, stop_price=None,
+                         callback_rate=None, activation_price=None, client_order_id=None):
+        """Защитный reduce-only ордер: STOP_MARKET / TAKE_PROFIT_MARKET / TRAILING_STOP_MARKET.
+        Срабатывает по mark price на стороне биржи; ошибки API поднимаются
+        """
+        if not self.initialized:
+            raise Exception("Клиент не инициализирован")
+        
+        self._rate_limit('futures_create_order', PRIORITY_HIGH)
+        
+        order_params = {
+            'symbol': symbol,
+            'side': side,
+            'type': order_type,
+            'quantity': quantity,
+            'reduceOnly': True,
+            'workingType': 'MARK_PRICE',
+        }
+        if stop_price is not None:
+            order_params['stopPrice'] = stop_price
+        if callback_rate is not None:
+            order_params['callbackRate'] = callback_rate
+        if activation_price is not None:
+            order_params['activationPrice'] = activation_price
+        if client_order_id:
+            order_params['newClientOrderId'] = client_order_id
+        
+        try:
+            order = self.client.futures_create_order(**order_params)
+            print(f"🛡️  {order_type} {symbol} {side} размещен: ID {order['orderId']}"
+                  f"{f', stop {stop_price}' if stop_price is not None else ''}")
+            return order
+            
+        except BinanceAPIException as e:
+            print(f"❌ Ошибка API при размещении {order_type} {symbol}: {e.code} - {e.message}")
+            self._handle_api_error(e)
+            raise
     
     def get_income_history(self, symbol=None, limit=100):
         """Получение истории доходов (комиссии, финансирование)"""
-        self._rate_limit()
+        self._rate_limit('futures_income_history')
         
         try:
             params = {'limit': limit}
@@ -552,7 +563,7 @@ class BinanceClient:
     
     def get_funding_rate(self, symbol):
         """Получение текущей ставки финансирования"""
-        self._rate_limit()
+        self._rate_limit('futures_funding_rate')
         
         try:
             funding = self.client.futures_funding_rate(symbol=symbol, limit=1)
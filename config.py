@@ -21,11 +21,25 @@ TOP_N_TICKERS = 10
 MIN_PRICE = 0.1
 MIN_VOLUME = 1_000_000
 MAX_SPREAD_PERCENT = 5.0
+KLINES_CACHE_SIZE = 500  # сколько свечей храним на символ
+
+# WebSocket
+WS_MULTIPLEX = True  # одно combined-stream соединение вместо сокета на каждый символ
+WS_STREAMS_PER_CONNECTION = 200  # потоков на одно соединение (шардирование)
+WARMUP_CONCURRENCY = 8  # параллельных загрузок истории при старте
 
 # Strategies
 SEND_TO_CHANNEL = True
 SEND_TO_ME = True
 
+# Telegram notifications
+NOTIFY_COALESCE_WINDOW = 1.0  # сек: сообщения в один чат за окно склеиваются в одно (notifier.py)
+NOTIFY_CHAT_INTERVAL = 1.0  # сек между сообщениями в личный чат (лимит Telegram ~1/сек)
+NOTIFY_CHANNEL_INTERVAL = 3.0  # сек между сообщениями в канал/группу (лимит Telegram 20/мин)
+NOTIFY_GLOBAL_RATE = 25  # сообщений в секунду на бота (лимит Telegram 30/сек)
+NOTIFY_DEDUP_TTL = 60.0  # сек: одинаковый текст в тот же чат повторно не отправляется
+NOTIFY_MAX_PENDING = 200  # сообщений в очереди одного чата, старые сверх лимита отбрасываются
+
 
 # Strategies optimization grids
 BBRSI_PARAM_GRID = [
@@ -37,12 +51,47 @@ BBRSI_PARAM_GRID = [
 BREAKOUT_PARAM_GRID = [{"period": p} for p in range(10, 31, 5)]
 USE_BBRSI = True
 USE_BREAKOUT = True
+OPTIMIZER_WORKERS = 0  # процессов для оптимизации параметров (0 - по числу ядер)
+OPTIMIZER_VECTORIZED = True  # ранжировать сетку векторно, точный бэктест только для лучших параметров
+OPT_CACHE_FILE = "optimization_cache.json"  # кеш результатов оптимизации (None - не сохранять)
+OPT_CACHE_TTL = 6 * 3600  # сек жизни записи кеша
+OPT_CACHE_MAX_ENTRIES = 500  # записей (символ × стратегия × сетка), старые вытесняются
+OPT_CACHE_MAX_NEW_BARS = 12  # новых баров, после которых символ переоптимизируется
+OPT_CACHE_MAX_PRICE_MOVE = 0.02  # сдвиг цены (доля), после которого символ переоптимизируется
+REOPT_EVERY_BARS = 24  # новых закрытых баров до фоновой переоптимизации символа
+REOPT_CPU_BUDGET = 0.25  # доля времени, которую может занимать фоновая оптимизация
+REOPT_POLL_INTERVAL = 30  # сек между проверками планировщика
+REOPT_NICE = 10  # понижение приоритета процесса фоновой оптимизации
 
 # Trading / risk
 INITIAL_CASH = 500.0
 LEVERAGE = 10
 RISK_FRACTION = 0.1  # 10% of equity per trade
 
+# Исполнение ордеров (вне event loop)
+ORDER_QUEUE_SIZE = 100  # максимум намерений в очереди
+ORDER_EXECUTOR_WORKERS = 4  # потоков для REST-вызовов
+ORDER_DRAIN_TIMEOUT = 30.0  # сек на исполнение принятых намерений при остановке
+
+# Подтверждение исполнения ордеров
+FILL_WAIT_TIMEOUT = 5.0  # сек ожидания ORDER_TRADE_UPDATE из user-data stream
+FILL_POLL_INTERVAL = 0.25  # сек между запросами статуса, если stream недоступен
+FILL_POLL_ATTEMPTS = 8  # максимум запросов статуса ордера
+LISTEN_KEY_KEEPALIVE = 30 * 60  # продление listenKey (ключ живёт 60 минут)
+ACCOUNT_RECONCILE_INTERVAL = 60  # сек между сверками позиций/баланса с REST
+ACCOUNT_STALE_AFTER = 180  # сек без сверки, после которых снова читаем REST
+POSITION_RECONCILE_INTERVAL = 30  # сек между сверками позиций бота с биржей (reconciler.py)
+
+# Лимиты Binance Futures API
+API_WEIGHT_LIMIT = 2400  # вес запросов в минуту (REQUEST_WEIGHT)
+API_ORDERS_PER_10S = 300  # ордеров за 10 секунд
+API_ORDERS_PER_MIN = 1200  # ордеров в минуту
+API_NORMAL_PRIORITY_RESERVE = 0.10  # доля лимита, недоступная обычным запросам
+API_LOW_PRIORITY_RESERVE = 0.25  # доля лимита, недоступная справочным запросам
+SYMBOL_INFO_TTL = 3600  # сек жизни кеша exchange info (фильтры символов)
+ASYNC_HTTP_MAX_CONNECTIONS = 20  # keep-alive соединений асинхронного REST-клиента
+ASYNC_HTTP_TIMEOUT = 10.0  # сек таймаута запроса
+
 # Стратегия TP/SL
 TP_STRATEGY = "rr"  # "fixed", "rr", "atr"
 
@@ -58,8 +107,25 @@ RISK_PERCENT = 0.01  # 1% риск
 # Для ATR:
 ATR_TP_MULTIPLIER = 2.0
 ATR_SL_MULTIPLIER = 1.0
+ATR_PERIOD = 14
+
+# Триггеры TP/SL по тикам (trigger_engine.py)
+TRIGGER_TRAIL_ACTIVATION = 0.01  # трейлинг включается после движения цены на 1% в прибыль
+TRIGGER_STALE_AFTER = 15  # сек без тиков по символу, после которых цена берётся из REST
+
+# Защитные ордера на бирже (STOP_MARKET / TAKE_PROFIT_MARKET)
+PROTECTIVE_ORDERS = False  # ставить TP/SL ордерами Binance сразу после открытия позиции
+PROTECTIVE_NATIVE_TRAILING = False  # трейлинг ордером TRAILING_STOP_MARKET вместо переноса STOP_MARKET
+PROTECTIVE_AMEND_MIN_STEP = 0.001  # минимальный сдвиг стопа (доля цены) для переноса ордера
 
 
 # Logging / files
 LOG_FILE = "trades_real.log"
-POSITIONS_LOG_FILE = "positions_log.json"
+POSITIONS_LOG_FILE = "positions_log.json"  # журнал сделок, JSON Lines (только дозапись)
+POSITIONS_STATE_FILE = "positions_state.json"  # история закрытых позиций (data_store.save_positions_to_file)
+LOG_INDEX_EVERY = 256  # шаг индекса смещений журнала сделок (log_reader.py)
+TRADE_STATS_FILE = "trade_stats.json"  # накопленная статистика сделок (trade_stats.py)
+JOURNAL_BATCH_SIZE = 256  # записей журнала сделок за один write (journal.py)
+JOURNAL_FLUSH_INTERVAL = 0.5  # сек ожидания новых записей перед записью пачки
+JOURNAL_FSYNC_INTERVAL = 5.0  # сек между fsync журнала (0 - после каждой пачки)
+LEDGER_DB_FILE = "trades_ledger.db"  # SQLite с историей и итогами сделок (ledger.py)
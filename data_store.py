@@ -1,57 +1,255 @@
 import pandas as pd
+import numpy as np
 import json
 import os
-from config import TRADING_MODE, POSITIONS_LOG_FILE  # добавляем импорт
+from collections.abc import MutableMapping
+from config import TRADING_MODE, POSITIONS_LOG_FILE, POSITIONS_STATE_FILE, KLINES_CACHE_SIZE  # добавляем импорт
+from models import PositionStore
 import time
+
+KLINE_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+
+class _SymbolKlines:
+    """Кольцевой буфер свечей одного символа.
+
+    Строки массива: время открытия (ms), Open, High, Low, Close, Volume.
+    Каждое значение пишется дважды (slot и slot + capacity), поэтому
+    последние N свечей всегда лежат в памяти непрерывно и читаются
+    срезом без копирования.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data = np.zeros((len(KLINE_FIELDS) + 1, capacity * 2), dtype=np.float64)
+        self.end = 0          # сколько свечей записано за всё время
+        self.length = 0       # сколько свечей доступно сейчас (<= capacity)
+        self.version = 0      # растёт при каждой записи
+        self.closed_count = 0 # сколько свечей закрылось с момента загрузки
+        self._frame = None
+        self._frame_version = -1
+
+    @property
+    def last_ts(self):
+        if not self.length:
+            return None
+        return int(self.data[0, (self.end - 1) % self.capacity])
+
+    def _write(self, slot: int, ts: int, o: float, h: float, l: float, c: float, v: float):
+        col = (ts, o, h, l, c, v)
+        self.data[:, slot] = col
+        self.data[:, slot + self.capacity] = col
+
+    def update(self, ts: int, o: float, h: float, l: float, c: float, v: float) -> str:
+        """Обновление формирующейся свечи или добавление новой.
+
+        Возвращает "update", "append" или "stale" (устаревшее сообщение).
+        """
+        last_ts = self.last_ts
+        if last_ts is not None and ts == last_ts:
+            self._write((self.end - 1) % self.capacity, ts, o, h, l, c, v)
+            self.version += 1
+            return "update"
+        if last_ts is not None and ts < last_ts:
+            return "stale"
+
+        self._write(self.end % self.capacity, ts, o, h, l, c, v)
+        self.end += 1
+        if self.length < self.capacity:
+            self.length += 1
+        if last_ts is not None:
+            self.closed_count += 1
+        self.version += 1
+        return "append"
+
+    def view(self) -> np.ndarray:
+        """Непрерывный read-only срез (6 x length) без копирования"""
+        start = (self.end - self.length) % self.capacity
+        window = self.data[:, start:start + self.length]
+        window.flags.writeable = False
+        return window
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame поверх массивов; пересобирается только после изменений"""
+        if self._frame_version != self.version:
+            window = self.view()
+            index = pd.to_datetime(window[0].astype(np.int64), unit="ms")
+            self._frame = pd.DataFrame(
+                {name: window[i + 1] for i, name in enumerate(KLINE_FIELDS)},
+                index=index,
+                copy=False,
+            )
+            self._frame_version = self.version
+        return self._frame
+
+
+class KlineStore:
+    """Хранилище свечей на преаллоцированных NumPy-массивах.
+
+    Обновление формирующейся свечи и добавление закрытой - O(1),
+    без пересоздания DataFrame на каждом сообщении WebSocket.
+    """
+
+    def __init__(self, capacity: int = KLINES_CACHE_SIZE):
+        self.capacity = capacity
+        self._symbols = {}
+        self._generations = {}  # растёт при каждой перезагрузке истории символа
+
+    def __contains__(self, symbol):
+        return symbol in self._symbols and self._symbols[symbol].length > 0
+
+    def symbols(self):
+        return [s for s, buf in self._symbols.items() if buf.length > 0]
+
+    def update(self, symbol: str, ts: int, o: float, h: float, l: float, c: float, v: float) -> str:
+        """Обновление свечи из сообщения WebSocket"""
+        buf = self._symbols.get(symbol)
+        if buf is None:
+            buf = self._symbols[symbol] = _SymbolKlines(self.capacity)
+        return buf.update(ts, o, h, l, c, v)
+
+    def load_frame(self, symbol: str, df: pd.DataFrame):
+        """Загрузка истории из DataFrame (REST / тестовые данные)"""
+        buf = _SymbolKlines(self.capacity)
+        if df is not None and not df.empty:
+            df = df.tail(self.capacity)
+            if "Open time" in df.columns:
+                times = pd.to_datetime(df["Open time"])
+            elif isinstance(df.index, pd.DatetimeIndex):
+                times = df.index
+            else:
+                times = None
+
+            if times is not None:
+                ts = np.asarray(times.values).astype("datetime64[ms]").astype(np.int64)
+            else:
+                ts = np.arange(len(df), dtype=np.int64)
+
+            values = df[list(KLINE_FIELDS)].to_numpy(dtype=np.float64)
+            for i in range(len(df)):
+                buf.update(int(ts[i]), *values[i])
+            buf.closed_count = 0
+        self._symbols[symbol] = buf
+        self._generations[symbol] = self._generations.get(symbol, 0) + 1
+
+    def remove(self, symbol: str):
+        self._symbols.pop(symbol, None)
+
+    def length(self, symbol: str) -> int:
+        buf = self._symbols.get(symbol)
+        return buf.length if buf else 0
+
+    def generation(self, symbol: str) -> int:
+        return self._generations.get(symbol, 0)
+
+    def version(self, symbol: str) -> int:
+        buf = self._symbols.get(symbol)
+        return buf.version if buf else -1
+
+    def closed_count(self, symbol: str) -> int:
+        buf = self._symbols.get(symbol)
+        return buf.closed_count if buf else 0
+
+    def arrays(self, symbol: str):
+        """Read-only массивы {"Time", "Open", ..., "Volume"} без копирования"""
+        buf = self._symbols.get(symbol)
+        if buf is None or not buf.length:
+            return None
+        window = buf.view()
+        arrays = {"Time": window[0]}
+        for i, name in enumerate(KLINE_FIELDS):
+            arrays[name] = window[i + 1]
+        return arrays
+
+    def frame(self, symbol: str):
+        """Read-only DataFrame для стратегий и бэктеста"""
+        buf = self._symbols.get(symbol)
+        if buf is None or not buf.length:
+            return None
+        return buf.frame()
+
+
+class KlinesCacheFacade(MutableMapping):
+    """Совместимость со старым dict klines_cache поверх KlineStore"""
+
+    def __init__(self, store: KlineStore):
+        self._store = store
+
+    def __getitem__(self, symbol):
+        df = self._store.frame(symbol)
+        if df is None:
+            raise KeyError(symbol)
+        return df
+
+    def __setitem__(self, symbol, df):
+        self._store.load_frame(symbol, df)
+
+    def __delitem__(self, symbol):
+        if symbol not in self._store:
+            raise KeyError(symbol)
+        self._store.remove(symbol)
+
+    def __iter__(self):
+        return iter(self._store.symbols())
+
+    def __len__(self):
+        return len(self._store.symbols())
+
+
 # Кеш свечей для каждого символа
+kline_store = KlineStore()
 # Формат: {"SYMBOL": pd.DataFrame с колонками ["Open", "High", "Low", "Close", "Volume"]}
-klines_cache = {}
+klines_cache = KlinesCacheFacade(kline_store)
+
+# Оптимизированные параметры стратегий по символам (optimizer.py)
+# Формат: {"BTCUSDT": {"bbrsi": {"bol_period": 30, ...}, "breakout": {"period": 20}}}
+strategy_params = {}
+
+# Символы для открытия новых позиций (топ-N оптимизации); кортеж заменяется целиком
+trading_state = {
+    "top_symbols": (),
+    "updated": 0.0,
+}
 
 # Пользовательские данные (позиции, баланс и т.д.)
 # Структура:
 # {
-#   "positions": {
-#       "BTCUSDT": {
-#           "side": "BUY" / "SELL",
-#           "qty": float,
-#           "entry": float,
-#           "tp": float,
-#           "sl": float,
-#           "trail_percent": float,
-#           "trailing": bool,
-#           "trail_pending": bool
-#       },
-#       ...
-#   },
-#   "real_positions": []  # для хранения реальных позиций с Binance
+#   "positions": PositionStore {"BTCUSDT": Position, ...},  # позиции бота (models.py)
+#   "real_positions": {"BTCUSDT": {...}},  # позиции с Binance (account_state.py)
+#   "balances": {"USDT": {"wallet", "cross_wallet", "available"}}
 # }
 user_data_cache = {
-    "positions": {},
-    "real_positions": []  # добавляем поле для реальных позиций
+    "positions": PositionStore(),
+    "real_positions": {},  # заполняется из user-data stream
+    "balances": {}
 }
 
 def load_positions_from_file():
     """Загружает позиции из файла при запуске"""
     global user_data_cache
     
+    # Раньше документ писался поверх журнала сделок - читаем его оттуда, если нового файла нет
+    path = POSITIONS_STATE_FILE if os.path.exists(POSITIONS_STATE_FILE) else POSITIONS_LOG_FILE
     try:
-        if os.path.exists(POSITIONS_LOG_FILE):
-            with open(POSITIONS_LOG_FILE, 'r') as f:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
                 data = json.load(f)
                 
                 # Загружаем только закрытые позиции для истории
                 if "closed_positions" in data:
                     user_data_cache["closed_positions"] = data["closed_positions"]
                     
-                print(f"✅ Загружены позиции из {POSITIONS_LOG_FILE}")
+                print(f"✅ Загружены позиции из {path}")
                 return True
+    except ValueError:
+        pass  # журнал в формате JSON Lines - истории закрытых позиций в нём нет
     except Exception as e:
         print(f"❌ Ошибка загрузки позиций из файла: {e}")
     
     return False
 
 def save_positions_to_file():
-    """Сохраняет позиции в файл"""
+    """Сохраняет позиции в POSITIONS_STATE_FILE (журнал сделок не трогает)"""
     try:
         # Сохраняем только историю закрытых позиций
         data_to_save = {
@@ -60,58 +258,17 @@ def save_positions_to_file():
             "last_update": pd.Timestamp.now().isoformat()
         }
         
-        with open(POSITIONS_LOG_FILE, 'w') as f:
+        # Запись во временный файл и замена: при сбое остаётся прежняя версия
+        tmp_path = POSITIONS_STATE_FILE + ".tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(data_to_save, f, indent=2, default=str)
+        os.replace(tmp_path, POSITIONS_STATE_FILE)
             
         return True
     except Exception as e:
         print(f"❌ Ошибка сохранения позиций: {e}")
         return False
 
-def sync_real_positions(binance_positions):
-    """Синхронизация позиций с Binance"""
-    try:
-        from data_store import user_data_cache
-        
-        positions_dict = user_data_cache.get("positions", {})
-        
-        # Очищаем старые реальные позиции
-        keys_to_remove = []
-        for key, pos in positions_dict.items():
-            if pos.get('source') == 'binance_real':
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            positions_dict.pop(key, None)
-        
-        # Добавляем актуальные позиции
-        for pos in binance_positions:
-            position_amt = float(pos.get('positionAmt', 0))
-            
-            if position_amt != 0:
-                symbol = pos.get('symbol')
-                if not symbol.endswith('USDT'):
-                    symbol = symbol + 'USDT'
-                
-                positions_dict[symbol] = {
-                    'symbol': symbol,
-                    'side': 'BUY' if position_amt > 0 else 'SELL',
-                    'qty': abs(position_amt),
-                    'entry': float(pos.get('entryPrice', 0)),
-                    'current_price': float(pos.get('markPrice', 0)),
-                    'unrealized_pnl': float(pos.get('unRealizedProfit', 0)),
-                    'realized_pnl': float(pos.get('realizedProfit', 0)),
-                    'leverage': float(pos.get('leverage', 1)),
-                    'source': 'binance_real',
-                    'timestamp': time.time()
-                }
-        
-        user_data_cache["positions"] = positions_dict
-        print(f"✅ Синхронизировано позиций: {len([p for p in positions_dict.values() if p.get('source') == 'binance_real'])}")
-        
-    except Exception as e:
-        print(f"❌ Ошибка синхронизации позиций: {e}")
-
 def get_all_positions():
     """Возвращает все позиции (виртуальные и реальные)"""
     positions = []
@@ -125,7 +282,7 @@ def get_all_positions():
         })
     
     # Реальные позиции (для real mode)
-    positions.extend(user_data_cache.get("real_positions", []))
+    positions.extend(user_data_cache.get("real_positions", {}).values())
     
     return positions
 
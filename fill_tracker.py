@@ -0,0 +1,121 @@
+# fill_tracker.py
+"""
+Подтверждение исполнения ордеров.
+
+Ордера размещаются с newOrderRespType=RESULT и собственным clientOrderId.
+Если ответ уже содержит FILLED - исполнение известно сразу. Иначе ждём
+ORDER_TRADE_UPDATE из user-data stream (user_data_stream.py), а если
+stream недоступен - делаем ограниченный опрос статуса ордера.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from config import FILL_WAIT_TIMEOUT, FILL_POLL_INTERVAL, FILL_POLL_ATTEMPTS
+from models import Fill
+
+TERMINAL_STATUSES = {"FILLED", "CANCELED", "EXPIRED", "EXPIRED_IN_MATCH", "REJECTED"}
+
+
+def new_client_order_id(prefix: str = "bot") -> str:
+    """clientOrderId для сопоставления ответа и событий stream (до 36 символов)"""
+    return f"{prefix}-{uuid.uuid4().hex[:24]}"
+
+
+def fill_from_response(order: dict, source: str = "response") -> Fill:
+    """Нормализация ответа REST (RESULT / futures_get_order)"""
+    return Fill.from_rest(order, source)
+
+
+def fill_from_event(order: dict) -> Fill:
+    """Нормализация поля "o" события ORDER_TRADE_UPDATE"""
+    return Fill.from_event(order)
+
+
+class FillTracker:
+    """Последние состояния ордеров из user-data stream по clientOrderId.
+
+    События приходят в event loop, а ждут их потоки исполнителя ордеров,
+    поэтому доступ защищён блокировкой, а ожидание - threading.Event.
+    """
+
+    def __init__(self, keep: int = 500):
+        self.keep = keep
+        self.stream_alive = False  # выставляет UserDataStream
+        self._lock = threading.Lock()
+        self._fills = OrderedDict()
+        self._waiters = {}
+
+    def on_order_update(self, order: dict):
+        """Обработчик ORDER_TRADE_UPDATE (передаётся поле "o")"""
+        fill = fill_from_event(order)
+        client_id = fill.client_order_id
+        if not client_id:
+            return
+        with self._lock:
+            self._fills[client_id] = fill
+            self._fills.move_to_end(client_id)
+            while len(self._fills) > self.keep:
+                self._fills.popitem(last=False)
+            waiter = self._waiters.get(client_id)
+        if waiter is not None and fill.status in TERMINAL_STATUSES:
+            waiter.set()
+
+    def get(self, client_id: str) -> Optional[Fill]:
+        with self._lock:
+            return self._fills.get(client_id)
+
+    def wait(self, client_id: str, timeout: float = FILL_WAIT_TIMEOUT) -> Optional[Fill]:
+        """Ожидание финального статуса ордера; событие могло прийти раньше ответа REST"""
+        with self._lock:
+            fill = self._fills.get(client_id)
+            if fill and fill.status in TERMINAL_STATUSES:
+                return fill
+            waiter = self._waiters.setdefault(client_id, threading.Event())
+        try:
+            waiter.wait(timeout)
+        finally:
+            with self._lock:
+                self._waiters.pop(client_id, None)
+        return self.get(client_id)
+
+
+def confirm_fill(client, symbol: str, order: dict, tracker: "FillTracker" = None,
+                 timeout: float = FILL_WAIT_TIMEOUT) -> Optional[Fill]:
+    """Исполнение ордера: ответ RESULT -> ORDER_TRADE_UPDATE -> ограниченный опрос.
+
+    Возвращает последнее известное состояние (status может быть не финальным,
+    если ордер так и не исполнился за отведённое время).
+    """
+    if not order:
+        return None
+    tracker = tracker or fill_tracker
+
+    fill = fill_from_response(order)
+    if fill.status in TERMINAL_STATUSES:
+        return fill
+
+    client_id = fill.client_order_id
+    if tracker.stream_alive and client_id:
+        event_fill = tracker.wait(client_id, timeout)
+        if event_fill and event_fill.status in TERMINAL_STATUSES:
+            return event_fill
+        if event_fill:
+            fill = event_fill
+
+    # Stream недоступен или молчит - несколько быстрых запросов статуса
+    for _ in range(FILL_POLL_ATTEMPTS):
+        time.sleep(FILL_POLL_INTERVAL)
+        status = client.get_order_status(symbol, fill.order_id)
+        if not status:
+            continue
+        fill = fill_from_response(status, source="poll")
+        if fill.status in TERMINAL_STATUSES:
+            break
+    return fill
+
+
+# Глобальный трекер исполнений
+fill_tracker = FillTracker()
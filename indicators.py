@@ -0,0 +1,218 @@
+# indicators.py
+"""
+Потоковые индикаторы: Bollinger, RSI, EMA200 и ATR за O(1) на сообщение.
+
+Для каждого символа хранится состояние по закрытым свечам (скользящие
+суммы, EMA); формирующаяся свеча накладывается поверх этого состояния
+без его изменения. Значения совпадают с utils.bol_h / bol_l / rsi /
+ema200 / atr, посчитанными на том же DataFrame.
+"""
+import math
+from collections import deque
+
+from data_store import kline_store
+
+# Раз в столько закрытий суммы пересчитываются заново, чтобы не копилась
+# ошибка округления от бесконечных прибавлений/вычитаний
+RESYNC_EVERY = 1000
+
+
+class RollingWindow:
+    """Скользящие сумма и сумма квадратов окна period.
+
+    Хранит period - 1 закрытых значений; последнее место окна занимает
+    текущая (формирующаяся) свеча. Суммы считаются от сдвига shift, чтобы
+    дисперсия не теряла точность на больших ценах.
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values = deque(maxlen=max(period - 1, 0))
+        self.shift = None
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self._pushes = 0
+
+    def push(self, x: float):
+        """Добавление закрытого значения"""
+        if self.values.maxlen == 0:
+            return
+        if self.shift is None:
+            self.shift = x
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0] - self.shift
+            self.sum -= old
+            self.sumsq -= old * old
+        self.values.append(x)
+        d = x - self.shift
+        self.sum += d
+        self.sumsq += d * d
+
+        self._pushes += 1
+        if self._pushes % RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        self.sum = math.fsum(v - self.shift for v in self.values)
+        self.sumsq = math.fsum((v - self.shift) ** 2 for v in self.values)
+
+    def ready(self) -> bool:
+        return len(self.values) + 1 >= self.period
+
+    def mean(self, x: float) -> float:
+        """Среднее окна, где последнее значение - x"""
+        if not self.ready():
+            return math.nan
+        shift = self.shift if self.shift is not None else x
+        return shift + (self.sum + (x - shift)) / self.period
+
+    def mean_std(self, x: float):
+        """Среднее и выборочное std (ddof=1) окна, где последнее значение - x"""
+        if not self.ready() or self.period < 2:
+            return math.nan, math.nan
+        shift = self.shift if self.shift is not None else x
+        d = x - shift
+        n = self.period
+        s = self.sum + d
+        ss = self.sumsq + d * d
+        var = max((ss - s * s / n) / (n - 1), 0.0)
+        return shift + s / n, math.sqrt(var)
+
+
+class SymbolIndicators:
+    """Состояние индикаторов одного символа"""
+
+    def __init__(self, bol_period=40, bol_dev=2, rsi_period=14, ema_span=200, atr_period=14):
+        self.bol_dev = bol_dev
+        self.ema_alpha = 2.0 / (ema_span + 1.0)
+
+        self.bol = RollingWindow(bol_period)
+        self.gains = RollingWindow(rsi_period)
+        self.losses = RollingWindow(rsi_period)
+        self.true_ranges = RollingWindow(atr_period)
+
+        self.ema = None          # EMA по закрытым свечам
+        self.prev_close = None   # close последней закрытой свечи
+
+        # Текущая (формирующаяся) свеча
+        self.ts = None
+        self.high = self.low = self.close = None
+        self._snapshot = None
+
+    def _gain_loss(self, close: float):
+        if self.prev_close is None:
+            # Как в utils.rsi: NaN от diff() превращается в 0
+            return 0.0, 0.0
+        delta = close - self.prev_close
+        return max(delta, 0.0), max(-delta, 0.0)
+
+    def _true_range(self, high: float, low: float) -> float:
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def _commit(self):
+        """Перенос текущей свечи в закрытую историю"""
+        high, low, close = self.high, self.low, self.close
+        gain, loss = self._gain_loss(close)
+        self.bol.push(close)
+        self.gains.push(gain)
+        self.losses.push(loss)
+        self.true_ranges.push(self._true_range(high, low))
+        if self.ema is None:
+            self.ema = close
+        else:
+            self.ema = self.ema_alpha * close + (1.0 - self.ema_alpha) * self.ema
+        self.prev_close = close
+
+    def update(self, ts, high: float, low: float, close: float):
+        """Обновление по сообщению свечи; новая ts закрывает предыдущую свечу"""
+        if self.ts is not None and ts != self.ts:
+            self._commit()
+        self.ts = ts
+        self.high, self.low, self.close = high, low, close
+        self._snapshot = None
+        return self.snapshot()
+
+    def seed(self, times, highs, lows, closes):
+        """Инициализация по истории; последняя свеча считается формирующейся"""
+        for i in range(len(closes)):
+            if self.ts is not None:
+                self._commit()
+            self.ts = times[i]
+            self.high, self.low, self.close = float(highs[i]), float(lows[i]), float(closes[i])
+        self._snapshot = None
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        """Значения индикаторов на текущей свече"""
+        if self._snapshot is not None:
+            return self._snapshot
+        if self.close is None:
+            return {}
+
+        close = self.close
+        mid, std = self.bol.mean_std(close)
+
+        gain, loss = self._gain_loss(close)
+        avg_gain = self.gains.mean(gain)
+        avg_loss = self.losses.mean(loss)
+        if math.isnan(avg_gain) or math.isnan(avg_loss) or (avg_gain == 0 and avg_loss == 0):
+            rsi_val = math.nan
+        elif avg_loss == 0:
+            rsi_val = 100.0
+        else:
+            rsi_val = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        if self.ema is None:
+            ema = close
+        else:
+            ema = self.ema_alpha * close + (1.0 - self.ema_alpha) * self.ema
+
+        self._snapshot = {
+            "bol_mid": mid,
+            "bol_upper": mid + self.bol_dev * std,
+            "bol_lower": mid - self.bol_dev * std,
+            "rsi": rsi_val,
+            "ema200": ema,
+            "atr": self.true_ranges.mean(self._true_range(self.high, self.low)),
+        }
+        return self._snapshot
+
+
+class IndicatorEngine:
+    """Потоковые индикаторы для всех символов поверх kline_store"""
+
+    def __init__(self, store=kline_store, **params):
+        self.store = store
+        self.params = params
+        self._symbols = {}
+        self._generations = {}
+
+    def _seed(self, symbol: str):
+        state = SymbolIndicators(**self.params)
+        bars = self.store.arrays(symbol)
+        if bars is not None:
+            state.seed(bars["Time"], bars["High"], bars["Low"], bars["Close"])
+        self._symbols[symbol] = state
+        self._generations[symbol] = self.store.generation(symbol)
+        return state
+
+    def on_kline(self, symbol: str, ts, high: float, low: float, close: float) -> dict:
+        """Вызывается после kline_store.update(); возвращает снимок индикаторов"""
+        state = self._symbols.get(symbol)
+        if state is None or self._generations.get(symbol) != self.store.generation(symbol):
+            # История уже содержит эту свечу
+            return self._seed(symbol).snapshot()
+        return state.update(ts, high, low, close)
+
+    def snapshot(self, symbol: str) -> dict:
+        state = self._symbols.get(symbol)
+        return state.snapshot() if state else {}
+
+    def reset(self, symbol: str):
+        self._symbols.pop(symbol, None)
+
+
+# Глобальный движок с параметрами по умолчанию (как в utils)
+indicator_engine = IndicatorEngine()
@@ -0,0 +1,198 @@
+# journal.py
+"""
+Журнал сделок (POSITIONS_LOG_FILE, JSON Lines) с фоновой записью.
+
+log_position вызывается из обработчика свечей и из потоков исполнителя
+ордеров, поэтому запись на диск вынесена из вызывающего кода: append()
+только кладёт словарь в очередь. Фоновый поток забирает записи пачками
+(до JOURNAL_BATCH_SIZE), сериализует и пишет одним write в постоянно
+открытый файл. fsync выполняется не чаще раза в JOURNAL_FSYNC_INTERVAL,
+при flush() и при остановке (close() регистрируется в atexit). flush()
+ставит в очередь маркер с собственным флагом fsync и ждёт именно его:
+всё, что было в очереди до маркера, к этому моменту записано (и
+синхронизировано, если fsync=True).
+
+Слушатели add_listener получают каждую записанную пачку в том же фоновом
+потоке (ledger.py дочитывает по ним файл в SQLite); flush() дожидается и их.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from config import (POSITIONS_LOG_FILE, JOURNAL_BATCH_SIZE, JOURNAL_FLUSH_INTERVAL,
+                    JOURNAL_FSYNC_INTERVAL)
+
+_STOP = object()
+
+
+class _Flush:
+    """Маркер flush() в очереди: пачка с ним закрывается (и fsync, если запрошен)"""
+
+    __slots__ = ("fsync", "done")
+
+    def __init__(self, fsync: bool):
+        self.fsync = fsync
+        self.done = threading.Event()
+
+
+class Journal:
+    """Буферизованная дозапись JSON-строк в файл из фонового потока"""
+
+    def __init__(self, path: str = POSITIONS_LOG_FILE, batch_size: int = JOURNAL_BATCH_SIZE,
+                 flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+                 fsync_interval: float = JOURNAL_FSYNC_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self._queue = queue.SimpleQueue()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._last_fsync = time.monotonic()
+        self._dirty = False  # есть записанные, но не синхронизированные данные
+        self._listeners: List[Callable[[List[dict]], None]] = []
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.errors = 0
+
+    def add_listener(self, listener: Callable[[List[dict]], None]):
+        self._listeners.append(listener)
+
+    # ---------- Запись (вызывающая сторона) ----------
+
+    def append(self, entry: dict):
+        """Поставить запись в очередь; на диск её запишет фоновый поток"""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        with self._cond:
+            self.enqueued += 1
+        self._queue.put(entry)
+
+    def flush(self, timeout: float = 5.0, fsync: bool = True) -> bool:
+        """Дождаться записи всего, что уже в очереди (и fsync)"""
+        if self._thread is None or not self._thread.is_alive():
+            return self.written >= self.enqueued
+        marker = _Flush(fsync)
+        self._queue.put(marker)  # будит поток, не дожидаясь flush_interval
+        return marker.done.wait(timeout)
+
+    # ---------- Фоновый поток ----------
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Записать хвост очереди, fsync и закрыть файл"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def _drain(self, first) -> tuple:
+        """Пачка записей начиная с first; (записи, маркер flush или None, встречен ли _STOP)"""
+        batch, marker, stop = [], None, False
+        item = first
+        while True:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, _Flush):
+                marker = item
+            elif item is not None:
+                batch.append(item)
+            if stop or marker is not None or len(batch) >= self.batch_size:
+                break
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return batch, marker, stop
+
+    def _write(self, batch):
+        if not batch:
+            return
+        lines = []
+        for entry in batch:
+            try:
+                lines.append(json.dumps(entry, ensure_ascii=False, default=str))
+            except (TypeError, ValueError) as e:
+                self.errors += 1
+                print(f"❌ Журнал: запись не сериализуется: {e}")
+        try:
+            f = self._open()
+            if lines:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                self._dirty = True
+        except OSError as e:
+            self.errors += 1
+            print(f"❌ Журнал: ошибка записи {self.path}: {e}")
+            self._close_file()
+        self.batches += 1
+
+    def _fsync(self):
+        self._last_fsync = time.monotonic()
+        if self._file is None or not self._dirty:
+            return
+        self._dirty = False
+        try:
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+        except OSError as e:
+            self.errors += 1
+            print(f"❌ Журнал: fsync не удался: {e}")
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                first = None
+            batch, marker, stop = self._drain(first)
+            self._write(batch)
+            fsync_due = ((marker is not None and marker.fsync) or stop
+                         or time.monotonic() - self._last_fsync >= self.fsync_interval)
+            if fsync_due:
+                self._fsync()
+            if batch:
+                for listener in self._listeners:
+                    try:
+                        listener(batch)
+                    except Exception as e:
+                        print(f"❌ Журнал: ошибка слушателя: {e}")
+            with self._cond:
+                self.written += len(batch)
+                self._cond.notify_all()
+            if marker is not None:
+                marker.done.set()
+        self._close_file()
+
+
+# Глобальный журнал сделок
+journal = Journal()
+atexit.register(journal.close)
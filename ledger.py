@@ -0,0 +1,220 @@
+# ledger.py
+"""
+Журнал сделок в SQLite (LEDGER_DB_FILE, режим WAL) для выборок и сводок.
+
+Источник записей - тот же POSITIONS_LOG_FILE (JSON Lines), что пишет
+journal.py. Ledger запоминает, до какого байта файл уже загружен, и
+catch_up() дочитывает только хвост: при первом запуске это однократный
+импорт всей истории, дальше - записи очередной пачки журнала (catch_up
+подписан на journal и выполняется в его фоновом потоке). Повторно
+встреченная запись (тот же timestamp/symbol/action/side) игнорируется
+уникальным индексом, поэтому перезапуск или пересоздание файла не
+дублируют сделки.
+
+Число закрытых сделок, прибыльных сделок и реализованный PnL (всего и по
+символу) ведут триггеры на вставку, так что сводка - чтение одной строки,
+а последние записи и история - запросы по индексам symbol / ts / action.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import LEDGER_DB_FILE, POSITIONS_LOG_FILE
+
+TOTAL = "*"  # строка итогов по всем символам в таблице totals
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    action TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT,
+    price REAL,
+    qty REAL,
+    pnl REAL NOT NULL DEFAULT 0,
+    trading_mode TEXT,
+    entry TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS trades_identity ON trades(timestamp, symbol, action, side);
+CREATE INDEX IF NOT EXISTS trades_symbol ON trades(symbol, ts);
+CREATE INDEX IF NOT EXISTS trades_ts ON trades(ts);
+CREATE INDEX IF NOT EXISTS trades_action ON trades(action, ts);
+
+CREATE TABLE IF NOT EXISTS totals (
+    symbol TEXT PRIMARY KEY,
+    closed INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    realized REAL NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS trades_close AFTER INSERT ON trades WHEN NEW.action = 'CLOSE'
+BEGIN
+    INSERT INTO totals (symbol, closed, wins, realized)
+    VALUES (NEW.symbol, 1, NEW.pnl > 0, NEW.pnl), ('{TOTAL}', 1, NEW.pnl > 0, NEW.pnl)
+    ON CONFLICT(symbol) DO UPDATE SET closed = closed + 1, wins = wins + excluded.wins,
+                                      realized = realized + excluded.realized;
+END;
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _ts(timestamp) -> float:
+    """time.time() записи журнала (timestamp - локальное время в ISO)"""
+    try:
+        return datetime.fromisoformat(str(timestamp)).timestamp()
+    except ValueError:
+        return time.time()
+
+
+class Ledger:
+    """Индексированная история сделок с накопленными итогами"""
+
+    def __init__(self, path: str = LEDGER_DB_FILE, source: str = POSITIONS_LOG_FILE):
+        self.path = path
+        self.source = source
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # ---------- Соединение ----------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self.catch_up()
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _meta(self, key: str, default=None):
+        row = self._db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    # ---------- Загрузка ----------
+
+    def record_many(self, entries: List[dict]) -> int:
+        """Вставка записей журнала; возвращает число новых (дубликаты пропускаются)"""
+        rows = [(_ts(e.get("timestamp")), str(e.get("timestamp")), str(e.get("action", "")).upper(),
+                 e.get("symbol") or "", e.get("side"), e.get("price"), e.get("qty"),
+                 float(e.get("pnl") or 0.0), e.get("trading_mode"),
+                 json.dumps(e, ensure_ascii=False, default=str))
+                for e in entries if e.get("timestamp") is not None]
+        if not rows:
+            return 0
+        with self._lock:
+            db = self._db()
+            last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0]
+            db.execute("BEGIN")
+            try:
+                db.executemany(
+                    "INSERT OR IGNORE INTO trades (ts, timestamp, action, symbol, side, price, qty, "
+                    "pnl, trading_mode, entry) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            # Новые строки получают id подряд после прежнего максимума
+            return db.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0] - last_id
+
+    def catch_up(self) -> int:
+        """Дочитать новые строки POSITIONS_LOG_FILE; возвращает число новых записей"""
+        with self._lock:
+            db = self._db()
+            offset = int(self._meta("source_offset", 0))
+            try:
+                size = os.path.getsize(self.source)
+            except OSError:
+                return 0
+            if size < offset:
+                offset = 0  # файл пересоздан: уже загруженное отсеет уникальный индекс
+            if size == offset:
+                return 0
+            entries = []
+            with open(self.source, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            end = data.rfind(b"\n") + 1  # незаконченная строка дочитается в следующий раз
+            for line in data[:end].splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    entries.append(entry)
+            added = self.record_many(entries)
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source_offset', ?)",
+                       (str(offset + end),))
+            return added
+
+    def on_journal_batch(self, batch: List[dict]):
+        """Слушатель journal: пачка уже записана в файл, дочитываем её оттуда"""
+        try:
+            self.catch_up()
+        except Exception as e:
+            print(f"❌ Ledger: ошибка загрузки журнала: {e}")
+
+    # ---------- Запросы ----------
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        """Последние limit записей в хронологическом порядке"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT entry FROM trades ORDER BY ts DESC, id DESC LIMIT ?", (limit,)).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def history(self, symbol: Optional[str] = None, action: Optional[str] = None,
+                since: Optional[float] = None, until: Optional[float] = None,
+                limit: int = 100) -> List[dict]:
+        """Записи по символу / действию / интервалу времени (time.time()), новые последними"""
+        where, args = [], []
+        if symbol:
+            where.append("symbol = ?")
+            args.append(symbol)
+        if action:
+            where.append("action = ?")
+            args.append(action.upper())
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            args.append(until)
+        sql = "SELECT entry FROM trades"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db().execute(sql, (*args, limit)).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def totals(self, symbol: str = TOTAL) -> Dict[str, float]:
+        """Закрытые сделки, прибыльные и реализованный PnL (всего или по символу)"""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT closed, wins, realized FROM totals WHERE symbol = ?", (symbol,)).fetchone()
+        closed, wins, realized = (row["closed"], row["wins"], row["realized"]) if row else (0, 0, 0.0)
+        return {
+            "total_trades": closed,
+            "winning_trades": wins,
+            "losing_trades": closed - wins,
+            "win_rate": wins / closed * 100 if closed else 0,
+            "total_pnl": realized,
+        }
+
+
+# Глобальный журнал сделок в SQLite
+ledger = Ledger()
@@ -0,0 +1,176 @@
+# log_reader.py
+"""
+Чтение хвоста журнала сделок (POSITIONS_LOG_FILE, JSON Lines) без чтения
+всего файла.
+
+tail_lines() идёт от конца файла назад блоками по TAIL_BLOCK_SIZE байт,
+пока не наберёт нужное число строк: стоимость зависит от limit, а не от
+размера журнала.
+
+LineIndex - индекс смещений рядом с журналом (<журнал>.idx): байтовое
+смещение каждой LOG_INDEX_EVERY-й строки. Журнал только дописывается,
+поэтому refresh() досчитывает индекс с последней проиндексированной
+позиции; если файл стал короче (пересоздан), индекс строится заново.
+page() открывает страницу с конца журнала: переход к ближайшей
+проиндексированной строке и чтение не более page_size + LOG_INDEX_EVERY
+строк.
+"""
+import json
+import os
+import threading
+from array import array
+from typing import List, Tuple
+
+from config import POSITIONS_LOG_FILE, LOG_INDEX_EVERY
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def _parse(lines) -> List[dict]:
+    entries = []
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue  # обрезанная или чужая строка
+        if isinstance(entry, dict):
+            entries.append(entry)
+    return entries
+
+
+def tail_lines(path: str, limit: int, block_size: int = TAIL_BLOCK_SIZE) -> List[bytes]:
+    """Последние limit непустых строк файла (старые первыми)"""
+    if limit <= 0:
+        return []
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos, chunks, newlines = end, [], 0
+        # limit строк - это limit + 1 перевод строки (включая конец предыдущей)
+        while pos > 0 and newlines <= limit:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+    pieces = b"".join(reversed(chunks)).split(b"\n")
+    if pos > 0:
+        pieces = pieces[1:]  # начало первого блока - хвост более ранней строки
+    lines = [line.rstrip(b"\r") for line in pieces if line.strip()]
+    return lines[-limit:]
+
+
+def read_tail(path: str = POSITIONS_LOG_FILE, limit: int = 50) -> List[dict]:
+    """Последние записи журнала; строки, не являющиеся JSON-объектом, пропускаются"""
+    try:
+        return _parse(tail_lines(path, limit))
+    except FileNotFoundError:
+        return []
+
+
+class LineIndex:
+    """Смещения каждой every-й строки журнала в файле <path>.idx"""
+
+    def __init__(self, path: str = POSITIONS_LOG_FILE, every: int = LOG_INDEX_EVERY):
+        self.path = path
+        self.every = every
+        self.index_path = path + ".idx"
+        self._lock = threading.Lock()
+        self.offsets = array("Q")   # смещение строк 0, every, 2*every, ...
+        self.lines = 0              # полных строк в проиндексированной части
+        self.size = 0               # проиндексированная длина файла (конец последней строки)
+        self._loaded = False
+
+    # ---------- Файл индекса ----------
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.index_path, "rb") as f:
+                header = array("Q")
+                header.fromfile(f, 3)
+                every, lines, size = header
+                offsets = array("Q")
+                offsets.frombytes(f.read())
+        except (OSError, EOFError, ValueError):
+            return
+        if every == self.every and len(offsets) == (lines + every - 1) // every:
+            self.offsets, self.lines, self.size = offsets, lines, size
+
+    def _save(self):
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                array("Q", (self.every, self.lines, self.size)).tofile(f)
+                self.offsets.tofile(f)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            print(f"⚠️  Не удалось сохранить индекс журнала: {e}")
+
+    def _reset(self):
+        self.offsets, self.lines, self.size = array("Q"), 0, 0
+
+    # ---------- Построение ----------
+
+    def refresh(self) -> int:
+        """Досчитать индекс до конца файла; возвращает число строк в журнале"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            try:
+                file_size = os.path.getsize(self.path)
+            except OSError:
+                self._reset()
+                return 0
+            if file_size < self.size:
+                self._reset()  # файл пересоздан
+            if file_size == self.size:
+                return self.lines
+            with open(self.path, "rb") as f:
+                f.seek(self.size)
+                offset = self.size
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # незаконченная запись
+                    if self.lines % self.every == 0:
+                        self.offsets.append(offset)
+                    self.lines += 1
+                    offset += len(line)
+            changed = offset != self.size
+            self.size = offset
+            if changed:
+                self._save()
+            return self.lines
+
+    # ---------- Чтение ----------
+
+    def read_lines(self, start: int, count: int) -> List[bytes]:
+        """Строки [start, start + count) по номеру строки"""
+        self.refresh()
+        start = max(0, start)
+        stop = min(self.lines, start + count)
+        if start >= stop:
+            return []
+        block = start // self.every
+        skip = start - block * self.every
+        result = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[block])
+            for i, line in enumerate(f):
+                if i >= skip + (stop - start):
+                    break
+                if i >= skip:
+                    result.append(line.rstrip(b"\r\n"))
+        return result
+
+    def page(self, page: int = 0, page_size: int = 20) -> Tuple[List[dict], int]:
+        """Страница записей с конца (0 - самые новые); (записи, всего страниц)"""
+        total = self.refresh()
+        pages = max(1, (total + page_size - 1) // page_size)
+        stop = total - page * page_size
+        start = max(0, stop - page_size)
+        return _parse(self.read_lines(start, stop - start)), pages
+
+
+# Индекс журнала сделок
+log_index = LineIndex()
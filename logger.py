@@ -1,20 +1,31 @@
+import asyncio
 import json
+import threading
 import pandas as pd
 from config import POSITIONS_LOG_FILE, INITIAL_CASH, TRADING_MODE  # меняем DRY_RUN на TRADING_MODE
 from data_store import user_data_cache
-from pnl_utils import simulate_realtime_pnl
+from account_state import account_state
+from pnl_utils import simulate_realtime_pnl_many
 from binance_client import BinanceClient  # добавляем для реального баланса
+from journal import journal
+from ledger import ledger
+from log_reader import log_index, read_tail
+from trade_stats import trade_stats
+from trigger_engine import trigger_engine
+
+# Записанные пачки журнала дочитываются в SQLite (выборки и сводки - оттуда)
+journal.add_listener(ledger.on_journal_batch)
 
 realized_total_pnl = 0.0
 opened_positions = set()  # (symbol, side, entry_price) для отслеживания открытых позиций
+_state_lock = threading.Lock()  # log_position вызывается и из потоков исполнителя ордеров
 
 # Клиент для получения реального баланса
 binance_client = None
 
 def _write_log_entry(entry: dict):
-    """Запись лога в файл"""
-    with open(POSITIONS_LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    """Запись лога в журнал: очередь, на диск пишет фоновый поток journal"""
+    journal.append(entry)
 
 def escape_markdown(text):
     """Экранирование для Markdown"""
@@ -44,8 +55,14 @@ def get_real_balance():
         print(f"❌ Ошибка получения реального баланса: {e}")
         return None
 
+def _cached_balance():
+    """Баланс USDT из памяти (user-data stream / сверка account_state), без REST"""
+    if "USDT" not in account_state.balances:
+        return None
+    return account_state.get_balance('USDT')
+
 def log_position(action, symbol, side, price, qty, pnl=0.0,
-                 reason="DRY_RUN", exit_reason=None, tp=None, sl=None):
+                 reason="DRY_RUN", exit_reason=None, tp=None, sl=None, strategy=None):
     global realized_total_pnl, opened_positions
     from telegram_bot import send_startup_message as send_telegram_message
 
@@ -55,37 +72,37 @@ def log_position(action, symbol, side, price, qty, pnl=0.0,
     
     key = (symbol, side, price,)
     
-    if action.upper() == "OPEN":
-        if key in opened_positions:
-            # Уже открыта — пропускаем
-            return
-        opened_positions.add(key)
-
-    if action.upper() == "CLOSE":
-        # Удаляем из открытых при закрытии
-        opened_positions.discard(key)
-        realized_total_pnl += pnl
+    with _state_lock:
+        if action.upper() == "OPEN":
+            if key in opened_positions:
+                # Уже открыта — пропускаем
+                return
+            opened_positions.add(key)
+
+        if action.upper() == "CLOSE":
+            # Удаляем из открытых при закрытии
+            opened_positions.discard(key)
+            realized_total_pnl += pnl
+            trade_stats.on_close(pnl, symbol, strategy)
+        realized = realized_total_pnl
 
     # unrealized PnL (только для dryrun)
     unrealized = 0.0
     if TRADING_MODE == 'dryrun':
-        for s, p in user_data_cache.get("positions", {}).items():
-            u = simulate_realtime_pnl(s)
-            if u is not None:
-                unrealized += u
+        unrealized = sum(simulate_realtime_pnl_many().values())
 
     # Баланс аккаунта
     if TRADING_MODE == 'dryrun':
-        total_equity = INITIAL_CASH + realized_total_pnl + unrealized
+        total_equity = INITIAL_CASH + realized + unrealized
         account_balance = total_equity
     else:
-        # Для реальной торговли получаем баланс с Binance
-        real_balance = get_real_balance()
+        # Для реальной торговли - баланс из памяти: запрос к Binance здесь блокировал бы вызывающего
+        real_balance = _cached_balance()
         if real_balance is not None:
             account_balance = real_balance
             total_equity = real_balance
         else:
-            account_balance = INITIAL_CASH + realized_total_pnl
+            account_balance = INITIAL_CASH + realized
             total_equity = account_balance
 
     # лог всегда создаётся
@@ -103,7 +120,8 @@ def log_position(action, symbol, side, price, qty, pnl=0.0,
         "reason": reason,
         "exit_reason": exit_reason,
         "tp": tp,
-        "sl": sl
+        "sl": sl,
+        "strategy": strategy
     }
 
     # Вывод в консоль с указанием режима
@@ -152,41 +170,76 @@ def log_position(action, symbol, side, price, qty, pnl=0.0,
     except Exception as e:
         print("Ошибка отправки лога в Telegram:", e)
 
+EXIT_EXTERNAL = "EXTERNAL"      # закрыта на бирже не ботом (событие user-data stream)
+EXIT_RECONCILED = "RECONCILED"  # исчезновение позиции обнаружила сверка с биржей
+
+def log_external_close(symbol, pos, price=None, reason=EXIT_EXTERNAL):
+    """CLOSE для позиции бота, закрытой на бирже в обход бота; цена - последний mark price"""
+    trigger_engine.untrack(symbol)
+    side = str(pos.get('side', 'BUY')).upper()
+    entry = float(pos.get('entry', 0) or 0)
+    qty = float(pos.get('qty', 0) or 0)
+    price = float(price or pos.get('current_price') or entry)
+    pnl = (price - entry) * qty * (1 if side == 'BUY' else -1)
+    print(f"⚠️  {symbol} закрыта на бирже вне бота ({reason}), по mark {price}: PnL {pnl:+.2f}")
+    log_position(action="CLOSE", symbol=symbol, side=side, price=price, qty=qty, pnl=pnl,
+                 exit_reason=reason, strategy=pos.get('strategy'))
+    return pnl
+
+# Закрытия, замеченные user-data stream, пишутся в журнал и trade_stats
+account_state.add_close_listener(log_external_close)
+
+def _flush_for_read():
+    """Дописать очередь журнала перед выборкой (до 5 с ожидания фонового потока).
+    Из event loop не ждём: выборка читает ledger как есть и может не увидеть записи
+    последних JOURNAL_FLUSH_INTERVAL секунд
+    """
+    try:
+        asyncio.get_running_loop()
+        return
+    except RuntimeError:
+        journal.flush(fsync=False)
+
 def get_recent_logs(limit=50):
-    """Получение последних логов"""
-    logs = []
+    """Получение последних логов (индексированный запрос к ledger)"""
+    _flush_for_read()  # записи из очереди должны попасть в выборку
+    try:
+        return ledger.recent(limit)
+    except Exception as e:
+        print("Ошибка чтения ledger, читаю файл журнала:", e)
     try:
-        with open(POSITIONS_LOG_FILE, "r", encoding="utf-8") as f:
-            lines = f.readlines()[-limit:]
-            for line in lines:
-                logs.append(json.loads(line))
+        # Чтение с конца файла блоками: O(limit), а не O(размер журнала)
+        return read_tail(POSITIONS_LOG_FILE, limit)
     except Exception as e:
         print("Ошибка чтения логов:", e)
-    return logs
+    return []
+
+def get_logs_page(page=0, page_size=10):
+    """Страница журнала с конца (0 - последние записи): (записи, всего страниц)"""
+    _flush_for_read()
+    try:
+        return log_index.page(page, page_size)
+    except Exception as e:
+        print("Ошибка чтения журнала:", e)
+        return [], 1
 
 def get_trading_summary():
-    """Получение сводки по торговле"""
-    logs = get_recent_logs(1000)
-    
-    if not logs:
-        return {"total_trades": 0, "win_rate": 0, "total_pnl": 0}
-    
-    closed_trades = [log for log in logs if log.get("action") == "CLOSE"]
-    
-    if not closed_trades:
+    """Получение сводки по торговле (накопленные итоги ledger, без разбора журнала)"""
+    _flush_for_read()
+    try:
+        totals = ledger.totals()
+    except Exception as e:
+        print("Ошибка чтения ledger:", e)
         return {"total_trades": 0, "win_rate": 0, "total_pnl": 0}
     
-    winning_trades = sum(1 for trade in closed_trades if trade.get("pnl", 0) > 0)
-    total_trades = len(closed_trades)
-    win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-    total_pnl = sum(trade.get("pnl", 0) for trade in closed_trades)
-    
+    stats = trade_stats.summary()
     return {
-        "total_trades": total_trades,
-        "winning_trades": winning_trades,
-        "losing_trades": total_trades - winning_trades,
-        "win_rate": win_rate,
-        "total_pnl": total_pnl,
+        **totals,
+        "avg_pnl": stats["avg_pnl"],
+        "sharpe": stats["sharpe"],
+        "profit_factor": stats["profit_factor"],
+        "max_drawdown": stats["max_drawdown"],
+        "max_drawdown_pct": stats["max_drawdown_pct"],
         "trading_mode": TRADING_MODE,
         "initial_cash": INITIAL_CASH,
         "current_balance": realized_total_pnl + INITIAL_CASH
@@ -8,10 +8,12 @@ import time
 import traceback
 import sys
 from datetime import datetime
+from functools import partial
 
 # Импорт модулей
-from websocket_handler import get_liquid_tickers, fetch_historical_klines, start_websockets
+from websocket_handler import get_liquid_tickers, warm_up, subscribe_when_ready, start_websockets
 from binance_client import binance_client
+from async_binance_client import async_client
 from config import (
     TIMEFRAME, CHECK_INTERVAL, TOP_N_TICKERS, MIN_PRICE, MIN_VOLUME,
     MAX_SPREAD_PERCENT, TRADING_MODE, USE_BBRSI, USE_BREAKOUT,
@@ -22,16 +24,26 @@ from config import (
     TP_STRATEGY, TP_PERCENT, SL_PERCENT, TRAILING_STOP_PERCENT,
     RR_RATIO, RISK_PERCENT, ATR_TP_MULTIPLIER, ATR_SL_MULTIPLIER, ATR_PERIOD
 )
-from strategies import BBRSI_EMA_Strategy, Breakout_Strategy, get_trading_signal
+from strategies import get_trading_signal
 from pos_manager import (
-    get_open_position, open_position, close_position, init_binance_client,
+    get_open_position_async, open_position, close_position, init_binance_client,
     auto_close_positions, check_all_positions_tp_sl, ensure_correct_leverage,
     calculate_tp_sl, calculate_atr, check_position_tp_sl
 )
-from backtesting.lib import FractionalBacktest
+from optimizer import optimize_and_select_top, publish_top, shutdown_pool
+from reoptimizer import ReOptimizer
 from utils import bol_h, bol_l, rsi, validate_trade_params
 from pnl_utils import simulate_realtime_pnl, get_total_pnl, format_pnl_message
-from data_store import load_positions_from_file, save_positions_to_file, klines_cache, user_data_cache
+from data_store import load_positions_from_file, save_positions_to_file, klines_cache, user_data_cache, trading_state
+from order_executor import order_executor, OrderIntent
+from rate_limiter import rate_limiter
+from user_data_stream import user_data_stream
+from protective_orders import protective_orders
+from reconciler import position_reconciler
+from state_store import state_store
+from journal import journal
+from trade_stats import trade_stats
+from notifier import notifier
 
 # Импорт Telegram бота
 from telegram_bot import (
@@ -52,83 +64,6 @@ import pandas as pd
 
 # ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
 
-def optimize_params_ws(symbol, strategy_class, param_grid):
-    """Оптимизация параметров стратегии"""
-    df = klines_cache.get(symbol)
-    if df is None or len(df) < 150:
-        return None
-
-    best_eq = -float("inf")
-    best_params = {}
-
-    for params in param_grid:
-        class TempStrategy(strategy_class):
-            pass
-        for k, v in params.items():
-            setattr(TempStrategy, k, v)
-        try:
-            bt = FractionalBacktest(df, TempStrategy, cash=INITIAL_CASH, margin=1, commission=0.005, finalize_trades=True)
-            stats = bt.run()
-            eq_final = stats.get("Equity Final [$]", None)
-            if eq_final is not None and eq_final > best_eq:
-                best_eq = eq_final
-                best_params = params
-        except Exception:
-            continue
-    return best_params
-
-def optimize_and_select_top_ws(symbols):
-    """Оптимизация и выбор топ-5 символов"""
-    results = []
-    for symbol in symbols:
-        total_equity = 0.0
-        df = klines_cache.get(symbol)
-        if df is None or df.empty:
-            print(f"[WARN] Нет данных по {symbol}")
-            continue
-
-        # BBRSI
-        if USE_BBRSI:
-            try:
-                params = optimize_params_ws(symbol, BBRSI_EMA_Strategy, BBRSI_PARAM_GRID)
-                if params:
-                    BBRSI_EMA_Strategy.bol_period = params["bol_period"]
-                    BBRSI_EMA_Strategy.bol_dev = params["bol_dev"]
-                    BBRSI_EMA_Strategy.rsi_period = params["rsi_period"]
-                bt = FractionalBacktest(df, BBRSI_EMA_Strategy, cash=INITIAL_CASH, margin=1, commission=0.005, finalize_trades=True)
-                stats = bt.run()
-                equity = stats.get("Equity Final [$]", 0.0)
-                total_equity += equity
-                print(f"[INFO] {symbol} BBRSI equity: {equity}")
-            except Exception as e:
-                print(f"[ERROR] BBRSI бэктест {symbol} упал:", e)
-
-        # BREAKOUT
-        if USE_BREAKOUT:
-            try:
-                params_b = optimize_params_ws(symbol, Breakout_Strategy, BREAKOUT_PARAM_GRID)
-                if params_b:
-                    Breakout_Strategy.period = params_b["period"]
-                bt2 = FractionalBacktest(df, Breakout_Strategy, cash=INITIAL_CASH, margin=1, commission=0.005, finalize_trades=True)
-                stats2 = bt2.run()
-                equity2 = stats2.get("Equity Final [$]", 0.0)
-                total_equity += equity2
-                print(f"[INFO] {symbol} BREAKOUT equity: {equity2}")
-            except Exception as e:
-                print(f"[ERROR] BREAKOUT бэктест {symbol} упал:", e)
-
-        results.append((symbol, total_equity))
-
-    # сортируем по equity и выбираем топ-5
-    if not results:
-        print("[WARN] Нет результатов оптимизации, берём первые 5 символов")
-        return symbols[:5]
-
-    results.sort(key=lambda x: x[1], reverse=True)
-    top5 = results[:5]
-    print("[INFO] Top5 монет:", top5)
-    return top5
-
 def check_balance_sufficient():
     """Проверка достаточности баланса для торговли"""
     if TRADING_MODE != 'real':
@@ -156,13 +91,8 @@ async def trade_symbol_loop(symbol):
     
     print(f"📈 Запущен торговый цикл для {symbol} (Режим: {TRADING_MODE})")
     
-    last_position_check = 0
-    position_check_interval = 10
-    
     while True:
         try:
-            current_time = time.time()
-            
             # Проверяем, можно ли торговать
             if not should_trade():
                 await asyncio.sleep(CHECK_INTERVAL)
@@ -173,49 +103,8 @@ async def trade_symbol_loop(symbol):
                 await asyncio.sleep(CHECK_INTERVAL)
                 continue
 
-            # Проверка позиции
-            if current_time - last_position_check > position_check_interval:
-                pos = get_open_position(symbol)
-                
-                if TRADING_MODE == 'real' and (not pos or pos.get('source') != 'binance_real'):
-                    try:
-                        positions = binance_client.get_positions()
-                        found_real = False
-                        
-                        for binance_pos in positions:
-                            binance_symbol = binance_pos.get('symbol', '')
-                            search_symbol = symbol.replace('USDT', '')
-                            
-                            if binance_symbol == search_symbol:
-                                position_amt = float(binance_pos.get('positionAmt', 0))
-                                if abs(position_amt) > 0:
-                                    pos = {
-                                        "symbol": symbol,
-                                        "side": "BUY" if position_amt > 0 else "SELL",
-                                        "qty": abs(position_amt),
-                                        "entry": float(binance_pos.get('entryPrice', 0)),
-                                        "current_price": float(df["Close"].iloc[-1]),
-                                        "source": "binance_real",
-                                        "status": "OPEN",
-                                        "timestamp": current_time
-                                    }
-                                    
-                                    positions_dict = user_data_cache.get("positions", {})
-                                    positions_dict[symbol] = pos
-                                    user_data_cache["positions"] = positions_dict
-                                    found_real = True
-                                    break
-                        
-                        if not found_real:
-                            print(f"ℹ️  Нет реальной позиции на Binance для {symbol}")
-                    
-                    except Exception as e:
-                        print(f"❌ Ошибка проверки реальной позиции {symbol}: {e}")
-                
-                last_position_check = current_time
-            
-            # Проверяем позицию
-            pos = get_open_position(symbol)
+            # Позиции с биржей сверяет position_reconciler (один запрос на все символы)
+            pos = await get_open_position_async(symbol)
             
             if pos:
                 price_last = float(df["Close"].iloc[-1])
@@ -233,33 +122,6 @@ async def trade_symbol_loop(symbol):
                     
                     print(f"⏳ {symbol} {pos.get('side')}: entry={entry:.4f}, current={price_last:.4f}, "
                           f"qty={qty:.4f}, PnL={pnl:+.2f} ({pnl_percent:+.2f}%)")
-                    
-                    # Для реальных позиций проверяем статус
-                    if TRADING_MODE == 'real' and pos.get('source') == 'binance_real':
-                        try:
-                            positions = binance_client.get_positions()
-                            still_open = False
-                            
-                            for binance_pos in positions:
-                                if binance_pos.get('symbol') == symbol.replace('USDT', ''):
-                                    position_amt = float(binance_pos.get('positionAmt', 0))
-                                    if abs(position_amt) > 0:
-                                        still_open = True
-                                        if abs(position_amt) != qty:
-                                            print(f"⚠️  Количество изменилось: было {qty}, стало {abs(position_amt)}")
-                                            pos['qty'] = abs(position_amt)
-                                            
-                                            if symbol in user_data_cache.get("positions", {}):
-                                                user_data_cache["positions"][symbol]['qty'] = abs(position_amt)
-                                        break
-                            
-                            if not still_open:
-                                print(f"⚠️  Позиция {symbol} закрыта на Binance, удаляю из кэша")
-                                if symbol in user_data_cache.get("positions", {}):
-                                    user_data_cache["positions"].pop(symbol)
-                        
-                        except Exception as e:
-                            print(f"❌ Ошибка проверки статуса реальной позиции: {e}")
                 
                 await asyncio.sleep(CHECK_INTERVAL)
                 continue
@@ -274,11 +136,18 @@ async def trade_symbol_loop(symbol):
                     await asyncio.sleep(CHECK_INTERVAL)
                     continue
 
+            # Символ выпал из топа после переоптимизации: новые позиции не открываем
+            if trading_state["top_symbols"] and symbol not in trading_state["top_symbols"]:
+                await asyncio.sleep(CHECK_INTERVAL)
+                continue
+
             # Проверка сигналов
-            signal = get_trading_signal(symbol, df, strategy="bb_rsi")
+            strategy = "bb_rsi"
+            signal = get_trading_signal(symbol, df, strategy=strategy)
             
             if not signal and USE_BREAKOUT:
-                signal = get_trading_signal(symbol, df, strategy="breakout")
+                strategy = "breakout"
+                signal = get_trading_signal(symbol, df, strategy=strategy)
             
             if signal:
                 price_last = float(df["Close"].iloc[-1])
@@ -293,7 +162,7 @@ async def trade_symbol_loop(symbol):
                 # Дополнительная проверка для реальной торговли
                 if TRADING_MODE == 'real':
                     try:
-                        balance = binance_client.get_balance('USDT')
+                        balance = await async_client.get_balance('USDT')
                         if balance < 20:
                             print(f"❌ Недостаточно баланса: {balance:.2f} USDT < 20 USDT")
                             await asyncio.sleep(CHECK_INTERVAL)
@@ -310,13 +179,17 @@ async def trade_symbol_loop(symbol):
                     print("✅ Подтверждение автоматическое - открываем позицию")
                 
                 try:
-                    # Устанавливаем правильное плечо перед открытием
+                    # Устанавливаем правильное плечо перед открытием (REST - в пуле исполнителя)
                     if TRADING_MODE == 'real':
-                        ensure_correct_leverage(symbol, LEVERAGE)
+                        await order_executor.run_blocking(ensure_correct_leverage, symbol, LEVERAGE)
                     
-                    pos_data = open_position(symbol, side, risk_fraction=RISK_FRACTION)
+                    pos_data = await order_executor.execute(OrderIntent(
+                        "OPEN", symbol, job=partial(open_position, symbol, side),
+                        side=side, price=price_last,
+                    ))
                     
                     if pos_data:
+                        pos_data["strategy"] = strategy  # для статистики по стратегиям
                         success_msg = f"✅ Позиция открыта: {side} для {symbol} @ {price_last:.4f}"
                         print(success_msg)
                         
@@ -380,8 +253,9 @@ async def tp_sl_monitor_loop():
                 await asyncio.sleep(30)
                 continue
             
-            # Автоматически закрываем позиции по TP/SL
-            closed_positions = auto_close_positions()
+            # Уровни TP/SL проверяются на тиках (trigger_engine); здесь - сверка
+            # индекса и REST-цена для символов, по которым поток молчит
+            closed_positions = await order_executor.run_blocking(auto_close_positions)
             
             # Отправляем уведомления о закрытых позициях
             if closed_positions:
@@ -450,75 +324,16 @@ async def monitoring_loop():
     
     last_pnl_report = time.time()
     last_status_report = time.time()
-    last_cache_refresh = time.time()
     last_cleanup = time.time()
     
     pnl_report_interval = 300
     status_report_interval = 3600
-    cache_refresh_interval = 30
     cleanup_interval = 300
     
     while True:
         try:
             current_time = time.time()
             
-            # Обновление кэша позиций
-            if current_time - last_cache_refresh > cache_refresh_interval:
-                try:
-                    print(f"🔄 Обновление кэша позиций...")
-                    
-                    if TRADING_MODE == 'real':
-                        try:
-                            positions = binance_client.get_positions()
-                            positions_dict = user_data_cache.get("positions", {})
-                            
-                            keys_to_remove = []
-                            for key, pos in positions_dict.items():
-                                if pos.get('source') == 'binance_real':
-                                    keys_to_remove.append(key)
-                            
-                            for key in keys_to_remove:
-                                positions_dict.pop(key, None)
-                            
-                            for pos in positions:
-                                position_amt = float(pos.get('positionAmt', 0))
-                                
-                                if abs(position_amt) > 0:
-                                    symbol = pos.get('symbol')
-                                    if not symbol.endswith('USDT'):
-                                        symbol = symbol + 'USDT'
-                                    
-                                    current_price = 0
-                                    try:
-                                        df = klines_cache.get(symbol)
-                                        if df is not None and not df.empty:
-                                            current_price = float(df["Close"].iloc[-1])
-                                    except:
-                                        current_price = float(pos.get('markPrice', 0))
-                                    
-                                    positions_dict[symbol] = {
-                                        "symbol": symbol,
-                                        "side": "BUY" if position_amt > 0 else "SELL",
-                                        "qty": abs(position_amt),
-                                        "entry": float(pos.get('entryPrice', 0)),
-                                        "current_price": current_price,
-                                        "unrealized_pnl": float(pos.get('unRealizedProfit', 0)),
-                                        "leverage": float(pos.get('leverage', 1)),
-                                        "source": "binance_real",
-                                        "status": "OPEN",
-                                        "last_updated": current_time
-                                    }
-                            
-                            user_data_cache["positions"] = positions_dict
-                            print(f"✅ Кэш обновлен: {len([p for p in positions_dict.values() if p.get('source') == 'binance_real'])} реальных позиций")
-                            
-                        except Exception as e:
-                            print(f"❌ Ошибка обновления кэша с Binance: {e}")
-                    
-                    last_cache_refresh = current_time
-                except Exception as e:
-                    print(f"❌ Ошибка при обновлении кэша: {e}")
-            
             # Очистка устаревших позиций
             if current_time - last_cleanup > cleanup_interval:
                 try:
@@ -531,7 +346,7 @@ async def monitoring_loop():
                         keys_to_remove = []
                         
                         for symbol, pos in positions_dict.items():
-                            last_updated = pos.get('last_updated', 0)
+                            last_updated = pos.get('last_updated', pos.get('timestamp', 0))
                             
                             if current_time - last_updated > 3600:
                                 keys_to_remove.append(symbol)
@@ -551,6 +366,9 @@ async def monitoring_loop():
                 except Exception as e:
                     print(f"❌ Ошибка очистки: {e}")
             
+            # Снимок позиций для потока Telegram (он не читает живой кэш)
+            state_store.publish_positions(user_data_cache["positions"])
+            
             # Отчет о PnL
             if current_time - last_pnl_report > pnl_report_interval:
                 try:
@@ -566,6 +384,12 @@ async def monitoring_loop():
                     print(f"   Закрытый PnL: {pnl_data['realized']:.2f}")
                     print(f"   Открытый PnL: {pnl_data['unrealized']:.2f}")
                     print(f"   Общий PnL: {pnl_data['total']:.2f}")
+                    stats = trade_stats.summary()
+                    if stats["trades"]:
+                        print(f"   Сделок: {stats['trades']} | Win rate: {stats['win_rate']:.1f}% | "
+                              f"Sharpe: {stats['sharpe']:.2f}")
+                        print(f"   Просадка: {stats['drawdown']:.2f} | "
+                              f"Макс. просадка: {stats['max_drawdown']:.2f} ({stats['max_drawdown_pct']:.1f}%)")
                     
                     try:
                         positions_dict = user_data_cache.get("positions", {})
@@ -626,16 +450,17 @@ async def monitoring_loop():
             except:
                 pass
             
-            # Сохранение позиций
+            # Сохранение позиций и статистики сделок
             try:
                 save_positions_to_file()
             except Exception as e:
                 print(f"❌ Ошибка сохранения позиций: {e}")
+            trade_stats.save()
             
             # Проверка баланса
             if TRADING_MODE == 'real' and current_time - last_pnl_report > 600:
                 try:
-                    balance = binance_client.get_balance('USDT')
+                    balance = await async_client.get_balance('USDT')
                     
                     if balance < 50:
                         warning_msg = f"⚠️  Низкий баланс: {balance:.2f} USDT"
@@ -671,7 +496,7 @@ async def system_health_loop():
             # Проверяем соединение с Binance
             if TRADING_MODE == 'real' and binance_client:
                 try:
-                    balance = binance_client.get_balance('USDT')
+                    balance = await async_client.get_balance('USDT')
                     print(f"💰 Баланс Binance: {balance:.2f} USDT")
                 except:
                     print("⚠️  Нет связи с Binance")
@@ -679,6 +504,8 @@ async def system_health_loop():
             # Проверяем кеш данных
             cache_size = len(klines_cache)
             print(f"📊 Размер кеша данных: {cache_size} символов")
+            print(f"⚙️  Исполнитель ордеров: {order_executor.format_stats()}")
+            print(f"🚦 Лимиты API: {rate_limiter.format_stats()}")
             
             await asyncio.sleep(300)
             
@@ -691,6 +518,9 @@ async def system_health_loop():
 async def main_async():
     """Основная асинхронная функция"""
     
+    # Команды Telegram меняют состояние в этом event loop
+    state_store.bind_loop(asyncio.get_running_loop())
+    
     print("=" * 60)
     print("🚀 ИНИЦИАЛИЗАЦИЯ ТОРГОВОГО БОТА")
     print("=" * 60)
@@ -710,9 +540,14 @@ async def main_async():
             if binance_client.is_connected():
                 print("✅ Binance клиент готов")
                 
+                # События исполнения ордеров (ORDER_TRADE_UPDATE)
+                user_data_stream.add_handler("ORDER_TRADE_UPDATE", protective_orders.on_order_update)
+                user_data_stream.start()
+                await async_client.sync_time()
+                
                 # Проверяем баланс
                 try:
-                    balance = binance_client.get_balance('USDT')
+                    balance = await async_client.get_balance('USDT')
                     print(f"💰 Текущий баланс: {balance:.2f} USDT")
                     
                     if balance == 0:
@@ -730,6 +565,10 @@ async def main_async():
     print("\n📂 Загрузка сохраненных позиций...")
     load_positions_from_file()
     
+    # Защитные ордера на бирже: привязка к позициям после перезапуска
+    if TRADING_MODE == 'real' and protective_orders.enabled:
+        await order_executor.run_blocking(protective_orders.reconcile)
+    
     # Выводим информацию о настройках
     print(f"\n📊 КОНФИГУРАЦИЯ БОТА:")
     print(f"   • Режим: {TRADING_MODE.upper()}")
@@ -749,7 +588,7 @@ async def main_async():
         send_to_me(warning_msg)
     
     # Проверяем баланс для реальной торговли
-    if TRADING_MODE == 'real' and not check_balance_sufficient():
+    if TRADING_MODE == 'real' and not await order_executor.run_blocking(check_balance_sufficient):
         error_msg = "❌ Недостаточно средств для торговли. Переключаю в тестовый режим."
         print(error_msg)
         send_to_me(error_msg)
@@ -758,12 +597,15 @@ async def main_async():
     
     # Получаем ликвидные тикеры
     print(f"\n🔍 Поиск ликвидных тикеров...")
-    symbols = await get_liquid_tickers(
-        top_n=TOP_N_TICKERS,
-        min_price=MIN_PRICE,
-        min_volume=MIN_VOLUME,
-        max_spread_percent=MAX_SPREAD_PERCENT
-    )
+    try:
+        symbols = await get_liquid_tickers(
+            top_n=TOP_N_TICKERS,
+            min_price=MIN_PRICE,
+            min_volume=MIN_VOLUME,
+            max_spread_percent=MAX_SPREAD_PERCENT
+        )
+    except Exception:
+        symbols = []
     
     if not symbols:
         print("❌ Не получили ликвидные тикеры, используем BTCUSDT")
@@ -772,18 +614,13 @@ async def main_async():
     print(f"📈 Найдено ликвидных тикеров: {len(symbols)}")
     print(f"📋 Символы: {symbols[:10]}{'...' if len(symbols) > 10 else ''}")
     
-    # Загрузка исторических свечей
+    # Загрузка исторических свечей: параллельно, поток свечей символа
+    # подключается сразу после загрузки его истории
     print("\n📥 Загружаем исторические свечи...")
-    loaded_symbols = []
-    
-    for s in symbols:
-        df = await fetch_historical_klines(s, interval=TIMEFRAME, limit=500)
-        if not df.empty:
-            klines_cache[s] = df
-            loaded_symbols.append(s)
-            print(f"   ✅ {s}: {len(df)} свечей")
-        else:
-            print(f"   ❌ {s}: не удалось загрузить")
+    loaded_symbols, _ = await warm_up(
+        symbols, interval=TIMEFRAME, limit=500,
+        on_ready=partial(subscribe_when_ready, interval=TIMEFRAME),
+    )
     
     if not loaded_symbols:
         error_msg = "❌ Не удалось загрузить данные ни по одному символу!"
@@ -793,14 +630,15 @@ async def main_async():
     
     symbols = loaded_symbols
     
-    # Запуск WebSocket
+    # Запуск WebSocket (работает в фоне до остановки бота)
     print(f"\n📡 Запуск WebSocket для {len(symbols)} символов...")
-    await start_websockets(symbols, interval=TIMEFRAME)
+    ws_task = asyncio.create_task(start_websockets(symbols, interval=TIMEFRAME))
     
     # Оптимизация и выбор топ-5
     print("\n🧮 Оптимизация и выбор топ-5 символов...")
-    top5 = optimize_and_select_top_ws(symbols)
+    top5 = await optimize_and_select_top(symbols, top_n=5)
     top_symbols = [s for s, _ in top5] if top5 else symbols[:5]
+    publish_top(top_symbols)
     
     print(f"🎯 Топ-5 символов для торговли: {top_symbols}")
     
@@ -817,8 +655,20 @@ async def main_async():
     send_to_me(telegram_msg)
     
     # Запуск всех циклов
+    order_executor.start()
     print(f"\n🔄 Запуск торговых циклов...")
-    trade_tasks = [asyncio.create_task(trade_symbol_loop(sym)) for sym in top_symbols]
+    trade_tasks = {sym: asyncio.create_task(trade_symbol_loop(sym)) for sym in top_symbols}
+    
+    def on_top_changed(new_top):
+        # Для символов, вошедших в топ, запускаем торговые циклы
+        for sym in new_top:
+            if sym not in trade_tasks or trade_tasks[sym].done():
+                trade_tasks[sym] = asyncio.create_task(trade_symbol_loop(sym))
+        send_to_me(f"🔁 Обновлён топ-5 символов: {', '.join(new_top)}")
+    
+    print("🧮 Запуск фоновой переоптимизации...")
+    reoptimizer = ReOptimizer(symbols, top_n=5, on_publish=on_top_changed)
+    reoptimizer.start()
     
     print("👁️  Запуск цикла мониторинга...")
     monitor_task = asyncio.create_task(monitoring_loop())
@@ -829,11 +679,29 @@ async def main_async():
     print("🎯 Запуск цикла мониторинга TP/SL...")
     tp_sl_task = asyncio.create_task(tp_sl_monitor_loop())
     
+    if TRADING_MODE == 'real':
+        print("🔄 Запуск сверки позиций с биржей...")
+        position_reconciler.add_listener(protective_orders.on_position_event)
+        position_reconciler.start()
+    
     print(f"\n✅ Бот успешно запущен! Торговля: {'АКТИВНА' if not get_trading_status()['paused'] else 'НА ПАУЗЕ'}")
     print("   Используйте Telegram для управления ботом")
     
     # Ожидание завершения всех задач
-    await asyncio.gather(*trade_tasks, monitor_task, health_task, tp_sl_task, return_exceptions=True)
+    try:
+        await asyncio.gather(*trade_tasks.values(), monitor_task, health_task, tp_sl_task, ws_task,
+                             return_exceptions=True)
+    finally:
+        await order_executor.stop()
+        await reoptimizer.stop()
+        await position_reconciler.stop()
+        await user_data_stream.stop()
+        await async_client.close()
+        shutdown_pool()
+        journal.flush()
+        trade_stats.save()
+        notifier.flush()
+        state_store.bind_loop(None)
 
 # ========== ЗАПУСК ПАНЕЛИ УПРАВЛЕНИЯ ==========
 
@@ -0,0 +1,329 @@
+# models.py
+"""
+Типизированные записи позиций, ордеров и исполнений.
+
+Position, Order и Fill - dataclass со __slots__: поля фиксированы, атрибуты
+читаются без словаря и без цепочек .get() с запасными ключами. Разные
+источники (open_position, get_positions / account_state, ORDER_TRADE_UPDATE,
+ответы REST) приводятся к одной форме один раз - в from_dict / from_event /
+from_rest.
+
+Для старого кода, работающего со словарями, записи поддерживают доступ
+по ключу: pos["entry"], pos.get("tp_price"), pos.update(...), pos.pop(...).
+Синонимы прежних форматов (entry_price, quantity, tp, sl, mark_price)
+отображаются на поля, незнакомые ключи хранятся в extra. Отсутствующее
+значение (None) для словарного доступа - отсутствующий ключ.
+
+PositionStore - единственное хранилище позиций бота
+(user_data_cache["positions"]): словарь символ -> Position с поиском за
+O(1); присвоенный словарь сразу превращается в Position. Позиции пишут и
+потоки исполнителя ордеров, поэтому изменения идут под блокировкой, а
+перебор (iter / items / values) - по снимку, сделанному под ней же.
+"""
+import threading
+from collections.abc import MutableMapping
+from dataclasses import MISSING, dataclass, field, fields
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import TRAILING_STOP_PERCENT
+
+SOURCE_REAL = "binance_real"
+SOURCE_PENDING = "binance_real_pending"
+
+_MISSING = object()
+
+
+def _f(value, default=0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _LegacyMapping:
+    """Словарный доступ к полям записи (формат, которого ждёт старый код)"""
+
+    __slots__ = ()
+    ALIASES: Dict[str, str] = {}
+
+    def _name(self, key: str) -> Optional[str]:
+        name = self.ALIASES.get(key, key)
+        return name if name in self._field_names() else None
+
+    @classmethod
+    def _field_names(cls):
+        names = cls.__dict__.get("_names")
+        if names is None:
+            names = frozenset(f.name for f in fields(cls) if f.name != "extra")
+            setattr(cls, "_names", names)
+        return names
+
+    def _extra(self) -> Optional[dict]:
+        return getattr(self, "extra", None)
+
+    def __getitem__(self, key: str):
+        name = self._name(key)
+        if name is not None:
+            value = getattr(self, name)
+            if value is None:
+                raise KeyError(key)
+            return value
+        extra = self._extra()
+        if extra is None:
+            raise KeyError(key)
+        return extra[key]
+
+    def __setitem__(self, key: str, value):
+        name = self._name(key)
+        if name is not None:
+            setattr(self, name, value)
+        elif self._extra() is not None:
+            self.extra[key] = value
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key: str, default=_MISSING):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        name = self._name(key)
+        if name is not None:
+            setattr(self, name, _DEFAULTS[type(self)][name])
+        else:
+            del self.extra[key]
+        return value
+
+    def setdefault(self, key: str, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            self[key] = value = default
+        return value
+
+    def update(self, other=(), **kwargs):
+        items = other.items() if hasattr(other, "items") else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def to_dict(self) -> dict:
+        data = {f.name: getattr(self, f.name) for f in fields(self)
+                if f.name != "extra" and getattr(self, f.name) is not None}
+        data.update(self._extra() or {})
+        return data
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def values(self):
+        return self.to_dict().values()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __bool__(self) -> bool:
+        return True
+
+
+@dataclass(slots=True, eq=False)
+class Position(_LegacyMapping):
+    """Позиция бота (реальная или виртуальная)"""
+    symbol: str
+    side: str = "BUY"
+    qty: float = 0.0
+    entry: float = 0.0
+    current_price: Optional[float] = None
+    unrealized_pnl: float = 0.0
+    leverage: Optional[float] = None
+    status: str = "OPEN"
+    source: Optional[str] = None
+    order_id: Optional[int] = None
+    timestamp: float = 0.0
+    last_updated: Optional[float] = None
+
+    tp_price: Optional[float] = None
+    sl_price: Optional[float] = None
+    tp_percent: Optional[float] = None
+    sl_percent: Optional[float] = None
+    trail_percent: float = TRAILING_STOP_PERCENT
+    highest_price: Optional[float] = None
+    lowest_price: Optional[float] = None
+    trailing_active: bool = False
+    exit_reason: Optional[str] = None
+    protective_orders: Optional[dict] = None
+
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    ALIASES = {"entry_price": "entry", "quantity": "qty", "tp": "tp_price",
+               "sl": "sl_price", "mark_price": "current_price"}
+
+    @classmethod
+    def from_dict(cls, data, symbol: Optional[str] = None, **overrides) -> "Position":
+        """Позиция из словаря любого из прежних форматов"""
+        pos = cls(symbol=symbol or data.get("symbol", ""))
+        pos.update(data)
+        pos.update(overrides)
+        return pos
+
+    @property
+    def is_buy(self) -> bool:
+        return self.side.upper() == "BUY"
+
+    @property
+    def is_real(self) -> bool:
+        return str(self.source or "").startswith(SOURCE_REAL)
+
+    @property
+    def direction(self) -> int:
+        return 1 if self.is_buy else -1
+
+    def pnl_at(self, price: float) -> float:
+        return (price - self.entry) * self.qty * self.direction
+
+
+@dataclass(slots=True, eq=False)
+class Order(_LegacyMapping):
+    """Открытый ордер на бирже"""
+    symbol: str
+    order_id: int
+    client_order_id: Optional[str] = None
+    side: Optional[str] = None
+    type: Optional[str] = None
+    status: Optional[str] = None
+    orig_qty: float = 0.0
+    executed_qty: float = 0.0
+    price: float = 0.0
+    stop_price: float = 0.0
+    reduce_only: bool = False
+
+    # Ключи ответа REST (camelCase)
+    ALIASES = {"orderId": "order_id", "clientOrderId": "client_order_id", "origQty": "orig_qty",
+               "executedQty": "executed_qty", "stopPrice": "stop_price", "reduceOnly": "reduce_only"}
+
+    @classmethod
+    def from_event(cls, o: dict) -> "Order":
+        """Поле "o" события ORDER_TRADE_UPDATE"""
+        return cls(symbol=o.get("s"), order_id=o.get("i"), client_order_id=o.get("c"),
+                   side=o.get("S"), type=o.get("o"), status=o.get("X"),
+                   orig_qty=_f(o.get("q")), executed_qty=_f(o.get("z")), price=_f(o.get("p")),
+                   stop_price=_f(o.get("sp")), reduce_only=bool(o.get("R")))
+
+    def to_rest(self) -> dict:
+        """Формат futures_get_open_orders"""
+        return {
+            'symbol': self.symbol,
+            'orderId': self.order_id,
+            'clientOrderId': self.client_order_id,
+            'side': self.side,
+            'type': self.type,
+            'status': self.status,
+            'origQty': self.orig_qty,
+            'executedQty': self.executed_qty,
+            'price': self.price,
+            'stopPrice': self.stop_price,
+            'reduceOnly': self.reduce_only,
+        }
+
+
+@dataclass(slots=True, eq=False)
+class Fill(_LegacyMapping):
+    """Результат исполнения ордера (fill_tracker.py)"""
+    symbol: Optional[str]
+    side: Optional[str]
+    status: str
+    order_id: Optional[int]
+    client_order_id: Optional[str]
+    executed_qty: float
+    avg_price: float
+    source: str
+
+    @classmethod
+    def from_rest(cls, order: dict, source: str = "response") -> "Fill":
+        """Ответ REST (RESULT / futures_get_order)"""
+        return cls(order.get("symbol"), order.get("side"), order.get("status", "UNKNOWN"),
+                   order.get("orderId"), order.get("clientOrderId"),
+                   _f(order.get("executedQty")), _f(order.get("avgPrice")), source)
+
+    @classmethod
+    def from_event(cls, o: dict) -> "Fill":
+        """Поле "o" события ORDER_TRADE_UPDATE"""
+        return cls(o.get("s"), o.get("S"), o.get("X", "UNKNOWN"), o.get("i"), o.get("c"),
+                   _f(o.get("z")), _f(o.get("ap")), "stream")
+
+
+_DEFAULTS = {
+    cls: {f.name: None if f.default is MISSING else f.default for f in fields(cls) if f.name != "extra"}
+    for cls in (Position, Order, Fill)
+}
+
+
+class PositionStore(MutableMapping):
+    """Позиции бота по символу; словари приводятся к Position при записи"""
+
+    def __init__(self, positions=None):
+        self._positions: Dict[str, Position] = {}
+        self._lock = threading.RLock()
+        for symbol, pos in (positions or {}).items():
+            self[symbol] = pos
+
+    def __getitem__(self, symbol: str) -> Position:
+        return self._positions[symbol]
+
+    def __setitem__(self, symbol: str, pos):
+        if not isinstance(pos, Position):
+            pos = Position.from_dict(pos, symbol=symbol)
+        with self._lock:
+            self._positions[symbol] = pos
+
+    def __delitem__(self, symbol: str):
+        with self._lock:
+            del self._positions[symbol]
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._positions))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __repr__(self):
+        return f"PositionStore({list(self)})"
+
+    def pop(self, symbol: str, *default):
+        with self._lock:
+            return self._positions.pop(symbol, *default)
+
+    def items(self) -> List[tuple]:
+        with self._lock:
+            return list(self._positions.items())
+
+    def values(self) -> List[Position]:
+        with self._lock:
+            return list(self._positions.values())
+
+    def copy(self) -> Dict[str, Position]:
+        with self._lock:
+            return dict(self._positions)
+
+    def open_positions(self) -> List[Position]:
+        return [p for p in self.values() if p.status == "OPEN"]
+
+    def real_positions(self) -> List[Position]:
+        return [p for p in self.values() if p.is_real]
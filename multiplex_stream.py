@@ -0,0 +1,272 @@
+# multiplex_stream.py
+"""
+Combined-stream WebSocket для всех символов сразу.
+
+Вместо отдельного kline_socket на каждый символ держим одно (или несколько,
+по WS_STREAMS_PER_CONNECTION потоков) соединение /stream и подписываемся
+через SUBSCRIBE / UNSUBSCRIBE. Подписки можно добавлять и снимать на лету,
+не разрывая соединение; при (пере)подключении текущий набор потоков
+передаётся прямо в URL (/stream?streams=...), без пачек SUBSCRIBE.
+
+Подписки, пришедшие по одной (символы из warm_up готовы в разное время),
+копятся в очереди соединения и уходят одним сообщением до SUBSCRIBE_BATCH
+потоков; между сообщениями - не меньше SUBSCRIBE_PAUSE. Вызывающий не ждёт
+паузу: пока идёт отправка, новые потоки попадают в следующее сообщение.
+
+Источник свечей - USD-M Futures (fstream.binance.com, в test - testnet
+фьючерсов), а не спотовый поток kline_socket, который использовался
+раньше: бот торгует фьючерсами, и TP/SL должны считаться по тем же ценам.
+"""
+import asyncio
+import json
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import websockets
+
+from config import TIMEFRAME, TRADING_MODE, WS_STREAMS_PER_CONNECTION
+
+FUTURES_STREAM_URL = "wss://fstream.binance.com/stream"
+FUTURES_TESTNET_STREAM_URL = "wss://stream.binancefuture.com/stream"
+
+# Binance принимает не больше 10 входящих сообщений в секунду на соединение
+SUBSCRIBE_BATCH = 50  # потоков в одном SUBSCRIBE / UNSUBSCRIBE
+SUBSCRIBE_PAUSE = 0.25  # сек между сообщениями одного соединения
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+def kline_stream_name(symbol: str, interval: str) -> str:
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+def stream_base_url(trading_mode: str = TRADING_MODE) -> str:
+    """Endpoint combined stream: фьючерсы mainnet в real, testnet фьючерсов иначе"""
+    return FUTURES_STREAM_URL if trading_mode == 'real' else FUTURES_TESTNET_STREAM_URL
+
+
+def combined_stream_url(base: str, streams: Iterable[str] = ()) -> str:
+    """URL соединения с уже подписанными потоками (порядок стабильный)"""
+    streams = sorted(streams)
+    return f"{base}?streams={'/'.join(streams)}" if streams else base
+
+
+def reconnect_delay(attempt: int) -> int:
+    """Пауза перед попыткой переподключения attempt (0, 1, ...)"""
+    return RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+
+
+class StreamShard:
+    """Одно combined-stream соединение с набором подписок"""
+
+    def __init__(self, url: str, dispatch: Handler, name: str = "shard-0",
+                 connect: Callable = websockets.connect):
+        self.url = url
+        self.name = name
+        self.dispatch = dispatch
+        self.connect = connect
+        self.streams = set()
+        self._ws = None
+        self._request_id = 0
+        self._task = None
+        self._outbox: Deque[Tuple[str, str]] = deque()  # (метод, поток) в порядке вызовов
+        self._sending = False
+        self._last_send = float("-inf")
+        self.connected = asyncio.Event()
+
+    def __len__(self):
+        return len(self.streams)
+
+    async def _send(self, method: str, streams: List[str]):
+        """Поставить потоки в очередь и отправить, если отправка ещё не идёт"""
+        self._outbox.extend((method, s) for s in streams)
+        if self._sending or self._ws is None:
+            # Идущая отправка заберёт их следующим сообщением, а без
+            # соединения подписки уйдут в URL при подключении
+            return
+        self._sending = True
+        try:
+            await self._flush_outbox()
+        finally:
+            self._sending = False
+
+    async def _flush_outbox(self):
+        loop = asyncio.get_running_loop()
+        while self._outbox and self._ws is not None:
+            wait = self._last_send + SUBSCRIBE_PAUSE - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                if self._ws is None:
+                    return
+            # Подряд идущие потоки с одним методом - одним сообщением
+            method, params = self._outbox[0][0], []
+            while self._outbox and self._outbox[0][0] == method and len(params) < SUBSCRIBE_BATCH:
+                params.append(self._outbox.popleft()[1])
+            self._request_id += 1
+            request = {"method": method, "params": params, "id": self._request_id}
+            self._last_send = loop.time()
+            await self._ws.send(json.dumps(request))
+
+    async def subscribe(self, streams: Iterable[str]):
+        new = [s for s in streams if s not in self.streams]
+        if not new:
+            return
+        self.streams.update(new)
+        try:
+            await self._send("SUBSCRIBE", new)
+        except Exception as e:
+            # Подписки уже сохранены и будут отправлены после переподключения
+            print(f"⚠️  [{self.name}] Не удалось отправить SUBSCRIBE: {e}")
+
+    async def unsubscribe(self, streams: Iterable[str]):
+        gone = [s for s in streams if s in self.streams]
+        if not gone:
+            return
+        self.streams.difference_update(gone)
+        try:
+            await self._send("UNSUBSCRIBE", gone)
+        except Exception as e:
+            print(f"⚠️  [{self.name}] Не удалось отправить UNSUBSCRIBE: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self):
+        attempt = 0
+        while True:
+            try:
+                initial = set(self.streams)
+                async with self.connect(combined_stream_url(self.url, initial), max_queue=None) as ws:
+                    self._ws = ws
+                    self.connected.set()
+                    attempt = 0
+                    # Очередь до подключения заменяется разницей с URL:
+                    # добавленные во время подключения в него не попали
+                    self._outbox.clear()
+                    gone = sorted(initial - self.streams)
+                    if gone:
+                        await self._send("UNSUBSCRIBE", gone)
+                    missed = sorted(self.streams - initial)
+                    if missed:
+                        await self._send("SUBSCRIBE", missed)
+                    print(f"✅ [{self.name}] Combined stream подключен: {len(self.streams)} потоков")
+
+                    async for raw in ws:
+                        msg = json.loads(raw)
+                        data = msg.get("data")
+                        if data is None:
+                            if msg.get("error"):
+                                print(f"❌ [{self.name}] Ошибка подписки: {msg['error']}")
+                            continue
+                        await self.dispatch(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  [{self.name}] Соединение потеряно: {e}")
+            finally:
+                self._ws = None
+                self.connected.clear()
+
+            delay = reconnect_delay(attempt)
+            attempt += 1
+            print(f"🔄 [{self.name}] Переподключение через {delay} сек...")
+            await asyncio.sleep(delay)
+
+
+class MultiplexKlineStream:
+    """Свечи всех символов через combined-stream соединения с шардированием"""
+
+    def __init__(self, interval: str = TIMEFRAME, handler: Optional[Handler] = None,
+                 streams_per_connection: int = WS_STREAMS_PER_CONNECTION):
+        self.interval = interval
+        self.default_handler = handler
+        self.streams_per_connection = streams_per_connection
+        self.url = stream_base_url()
+        self.shards: List[StreamShard] = []
+        self.handlers: Dict[str, Handler] = {}
+        self._shard_by_symbol: Dict[str, StreamShard] = {}
+        self._started = False
+
+    async def _dispatch(self, data: dict):
+        symbol = data.get("s")
+        handler = self.handlers.get(symbol)
+        if handler is None:
+            return
+        try:
+            await handler(data)
+        except Exception as e:
+            print(f"❌ Ошибка обработчика {symbol}: {e}")
+
+    def _shard_with_room(self) -> StreamShard:
+        for shard in self.shards:
+            if len(shard) < self.streams_per_connection:
+                return shard
+        shard = StreamShard(self.url, self._dispatch, name=f"shard-{len(self.shards)}")
+        self.shards.append(shard)
+        if self._started:
+            shard.start()
+        return shard
+
+    def symbols(self) -> List[str]:
+        return list(self._shard_by_symbol)
+
+    async def add_symbols(self, symbols: Iterable[str], handler: Optional[Handler] = None):
+        """Подписка на свечи новых символов без переподключения"""
+        pending: Dict[StreamShard, List[str]] = {}
+        for symbol in symbols:
+            self.handlers[symbol] = handler or self.default_handler
+            if symbol in self._shard_by_symbol:
+                continue
+            shard = self._shard_with_room()
+            self._shard_by_symbol[symbol] = shard
+            # резервируем место в шарде сразу, чтобы следующий символ считался правильно
+            shard.streams.add(kline_stream_name(symbol, self.interval))
+            pending.setdefault(shard, []).append(kline_stream_name(symbol, self.interval))
+
+        for shard, streams in pending.items():
+            shard.streams.difference_update(streams)
+            await shard.subscribe(streams)
+
+    async def remove_symbols(self, symbols: Iterable[str]):
+        """Отписка от символов без переподключения"""
+        pending: Dict[StreamShard, List[str]] = {}
+        for symbol in symbols:
+            shard = self._shard_by_symbol.pop(symbol, None)
+            self.handlers.pop(symbol, None)
+            if shard is not None:
+                pending.setdefault(shard, []).append(kline_stream_name(symbol, self.interval))
+
+        for shard, streams in pending.items():
+            await shard.unsubscribe(streams)
+
+    async def start(self, symbols: Iterable[str] = ()):
+        self._started = True
+        await self.add_symbols(symbols)
+        for shard in self.shards:
+            shard.start()
+
+    async def run_forever(self):
+        """Ожидание работы всех соединений (включая добавленные позже)"""
+        while True:
+            tasks = [shard.start() for shard in self.shards]
+            if tasks:
+                await asyncio.wait(tasks, timeout=60)
+            else:
+                await asyncio.sleep(1)
+
+    async def stop(self):
+        for shard in self.shards:
+            await shard.stop()
+        self._started = False
@@ -0,0 +1,283 @@
+# notifier.py
+"""
+Очередь исходящих сообщений Telegram с фоновой отправкой.
+
+send_to_me / send_to_channel вызываются из обработчика свечей, потоков
+исполнителя ордеров и циклов мониторинга, поэтому HTTP-запрос вынесен из
+вызывающего кода: enqueue() только кладёт текст в очередь чата и сразу
+возвращается, даже если Telegram отвечает медленно.
+
+Фоновый поток отправляет по одному сообщению на чат за раз:
+- сообщения, пришедшие в чат за NOTIFY_COALESCE_WINDOW, склеиваются в
+  одно (до 4096 символов, с одинаковым parse_mode);
+- между отправками в один чат - не меньше NOTIFY_CHAT_INTERVAL (канал или
+  группа - NOTIFY_CHANNEL_INTERVAL), всего не больше NOTIFY_GLOBAL_RATE
+  сообщений в секунду; ответ 429 откладывает чат на retry_after;
+- одинаковый текст в тот же чат в течение NOTIFY_DEDUP_TTL отбрасывается
+  (кроме ответов на команды - enqueue(..., dedup=False));
+- в очереди чата не больше NOTIFY_MAX_PENDING сообщений, старые сверх
+  лимита отбрасываются.
+
+flush() отправляет накопленное, не дожидаясь окна склейки; close()
+регистрируется в atexit.
+"""
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import requests
+
+from config import (TELEGRAM_BOT_TOKEN, NOTIFY_COALESCE_WINDOW, NOTIFY_CHAT_INTERVAL,
+                    NOTIFY_CHANNEL_INTERVAL, NOTIFY_GLOBAL_RATE, NOTIFY_DEDUP_TTL,
+                    NOTIFY_MAX_PENDING)
+
+MAX_MESSAGE_LENGTH = 4096
+SEPARATOR = "\n\n"
+
+# Отправитель: True - доставлено, False - ошибка, float - повторить через столько секунд (429)
+Sender = Callable[[str, str, Optional[str]], Union[bool, float]]
+
+
+def is_channel(chat_id) -> bool:
+    """Канал или группа (у них более строгий лимит Telegram)"""
+    return "@" in str(chat_id) or str(chat_id).startswith("-")
+
+
+def post_message(chat_id: str, text: str, parse_mode: Optional[str] = "Markdown") -> Union[bool, float]:
+    """Синхронная отправка через Bot API (вызывается только из потока notifier)"""
+    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    data = {
+        "chat_id": chat_id,
+        "text": text[:MAX_MESSAGE_LENGTH],
+        "disable_notification": False,
+        "disable_web_page_preview": True
+    }
+    if parse_mode:
+        data["parse_mode"] = parse_mode
+
+    try:
+        response = requests.post(url, json=data, timeout=10)
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after", 5)
+            except ValueError:
+                retry_after = 5
+            print(f"⚠️  Telegram: лимит сообщений, повтор через {retry_after} сек")
+            return float(retry_after)
+        if response.status_code == 200:
+            destination = "канал" if is_channel(chat_id) else "вам"
+            print(f"✅ Сообщение отправлено в {destination} (символов: {len(text)})")
+            return True
+
+        print(f"❌ Ошибка отправки: {response.status_code}")
+        print(f"   Ответ Telegram: {response.text[:200]}")
+
+        # Если ошибка из-за parse_mode, пробуем без него
+        if parse_mode and "parse mode" in response.text.lower():
+            print("⚠️  Пробуем отправить без форматирования...")
+            data.pop("parse_mode", None)
+            response2 = requests.post(url, json=data, timeout=10)
+            if response2.status_code == 200:
+                print("✅ Сообщение отправлено без форматирования")
+                return True
+            print(f"❌ Снова ошибка: {response2.status_code}")
+            print(f"   Ответ: {response2.text[:200]}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Ошибка отправки: {e}")
+        return False
+
+
+class Notifier:
+    """Неблокирующая отправка с окном склейки, лимитами и отсевом повторов"""
+
+    def __init__(self, send: Sender = post_message, window: float = NOTIFY_COALESCE_WINDOW,
+                 chat_interval: float = NOTIFY_CHAT_INTERVAL,
+                 channel_interval: float = NOTIFY_CHANNEL_INTERVAL,
+                 global_rate: float = NOTIFY_GLOBAL_RATE, dedup_ttl: float = NOTIFY_DEDUP_TTL,
+                 max_pending: int = NOTIFY_MAX_PENDING):
+        self.send = send
+        self.window = window
+        self.chat_interval = chat_interval
+        self.channel_interval = channel_interval
+        self.global_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self.dedup_ttl = dedup_ttl
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pending: Dict[str, Deque[Tuple[str, Optional[str]]]] = {}
+        self._first_at: Dict[str, float] = {}     # начало текущей пачки чата
+        self._next_at: Dict[str, float] = {}      # когда чату можно следующее сообщение
+        self._global_next = 0.0
+        self._recent: Dict[Tuple[str, str], float] = {}  # (чат, текст) -> до какого времени повтор отсеивается
+        self._in_flight = 0
+        self._flushing = 0
+        self._stopping = False
+        self.enqueued = 0
+        self.sent = 0          # отправленных сообщений Telegram (после склейки)
+        self.merged = 0        # исходных сообщений, доставленных в составе склейки
+        self.duplicates = 0
+        self.dropped = 0
+        self.errors = 0
+
+    # ---------- Постановка в очередь (вызывающая сторона) ----------
+
+    def enqueue(self, chat_id, text: str, parse_mode: Optional[str] = "Markdown",
+                dedup: bool = True) -> bool:
+        """Поставить сообщение в очередь; False - повтор недавнего текста.
+
+        dedup=False - ответы на команды: они не отсеиваются и не попадают в
+        список недавних текстов.
+        """
+        chat_id = str(chat_id)
+        now = time.monotonic()
+        with self._cond:
+            if dedup:
+                key = (chat_id, text)
+                if self._recent.get(key, 0.0) > now:
+                    self.duplicates += 1
+                    return False
+                self._recent[key] = now + self.dedup_ttl
+                if len(self._recent) > 4 * self.max_pending:
+                    self._recent = {k: t for k, t in self._recent.items() if t > now}
+
+            queue = self._pending.setdefault(chat_id, deque())
+            if not queue:
+                self._first_at[chat_id] = now
+            queue.append((text, parse_mode))
+            if len(queue) > self.max_pending:
+                queue.popleft()
+                self.dropped += 1
+            self.enqueued += 1
+            self._cond.notify_all()
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._pending.values()) + self._in_flight
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Отправить всё из очереди, не дожидаясь окна склейки (лимиты соблюдаются)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._pending and not self._in_flight:
+                return True
+            if self._thread is None or not self._thread.is_alive():
+                return False
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._pending or self._in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._flushing -= 1
+
+    # ---------- Фоновый поток ----------
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Отправить остаток очереди и остановить поток"""
+        thread = self._thread
+        if thread is None:
+            return
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+        self._thread = None
+
+    def _interval(self, chat_id: str) -> float:
+        return self.channel_interval if is_channel(chat_id) else self.chat_interval
+
+    def _next_due(self) -> Tuple[Optional[str], float]:
+        """Чат, которому раньше всех можно отправлять, и когда"""
+        best, best_at = None, 0.0
+        for chat_id in self._pending:
+            due = self._next_at.get(chat_id, 0.0)
+            if not self._flushing:
+                due = max(due, self._first_at[chat_id] + self.window)
+            if best is None or due < best_at:
+                best, best_at = chat_id, due
+        return best, max(best_at, self._global_next)
+
+    def _take(self, chat_id: str) -> Tuple[List[str], Optional[str]]:
+        """Подряд идущие сообщения чата с одним parse_mode, вмещающиеся в одно"""
+        queue = self._pending[chat_id]
+        text, parse_mode = queue.popleft()
+        texts, length = [text], len(text)
+        while queue and queue[0][1] == parse_mode:
+            nxt = queue[0][0]
+            if length + len(SEPARATOR) + len(nxt) > MAX_MESSAGE_LENGTH:
+                break
+            queue.popleft()
+            texts.append(nxt)
+            length += len(SEPARATOR) + len(nxt)
+        if not queue:
+            del self._pending[chat_id]
+            del self._first_at[chat_id]
+        return texts, parse_mode
+
+    def _requeue(self, chat_id: str, texts: List[str], parse_mode: Optional[str]):
+        queue = self._pending.setdefault(chat_id, deque())
+        if not queue:
+            self._first_at[chat_id] = 0.0  # окно склейки уже прошло
+        queue.extendleft((t, parse_mode) for t in reversed(texts))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    chat_id, due = self._next_due()
+                    now = time.monotonic()
+                    if chat_id is not None and due <= now:
+                        break
+                    self._cond.wait(None if chat_id is None else due - now)
+                texts, parse_mode = self._take(chat_id)
+                self._in_flight += len(texts)
+
+            try:
+                result = self.send(chat_id, SEPARATOR.join(texts), parse_mode)
+            except Exception as e:
+                print(f"❌ Notifier: ошибка отправки: {e}")
+                result = False
+
+            with self._cond:
+                now = time.monotonic()
+                self._in_flight -= len(texts)
+                self._global_next = now + self.global_interval
+                if result is True:
+                    self.sent += 1
+                    if len(texts) > 1:
+                        self.merged += len(texts)
+                    self._next_at[chat_id] = now + self._interval(chat_id)
+                elif result is False or result is None:
+                    self.errors += 1
+                    self._next_at[chat_id] = now + self._interval(chat_id)
+                else:
+                    # 429: повторяем ту же пачку, когда Telegram разрешит
+                    self._requeue(chat_id, texts, parse_mode)
+                    self._next_at[chat_id] = now + max(float(result), self._interval(chat_id))
+                self._cond.notify_all()
+
+
+# Глобальная очередь уведомлений
+notifier = Notifier()
+atexit.register(notifier.close)
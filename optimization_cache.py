@@ -0,0 +1,162 @@
+# optimization_cache.py
+"""
+Кеш результатов оптимизации на диске.
+
+Лучшие параметры и equity хранятся по ключу символ | стратегия | хеш сетки
+вместе с отпечатком данных (время последнего бара, хеш времени и цен закрытия,
+последняя цена). После перезапуска символ переоптимизируется, только если
+данные заметно сдвинулись: появилось больше OPT_CACHE_MAX_NEW_BARS новых
+баров или цена ушла дальше OPT_CACHE_MAX_PRICE_MOVE. Записи старше
+OPT_CACHE_TTL не используются, а сверх OPT_CACHE_MAX_ENTRIES вытесняются
+давно не использованные.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    OPT_CACHE_FILE, OPT_CACHE_TTL, OPT_CACHE_MAX_ENTRIES,
+    OPT_CACHE_MAX_NEW_BARS, OPT_CACHE_MAX_PRICE_MOVE,
+)
+
+
+def grid_hash(grid: List[Dict]) -> str:
+    """Хеш сетки параметров: другая сетка - другой ключ"""
+    raw = json.dumps(grid, sort_keys=True, default=str).encode()
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def data_fingerprint(df: pd.DataFrame) -> Dict:
+    """Отпечаток свечей: последний бар, число баров, последняя цена и хеш времени и Close"""
+    close = np.ascontiguousarray(df["Close"].to_numpy(dtype=float))
+    index = np.ascontiguousarray(pd.DatetimeIndex(df.index).asi8)
+    return {
+        "last_bar": int(index[-1] // 1_000_000),
+        "bars": len(df),
+        "close": float(close[-1]),
+        "hash": hashlib.sha1(index.tobytes() + close.tobytes()).hexdigest()[:16],
+    }
+
+
+def _new_bars(df: pd.DataFrame, last_bar_ms: int) -> int:
+    index_ms = pd.DatetimeIndex(df.index).asi8 // 1_000_000
+    return int((index_ms > last_bar_ms).sum())
+
+
+class OptimizationCache:
+    """Лучшие параметры по (символ, стратегия, сетка) с TTL и LRU-вытеснением"""
+
+    def __init__(self, path: Optional[str] = OPT_CACHE_FILE, ttl: float = OPT_CACHE_TTL,
+                 max_entries: int = OPT_CACHE_MAX_ENTRIES,
+                 max_new_bars: int = OPT_CACHE_MAX_NEW_BARS,
+                 max_price_move: float = OPT_CACHE_MAX_PRICE_MOVE):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_new_bars = max_new_bars
+        self.max_price_move = max_price_move
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # save() может идти из нескольких потоков
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(symbol: str, strategy: str, grid: List[Dict]) -> str:
+        return f"{symbol}|{strategy}|{grid_hash(grid)}"
+
+    # ---------- Диск ----------
+
+    def load(self):
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            entries = sorted(data.get("entries", {}).items(), key=lambda kv: kv[1].get("used", 0))
+            with self._lock:
+                self._entries = OrderedDict(entries)
+            print(f"✅ Кеш оптимизации загружен: {len(self._entries)} записей")
+        except Exception as e:
+            print(f"⚠️  Не удалось загрузить кеш оптимизации: {e}")
+
+    def save(self):
+        """Атомарная запись (временный файл + os.replace); из event loop - через asyncio.to_thread"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                data = {"entries": dict(self._entries), "saved": time.time()}
+            tmp = f"{self.path}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp, self.path)
+            except Exception as e:
+                print(f"⚠️  Не удалось сохранить кеш оптимизации: {e}")
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    # ---------- Поиск и запись ----------
+
+    def _fresh(self, entry: dict, df: pd.DataFrame) -> bool:
+        if time.time() - entry.get("created", 0) > self.ttl:
+            return False
+        fp = entry.get("data", {})
+        if fp.get("hash") == data_fingerprint(df)["hash"]:
+            return True
+        if _new_bars(df, fp.get("last_bar", 0)) > self.max_new_bars:
+            return False
+        ref = fp.get("close") or 0.0
+        return ref > 0 and abs(float(df["Close"].iloc[-1]) / ref - 1) <= self.max_price_move
+
+    def lookup(self, symbol: str, strategy: str, grid: List[Dict],
+               df: pd.DataFrame) -> Optional[dict]:
+        """{"params", "equity"} из кеша, если данные сдвинулись несильно"""
+        self._ensure_loaded()
+        key = self.key(symbol, strategy, grid)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._fresh(entry, df):
+                self.misses += 1
+                return None
+            entry["used"] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {"params": dict(entry["params"]), "equity": entry["equity"]}
+
+    def store(self, symbol: str, strategy: str, grid: List[Dict], df: pd.DataFrame,
+              params: Dict, equity: float):
+        self._ensure_loaded()
+        now = time.time()
+        entry = {
+            "params": dict(params),
+            "equity": float(equity),
+            "data": data_fingerprint(df),
+            "created": now,
+            "used": now,
+        }
+        key = self.key(symbol, strategy, grid)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Глобальный кеш оптимизации
+optimization_cache = OptimizationCache()
@@ -0,0 +1,220 @@
+# optimizer.py
+"""
+Параллельная оптимизация параметров стратегий.
+
+Каждая комбинация символ × стратегия × набор параметров - отдельная задача в
+ProcessPoolExecutor. Параметры передаются в Backtest.run(**params), классы
+стратегий не изменяются, поэтому задачи независимы друг от друга. Event loop
+только ждёт результаты (run_in_executor) и остаётся отзывчивым.
+
+При OPTIMIZER_VECTORIZED сетка ранжируется векторным бэктестом
+(vector_backtest.py) за один проход, а FractionalBacktest запускается только
+для лучшего набора параметров символа и стратегии.
+
+Результаты сохраняются в optimization_cache: после перезапуска
+переоптимизируются только символы, чьи данные заметно изменились.
+
+Результат - данные, а не глобальное состояние: лучшие параметры и equity по
+каждому символу и стратегии; параметры публикуются в data_store.strategy_params.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from backtesting.lib import FractionalBacktest
+
+from config import (
+    BBRSI_PARAM_GRID, BREAKOUT_PARAM_GRID, USE_BBRSI, USE_BREAKOUT,
+    INITIAL_CASH, OPTIMIZER_WORKERS, OPTIMIZER_VECTORIZED,
+)
+from data_store import klines_cache, strategy_params, trading_state
+from optimization_cache import OptimizationCache, optimization_cache
+from strategies import BBRSI_EMA_Strategy, Breakout_Strategy
+from vector_backtest import best_params
+
+MIN_BARS = 150
+COMMISSION = 0.005
+
+STRATEGIES = {
+    "bbrsi": BBRSI_EMA_Strategy,
+    "breakout": Breakout_Strategy,
+}
+
+# {symbol: {strategy: {"params": {...}, "equity": float}}}
+OptimizationResult = Dict[str, Dict[str, dict]]
+
+# Результаты последней полной оптимизации (отправная точка для reoptimizer.py)
+last_results: OptimizationResult = {}
+
+
+def enabled_grids() -> Dict[str, List[dict]]:
+    """Сетки параметров включённых стратегий"""
+    grids = {}
+    if USE_BBRSI:
+        grids["bbrsi"] = BBRSI_PARAM_GRID
+    if USE_BREAKOUT:
+        grids["breakout"] = BREAKOUT_PARAM_GRID
+    return grids
+
+
+def run_backtest(df: pd.DataFrame, strategy: str, params: dict) -> Optional[float]:
+    """Equity Final одного бэктеста; выполняется в процессе пула"""
+    try:
+        bt = FractionalBacktest(df, STRATEGIES[strategy], cash=INITIAL_CASH, margin=1,
+                                commission=COMMISSION, finalize_trades=True)
+        stats = bt.run(**params)
+        equity = stats.get("Equity Final [$]")
+        return float(equity) if equity is not None else None
+    except Exception:
+        return None
+
+
+# ---------- Пул процессов ----------
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Общий пул процессов (создаётся при первой оптимизации и живёт до остановки)"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=OPTIMIZER_WORKERS or os.cpu_count())
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ---------- Оптимизация ----------
+
+def best_results(jobs: List[Tuple[str, str, dict]], equities: List[Optional[float]]) -> OptimizationResult:
+    """Лучший набор параметров по символу и стратегии (при равенстве - первый в сетке)"""
+    results: OptimizationResult = {}
+    for (symbol, strategy, params), equity in zip(jobs, equities):
+        if equity is None:
+            continue
+        by_strategy = results.setdefault(symbol, {})
+        best = by_strategy.get(strategy)
+        if best is None or equity > best["equity"]:
+            by_strategy[strategy] = {"params": dict(params), "equity": equity}
+    return results
+
+
+def screen_grid(df: pd.DataFrame, strategy: str, grid: List[dict]) -> Optional[dict]:
+    """Лучшие параметры по векторному бэктесту; выполняется в процессе пула"""
+    try:
+        return best_params(df, strategy, grid)
+    except Exception:
+        return None
+
+
+async def optimize_symbols(symbols: List[str], grids: Optional[Dict[str, List[dict]]] = None,
+                           executor: Optional[Executor] = None,
+                           frames: Optional[Dict[str, pd.DataFrame]] = None,
+                           vectorized: bool = OPTIMIZER_VECTORIZED,
+                           cache: Optional[OptimizationCache] = optimization_cache) -> OptimizationResult:
+    """Оптимизация всех символов и стратегий в пуле процессов (с учётом кеша)"""
+    grids = enabled_grids() if grids is None else grids
+    executor = executor or get_pool()
+    loop = asyncio.get_running_loop()
+
+    data = {}
+    for symbol in symbols:
+        df = frames[symbol] if frames is not None else klines_cache.get(symbol)
+        if df is None or len(df) < MIN_BARS:
+            print(f"[WARN] Недостаточно данных по {symbol} для оптимизации")
+            continue
+        data[symbol] = df
+
+    cached: OptimizationResult = {}
+    keys = []
+    for symbol, df in data.items():
+        for strategy, grid in grids.items():
+            hit = cache.lookup(symbol, strategy, grid, df) if cache is not None else None
+            if hit is not None:
+                cached.setdefault(symbol, {})[strategy] = hit
+            else:
+                keys.append((symbol, strategy))
+    if cache is not None and data:
+        print(f"[INFO] Кеш оптимизации: {len(data) * len(grids) - len(keys)} из "
+              f"{len(data) * len(grids)}, переоптимизация: {sorted({s for s, _ in keys})}")
+
+    if vectorized:
+        # Одна задача на символ и стратегию: вся сетка за один векторный проход
+        screened = await asyncio.gather(*(
+            loop.run_in_executor(executor, screen_grid, data[symbol], strategy, grids[strategy])
+            for symbol, strategy in keys))
+        jobs = [(symbol, strategy, params)
+                for (symbol, strategy), params in zip(keys, screened) if params is not None]
+    else:
+        jobs = [(symbol, strategy, params)
+                for symbol, strategy in keys for params in grids[strategy]]
+
+    equities = await asyncio.gather(*(
+        loop.run_in_executor(executor, run_backtest, data[symbol], strategy, params)
+        for symbol, strategy, params in jobs))
+    results = best_results(jobs, equities)
+
+    if cache is not None and keys:
+        for symbol, by_strategy in results.items():
+            for strategy, r in by_strategy.items():
+                cache.store(symbol, strategy, grids[strategy], data[symbol], r["params"], r["equity"])
+        # Запись JSON на диск не должна останавливать обработку свечей
+        await asyncio.to_thread(cache.save)
+
+    for symbol, by_strategy in cached.items():
+        results.setdefault(symbol, {}).update(by_strategy)
+    return results
+
+
+def rank_symbols(results: OptimizationResult, top_n: int = 5) -> List[Tuple[str, float]]:
+    """Символы по суммарной equity лучших параметров всех стратегий"""
+    totals = [(symbol, sum(r["equity"] for r in by_strategy.values()))
+              for symbol, by_strategy in results.items()]
+    totals.sort(key=lambda x: x[1], reverse=True)
+    return totals[:top_n]
+
+
+def publish_params(results: OptimizationResult):
+    """Параметры по символам для торговых циклов (strategies.get_trading_signal)"""
+    for symbol, by_strategy in results.items():
+        strategy_params[symbol] = {strategy: r["params"] for strategy, r in by_strategy.items()}
+
+
+def publish_top(symbols):
+    """Топ-N символов для открытия позиций (trade_symbol_loop)"""
+    trading_state["top_symbols"] = tuple(symbols)
+    trading_state["updated"] = time.time()
+
+
+async def optimize_and_select_top(symbols: List[str], top_n: int = 5,
+                                  executor: Optional[Executor] = None) -> List[Tuple[str, float]]:
+    """Оптимизация и выбор топ-N символов; [] если результатов нет.
+
+    Параметры публикуются сразу, а топ публикует вызывающий (publish_top):
+    при пустом результате он сам выбирает запасной список.
+    """
+    global last_results
+    started = time.monotonic()
+    results = await optimize_symbols(symbols, executor=executor)
+    last_results = results
+    publish_params(results)
+
+    for symbol, by_strategy in results.items():
+        for strategy, r in by_strategy.items():
+            print(f"[INFO] {symbol} {strategy.upper()} equity: {r['equity']:.2f} params: {r['params']}")
+
+    if not results:
+        print("[WARN] Нет результатов оптимизации")
+        return []
+
+    top = rank_symbols(results, top_n)
+    print(f"[INFO] Оптимизация заняла {time.monotonic() - started:.1f} сек")
+    print(f"[INFO] Top{top_n} монет:", top)
+    return top
@@ -0,0 +1,191 @@
+# order_executor.py
+"""
+Исполнение ордеров вне event loop.
+
+open_position / close_position делают несколько блокирующих REST-запросов
+python-binance. Обработчик свечей кладёт намерение (OrderIntent) в
+ограниченную очередь и сразу возвращается к потоку данных, а воркеры
+выполняют запросы в отдельном пуле потоков.
+
+Задания меняют общие структуры (позиции в PositionStore, журнал, индекс
+TP/SL) из потоков пула - эти структуры защищены собственными блокировками.
+stop() дожидается уже принятых намерений и только потом снимает воркеров.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import ORDER_QUEUE_SIZE, ORDER_EXECUTOR_WORKERS, ORDER_DRAIN_TIMEOUT
+
+
+class OrderIntent:
+    """Намерение открыть или закрыть позицию"""
+
+    __slots__ = ("action", "symbol", "side", "price", "reason", "job", "created_at", "future")
+
+    def __init__(self, action: str, symbol: str, job: Callable[[], Any],
+                 side: Optional[str] = None, price: Optional[float] = None,
+                 reason: Optional[str] = None):
+        self.action = action      # "OPEN" / "CLOSE"
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.reason = reason
+        self.job = job            # блокирующая функция, выполняется в пуле
+        self.created_at = time.monotonic()
+        self.future = None        # заполняется в execute()
+
+    def __repr__(self):
+        return f"OrderIntent({self.action} {self.symbol} {self.side or ''})"
+
+
+class _LatencyStat:
+    """Счетчик задержек: последнее, среднее, максимум (секунды)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.last = value
+        self.max = max(self.max, value)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "last_ms": self.last * 1000,
+            "avg_ms": (self.total / self.count * 1000) if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+class OrderExecutor:
+    """Очередь намерений + пул потоков для блокирующих REST-вызовов"""
+
+    def __init__(self, max_queue: int = ORDER_QUEUE_SIZE, workers: int = ORDER_EXECUTOR_WORKERS):
+        self.max_queue = max_queue
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="orders")
+        self.queue: Optional[asyncio.Queue] = None
+        self._loop = None
+        self._tasks = []
+        self._in_flight = set()  # символы с необработанным намерением
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.queue_wait = _LatencyStat()   # от постановки в очередь до начала исполнения
+        self.execution = _LatencyStat()    # время самого REST-исполнения
+
+    def start(self):
+        """Запуск воркеров в текущем event loop (повторный вызов безопасен)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._in_flight.clear()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"⚙️  Исполнитель ордеров запущен: {self.workers} воркеров, очередь {self.max_queue}")
+
+    def submit(self, intent: OrderIntent) -> bool:
+        """Неблокирующая постановка намерения в очередь"""
+        self.start()
+        if intent.symbol in self._in_flight:
+            # По символу уже есть необработанный ордер - не дублируем
+            return False
+        try:
+            self.queue.put_nowait(intent)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"⚠️  Очередь ордеров переполнена, пропускаю {intent}")
+            return False
+        self._in_flight.add(intent.symbol)
+        self.submitted += 1
+        return True
+
+    async def execute(self, intent: OrderIntent):
+        """Постановка в очередь с ожиданием результата"""
+        intent.future = asyncio.get_running_loop().create_future()
+        if not self.submit(intent):
+            return None
+        return await intent.future
+
+    async def run_blocking(self, func: Callable, *args):
+        """Выполнение произвольного блокирующего вызова в пуле исполнителя"""
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+        finally:
+            self.execution.add(time.monotonic() - started)
+
+    async def _worker(self, n: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            intent = await self.queue.get()
+            started = time.monotonic()
+            self.queue_wait.add(started - intent.created_at)
+            result = None
+            try:
+                result = await loop.run_in_executor(self.pool, intent.job)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Ошибка исполнения {intent}: {e}")
+            finally:
+                self.execution.add(time.monotonic() - started)
+                self._in_flight.discard(intent.symbol)
+                self.queue.task_done()
+                if intent.future is not None and not intent.future.done():
+                    intent.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики: глубина очереди и задержки исполнения"""
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "in_flight": len(self._in_flight),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "queue_wait": self.queue_wait.as_dict(),
+            "execution": self.execution.as_dict(),
+        }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"очередь={s['queue_depth']} в работе={s['in_flight']} "
+                f"выполнено={s['completed']} ошибок={s['failed']} отброшено={s['dropped']} "
+                f"ожидание avg={s['queue_wait']['avg_ms']:.0f}ms "
+                f"исполнение avg={s['execution']['avg_ms']:.0f}ms max={s['execution']['max_ms']:.0f}ms")
+
+    async def stop(self, timeout: float = ORDER_DRAIN_TIMEOUT):
+        """Дождаться исполнения принятых намерений (не дольше timeout) и остановить воркеров"""
+        if self.queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️  Исполнитель ордеров: не исполнено за {timeout} сек, "
+                      f"в очереди {self.queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Оставшиеся намерения не исполнятся - ожидающие execute() получают None
+        while self.queue is not None and not self.queue.empty():
+            intent = self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += 1
+            self._in_flight.discard(intent.symbol)
+            if intent.future is not None and not intent.future.done():
+                intent.future.set_result(None)
+
+
+# Глобальный исполнитель ордеров
+order_executor = OrderExecutor()
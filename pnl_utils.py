@@ -1,4 +1,5 @@
-from data_store import klines_cache, user_data_cache
+import numpy as np
+from data_store import kline_store, user_data_cache
 from config import TRADING_MODE
 
 def get_real_positions_pnl():
@@ -29,58 +30,95 @@ def get_real_positions_pnl():
         return 0.0
     
 
-def simulate_realtime_pnl(symbol: str):
-    pos = user_data_cache.get("positions", {}).get(symbol)
-    if not pos:
-        return None
+TRAIL_ACTIVATION = 0.002  # трейлинг включается после движения цены на 0.2% в прибыль
 
-    df = klines_cache.get(symbol)
-    if df is None or df.empty:
-        return None
 
-    prices = df["Close"].to_numpy()
+def _position_params(pos: dict):
+    """entry, qty, buy?, tp, sl, trail для симуляции (None в tp/sl - уровень не задан)"""
     entry = pos["entry"]
-    qty = pos["qty"]
     side = pos["side"]
     tp = pos.get("tp", entry * (1.01 if side == "BUY" else 0.99))
     sl = pos.get("sl", entry * (0.98 if side == "BUY" else 1.02))
     trail_percent = pos.get("trail_percent", 0.5) / 100.0
-    trail_activation = 0.002
-    trailing_active = False
-
-    if side == "BUY":
-        max_price = entry
-        for price in prices:
-            max_price = max(max_price, price)
-            if not trailing_active and price >= entry * (1 + trail_activation):
-                trailing_active = True
-            if tp is not None and price >= tp:
-                return (tp - entry) * qty
-            if sl is not None and price <= sl:
-                return (sl - entry) * qty
-            if trailing_active and price < max_price * (1 - trail_percent):
-                pnl = (price - entry) * qty
-                if pnl > 0:
-                    return pnl
-        return (prices[-1] - entry) * qty
-    else:  # SELL
-        min_price = entry
-        for price in prices:
-            min_price = min(min_price, price)
-            if not trailing_active and price <= entry * (1 - trail_activation):
-                trailing_active = True
-            if tp is not None and tp <= price:
-                return (entry - tp) * qty
-            if sl is not None and price >= sl:
-                return (entry - sl) * qty
-            if trailing_active and price > min_price * (1 + trail_percent):
-                pnl = (entry - price) * qty
-                if pnl > 0:
-                    return pnl
-        return (entry - prices[-1]) * qty
-
-def get_total_pnl():
-    """Получение общего PnL (учитывая режим)"""
+    return (entry, pos["qty"], side == "BUY",
+            np.nan if tp is None else tp, np.nan if sl is None else sl, trail_percent)
+
+
+def simulate_positions_pnl(price_rows, positions):
+    """
+    PnL позиций по истории цен: выход на первом баре, где сработал TP, SL или
+    трейлинг (в этом порядке), иначе по последней цене.
+
+    Все позиции считаются одним набором матричных операций: строки цен
+    дополняются NaN до общей длины, накопленные max/min и маски TP/SL/трейлинга
+    строятся сразу для всех строк, первый бар выхода - argmax по маске.
+    """
+    n_pos = len(positions)
+    if n_pos == 0:
+        return np.zeros(0)
+    lengths = np.array([len(r) for r in price_rows])
+    prices = np.full((n_pos, lengths.max()), np.nan)
+    for k, row in enumerate(price_rows):
+        prices[k, :lengths[k]] = row
+
+    entry, qty, is_buy, tp, sl, trail = (np.array(col, dtype=float) for col in zip(*positions))
+    is_buy = is_buy.astype(bool)
+    entry_c, qty_c, tp_c, sl_c, trail_c = (a[:, None] for a in (entry, qty, tp, sl, trail))
+    buy = is_buy[:, None]
+
+    with np.errstate(invalid="ignore"):
+        # Экстремум цены с момента входа (NaN в хвосте не влияет)
+        running_max = np.fmax.accumulate(np.fmax(prices, entry_c), axis=1)
+        running_min = np.fmin.accumulate(np.fmin(prices, entry_c), axis=1)
+        activated = np.where(buy, prices >= entry_c * (1 + TRAIL_ACTIVATION),
+                             prices <= entry_c * (1 - TRAIL_ACTIVATION))
+        active = np.logical_or.accumulate(activated, axis=1)
+
+        pnl_at_price = np.where(buy, (prices - entry_c) * qty_c, (entry_c - prices) * qty_c)
+        tp_hit = np.where(buy, prices >= tp_c, tp_c <= prices)
+        sl_hit = np.where(buy, prices <= sl_c, prices >= sl_c)
+        trail_hit = active & (pnl_at_price > 0) & np.where(
+            buy, prices < running_max * (1 - trail_c), prices > running_min * (1 + trail_c))
+
+    exit_any = tp_hit | sl_hit | trail_hit
+    has_exit = exit_any.any(axis=1)
+    first = exit_any.argmax(axis=1)
+    rows = np.arange(n_pos)
+
+    tp_pnl = np.where(is_buy, (tp - entry) * qty, (entry - tp) * qty)
+    sl_pnl = np.where(is_buy, (sl - entry) * qty, (entry - sl) * qty)
+    exit_pnl = np.where(tp_hit[rows, first], tp_pnl,
+                        np.where(sl_hit[rows, first], sl_pnl, pnl_at_price[rows, first]))
+    last_pnl = pnl_at_price[rows, lengths - 1]
+    return np.where(has_exit, exit_pnl, last_pnl)
+
+
+def simulate_realtime_pnl_many(symbols=None, positions=None):
+    """PnL всех (или указанных) открытых позиций одним вызовом: {symbol: pnl}
+
+    positions - снимок позиций (state_store) для чтения из другого потока
+    """
+    if positions is None:
+        positions = user_data_cache.get("positions", {})
+    keys, rows, params = [], [], []
+    for symbol in (positions if symbols is None else symbols):
+        pos = positions.get(symbol)
+        if not pos:
+            continue
+        bars = kline_store.arrays(symbol)
+        if bars is None or not len(bars["Close"]):
+            continue
+        keys.append(symbol)
+        rows.append(bars["Close"])
+        params.append(_position_params(pos))
+    return {k: float(v) for k, v in zip(keys, simulate_positions_pnl(rows, params))}
+
+
+def simulate_realtime_pnl(symbol: str):
+    return simulate_realtime_pnl_many([symbol]).get(symbol)
+
+def get_total_pnl(positions=None):
+    """Получение общего PnL (учитывая режим); positions - снимок позиций для dryrun"""
     if TRADING_MODE == 'real':
         # Для реального режима
         from logger import realized_total_pnl
@@ -101,11 +139,7 @@ def get_total_pnl():
         # Для dryrun режима
         from logger import realized_total_pnl
         
-        unrealized = 0.0
-        for symbol in user_data_cache.get("positions", {}).keys():
-            pnl = simulate_realtime_pnl(symbol)
-            if pnl is not None:
-                unrealized += pnl
+        unrealized = sum(simulate_realtime_pnl_many(positions=positions).values())
         
         total_pnl = realized_total_pnl + unrealized
         
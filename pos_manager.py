@@ -1,26 +1,47 @@
 # pos_manager.py
-from data_store import klines_cache, user_data_cache, sync_real_positions
-from config import LEVERAGE, INITIAL_CASH, RISK_FRACTION, TRADING_MODE
+from data_store import klines_cache, user_data_cache
+from config import LEVERAGE, INITIAL_CASH, RISK_FRACTION, TRADING_MODE, TRIGGER_STALE_AFTER
 from utils import _quantize_to_step
-from logger import log_position
+from logger import log_position, log_external_close
+from fill_tracker import confirm_fill, new_client_order_id
+from rate_limiter import rate_limiter, PRIORITY_HIGH
+from symbol_registry import symbol_registry
+from trigger_engine import trigger_engine
+from protective_orders import protective_orders
+from models import Position, SOURCE_PENDING, SOURCE_REAL
 import time
 from typing import Dict, List, Optional, Any
 # Импортируем глобальный клиент
 from binance_client import binance_client as global_client
+from async_binance_client import async_client
 from config import TP_STRATEGY, TP_PERCENT, SL_PERCENT, RR_RATIO, RISK_PERCENT, ATR_TP_MULTIPLIER, ATR_SL_MULTIPLIER, TRAILING_STOP_PERCENT
 import pandas as pd
+import numpy as np
 # ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ДЛЯ TP/SL ==========
 
 def calculate_atr(df, period=14):
-    """Расчет Average True Range (ATR)"""
+    """Расчет Average True Range (ATR)
+
+    Принимает DataFrame или массивы kline_store.arrays(); считает только
+    последнее окно из period свечей вместо всей истории.
+    """
     try:
-        high_low = df['High'] - df['Low']
-        high_close = abs(df['High'] - df['Close'].shift())
-        low_close = abs(df['Low'] - df['Close'].shift())
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        true_range = ranges.max(axis=1)
-        atr = true_range.rolling(window=period).mean().iloc[-1]
-        return atr
+        high = np.asarray(df['High'], dtype=np.float64)
+        low = np.asarray(df['Low'], dtype=np.float64)
+        close = np.asarray(df['Close'], dtype=np.float64)
+        n = len(high)
+        if n < period:
+            return float("nan")
+
+        h = high[n - period:]
+        l = low[n - period:]
+        if n > period:
+            prev_close = close[n - period - 1:n - 1]
+        else:
+            prev_close = np.concatenate(([np.nan], close[:n - 1]))
+
+        true_range = np.fmax(h - l, np.fmax(np.abs(h - prev_close), np.abs(l - prev_close)))
+        return float(true_range.mean())
     except:
         return 0
 
@@ -83,63 +104,6 @@ def calculate_tp_sl(entry_price, side, df=None):
             return (entry_price * 0.98, entry_price * 1.01, 0.02, 0.01)
 
 
-def refresh_positions_cache():
-    """Обновление кэша позиций с Binance"""
-    try:
-        if TRADING_MODE != 'real' or not global_client:
-            return
-        
-        from data_store import user_data_cache
-        
-        # Получаем позиции с Binance
-        positions = global_client.get_positions()
-        positions_dict = user_data_cache.get("positions", {})
-        
-        # Очищаем старые реальные позиции
-        symbols_to_remove = []
-        for symbol, pos in positions_dict.items():
-            if pos.get('source') == 'binance_real':
-                symbols_to_remove.append(symbol)
-        
-        for symbol in symbols_to_remove:
-            positions_dict.pop(symbol, None)
-        
-        # Добавляем актуальные позиции
-        for pos in positions:
-            position_amt = float(pos.get('positionAmt', 0))
-            
-            if abs(position_amt) > 0:
-                symbol = pos.get('symbol')
-                if not symbol.endswith('USDT'):
-                    symbol = symbol + 'USDT'
-                
-                # Получаем текущую цену
-                try:
-                    from data_store import klines_cache
-                    df = klines_cache.get(symbol)
-                    current_price = float(df["Close"].iloc[-1]) if df is not None else float(pos.get('markPrice', 0))
-                except:
-                    current_price = float(pos.get('markPrice', 0))
-                
-                positions_dict[symbol] = {
-                    "symbol": symbol,
-                    "side": "BUY" if position_amt > 0 else "SELL",
-                    "qty": abs(position_amt),
-                    "entry": float(pos.get('entryPrice', 0)),
-                    "current_price": current_price,
-                    "source": "binance_real",
-                    "status": "OPEN",
-                    "timestamp": time.time()
-                }
-        
-        user_data_cache["positions"] = positions_dict
-        
-        if positions_dict:
-            print(f"✅ Кэш позиций обновлен: {len(positions_dict)} позиций")
-        
-    except Exception as e:
-        print(f"❌ Ошибка обновления кэша позиций: {e}")
-
 # Используем глобальный клиент
 binance_client = global_client
 def check_order_status(order_id: str, symbol: str) -> Dict:
@@ -201,8 +165,41 @@ def init_binance_client():
     # Для dryrun всегда возвращаем True
     return TRADING_MODE == 'dryrun'
 
+def _match_open_position(symbol: str, positions: List[dict]):
+    """Позиция символа в снимке позиций Binance; пропавшая с биржи закрывается в журнале.
+    positions - полный снимок (strict-запрос), пустой список из-за ошибки сюда попадать не должен
+    """
+    for pos in positions:
+        # Приводим символы к одному формату (USDT может быть с суффиксом или без)
+        pos_symbol = pos.get('symbol')
+        search_symbol = symbol
+        
+        # Нормализуем символы
+        if not pos_symbol.endswith('USDT') and search_symbol.endswith('USDT'):
+            search_symbol = search_symbol.replace('USDT', '')
+        elif pos_symbol.endswith('USDT') and not search_symbol.endswith('USDT'):
+            search_symbol = search_symbol + 'USDT'
+        
+        if pos_symbol == search_symbol:
+            print(f"✅ Найдена реальная позиция: {symbol} {pos.get('side')} {pos.get('quantity')}")
+            # Запись бота (с TP/SL) приоритетнее голого снимка биржи
+            stored = user_data_cache["positions"].get(symbol)
+            if stored is not None and stored.is_real:
+                return stored
+            return Position.from_dict(pos, symbol=symbol, source=SOURCE_REAL)
+    
+    # Если не нашли в реальных позициях, проверяем кэш
+    cached_pos = user_data_cache.get("positions", {}).get(symbol)
+    if cached_pos and cached_pos.source == SOURCE_REAL:
+        if cached_pos.get("closing") or cached_pos.get("protective_orders"):
+            return None  # CLOSE запишет close_position / protective_orders
+        print(f"⚠️  Позиция {symbol} есть в кэше, но нет на Binance. Удаляю из кэша.")
+        if user_data_cache["positions"].pop(symbol, None) is not None:
+            log_external_close(symbol, cached_pos)
+    return None
+
 def get_open_position(symbol: str):
-    """Получение конкретной позиции"""
+    """Получение конкретной позиции (блокирующий вызов; из event loop - get_open_position_async)"""
     try:
         if TRADING_MODE == 'real':
             # Для реальной торговли ищем в позициях Binance
@@ -211,35 +208,7 @@ def get_open_position(symbol: str):
                 return None
             
             try:
-                positions = global_client.get_positions()
-            
-
-                for pos in positions:
-                    # Приводим символы к одному формату (USDT может быть с суффиксом или без)
-                    pos_symbol = pos.get('symbol')
-                    search_symbol = symbol
-                    
-                    # Нормализуем символы
-                    if not pos_symbol.endswith('USDT') and search_symbol.endswith('USDT'):
-                        search_symbol = search_symbol.replace('USDT', '')
-                    elif pos_symbol.endswith('USDT') and not search_symbol.endswith('USDT'):
-                        search_symbol = search_symbol + 'USDT'
-                    
-                    if pos_symbol == search_symbol:
-                        print(f"✅ Найдена реальная позиция: {symbol} {pos.get('side')} {pos.get('qty')}")
-                        return pos
-                
-                # Если не нашли в реальных позициях, проверяем кэш
-                from data_store import user_data_cache
-                cached_pos = user_data_cache.get("positions", {}).get(symbol)
-                if cached_pos and cached_pos.get('source') == 'binance_real':
-                    print(f"⚠️  Позиция {symbol} есть в кэше, но нет на Binance. Удаляю из кэша.")
-                    # Удаляем из кэша
-                    positions_dict = user_data_cache.get("positions", {})
-                    positions_dict.pop(symbol, None)
-                    user_data_cache["positions"] = positions_dict
-                
-                    return None
+                return _match_open_position(symbol, global_client.get_positions(strict=True))
             except Exception as e:
                 print(f"❌ Ошибка получения позиций: {e}")
                 return None
@@ -250,6 +219,19 @@ def get_open_position(symbol: str):
     except Exception as e:
         print(f"❌ Ошибка в get_open_position для {symbol}: {e}")
         return None
+
+async def get_open_position_async(symbol: str):
+    """get_open_position для event loop: REST через async_client, лимит - await rate_limiter.acquire"""
+    if TRADING_MODE != 'real':
+        return get_open_position(symbol)
+    if not global_client or not global_client.is_connected():
+        print(f"❌ Глобальный клиент не подключен для {symbol}")
+        return None
+    try:
+        return _match_open_position(symbol, await async_client.get_positions(strict=True))
+    except Exception as e:
+        print(f"❌ Ошибка в get_open_position_async для {symbol}: {e}")
+        return None
     
 def calculate_qty(price: float, equity: float = None, risk_fraction: float = RISK_FRACTION) -> float:
     """Расчет количества для сделки"""
@@ -319,37 +301,16 @@ def open_position(symbol: str, side: str):
     try:
         print(f"🔍 Получаю данные с Binance...")
         
-        # 3. Получаем информацию о символе ПРАВИЛЬНО
-        # Вместо get_symbol_info используем futures_exchange_info
-        try:
-            exchange_info = global_client.client.futures_exchange_info()
-            symbol_info = None
-            
-            # Ищем нужный символ в списке
-            for sym_info in exchange_info['symbols']:
-                if sym_info['symbol'] == symbol:
-                    symbol_info = sym_info
-                    break
-            
-            if not symbol_info:
-                print(f"❌ Символ {symbol} не найден на Binance")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Ошибка получения информации о символе: {e}")
+        # 3-4. Фильтры символа из реестра (exchange info кешируется с TTL)
+        filters = symbol_registry.get(symbol)
+        if not filters:
+            print(f"❌ Символ {symbol} не найден на Binance")
             return None
         
-        # 4. Извлекаем фильтры ПРАВИЛЬНО
-        step_size = 0.001
-        min_qty = 0.001
-        
-        if 'filters' in symbol_info:
-            for filt in symbol_info['filters']:
-                if filt.get('filterType') == 'LOT_SIZE':
-                    step_size = float(filt.get('stepSize', 0.001))
-                    min_qty = float(filt.get('minQty', 0.001))
-                    print(f"✅ Параметры с Binance: step={step_size}, min={min_qty}")
-                    break
+        step_size = filters.step_size
+        min_qty = filters.min_qty
+        print(f"✅ Параметры с Binance: step={step_size}, min={min_qty}, "
+              f"min_notional={filters.min_notional}")
         
         # 5. Получаем текущую цену
         current_price = global_client.get_ticker_price(symbol)
@@ -375,17 +336,10 @@ def open_position(symbol: str, side: str):
                     return None
         
         # 8. Автоматический расчет количества
-        MIN_NOTIONAL = 5.0
-        
-        # Рассчитываем минимальное количество для 5 USDT
-        min_qty_for_5usdt = MIN_NOTIONAL / current_price
+        MIN_NOTIONAL = filters.min_notional
         
-        # Округляем до step_size ВВЕРХ
-        if step_size > 0:
-            min_qty_for_5usdt = ((min_qty_for_5usdt // step_size) + 1) * step_size
-        
-        # Берем большее из: минимального количества символа и минимального для 5 USDT
-        quantity = max(min_qty, min_qty_for_5usdt)
+        # Минимальное количество символа с учетом минимального номинала (округлено ВВЕРХ)
+        quantity = filters.min_qty_for_notional(current_price)
         
         # Проверяем номинал
         notional = quantity * current_price
@@ -394,7 +348,7 @@ def open_position(symbol: str, side: str):
         # Если все еще меньше 5 USDT, добавляем еще один шаг
         if notional < MIN_NOTIONAL:
             print(f"⚠️  Номинал {notional:.2f} < {MIN_NOTIONAL}, увеличиваю...")
-            quantity += step_size
+            quantity = filters.quantize_qty(quantity + step_size)
             notional = quantity * current_price
         
         # Проверяем, не превышает ли 20% от баланса
@@ -403,9 +357,7 @@ def open_position(symbol: str, side: str):
             # Максимум 20% от баланса
             max_qty = (balance * 0.2) / current_price
             # Округляем ВНИЗ до step_size
-            if step_size > 0:
-                max_qty = (max_qty // step_size) * step_size
-            quantity = max(min_qty, max_qty)
+            quantity = max(min_qty, filters.quantize_qty(max_qty))
             notional = quantity * current_price
         
         # Финальная проверка
@@ -419,22 +371,10 @@ def open_position(symbol: str, side: str):
         print(f"   Номинал: {notional:.2f} USDT")
         print(f"   % от баланса: {(notional/balance*100):.1f}%")
         
-        # 9. Определяем точность для форматирования
-        # Смотрим сколько знаков после запятой в step_size
-        step_str = str(step_size)
-        if '.' in step_str:
-            # Убираем лишние нули в конце
-            precision = len(step_str.rstrip('0').split('.')[1])
-        else:
-            precision = 0
-        
-        # Форматируем количество
-        if precision == 0:
-            qty_str = str(int(quantity))
-        else:
-            qty_str = format(quantity, f'.{precision}f')
+        # 9. Форматируем количество с точностью шага символа
+        qty_str = filters.format_qty(quantity)
         
-        print(f"🔢 Количество для API ({precision} знаков): {qty_str}")
+        print(f"🔢 Количество для API ({filters.qty_precision} знаков): {qty_str}")
         
         # 10. Открываем ордер на Binance
         print(f"🚀 Открываю ордер на Binance...")
@@ -443,7 +383,8 @@ def open_position(symbol: str, side: str):
             side=side.upper(),
             quantity=qty_str,
             symbol=symbol,
-            order_type='MARKET'
+            order_type='MARKET',
+            client_order_id=new_client_order_id("open")
         )
         
         if not order or 'orderId' not in order:
@@ -453,27 +394,16 @@ def open_position(symbol: str, side: str):
         print(f"✅✅✅ ОРДЕР РАЗМЕЩЕН!")
         print(f"📋 ID: {order['orderId']}")
         
-        # 11. Ждем и проверяем позицию
-        time.sleep(3)
-        
-        # Получаем обновленные позиции
-        positions = global_client.get_positions()
-        opened_position = None
-        
-        for pos in positions:
-            if pos.get('symbol') == symbol:
-                position_amt = float(pos.get('positionAmt', 0))
-                if abs(position_amt) > 0:
-                    opened_position = pos
-                    break
+        # 11. Подтверждение исполнения: ответ RESULT / ORDER_TRADE_UPDATE / ограниченный опрос
+        fill = confirm_fill(global_client, symbol, order)
         
-        if opened_position:
-            print(f"✅ ПОЗИЦИЯ ОТКРЫТА НА BINANCE!")
+        if fill and fill["executed_qty"] > 0:
+            print(f"✅ ПОЗИЦИЯ ОТКРЫТА НА BINANCE! (подтверждение: {fill['source']})")
             
             from data_store import klines_cache
             df = klines_cache.get(symbol)
         
-            entry_price = float(opened_position.get('entryPrice', current_price))
+            entry_price = fill["avg_price"] or current_price
         
             # Рассчитываем TP/SL
             tp_price, sl_price, tp_percent, sl_percent = calculate_tp_sl(
@@ -482,30 +412,28 @@ def open_position(symbol: str, side: str):
                 df
             )
             # Создаем данные позиции
-            pos_data = {
-                "symbol": symbol,
-                "side": 'BUY' if position_amt > 0 else 'SELL',
-                "qty": abs(position_amt),
-                "entry": float(opened_position.get('entryPrice', current_price)),
-                "current_price": float(opened_position.get('markPrice', current_price)),
-                "unrealized_pnl": float(opened_position.get('unRealizedProfit', 0)),
-                "leverage": float(opened_position.get('leverage', LEVERAGE)),
-                "status": "OPEN",
-                "source": "binance_real",
-                "order_id": order['orderId'],
-                "timestamp": time.time(),
-
-                "tp_price": tp_price,
-                "sl_price": sl_price,
-                "tp_percent": tp_percent,
-                "sl_percent": sl_percent,
-                "trail_percent": TRAILING_STOP_PERCENT,
-                "highest_price": entry_price if side.upper() == 'BUY' else entry_price,
-                "lowest_price": entry_price if side.upper() == 'SELL' else entry_price,
-                "trailing_active": False,
-                "exit_reason": None
+            pos_data = Position(
+                symbol=symbol,
+                side=side.upper(),
+                qty=fill["executed_qty"],
+                entry=entry_price,
+                current_price=current_price,
+                unrealized_pnl=0.0,
+                leverage=float(LEVERAGE),
+                status="OPEN",
+                source=SOURCE_REAL,
+                order_id=order['orderId'],
+                timestamp=time.time(),
 
-            }
+                tp_price=tp_price,
+                sl_price=sl_price,
+                tp_percent=tp_percent,
+                sl_percent=sl_percent,
+                trail_percent=TRAILING_STOP_PERCENT,
+                highest_price=entry_price,
+                lowest_price=entry_price,
+                trailing_active=False,
+            )
             
             print(f"🎯 УСТАНОВЛЕНЫ TP/SL:")
             print(f"   Стратегия: {TP_STRATEGY.upper()}")
@@ -522,31 +450,32 @@ def open_position(symbol: str, side: str):
             
             
             print(f"📊 Данные с Binance:")
-            print(f"   Количество: {pos_data['qty']}")
-            print(f"   Цена входа: {pos_data['entry']}")
-            print(f"   Текущая цена: {pos_data['current_price']}")
-            print(f"   PnL: {pos_data['unrealized_pnl']:+.2f}")
+            print(f"   Количество: {pos_data.qty}")
+            print(f"   Цена входа: {pos_data.entry}")
+            print(f"   Текущая цена: {pos_data.current_price}")
+            print(f"   PnL: {pos_data.unrealized_pnl:+.2f}")
             
             # Сохраняем в кэш
-            from data_store import user_data_cache
-            if "positions" not in user_data_cache:
-                user_data_cache["positions"] = {}
             user_data_cache["positions"][symbol] = pos_data
+            if protective_orders.enabled:
+                # TP/SL исполняет биржа; локально остаются только не поставленные уровни
+                protective_orders.protect(symbol, pos_data)
+            trigger_engine.track(symbol, pos_data)
             try:
                 from telegram_bot import send_trade_opened
                 
-                # Формируем данные для Telegram (без current_price, так как позиция еще не открыта)
+                # Формируем данные для Telegram по фактическому исполнению
                 trade_data = {
                     'symbol': symbol,
                     'side': side.upper(),
-                    'qty': quantity,
-                    'entry_price': current_price,
-                    'current_price': current_price,  # дублируем entry_price
+                    'qty': pos_data.qty,
+                    'entry_price': entry_price,
+                    'current_price': current_price,
                     'order_id': order['orderId'],
                     'leverage': LEVERAGE,
-                    'notional': quantity * current_price,
+                    'notional': pos_data.qty * entry_price,
                     'mode': 'REAL',
-                    'status': 'PENDING'
+                    'status': fill['status']
                 }
                 
                 send_trade_opened(trade_data)
@@ -559,24 +488,22 @@ def open_position(symbol: str, side: str):
 
             return pos_data
         else:
-            print(f"⚠️  Ордер размещен, но позиция еще не появилась")
+            print(f"⚠️  Ордер размещен, но исполнение не подтверждено "
+                  f"(статус: {fill['status'] if fill else 'UNKNOWN'})")
             
             # Создаем временные данные
-            pos_data = {
-                "symbol": symbol,
-                "side": side.upper(),
-                "qty": quantity,
-                "entry": current_price,
-                "status": "PENDING",
-                "source": "binance_real_pending",
-                "order_id": order['orderId'],
-                "timestamp": time.time()
-            }
+            pos_data = Position(
+                symbol=symbol,
+                side=side.upper(),
+                qty=quantity,
+                entry=current_price,
+                status="PENDING",
+                source=SOURCE_PENDING,
+                order_id=order['orderId'],
+                timestamp=time.time(),
+            )
             
             # Сохраняем в кэш
-            from data_store import user_data_cache
-            if "positions" not in user_data_cache:
-                user_data_cache["positions"] = {}
             user_data_cache["positions"][symbol] = pos_data
             
             return pos_data
@@ -638,6 +565,7 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
     print(f"\n{'='*50}")
     print(f"🚨 ЗАКРЫТИЕ ПОЗИЦИИ {symbol}")
     print(f"{'='*50}")
+    bot_pos = None
     
     # Инициализируем клиент если нужно
     if TRADING_MODE == 'real':
@@ -686,11 +614,13 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
                 price=exit_price,
                 qty=qty,
                 pnl=pnl,
-                exit_reason=pos["exit_reason"]
+                exit_reason=pos["exit_reason"],
+                strategy=pos.get("strategy")
             )
 
             # Удаляем из кэша
             user_data_cache["positions"].pop(symbol, None)
+            trigger_engine.untrack(symbol)
             print(f"✅ Позиция {symbol} закрыта в сухом режиме")
             return True
             
@@ -737,43 +667,42 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
             print(f"   Режим: РЕАЛЬНЫЙ")
             print(f"   Причина закрытия: {exit_reason}")
             
-            # 3. Форматируем количество для API
-            # Получаем step_size для символа
-            symbol_info = global_client.get_symbol_info(symbol)
-            step_size = symbol_info.get('step_size', 1.0) if symbol_info else 1.0
-            
-            # Определяем точность
-            step_str = str(step_size)
-            if '.' in step_str:
-                precision = len(step_str.rstrip('0').split('.')[1])
-            else:
-                precision = 0
-            
-            # Форматируем количество
-            if precision == 0:
-                qty_str = str(int(qty))
+            # 3. Форматируем количество для API по шагу символа
+            filters = symbol_registry.get(symbol)
+            if filters:
+                qty_str = filters.format_qty(qty)
+                precision = filters.qty_precision
             else:
-                qty_str = format(qty, f'.{precision}f')
+                qty_str = str(qty)
+                precision = None
             
             print(f"🔢 Количество для API ({precision} знаков): {qty_str}")
             
             # 4. Закрываем позицию на Binance
             print(f"🚀 Отправляю ордер на закрытие...")
+            # Пока бот закрывает сам, account_state и сверка не пишут CLOSE за него
+            bot_pos = user_data_cache["positions"].get(symbol)
+            if bot_pos is not None:
+                bot_pos["closing"] = True
             
             try:
                 # Используем close_position из binance_client
-                order = global_client.close_position(symbol, side, qty_str)
+                client_order_id = new_client_order_id("close")
+                order = global_client.close_position(symbol, side, qty_str, client_order_id=client_order_id)
                 
                 if not order or 'orderId' not in order:
                     print(f"❌ Ошибка: не получен ID ордера")
                     # Пробуем использовать place_order с reduceOnly
                     print(f"⚠️  Пробую альтернативный метод закрытия...")
+                    rate_limiter.acquire_endpoint('futures_create_order', PRIORITY_HIGH)
                     order = global_client.client.futures_create_order(
                         symbol=symbol,
                         side=close_side,
                         type='MARKET',
                         quantity=qty_str,
-                        reduceOnly=True
+                        reduceOnly=True,
+                        newOrderRespType='RESULT',
+                        newClientOrderId=client_order_id
                     )
                 
                 print(f"✅ Ордер на закрытие размещен!")
@@ -781,32 +710,35 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
                 print(f"📊 Статус: {order.get('status', 'UNKNOWN')}")
                 print(f"💰 Исполнено: {order.get('executedQty', '0')}")
                 
-                # 5. Логируем закрытие
-                pnl = target_pos.get('unrealized_pnl', 0)
+                # 5. Подтверждение исполнения: ответ RESULT / ORDER_TRADE_UPDATE / ограниченный опрос
+                fill = confirm_fill(global_client, symbol, order)
+                filled_qty = fill["executed_qty"] if fill else 0.0
+                fill_price = (fill["avg_price"] if fill else 0.0) or exit_price
+                entry = float(target_pos.get('entry_price', target_pos.get('entry', 0)) or 0)
+                
+                if entry and filled_qty:
+                    direction = 1 if side == "BUY" else -1
+                    pnl = (fill_price - entry) * filled_qty * direction
+                else:
+                    pnl = target_pos.get('unrealized_pnl', 0)
+                
+                # 6. Логируем закрытие по фактической цене исполнения
                 log_position(
                     action="CLOSE",
                     symbol=symbol,
                     side=side,
-                    price=exit_price,
-                    qty=qty,
+                    price=fill_price,
+                    qty=filled_qty or qty,
                     pnl=pnl,
-                    exit_reason=exit_reason or "REAL_TRADE_CLOSE"
+                    exit_reason=exit_reason or "REAL_TRADE_CLOSE",
+                    strategy=bot_pos.get("strategy") if bot_pos else None
                 )
                 
-                # 6. Ждем и проверяем закрытие
-                time.sleep(3)
-                
-                # Проверяем, закрылась ли позиция
-                positions_after = global_client.get_positions()
-                still_open = False
-                
-                for pos in positions_after:
-                    if pos.get('symbol') == symbol:
-                        if float(pos.get('quantity', 0)) > 0:
-                            still_open = True
-                            print(f"⚠️  Позиция {symbol} все еще открыта!")
-                            print(f"   Остаток: {pos.get('quantity')}")
-                        break
+                still_open = not fill or fill["status"] != "FILLED" or filled_qty < float(qty_str)
+                if still_open:
+                    print(f"⚠️  Позиция {symbol} все еще открыта!")
+                    print(f"   Статус ордера: {fill['status'] if fill else 'UNKNOWN'}, "
+                          f"исполнено {filled_qty} из {qty_str}")
                 
                 if not still_open:
                     print(f"✅✅✅ ПОЗИЦИЯ {symbol} УСПЕШНО ЗАКРЫТА НА BINANCE!")
@@ -815,6 +747,8 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
                     if "positions" in user_data_cache and symbol in user_data_cache["positions"]:
                         del user_data_cache["positions"][symbol]
                         print(f"🗑️  Позиция удалена из кэша")
+                    trigger_engine.untrack(symbol)
+                    protective_orders.cancel_all(symbol)
                 
                 # 7. Отправляем уведомление в Telegram
                 try:
@@ -824,8 +758,8 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
                         'symbol': symbol,
                         'side': side,
                         'qty': qty,
-                        'entry_price': target_pos.get('entry', exit_price),
-                        'exit_price': exit_price,
+                        'entry_price': entry or exit_price,
+                        'exit_price': fill_price,
                         'pnl': pnl,
                         'order_id': order.get('orderId', 'N/A'),
                         'reason': exit_reason or "Закрытие позиции",
@@ -846,6 +780,7 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
                 # Пробуем альтернативный метод через futures_create_order
                 try:
                     print(f"🔄 Пробую альтернативный метод закрытия...")
+                    rate_limiter.acquire_endpoint('futures_create_order', PRIORITY_HIGH)
                     order = global_client.client.futures_create_order(
                         symbol=symbol,
                         side=close_side,
@@ -865,163 +800,104 @@ def close_position(symbol: str, exit_price: float, exit_reason=None):
         return False
     
     finally:
+        if bot_pos is not None:
+            bot_pos.pop("closing", None)
         print(f"{'='*50}\n")
+def close_triggered_position(symbol: str, price: float, exit_reason: str) -> Optional[Dict]:
+    """Закрытие позиции по сработавшему уровню TP/SL (trigger_engine)"""
+    positions_dict = user_data_cache.get("positions", {})
+    pos = positions_dict.get(symbol)
+    if not pos or pos.get('status') != 'OPEN':
+        return None
+
+    side = pos.get('side', 'BUY').upper()
+    entry = pos.get('entry', 0)
+
+    print(f"\n{'='*50}")
+    print(f"🚨 АВТОМАТИЧЕСКОЕ ЗАКРЫТИЕ: {symbol}")
+    print(f"📊 Причина: {exit_reason}")
+    print(f"💰 Цена входа: {entry:.4f}")
+    print(f"💰 Цена выхода: {price:.4f}")
+
+    if side == 'BUY':
+        pnl = (price - entry) * pos['qty']
+    else:
+        pnl = (entry - price) * pos['qty']
+
+    pnl_percent = (pnl / (entry * pos['qty'])) * 100 if entry > 0 else 0
+    print(f"💰 PnL: {pnl:+.2f} ({pnl_percent:+.2f}%)")
+    print(f"{'='*50}")
+
+    if not close_position(symbol, price, exit_reason):
+        print(f"❌ Не удалось закрыть позицию {symbol}")
+        return None
+
+    positions_dict.pop(symbol, None)
+    print(f"✅ {symbol} закрыт по {exit_reason}")
+
+    # Отправляем уведомление в Telegram
+    try:
+        from telegram_bot import send_trade_closed
+
+        trade_data = {
+            'symbol': symbol,
+            'side': side,
+            'qty': pos['qty'],
+            'entry_price': entry,
+            'exit_price': price,
+            'pnl': pnl,
+            'pnl_percent': pnl_percent,
+            'reason': exit_reason,
+            'mode': 'REAL'
+        }
+
+        send_trade_closed(trade_data)
+    except Exception as tg_error:
+        print(f"⚠️  Не удалось отправить в Telegram: {tg_error}")
+
+    return {
+        'symbol': symbol,
+        'reason': exit_reason,
+        'pnl': pnl,
+        'pnl_percent': pnl_percent
+    }
+
+
 def auto_close_positions():
-    """Автоматическая проверка и закрытие позиций по TP/SL"""
-    from data_store import user_data_cache
+    """Страховочная проверка TP/SL для символов без свежих тиков.
+
+    Уровни проверяет trigger_engine на каждом тике потока свечей; здесь
+    индекс сверяется с кэшем позиций, а цена по REST запрашивается только
+    для символов, по которым поток молчит дольше TRIGGER_STALE_AFTER
+    (в dryrun - для всех).
+    """
     from binance_client import binance_client
-    
+
     positions_dict = user_data_cache.get("positions", {})
-    
-    if not positions_dict:
-        return []
-    
+    trigger_engine.sync(positions_dict)
+
     closed_symbols = []
-    
-    for symbol, pos in list(positions_dict.items()):
+
+    for symbol in trigger_engine.stale(TRIGGER_STALE_AFTER):
         try:
-            # Проверяем только открытые позиции
-            if pos.get('status') != 'OPEN':
-                continue
-            
-            # Получаем текущую цену
             current_price = binance_client.get_ticker_price(symbol)
-            
-            # Обновляем текущую цену в позиции
-            pos['current_price'] = current_price
-            
-            side = pos.get('side', 'BUY').upper()
-            entry = pos.get('entry', 0)
-            tp_price = pos.get('tp_price')
-            sl_price = pos.get('sl_price')
-            trail_percent = pos.get('trail_percent', 0.005)
-            
-            exit_reason = None
-            
-            # ========== ОБНОВЛЕНИЕ ТРЕЙЛИНГ СТОПА ==========
-            if side == 'BUY':
-                # Для LONG: обновляем максимальную цену
-                current_high = pos.get('highest_price', entry)
-                new_high = max(current_high, current_price)
-                pos['highest_price'] = new_high
-                
-                # Активируем трейлинг после движения +1%
-                if current_price >= entry * 1.01 and not pos.get('trailing_active', False):
-                    pos['trailing_active'] = True
-                    print(f"📈 Активирован трейлинг стоп для {symbol}")
-                
-                # Подтягиваем SL вверх если трейлинг активен
-                if pos.get('trailing_active', False):
-                    trailing_stop = new_high * (1 - trail_percent)
-                    if trailing_stop > sl_price:
-                        pos['sl_price'] = trailing_stop
-                        print(f"🔼 {symbol}: Трейлинг стоп поднят до {trailing_stop:.4f}")
-            
-            else:  # SELL
-                # Для SHORT: обновляем минимальную цену
-                current_low = pos.get('lowest_price', entry)
-                new_low = min(current_low, current_price)
-                pos['lowest_price'] = new_low
-                
-                # Активируем трейлинг после движения -1%
-                if current_price <= entry * 0.99 and not pos.get('trailing_active', False):
-                    pos['trailing_active'] = True
-                    print(f"📉 Активирован трейлинг стоп для {symbol}")
-                
-                # Подтягиваем SL вниз если трейлинг активен
-                if pos.get('trailing_active', False):
-                    trailing_stop = new_low * (1 + trail_percent)
-                    if trailing_stop < sl_price:
-                        pos['sl_price'] = trailing_stop
-                        print(f"🔽 {symbol}: Трейлинг стоп опущен до {trailing_stop:.4f}")
-            
-            # ========== ПРОВЕРКА TP/SL ==========
-            if side == 'BUY':
-                if tp_price and current_price >= tp_price:
-                    exit_reason = "TAKE_PROFIT"
-                elif sl_price and current_price <= sl_price:
-                    exit_reason = "STOP_LOSS"
-            
-            else:  # SELL
-                if tp_price and current_price <= tp_price:
-                    exit_reason = "TAKE_PROFIT"
-                elif sl_price and current_price >= sl_price:
-                    exit_reason = "STOP_LOSS"
-            
-            # ========== ЗАКРЫТИЕ ПОЗИЦИИ ==========
-            if exit_reason:
-                print(f"\n{'='*50}")
-                print(f"🚨 АВТОМАТИЧЕСКОЕ ЗАКРЫТИЕ: {symbol}")
-                print(f"📊 Причина: {exit_reason}")
-                print(f"💰 Цена входа: {entry:.4f}")
-                print(f"💰 Цена выхода: {current_price:.4f}")
-                
-                if side == 'BUY':
-                    pnl = (current_price - entry) * pos['qty']
-                else:
-                    pnl = (entry - current_price) * pos['qty']
-                
-                pnl_percent = (pnl / (entry * pos['qty'])) * 100 if entry > 0 else 0
-                print(f"💰 PnL: {pnl:+.2f} ({pnl_percent:+.2f}%)")
-                print(f"{'='*50}")
-                
-                # Закрываем позицию
-                success = close_position(symbol, current_price, exit_reason)
-                
-                if success:
-                    # Удаляем из кэша
-                    if symbol in positions_dict:
-                        del positions_dict[symbol]
-                    
-                    closed_symbols.append({
-                        'symbol': symbol,
-                        'reason': exit_reason,
-                        'pnl': pnl,
-                        'pnl_percent': pnl_percent
-                    })
-                    
-                    print(f"✅ {symbol} закрыт по {exit_reason}")
-                    
-                    # Отправляем уведомление в Telegram
-                    try:
-                        from telegram_bot import send_trade_closed
-                        
-                        trade_data = {
-                            'symbol': symbol,
-                            'side': side,
-                            'qty': pos['qty'],
-                            'entry_price': entry,
-                            'exit_price': current_price,
-                            'pnl': pnl,
-                            'pnl_percent': pnl_percent,
-                            'reason': exit_reason,
-                            'mode': 'REAL'
-                        }
-                        
-                        send_trade_closed(trade_data)
-                    except Exception as tg_error:
-                        print(f"⚠️  Не удалось отправить в Telegram: {tg_error}")
-                
-                else:
-                    print(f"❌ Не удалось закрыть позицию {symbol}")
-            
-            # Обновляем позицию в кэше
-            else:
+            fired = trigger_engine.on_price(symbol, current_price)
+            pos = positions_dict.get(symbol)
+            if pos and pos.get('entry'):
                 # Пересчитываем PnL
-                if side == 'BUY':
-                    pnl = (current_price - entry) * pos['qty']
+                if pos.get('side', 'BUY').upper() == 'BUY':
+                    pos['unrealized_pnl'] = (current_price - pos['entry']) * pos['qty']
                 else:
-                    pnl = (entry - current_price) * pos['qty']
-                
-                pos['unrealized_pnl'] = pnl
-                positions_dict[symbol] = pos
-        
+                    pos['unrealized_pnl'] = (pos['entry'] - current_price) * pos['qty']
+
+            for f in fired:
+                closed = close_triggered_position(f.symbol, f.price, f.reason)
+                if closed:
+                    closed_symbols.append(closed)
+
         except Exception as e:
             print(f"❌ Ошибка проверки позиции {symbol}: {e}")
             import traceback
             traceback.print_exc()
-    
-    # Обновляем кэш
-    user_data_cache["positions"] = positions_dict
-    
+
     return closed_symbols
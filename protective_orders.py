@@ -0,0 +1,327 @@
+# protective_orders.py
+"""
+Защитные ордера на бирже вместо локального контроля TP/SL.
+
+При PROTECTIVE_ORDERS сразу после открытия позиции ставятся reduce-only
+STOP_MARKET (SL) и TAKE_PROFIT_MARKET (TP) по mark price, при
+PROTECTIVE_NATIVE_TRAILING - ещё и TRAILING_STOP_MARKET. Id ордеров
+хранятся в pos["protective_orders"], поэтому trigger_engine эти уровни
+больше не проверяет.
+
+Перенос трейлинг-стопа (trigger_engine.add_stop_listener) - новый
+STOP_MARKET, затем отмена старого, чтобы позиция ни на миг не осталась
+без стопа. Переносы по символу схлопываются: пока идёт замена, сохраняется
+только последний уровень. Исполнение защитного ордера приходит
+ORDER_TRADE_UPDATE из user-data stream: позиция закрывается в кэше и
+журнале, оставшиеся ордера символа отменяются. ACCOUNT_UPDATE с нулевой
+позицией может прийти раньше исполнения - account_state такую позицию не
+удаляет, её снимает on_order_update. При старте reconcile()
+привязывает открытые ордера к позициям, ставит недостающие и отменяет
+ордера без позиции.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from binance_client import binance_client
+from config import (
+    PROTECTIVE_ORDERS, PROTECTIVE_NATIVE_TRAILING, PROTECTIVE_AMEND_MIN_STEP,
+    TRIGGER_TRAIL_ACTIVATION,
+)
+from data_store import user_data_cache
+from fill_tracker import fill_from_event, new_client_order_id
+from logger import log_position
+from order_executor import order_executor
+from symbol_registry import symbol_registry
+from trigger_engine import trigger_engine, TP, SL, TRAIL
+
+ORDER_TYPES = {SL: "STOP_MARKET", TP: "TAKE_PROFIT_MARKET", TRAIL: "TRAILING_STOP_MARKET"}
+PREFIXES = {SL: "sl", TP: "tp", TRAIL: "trail"}
+EXIT_REASONS = {SL: "STOP_LOSS", TP: "TAKE_PROFIT", TRAIL: "TRAILING_STOP"}
+DROPPED_STATUSES = {"CANCELED", "EXPIRED", "EXPIRED_IN_MATCH", "REJECTED"}
+
+
+def order_kind(client_order_id: Optional[str]) -> Optional[str]:
+    """SL / TP / TRAIL по префиксу clientOrderId; None для чужих ордеров"""
+    prefix = (client_order_id or "").split("-", 1)[0]
+    for kind, p in PREFIXES.items():
+        if prefix == p:
+            return kind
+    return None
+
+
+def _format_price(symbol: str, price: float, up: bool) -> str:
+    filters = symbol_registry.get(symbol)
+    if filters is None:
+        return str(price)
+    return f"{filters.quantize_price(price, up=up):.{filters.price_precision}f}"
+
+
+def _format_qty(symbol: str, qty: float) -> str:
+    filters = symbol_registry.get(symbol)
+    return filters.format_qty(qty) if filters else str(qty)
+
+
+class ProtectiveOrders:
+    """Reduce-only TP/SL ордера открытых позиций"""
+
+    def __init__(self, client=binance_client, enabled: bool = PROTECTIVE_ORDERS,
+                 native_trailing: bool = PROTECTIVE_NATIVE_TRAILING,
+                 min_step: float = PROTECTIVE_AMEND_MIN_STEP,
+                 engine=trigger_engine, cache: dict = user_data_cache, pool=None):
+        self.client = client
+        self.enabled = enabled
+        self.native_trailing = native_trailing
+        self.min_step = min_step
+        self.engine = engine
+        self.cache = cache
+        self._pool = pool
+        # {symbol: {kind: {"order_id", "client_order_id", "stop_price"}}}
+        self.orders: Dict[str, Dict[str, dict]] = {}
+        self._by_client_id: Dict[str, Tuple[str, str]] = {}
+        self._pending_stop: Dict[str, float] = {}
+        self._amending = set()
+        self._lock = threading.Lock()
+        self.amended = 0
+        self.exits = 0
+        engine.add_stop_listener(self.move_stop)
+
+    def _positions(self) -> Dict[str, dict]:
+        return self.cache.get("positions", {})
+
+    def _submit(self, func, *args):
+        """Блокирующий REST - в пуле исполнителя ордеров, не в event loop"""
+        return (self._pool or order_executor.pool).submit(func, *args)
+
+    def _remember(self, symbol: str, kind: str, record: dict):
+        with self._lock:
+            self.orders.setdefault(symbol, {})[kind] = record
+            self._by_client_id[record["client_order_id"]] = (symbol, kind)
+
+    def _forget(self, symbol: str, kind: str) -> Optional[dict]:
+        with self._lock:
+            record = self.orders.get(symbol, {}).pop(kind, None)
+            if record is not None:
+                self._by_client_id.pop(record["client_order_id"], None)
+            return record
+
+    # ---------- Размещение ----------
+
+    def _place(self, symbol: str, kind: str, side: str, qty: str, **params) -> Optional[dict]:
+        client_order_id = new_client_order_id(PREFIXES[kind])
+        try:
+            order = self.client.place_stop_order(symbol, side, ORDER_TYPES[kind], qty,
+                                                 client_order_id=client_order_id, **params)
+        except Exception as e:
+            print(f"⚠️  Не удалось поставить {ORDER_TYPES[kind]} для {symbol}: {e}")
+            return None
+        return {
+            "order_id": order["orderId"],
+            "client_order_id": order.get("clientOrderId", client_order_id),
+            "stop_price": float(params.get("stop_price") or 0.0),
+        }
+
+    def protect(self, symbol: str, pos: dict) -> Dict[str, dict]:
+        """Постановка недостающих защитных ордеров позиции"""
+        buy = pos.get('side', 'BUY').upper() == 'BUY'
+        close_side = 'SELL' if buy else 'BUY'
+        qty = _format_qty(symbol, pos['qty'])
+        existing = self.orders.get(symbol, {})
+
+        wanted = {}
+        if pos.get('sl_price'):
+            wanted[SL] = {"stop_price": _format_price(symbol, pos['sl_price'], up=not buy)}
+        if pos.get('tp_price'):
+            wanted[TP] = {"stop_price": _format_price(symbol, pos['tp_price'], up=buy)}
+        if self.native_trailing:
+            entry = pos.get('entry', 0)
+            activation = entry * (1 + TRIGGER_TRAIL_ACTIVATION if buy else 1 - TRIGGER_TRAIL_ACTIVATION)
+            # callbackRate Binance: 0.1 - 5 процентов
+            callback = min(max(round(pos.get('trail_percent', 0.005) * 100, 1), 0.1), 5.0)
+            wanted[TRAIL] = {"callback_rate": callback,
+                             "activation_price": _format_price(symbol, activation, up=buy)}
+
+        for kind, params in wanted.items():
+            if kind in existing:
+                continue
+            record = self._place(symbol, kind, close_side, qty, **params)
+            if record is not None:
+                self._remember(symbol, kind, record)
+
+        placed = self.orders.get(symbol, {})
+        pos['protective_orders'] = placed
+        print(f"🛡️  {symbol}: защитные ордера на бирже: {sorted(placed) or 'нет'}")
+        return placed
+
+    # ---------- Перенос стопа ----------
+
+    def move_stop(self, symbol: str, stop: float):
+        """Подписчик trigger_engine: трейлинг подтянул SL"""
+        record = self.orders.get(symbol, {}).get(SL)
+        if record is None or TRAIL in self.orders.get(symbol, {}):
+            return
+        if record["stop_price"] and abs(stop / record["stop_price"] - 1) < self.min_step:
+            return
+        with self._lock:
+            self._pending_stop[symbol] = stop
+            if symbol in self._amending:
+                return
+            self._amending.add(symbol)
+        self._submit(self._amend_loop, symbol)
+
+    def _amend_loop(self, symbol: str):
+        while True:
+            with self._lock:
+                stop = self._pending_stop.pop(symbol, None)
+                if stop is None:
+                    self._amending.discard(symbol)
+                    return
+            try:
+                self._replace_stop(symbol, stop)
+            except Exception as e:
+                print(f"❌ Ошибка переноса стопа {symbol}: {e}")
+
+    def _replace_stop(self, symbol: str, stop: float):
+        pos = self._positions().get(symbol)
+        old = self.orders.get(symbol, {}).get(SL)
+        if pos is None or old is None:
+            return
+        buy = pos.get('side', 'BUY').upper() == 'BUY'
+        new = self._place(symbol, SL, 'SELL' if buy else 'BUY', _format_qty(symbol, pos['qty']),
+                          stop_price=_format_price(symbol, stop, up=not buy))
+        if new is None:
+            return  # старый стоп остаётся на бирже
+        self._forget(symbol, SL)
+        self._remember(symbol, SL, new)
+        self.client.cancel_order(symbol, old["order_id"])
+        self.amended += 1
+        print(f"🔁 {symbol}: стоп на бирже перенесён {old['stop_price']} → {new['stop_price']}")
+
+    # ---------- Отмена и исполнение ----------
+
+    def cancel_all(self, symbol: str):
+        """Отмена всех защитных ордеров символа (позиция закрыта)"""
+        with self._lock:
+            orders = self.orders.pop(symbol, {})
+            self._pending_stop.pop(symbol, None)
+            for record in orders.values():
+                self._by_client_id.pop(record["client_order_id"], None)
+        for record in orders.values():
+            self.client.cancel_order(symbol, record["order_id"])
+        pos = self._positions().get(symbol)
+        if pos is not None:
+            pos.pop('protective_orders', None)
+
+    def on_position_event(self, event):
+        """Подписчик reconciler: позиция исчезла с биржи - её ордера больше не нужны"""
+        if event.kind == "CLOSED" and event.symbol in self.orders:
+            self._submit(self.cancel_all, event.symbol)
+
+    def on_order_update(self, msg: dict):
+        """Обработчик ORDER_TRADE_UPDATE (event loop): только разбор, REST - в пуле"""
+        o = msg.get("o", {})
+        ref = self._by_client_id.get(o.get("c"))
+        if ref is None:
+            return
+        symbol, kind = ref
+        status = o.get("X")
+        if status == "FILLED":
+            self._forget(symbol, kind)
+            # Запись снимается здесь, в event loop: account_state защищённые позиции
+            # не удаляет, а _on_exit пишет CLOSE по ней, что бы ни было в кэше потом
+            pos = self._positions().pop(symbol, None)
+            self._submit(self._on_exit, symbol, kind, fill_from_event(o), pos)
+        elif status in DROPPED_STATUSES:
+            # Ордер снят не нами - уровень снова контролирует trigger_engine
+            self._forget(symbol, kind)
+            print(f"⚠️  {symbol}: защитный {ORDER_TYPES[kind]} снят биржей ({status})")
+            pos = self._positions().get(symbol)
+            if pos is not None and pos.get('status') == 'OPEN':
+                self.engine.track(symbol, pos)
+
+    def _on_exit(self, symbol: str, kind: str, fill: dict,
+                 pos: Optional[dict] = None) -> Optional[dict]:
+        """Позиция закрыта защитным ордером на бирже; pos - запись, снятая on_order_update"""
+        self.cancel_all(symbol)
+        self.engine.untrack(symbol)
+        if pos is None:
+            pos = self._positions().pop(symbol, None)
+        if pos is None:
+            return None  # закрытие уже записано другим путём
+        self.exits += 1
+
+        reason = EXIT_REASONS[kind]
+        side = pos.get('side', 'BUY').upper()
+        entry = pos.get('entry', 0)
+        price = fill["avg_price"] or pos.get('current_price', entry)
+        qty = fill["executed_qty"] or pos.get('qty', 0)
+        pnl = (price - entry) * qty * (1 if side == 'BUY' else -1)
+        print(f"✅ {symbol} закрыт на бирже по {reason}: {price} (PnL {pnl:+.2f})")
+
+        log_position(action="CLOSE", symbol=symbol, side=side, price=price, qty=qty,
+                     pnl=pnl, exit_reason=reason, strategy=pos.get('strategy'))
+        try:
+            from telegram_bot import send_trade_closed
+            send_trade_closed({
+                'symbol': symbol,
+                'side': side,
+                'qty': qty,
+                'entry_price': entry,
+                'exit_price': price,
+                'pnl': pnl,
+                'order_id': fill.get("order_id"),
+                'reason': reason,
+                'mode': 'REAL'
+            })
+        except Exception as tg_error:
+            print(f"⚠️  Не удалось отправить в Telegram: {tg_error}")
+        return {'symbol': symbol, 'reason': reason, 'pnl': pnl}
+
+    # ---------- Сверка при старте ----------
+
+    def reconcile(self) -> Dict[str, int]:
+        """Привязка открытых ордеров к позициям после перезапуска (блокирующий вызов)"""
+        stats = {"attached": 0, "placed": 0, "cancelled": 0}
+        if not self.enabled:
+            return stats
+
+        found: Dict[str, Dict[str, dict]] = {}
+        for o in sorted(self.client.get_open_orders() or [], key=lambda o: o.get("updateTime", 0)):
+            kind = order_kind(o.get("clientOrderId"))
+            if kind is None:
+                continue
+            symbol = o.get("symbol")
+            previous = found.setdefault(symbol, {}).get(kind)
+            if previous is not None:
+                # Дубликат (например, перенос стопа прерван перезапуском) - оставляем новый
+                self.client.cancel_order(symbol, previous["order_id"])
+                stats["cancelled"] += 1
+            found[symbol][kind] = {
+                "order_id": o.get("orderId"),
+                "client_order_id": o.get("clientOrderId"),
+                "stop_price": float(o.get("stopPrice") or 0.0),
+            }
+
+        positions = {s: p for s, p in self._positions().items() if p.get('status') == 'OPEN'}
+        for symbol, orders in found.items():
+            if symbol in positions:
+                continue
+            for record in orders.values():
+                self.client.cancel_order(symbol, record["order_id"])
+                stats["cancelled"] += 1
+
+        for symbol, pos in positions.items():
+            for kind, record in found.get(symbol, {}).items():
+                self._remember(symbol, kind, record)
+                stats["attached"] += 1
+            before = len(self.orders.get(symbol, {}))
+            self.protect(symbol, pos)
+            stats["placed"] += len(self.orders.get(symbol, {})) - before
+            self.engine.track(symbol, pos)
+
+        print(f"🛡️  Сверка защитных ордеров: привязано {stats['attached']}, "
+              f"поставлено {stats['placed']}, отменено {stats['cancelled']}")
+        return stats
+
+
+# Глобальный менеджер защитных ордеров
+protective_orders = ProtectiveOrders()
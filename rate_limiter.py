@@ -0,0 +1,281 @@
+# rate_limiter.py
+"""
+Учёт лимитов Binance Futures по весам запросов.
+
+Token bucket на вес запросов (REQUEST_WEIGHT, в минуту) и два на количество
+ордеров (за 10 секунд и за минуту). Корзины пополняются непрерывно, а
+заголовки X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-* каждого ответа
+подтягивают их к фактическому расходу на сервере.
+
+Приоритеты: низкоприоритетные (информационные) запросы не могут залезть в
+резерв корзины, поэтому reduce-only закрытия всегда находят вес. Ожидание
+синхронное (acquire_sync, для потоков) или асинхронное (acquire, для
+event loop) - event loop никогда не блокируется на time.sleep.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict
+
+from config import (
+    API_WEIGHT_LIMIT, API_ORDERS_PER_10S, API_ORDERS_PER_MIN,
+    API_NORMAL_PRIORITY_RESERVE, API_LOW_PRIORITY_RESERVE,
+)
+
+PRIORITY_HIGH = 0     # reduce-only закрытия, защитные ордера
+PRIORITY_NORMAL = 1   # открытие позиций, статусы ордеров, счёт
+PRIORITY_LOW = 2      # справочные данные, свечи, тикеры
+
+# Вес запросов USD-M Futures (для IP-лимита REQUEST_WEIGHT)
+ENDPOINT_WEIGHTS = {
+    "futures_ping": 1,
+    "futures_time": 1,
+    "get_server_time": 1,
+    "futures_exchange_info": 1,
+    "futures_symbol_ticker": 1,
+    "futures_orderbook_ticker": 1,
+    "futures_mark_price": 1,
+    "futures_funding_rate": 1,
+    "futures_ticker": 1,
+    "futures_account": 5,
+    "futures_account_balance": 5,
+    "futures_position_information": 5,
+    "futures_create_order": 0,
+    "futures_get_order": 1,
+    "futures_cancel_order": 1,
+    "futures_get_open_orders": 1,
+    "futures_change_leverage": 1,
+    "futures_income_history": 30,
+    "futures_stream_get_listen_key": 1,
+    "futures_stream_keepalive": 1,
+}
+
+# Запросы, которые без symbol возвращают все символы и стоят дороже
+ALL_SYMBOLS_WEIGHTS = {
+    "futures_symbol_ticker": 2,
+    "futures_orderbook_ticker": 2,
+    "futures_mark_price": 10,
+    "futures_ticker": 40,
+    "futures_get_open_orders": 40,
+}
+
+ORDER_ENDPOINTS = {"futures_create_order"}
+
+
+def klines_weight(limit: int) -> int:
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def endpoint_weight(endpoint: str, **params) -> int:
+    """Вес запроса с учётом параметров"""
+    if endpoint in ("futures_klines", "futures_continous_klines", "futures_mark_price_klines"):
+        return klines_weight(int(params.get("limit", 500)))
+    if "symbol" not in params and endpoint in ALL_SYMBOLS_WEIGHTS:
+        return ALL_SYMBOLS_WEIGHTS[endpoint]
+    return ENDPOINT_WEIGHTS.get(endpoint, 1)
+
+
+class TokenBucket:
+    """Корзина на capacity единиц, пополняемая за period секунд"""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self._stamp = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_time(self, amount: float, floor: float) -> float:
+        """Через сколько секунд после списания amount останется не меньше floor"""
+        floor = min(floor, max(self.capacity - amount, 0.0))
+        deficit = amount + floor - self.tokens
+        return deficit / self.rate if deficit > 0 else 0.0
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def sync_used(self, used: float):
+        """Сервер уже насчитал used единиц в текущем окне"""
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+def _on_event_loop() -> bool:
+    """Вызов из потока, в котором работает event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class RateLimiter:
+    """Лимитер веса запросов и количества ордеров с приоритетами"""
+
+    def __init__(self, weight_limit: int = API_WEIGHT_LIMIT,
+                 orders_per_10s: int = API_ORDERS_PER_10S,
+                 orders_per_min: int = API_ORDERS_PER_MIN):
+        self.weight = TokenBucket(weight_limit, 60)
+        self.orders_10s = TokenBucket(orders_per_10s, 10)
+        self.orders_1m = TokenBucket(orders_per_min, 60)
+        self.reserve = {
+            PRIORITY_HIGH: 0.0,
+            PRIORITY_NORMAL: API_NORMAL_PRIORITY_RESERVE,
+            PRIORITY_LOW: API_LOW_PRIORITY_RESERVE,
+        }
+        self._lock = threading.Lock()
+        self._waiting_high = 0
+        self.blocked_until = 0.0   # после 429/418 не шлём ничего до этого момента
+
+        self.acquired = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.loop_blocked = 0   # ожиданий acquire_sync внутри event loop (должно быть 0)
+        self.server_weight = 0
+        self.server_orders_10s = 0
+        self.server_orders_1m = 0
+
+    def _try_acquire(self, weight: int, orders: int, priority: int) -> float:
+        """0 - разрешено и списано; иначе сколько секунд подождать"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if priority > PRIORITY_HIGH and self._waiting_high:
+            # Закрытия позиций ждут - остальные пропускают их вперёд
+            return 0.05
+
+        for bucket in (self.weight, self.orders_10s, self.orders_1m):
+            bucket.refill(now)
+
+        share = self.reserve.get(priority, 0.0)
+        wait = self.weight.wait_time(weight, self.weight.capacity * share)
+        if orders:
+            wait = max(wait,
+                       self.orders_10s.wait_time(orders, self.orders_10s.capacity * share),
+                       self.orders_1m.wait_time(orders, self.orders_1m.capacity * share))
+        if wait > 0:
+            return wait
+
+        self.weight.take(weight)
+        if orders:
+            self.orders_10s.take(orders)
+            self.orders_1m.take(orders)
+        self.acquired += 1
+        return 0.0
+
+    def _poll(self, weight: int, orders: int, priority: int) -> float:
+        with self._lock:
+            return self._try_acquire(weight, orders, priority)
+
+    def _register(self, priority: int, delta: int, waited: float = 0.0):
+        with self._lock:
+            if priority == PRIORITY_HIGH:
+                self._waiting_high += delta
+            if waited > 0:
+                self.throttled += 1
+                self.waited += waited
+
+    def acquire_sync(self, weight: int = 1, priority: int = PRIORITY_NORMAL, orders: int = 0) -> float:
+        """Блокирующее ожидание (для потоков); возвращает время ожидания"""
+        started = time.monotonic()
+        self._register(priority, 1)
+        try:
+            wait = self._poll(weight, orders, priority)
+            if wait and _on_event_loop():
+                # time.sleep здесь останавливает весь event loop - вызов нужно
+                # перевести на async acquire или вынести в поток
+                with self._lock:
+                    self.loop_blocked += 1
+                    first = self.loop_blocked == 1
+                if first:
+                    print("⚠️  rate_limiter: блокирующее ожидание лимита в event loop")
+            while wait:
+                time.sleep(min(wait, 1.0))
+                wait = self._poll(weight, orders, priority)
+        finally:
+            waited = time.monotonic() - started
+            self._register(priority, -1, waited if waited > 0.001 else 0.0)
+        return waited
+
+    async def acquire(self, weight: int = 1, priority: int = PRIORITY_NORMAL, orders: int = 0) -> float:
+        """Асинхронное ожидание (для event loop); возвращает время ожидания"""
+        started = time.monotonic()
+        self._register(priority, 1)
+        try:
+            wait = self._poll(weight, orders, priority)
+            while wait:
+                await asyncio.sleep(min(wait, 1.0))
+                wait = self._poll(weight, orders, priority)
+        finally:
+            waited = time.monotonic() - started
+            self._register(priority, -1, waited if waited > 0.001 else 0.0)
+        return waited
+
+    def acquire_endpoint(self, endpoint: str, priority: int = PRIORITY_NORMAL, **params) -> float:
+        return self.acquire_sync(endpoint_weight(endpoint, **params), priority,
+                                 1 if endpoint in ORDER_ENDPOINTS else 0)
+
+    # ---------- Синхронизация с сервером ----------
+
+    def update_from_headers(self, headers):
+        with self._lock:
+            used = headers.get("X-MBX-USED-WEIGHT-1M")
+            if used is not None:
+                self.server_weight = int(used)
+                self.weight.sync_used(self.server_weight)
+            count_10s = headers.get("X-MBX-ORDER-COUNT-10S")
+            if count_10s is not None:
+                self.server_orders_10s = int(count_10s)
+                self.orders_10s.sync_used(self.server_orders_10s)
+            count_1m = headers.get("X-MBX-ORDER-COUNT-1M")
+            if count_1m is not None:
+                self.server_orders_1m = int(count_1m)
+                self.orders_1m.sync_used(self.server_orders_1m)
+
+    def backoff(self, seconds: float):
+        """Пауза для всех запросов после 429 / 418"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        print(f"🚨 Лимит API превышен, пауза {seconds:.0f} сек")
+
+    def on_response(self, response, *args, **kwargs):
+        """Хук requests.Session: заголовки лимитов каждого ответа фьючерсного API"""
+        if "/fapi/" not in getattr(response, "url", ""):
+            return None
+        self.update_from_headers(response.headers)
+        if response.status_code in (418, 429):
+            retry_after = response.headers.get("Retry-After")
+            self.backoff(float(retry_after) if retry_after else 60.0)
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self.weight.refill(time.monotonic())
+            return {
+                "weight_available": self.weight.tokens,
+                "weight_limit": self.weight.capacity,
+                "server_weight_1m": self.server_weight,
+                "server_orders_10s": self.server_orders_10s,
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "waited_sec": self.waited,
+                "loop_blocked": self.loop_blocked,
+            }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"вес {s['server_weight_1m']}/{s['weight_limit']:.0f} (сервер), "
+                f"доступно {s['weight_available']:.0f}, запросов {s['acquired']}, "
+                f"ожиданий {s['throttled']} ({s['waited_sec']:.1f} сек)")
+
+
+# Глобальный лимитер: общий для синхронного и асинхронного клиентов
+rate_limiter = RateLimiter()
@@ -0,0 +1,200 @@
+# reconciler.py
+"""
+Единая сверка позиций бота (user_data_cache["positions"]) с биржей.
+
+Раз в POSITION_RECONCILE_INTERVAL позиции запрашиваются одним вызовом
+get_positions (пока user-data stream жив, он отвечает из account_state без
+REST). Снимок сравнивается с локальными записями:
+
+- количество, цена входа, mark price и PnL с биржи вливаются в существующую
+  запись, а TP/SL, трейлинг, id ордеров и прочие локальные поля сохраняются;
+- позиция, которой нет в кэше, добавляется как Position с source="binance_real";
+- реальная позиция, исчезнувшая с биржи, удаляется, если она открыта раньше
+  запроса снимка (иначе снимок мог просто не успеть её увидеть), и для неё
+  пишется CLOSE с exit_reason RECONCILED по последнему mark price (тот же
+  logger.log_external_close, что и для закрытий из user-data stream). Позиции,
+  которые закрывает сам бот (флаг "closing"), не трогаются.
+
+Словарь позиций не пересоздаётся, поэтому ссылки на записи (trigger_engine,
+protective_orders) остаются валидными. Изменения публикуются событиями
+OPENED / CHANGED / CLOSED подписчикам add_listener.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from async_binance_client import async_client
+from config import POSITION_RECONCILE_INTERVAL
+from data_store import user_data_cache
+from logger import EXIT_RECONCILED, log_external_close
+from models import Position, SOURCE_REAL
+from trigger_engine import trigger_engine
+
+OPENED, CHANGED, CLOSED = "OPENED", "CHANGED", "CLOSED"
+
+
+class PositionEvent(NamedTuple):
+    kind: str            # OPENED / CHANGED / CLOSED
+    symbol: str
+    position: Position
+    changes: Dict[str, tuple]   # поле -> (было, стало)
+
+
+def normalize_symbol(symbol: str) -> str:
+    return symbol if symbol.endswith('USDT') else symbol + 'USDT'
+
+
+def exchange_snapshot(positions: List[dict]) -> Dict[str, dict]:
+    """{symbol: поля записи бота} из get_positions (или сырого positionRisk)"""
+    snapshot = {}
+    for p in positions:
+        if 'positionAmt' in p:
+            amt = float(p.get('positionAmt', 0))
+            side, qty = ('BUY' if amt > 0 else 'SELL'), abs(amt)
+            entry, mark = float(p.get('entryPrice', 0)), float(p.get('markPrice', 0))
+            pnl, leverage = float(p.get('unRealizedProfit', 0)), float(p.get('leverage', 1))
+        else:
+            side, qty = p.get('side', 'BUY'), float(p.get('quantity', 0))
+            entry, mark = float(p.get('entry_price', 0)), float(p.get('mark_price', 0))
+            pnl, leverage = float(p.get('unrealized_pnl', 0)), float(p.get('leverage', 1))
+        if qty == 0:
+            continue
+        snapshot[normalize_symbol(p['symbol'])] = {
+            "side": side,
+            "qty": qty,
+            "entry": entry,
+            "current_price": mark,
+            "unrealized_pnl": pnl,
+            "leverage": leverage,
+        }
+    return snapshot
+
+
+def _is_real(pos: dict) -> bool:
+    return str(pos.get('source', '')).startswith(SOURCE_REAL)
+
+
+class PositionReconciler:
+    """Периодическая сверка позиций с биржей и публикация изменений"""
+
+    # Поля, изменение которых - событие CHANGED (цена и PnL меняются постоянно)
+    TRACKED_FIELDS = ("side", "qty", "entry")
+
+    def __init__(self, client=async_client, cache: dict = user_data_cache,
+                 interval: float = POSITION_RECONCILE_INTERVAL, engine=trigger_engine,
+                 closer: Callable = log_external_close):
+        self.client = client
+        self.cache = cache
+        self.interval = interval
+        self.engine = engine
+        self.closer = closer  # closer(symbol, pos, price, reason) - запись CLOSE
+        self._listeners: List[Callable[[PositionEvent], None]] = []
+        self._task = None
+        self.runs = 0
+        self.failures = 0
+        self.last_run = 0.0
+
+    def add_listener(self, listener: Callable[[PositionEvent], None]):
+        self._listeners.append(listener)
+
+    def _publish(self, events: List[PositionEvent]):
+        for event in events:
+            for listener in self._listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    print(f"❌ Ошибка обработчика {event.kind} {event.symbol}: {e}")
+
+    # ---------- Слияние ----------
+
+    def apply(self, positions: List[dict], started: Optional[float] = None) -> List[PositionEvent]:
+        """Слияние снимка биржи с локальными позициями; started - time.time() запроса снимка"""
+        started = time.time() if started is None else started
+        now = time.time()
+        snapshot = exchange_snapshot(positions)
+        local = self.cache.setdefault("positions", {})
+        events = []
+
+        for symbol, fields in snapshot.items():
+            pos = local.get(symbol)
+            if pos is None:
+                pos = local[symbol] = Position(symbol=symbol, **fields, source=SOURCE_REAL,
+                                               status="OPEN", timestamp=now, last_updated=now)
+                events.append(PositionEvent(OPENED, symbol, pos, {}))
+                continue
+            if not _is_real(pos):
+                continue
+
+            changes = {k: (pos.get(k), fields[k]) for k in self.TRACKED_FIELDS if pos.get(k) != fields[k]}
+            if "side" in changes:
+                # Позиция перевёрнута: уровни старого направления больше не действуют
+                for key in ("tp_price", "sl_price", "highest_price", "lowest_price", "trailing_active"):
+                    pos.pop(key, None)
+            pos.update(fields)
+            pos["last_updated"] = now
+            if pos.get("status") == "PENDING":
+                pos["status"] = "OPEN"
+                pos["source"] = SOURCE_REAL
+                changes["status"] = ("PENDING", "OPEN")
+            if changes:
+                events.append(PositionEvent(CHANGED, symbol, pos, changes))
+
+        for symbol, pos in list(local.items()):
+            if symbol in snapshot or not _is_real(pos) or pos.get("status") != "OPEN":
+                continue
+            if pos.get("timestamp", 0) > started:
+                continue  # открыта после запроса снимка
+            if pos.get("closing"):
+                continue  # закрывает сам бот, CLOSE запишет close_position
+            del local[symbol]
+            events.append(PositionEvent(CLOSED, symbol, pos, {}))
+            try:
+                self.closer(symbol, pos, pos.get("current_price"), EXIT_RECONCILED)
+            except Exception as e:
+                print(f"❌ Не удалось записать закрытие {symbol}: {e}")
+
+        self.engine.sync(local)
+        self._publish(events)
+        return events
+
+    # ---------- Цикл ----------
+
+    async def reconcile_once(self) -> Optional[List[PositionEvent]]:
+        """Один запрос позиций и слияние; None, если биржа не ответила"""
+        started = time.time()
+        try:
+            positions = await self.client.get_positions(strict=True)
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️  Сверка позиций не удалась: {e}")
+            return None
+        events = self.apply(positions, started)
+        self.runs += 1
+        self.last_run = time.time()
+        for event in events:
+            print(f"🔄 Сверка позиций: {event.kind} {event.symbol}"
+                  f"{' ' + str(event.changes) if event.changes else ''}")
+        return events
+
+    async def run(self):
+        while True:
+            await self.reconcile_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+# Глобальная сверка позиций
+position_reconciler = PositionReconciler()
@@ -0,0 +1,147 @@
+# reoptimizer.py
+"""
+Фоновая переоптимизация параметров во время работы бота.
+
+Символ переоптимизируется после REOPT_EVERY_BARS новых закрытых баров, по
+одному символу за раз, в отдельном однопроцессном пуле с пониженным
+приоритетом. Между задачами выдерживается пауза, чтобы оптимизация занимала
+не больше REOPT_CPU_BUDGET доли времени и не мешала обработке свечей.
+
+Новые параметры символа и обновлённый топ-N публикуются одной заменой
+значения (strategy_params[symbol], trading_state["top_symbols"]), поэтому
+торговые циклы всегда видят согласованный набор.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import REOPT_EVERY_BARS, REOPT_CPU_BUDGET, REOPT_POLL_INTERVAL, REOPT_NICE
+from data_store import kline_store, strategy_params, trading_state
+import optimizer
+from optimizer import OptimizationResult, optimize_symbols, rank_symbols, publish_top
+from optimization_cache import optimization_cache
+
+
+def _background_priority():
+    """Инициализатор процесса пула: ниже приоритет, чем у процесса бота"""
+    if hasattr(os, "nice"):
+        try:
+            os.nice(REOPT_NICE)
+        except OSError:
+            pass
+
+
+class ReOptimizer:
+    """Планировщик переоптимизации символов по числу новых закрытых баров"""
+
+    def __init__(self, symbols: Iterable[str], top_n: int = 5,
+                 every_bars: int = REOPT_EVERY_BARS, cpu_budget: float = REOPT_CPU_BUDGET,
+                 poll_interval: float = REOPT_POLL_INTERVAL, executor=None,
+                 cache=optimization_cache, grids: Optional[Dict[str, List[dict]]] = None,
+                 on_publish: Optional[Callable[[Tuple[str, ...]], None]] = None):
+        self.symbols = list(symbols)
+        self.top_n = top_n
+        self.every_bars = every_bars
+        self.cpu_budget = max(0.01, min(cpu_budget, 1.0))
+        self.poll_interval = poll_interval
+        self.cache = cache
+        self.grids = grids
+        self.on_publish = on_publish
+        self._executor = executor
+        self._own_executor = executor is None
+        self._task = None
+        # Результаты стартовой оптимизации - отправная точка для ранжирования
+        self.results: OptimizationResult = {s: dict(r) for s, r in optimizer.last_results.items()}
+        self._marks: Dict[str, Tuple[int, int]] = {s: self._mark(s) for s in self.symbols}
+
+        self.runs = 0
+        self.busy_sec = 0.0
+
+    @staticmethod
+    def _mark(symbol: str) -> Tuple[int, int]:
+        """(поколение истории, число закрытых баров) символа"""
+        return kline_store.generation(symbol), kline_store.closed_count(symbol)
+
+    def _executor_or_create(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=1, initializer=_background_priority)
+        return self._executor
+
+    def due(self) -> List[str]:
+        """Символы, набравшие every_bars новых баров (сначала самые отставшие)"""
+        lag = {}
+        for symbol in self.symbols:
+            generation, count = self._mark(symbol)
+            last_generation, last_count = self._marks.get(symbol, (-1, 0))
+            if generation != last_generation:
+                # История перезагружена - данные другие, счётчик баров начался заново
+                bars = max(count, self.every_bars)
+            else:
+                bars = count - last_count
+            if bars >= self.every_bars:
+                lag[symbol] = bars
+        return sorted(lag, key=lag.get, reverse=True)
+
+    async def reoptimize(self, symbol: str) -> float:
+        """Переоптимизация одного символа; возвращает затраченное время"""
+        started = time.monotonic()
+        mark = self._mark(symbol)
+        try:
+            results = await optimize_symbols([symbol], self.grids,
+                                             executor=self._executor_or_create(), cache=self.cache)
+        except Exception as e:
+            print(f"⚠️  Переоптимизация {symbol} не удалась: {e}")
+            results = {}
+        self._marks[symbol] = mark
+
+        if results.get(symbol):
+            self.results[symbol] = results[symbol]
+            self.publish(symbol)
+
+        elapsed = time.monotonic() - started
+        self.runs += 1
+        self.busy_sec += elapsed
+        return elapsed
+
+    def publish(self, symbol: str):
+        strategy_params[symbol] = {s: r["params"] for s, r in self.results[symbol].items()}
+        top = tuple(s for s, _ in rank_symbols(self.results, self.top_n))
+        if top and top != trading_state["top_symbols"]:
+            publish_top(top)
+            print(f"🔁 Обновлён топ-{self.top_n}: {list(top)}")
+            if self.on_publish is not None:
+                self.on_publish(top)
+
+    def pause_after(self, elapsed: float) -> float:
+        """Пауза, при которой работа занимает не больше cpu_budget доли времени"""
+        return max(self.poll_interval, elapsed * (1 / self.cpu_budget - 1))
+
+    async def run(self):
+        while True:
+            due = self.due()
+            if not due:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            elapsed = await self.reoptimize(due[0])
+            print(f"🧮 Переоптимизирован {due[0]} за {elapsed:.1f} сек "
+                  f"(в очереди {len(due) - 1})")
+            await asyncio.sleep(self.pause_after(elapsed))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,10 +1,10 @@
 # run_simple.py - Простой запуск
 import asyncio
-from websocket_handler import get_liquid_tickers, fetch_historical_klines, start_websockets
+from websocket_handler import get_liquid_tickers, warm_up, subscribe_when_ready, start_websockets
 from data_store import klines_cache
 from config import TRADING_MODE, TIMEFRAME, CHECK_INTERVAL
 from strategies import get_trading_signal
-from pos_manager import get_open_position, open_position
+from pos_manager import get_open_position_async, open_position
 
 print(f"🤖 Binance Trading Bot - Режим: {TRADING_MODE.upper()}")
 
@@ -20,7 +20,7 @@ async def trade(symbol):
                 continue
             
             # Проверяем позицию
-            pos = get_open_position(symbol)
+            pos = await get_open_position_async(symbol)
             if pos:
                 print(f"📊 {symbol}: позиция {pos.get('side', '?')}")
                 await asyncio.sleep(CHECK_INTERVAL)
@@ -55,25 +55,24 @@ async def trade(symbol):
 
 async def main():
     # Получаем тикеры
-    symbols = await get_liquid_tickers(top_n=3)
+    try:
+        symbols = await get_liquid_tickers(top_n=3)
+    except Exception:
+        symbols = []
     if not symbols:
         symbols = ["BTCUSDT"]
     
     print(f"🎯 Торгуем: {symbols}")
     
-    # Загружаем данные
-    for symbol in symbols:
-        df = await fetch_historical_klines(symbol, TIMEFRAME, 200)
-        if not df.empty:
-            klines_cache[symbol] = df
-            print(f"✅ {symbol}: {len(df)} свечей")
+    # Загружаем данные (параллельно, с подпиской на свечи по готовности)
+    await warm_up(symbols, TIMEFRAME, 200, on_ready=subscribe_when_ready)
     
     # Запускаем WebSocket
-    await start_websockets(symbols, TIMEFRAME)
+    ws_task = asyncio.create_task(start_websockets(symbols, TIMEFRAME))
     
     # Запускаем торговлю
     tasks = [asyncio.create_task(trade(sym)) for sym in symbols]
-    await asyncio.gather(*tasks)
+    await asyncio.gather(*tasks, ws_task)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,111 @@
+# state_store.py
+"""
+Общее состояние бота для потока Telegram и event loop.
+
+Читатели (поток listen_commands, отчёты) получают неизменяемый снимок
+StateSnapshot: ссылка на текущий снимок читается без блокировки, а запись
+собирает новый снимок и подменяет ссылку целиком (copy-on-write) под
+блокировкой писателей. Номер версии растёт с каждой записью, так что
+читатель видит либо старое, либо новое состояние, но не смесь.
+
+Позиции попадают в снимок копиями (publish_positions вызывается из event
+loop): поток Telegram больше не обходит живой user_data_cache["positions"],
+который в это время меняют циклы main.py.
+
+Команды, меняющие состояние, поток Telegram не выполняет сам, а передаёт
+в event loop через call_soon_threadsafe (call_in_loop).
+"""
+import asyncio
+import dataclasses
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, NamedTuple, Optional
+
+from models import Position
+
+_EMPTY = MappingProxyType({})
+
+
+class StateSnapshot(NamedTuple):
+    version: int
+    control: Mapping[str, Any]      # paused / auto_trading / emergency_stop / bot_active
+    positions: Mapping[str, Any]    # symbol -> копия позиции
+    updated: float
+
+
+def _copy_position(pos):
+    if isinstance(pos, Position):
+        return dataclasses.replace(pos, extra=dict(pos.extra))
+    return MappingProxyType(dict(pos))
+
+
+class StateStore:
+    """Версионированное состояние с неизменяемыми снимками"""
+
+    def __init__(self, **control):
+        self._lock = threading.Lock()
+        self._snapshot = StateSnapshot(0, MappingProxyType(dict(control)), _EMPTY, time.time())
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ---------- Чтение (без блокировки) ----------
+
+    def snapshot(self) -> StateSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def control(self) -> Mapping[str, Any]:
+        return self._snapshot.control
+
+    @property
+    def positions(self) -> Mapping[str, Any]:
+        return self._snapshot.positions
+
+    # ---------- Запись ----------
+
+    def _swap(self, control=None, positions=None) -> StateSnapshot:
+        with self._lock:
+            old = self._snapshot
+            self._snapshot = StateSnapshot(
+                old.version + 1,
+                old.control if control is None else MappingProxyType({**old.control, **control}),
+                old.positions if positions is None else positions,
+                time.time(),
+            )
+            return self._snapshot
+
+    def update_control(self, **changes) -> StateSnapshot:
+        return self._swap(control=changes)
+
+    def publish_positions(self, positions: Mapping[str, Any]) -> StateSnapshot:
+        """Снимок позиций бота; вызывать из event loop"""
+        copies = {symbol: _copy_position(pos) for symbol, pos in positions.copy().items()}
+        return self._swap(positions=MappingProxyType(copies))
+
+    # ---------- Передача команд в event loop ----------
+
+    def bind_loop(self, loop: Optional[asyncio.AbstractEventLoop]):
+        self._loop = loop
+
+    def call_in_loop(self, func: Callable, *args):
+        """Выполнение func в event loop; без запущенного loop - сразу в этом потоке"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            func(*args)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            func(*args)
+        else:
+            loop.call_soon_threadsafe(func, *args)
+
+
+# Глобальное состояние бота
+state_store = StateStore(paused=False, auto_trading=True, emergency_stop=False, bot_active=True)
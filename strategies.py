@@ -4,6 +4,8 @@ from utils import ema200, bol_h, bol_l, rsi
 from pos_manager import calculate_qty
 from config import RISK_FRACTION, TRADING_MODE, LEVERAGE, INITIAL_CASH
 from binance_client import BinanceClient
+from symbol_registry import symbol_registry
+from data_store import strategy_params
 
 # Клиент для реальной торговли
 binance_client = None
@@ -41,11 +43,10 @@ def calculate_qty_for_realtime(price: float, symbol: str, risk_fraction: float =
         equity = binance_client.get_balance('USDT')
         qty = max(1e-8, (equity * risk_fraction * LEVERAGE) / price)
         
-        symbol_info = binance_client.get_symbol_info(symbol)
-        if symbol_info:
-            min_qty = float(symbol_info.get('minQty', 0.001))
-            max_qty = float(symbol_info.get('maxQty', 1000))
-            qty = max(min_qty, min(qty, max_qty))
+        filters = symbol_registry.get(symbol)
+        if filters:
+            qty = filters.quantize_qty(qty)
+            qty = max(filters.min_qty_for_notional(price), min(qty, filters.max_qty or qty))
         
         return qty
     except Exception as e:
@@ -184,14 +185,19 @@ def generate_breakout_signal(df, period=20):
     
     return None
 
-def get_trading_signal(symbol, df, strategy="bb_rsi"):
-    """Получение торгового сигнала для реальной торговли"""
+def get_trading_signal(symbol, df, strategy="bb_rsi", params=None):
+    """Получение торгового сигнала для реальной торговли
+    
+    params - параметры стратегии; по умолчанию оптимизированные для символа
+    (data_store.strategy_params), иначе значения по умолчанию
+    """
     if df is None or len(df) < 100:
         return None
     
-    if strategy == "bb_rsi":
-        return generate_bb_rsi_signal(df)
-    elif strategy == "breakout":
-        return generate_breakout_signal(df)
-    else:
-        return generate_bb_rsi_signal(df)
\ No newline at end of file
+    if strategy == "breakout":
+        if params is None:
+            params = strategy_params.get(symbol, {}).get("breakout", {})
+        return generate_breakout_signal(df, **params)
+    if params is None:
+        params = strategy_params.get(symbol, {}).get("bbrsi", {})
+    return generate_bb_rsi_signal(df, **params)
\ No newline at end of file
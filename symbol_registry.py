@@ -0,0 +1,202 @@
+# symbol_registry.py
+"""
+Реестр параметров символов Binance Futures.
+
+futures_exchange_info() загружается один раз (и повторно после
+SYMBOL_INFO_TTL), индексируется по символу, а шаг количества, шаг цены,
+минимальный номинал и число знаков считаются заранее. Все округления и
+проверки количества/цены идут через этот реестр.
+"""
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_UP
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import SYMBOL_INFO_TTL
+from rate_limiter import rate_limiter
+
+DEFAULT_MIN_NOTIONAL = 5.0
+# Погрешность float (0.1 + 0.2 = 0.30000000000000004) не должна сдвигать округление на шаг
+_STEP_EPSILON = Decimal("1e-9")
+RETRY_AFTER_FAILURE = 30  # сек до повторной загрузки после ошибки
+
+
+def _round_to_step(value: float, step: Decimal, up: bool) -> float:
+    if step <= 0:
+        return value
+    ratio = (Decimal(str(value)) / step).quantize(_STEP_EPSILON)
+    return float(ratio.to_integral_value(rounding=ROUND_UP if up else ROUND_DOWN) * step)
+
+
+def _decimals(step: str) -> int:
+    """Число знаков после запятой у шага ("0.00100000" -> 3)"""
+    exponent = Decimal(step).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+class SymbolFilters:
+    """Фильтры одного символа с предрасчитанными шагами и точностью"""
+
+    __slots__ = (
+        "symbol", "status", "base_asset", "quote_asset", "filters",
+        "min_qty", "max_qty", "step_size", "market_max_qty",
+        "min_price", "max_price", "tick_size", "min_notional",
+        "qty_precision", "price_precision", "_step", "_tick",
+    )
+
+    def __init__(self, sym_info: dict):
+        self.symbol = sym_info["symbol"]
+        self.status = sym_info.get("status")
+        self.base_asset = sym_info.get("baseAsset")
+        self.quote_asset = sym_info.get("quoteAsset")
+        self.filters = {f["filterType"]: f for f in sym_info.get("filters", [])}
+
+        lot_size = self.filters.get("LOT_SIZE", {})
+        market_lot = self.filters.get("MARKET_LOT_SIZE", {})
+        price_filter = self.filters.get("PRICE_FILTER", {})
+        min_notional = self.filters.get("MIN_NOTIONAL", {})
+
+        step = lot_size.get("stepSize", "0.001")
+        tick = price_filter.get("tickSize", "0.01")
+        self._step = Decimal(step)
+        self._tick = Decimal(tick)
+
+        self.step_size = float(step)
+        self.min_qty = float(lot_size.get("minQty", 0))
+        self.max_qty = float(lot_size.get("maxQty", 0))
+        self.market_max_qty = float(market_lot.get("maxQty", self.max_qty))
+        self.tick_size = float(tick)
+        self.min_price = float(price_filter.get("minPrice", 0))
+        self.max_price = float(price_filter.get("maxPrice", 0))
+        # У фьючерсов поле называется notional, у спота - minNotional
+        self.min_notional = float(min_notional.get("notional",
+                                  min_notional.get("minNotional", DEFAULT_MIN_NOTIONAL)))
+        self.qty_precision = _decimals(step)
+        self.price_precision = _decimals(tick)
+
+    def quantize_qty(self, qty: float, up: bool = False) -> float:
+        """Округление количества до шага (по умолчанию вниз)"""
+        return _round_to_step(qty, self._step, up)
+
+    def quantize_price(self, price: float, up: bool = False) -> float:
+        """Округление цены до тика (по умолчанию вниз)"""
+        return _round_to_step(price, self._tick, up)
+
+    def format_qty(self, qty: float) -> str:
+        """Количество строкой для API (округлено вниз до шага)"""
+        return f"{self.quantize_qty(qty):.{self.qty_precision}f}"
+
+    def format_price(self, price: float) -> str:
+        return f"{self.quantize_price(price):.{self.price_precision}f}"
+
+    def min_qty_for_notional(self, price: float) -> float:
+        """Минимальное количество, проходящее и LOT_SIZE, и MIN_NOTIONAL"""
+        if price <= 0:
+            return self.min_qty
+        return max(self.min_qty, self.quantize_qty(self.min_notional / price, up=True))
+
+    def is_valid_step(self, qty: float) -> bool:
+        return self._step <= 0 or self.quantize_qty(qty) == self.quantize_qty(qty, up=True)
+
+    def validate(self, price: float, qty: float) -> Tuple[bool, str]:
+        """Проверка количества и номинала ордера; (ok, причина)"""
+        if qty < self.min_qty:
+            return False, f"количество {qty} меньше минимального {self.min_qty}"
+        if self.max_qty and qty > self.max_qty:
+            return False, f"количество {qty} больше максимального {self.max_qty}"
+        if not self.is_valid_step(qty):
+            return False, f"количество {qty} не соответствует шагу {self.step_size}"
+        if price * qty < self.min_notional:
+            return False, f"номинал {price * qty:.2f} меньше минимального {self.min_notional}"
+        return True, ""
+
+    def as_dict(self) -> dict:
+        """Формат BinanceClient.get_symbol_info"""
+        return {
+            'symbol': self.symbol,
+            'status': self.status,
+            'baseAsset': self.base_asset,
+            'quoteAsset': self.quote_asset,
+            'filters': self.filters,
+            'min_qty': self.min_qty,
+            'max_qty': self.max_qty,
+            'step_size': self.step_size,
+            'min_price': self.min_price,
+            'max_price': self.max_price,
+            'tick_size': self.tick_size,
+            'min_notional': self.min_notional,
+            'qty_precision': self.qty_precision,
+            'price_precision': self.price_precision,
+        }
+
+
+def _load_from_binance() -> Optional[dict]:
+    from binance_client import binance_client
+    if not binance_client or not binance_client.client:
+        return None
+    rate_limiter.acquire_endpoint('futures_exchange_info')
+    return binance_client.client.futures_exchange_info()
+
+
+class SymbolRegistry:
+    """exchange info по символам с TTL; загрузка одна на всех вызывающих"""
+
+    def __init__(self, loader: Callable[[], Optional[dict]] = _load_from_binance,
+                 ttl: float = SYMBOL_INFO_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._symbols: Dict[str, SymbolFilters] = {}
+        self._loaded_at = 0.0
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def load(self, exchange_info: dict):
+        """Индексация готового ответа futures_exchange_info"""
+        symbols = {}
+        for sym_info in exchange_info.get("symbols", []):
+            try:
+                filters = SymbolFilters(sym_info)
+            except Exception as e:
+                print(f"⚠️  Пропускаю фильтры {sym_info.get('symbol')}: {e}")
+                continue
+            symbols[filters.symbol] = filters
+        self._symbols = symbols
+        self._loaded_at = time.time()
+        self.loads += 1
+
+    def expired(self) -> bool:
+        return not self._symbols or time.time() - self._loaded_at > self.ttl
+
+    def refresh(self, force: bool = False) -> bool:
+        with self._lock:
+            if not force and not self.expired():
+                return True
+            if not force and time.time() - self._failed_at < RETRY_AFTER_FAILURE:
+                return bool(self._symbols)
+            try:
+                exchange_info = self.loader()
+            except Exception as e:
+                exchange_info = None
+                print(f"⚠️  Не удалось загрузить exchange info: {e}")
+            if not exchange_info:
+                self._failed_at = time.time()
+                # Оставляем устаревшие данные, если они есть
+                return bool(self._symbols)
+            self.load(exchange_info)
+            print(f"✅ Exchange info загружен: {len(self._symbols)} символов")
+            return True
+
+    def get(self, symbol: str) -> Optional[SymbolFilters]:
+        if self.expired():
+            self.refresh()
+        return self._symbols.get(symbol)
+
+    def symbols(self) -> List[str]:
+        if self.expired():
+            self.refresh()
+        return list(self._symbols)
+
+
+# Глобальный реестр символов
+symbol_registry = SymbolRegistry()
@@ -8,6 +8,7 @@ import time
 import requests
 import json
 from datetime import datetime
+from functools import partial
 from typing import Dict, List, Optional
 import logging
 
@@ -37,13 +38,23 @@ except ImportError as e:
     TRADING_MODE = "test"
     binance_client = None
 
+from state_store import state_store
+from trade_stats import trade_stats
+from notifier import notifier
+
 log = logging.getLogger(__name__)
 
-# ========== ГЛОБАЛЬНЫЕ СОСТОЯНИЯ ==========
-trading_paused = False
-bot_active = True
-auto_trading = True
-emergency_stop = False
+# ========== СОСТОЯНИЕ ТОРГОВЛИ ==========
+# Флаги живут в state_store: поток команд читает снимок, а меняет их event loop
+
+def _control_flags():
+    """(пауза, автоторговля, аварийная остановка) из текущего снимка"""
+    control = state_store.control
+    return control["paused"], control["auto_trading"], control["emergency_stop"]
+
+def _set_control(**changes):
+    """Изменение флагов торговли - выполняется в event loop"""
+    state_store.call_in_loop(partial(state_store.update_control, **changes))
 
 # ========== КЛАСС ДЛЯ УПРАВЛЕНИЯ ==========
 class TradingControl:
@@ -104,7 +115,8 @@ def get_real_pnl() -> Dict:
     try:
         # Используем реальные данные если доступны
         from pnl_utils import get_total_pnl
-        pnl_data = get_total_pnl()
+        # Снимок позиций, а не живой user_data_cache: его меняет event loop
+        pnl_data = get_total_pnl(state_store.positions)
         
         # Получаем реальный баланс
         real_balance = get_real_balance()
@@ -123,6 +135,7 @@ def get_real_pnl() -> Dict:
 # ========== КРАСИВЫЕ СООБЩЕНИЯ ДЛЯ КАНАЛА ==========
 def create_channel_message(message_type: str, **kwargs) -> str:
     """Создание красивых сообщений для канала с реальными данными"""
+    trading_paused, auto_trading, emergency_stop = _control_flags()
     
     # Получаем актуальные данные
     current_balance = get_real_balance()
@@ -348,55 +361,16 @@ def send_to_channel(message: str, parse_mode: str = 'HTML') -> bool:
     
     return _send_message(TELEGRAM_CHANNEL_ID, message, parse_mode)
 
-def send_to_me(message: str, parse_mode: str = 'Markdown') -> bool:
+def send_to_me(message: str, parse_mode: str = 'Markdown', dedup: bool = True) -> bool:
     """Отправить сообщение вам лично (для управления)"""
     if not SEND_TO_ME or not TELEGRAM_BOT_TOKEN or not TELEGRAM_MY_CHAT_ID:
         return False
     
-    return _send_message(TELEGRAM_MY_CHAT_ID, message, parse_mode)
+    return _send_message(TELEGRAM_MY_CHAT_ID, message, parse_mode, dedup)
 
-def _send_message(chat_id: str, text: str, parse_mode: str = 'Markdown') -> bool:
-    """Базовая функция отправки сообщения"""
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        data = {
-            "chat_id": chat_id,
-            "text": text[:4096],
-            "parse_mode": parse_mode,
-            "disable_notification": False,
-            "disable_web_page_preview": True
-        }
-        
-        # Отладка
-        print(f"📤 Отправка в Telegram (chat_id: {chat_id}, символов: {len(text)})")
-        
-        response = requests.post(url, json=data, timeout=10)
-        
-        if response.status_code == 200:
-            destination = "канал" if "@" in str(chat_id) or "-100" in str(chat_id) else "вам"
-            print(f"✅ Сообщение отправлено в {destination}")
-            return True
-        else:
-            print(f"❌ Ошибка отправки: {response.status_code}")
-            print(f"   Ответ Telegram: {response.text[:200]}")
-            
-            # Если ошибка из-за parse_mode, пробуем без него
-            if "parse mode" in response.text.lower():
-                print("⚠️  Пробуем отправить без форматирования...")
-                data.pop("parse_mode", None)
-                response2 = requests.post(url, json=data, timeout=10)
-                if response2.status_code == 200:
-                    print("✅ Сообщение отправлено без форматирования")
-                    return True
-                else:
-                    print(f"❌ Снова ошибка: {response2.status_code}")
-                    print(f"   Ответ: {response2.text[:200]}")
-            
-            return False
-            
-    except Exception as e:
-        print(f"❌ Ошибка отправки: {e}")
-        return False
+def _send_message(chat_id: str, text: str, parse_mode: str = 'Markdown', dedup: bool = True) -> bool:
+    """Постановка сообщения в очередь notifier (HTTP-запрос - в его фоновом потоке)"""
+    return notifier.enqueue(chat_id, text, parse_mode, dedup=dedup)
 
 # ========== ИНТЕГРАЦИОННЫЕ ФУНКЦИИ ==========
 def send_startup_message(custom_message=None):
@@ -442,6 +416,7 @@ def send_startup_message(custom_message=None):
 
 def send_signal_alert(symbol: str, side: str, price: float):
     """Отправка алерта о сигнале"""
+    trading_paused, auto_trading, emergency_stop = _control_flags()
     # Получаем реальный баланс
     current_balance = get_real_balance()
     
@@ -543,6 +518,7 @@ def send_trade_closed(symbol: str, side: str, entry_price: float,
 
 def send_status_update():
     """Отправка периодического отчета"""
+    trading_paused, auto_trading, emergency_stop = _control_flags()
     # Получаем реальные данные
     pnl_data = get_real_pnl()
     positions = get_real_positions()
@@ -631,9 +607,13 @@ def listen_commands():
             print(f"❌ Ошибка в listen_commands: {e}")
             time.sleep(5)
 
+def _reply(message: str, parse_mode: str = 'Markdown') -> bool:
+    """Ответ на команду: повторный /status или /pause тоже получает ответ"""
+    return send_to_me(message, parse_mode, dedup=False)
+
 def _process_command(chat_id: str, command: str):
     """Обработка команд"""
-    global trading_paused, auto_trading, emergency_stop
+    trading_paused, auto_trading, emergency_stop = _control_flags()
     
     cmd = command.lower().strip()
     
@@ -642,7 +622,7 @@ def _process_command(chat_id: str, command: str):
         current_balance = get_real_balance()
         positions = get_real_positions()
         
-        send_to_me(f"""
+        _reply(f"""
 🤖 *ТОРГОВЫЙ БОТ BINANCE*
 
 📊 *Режим:* {TRADING_MODE.upper()}
@@ -695,38 +675,38 @@ def _process_command(chat_id: str, command: str):
 
 🕐 *Время:* {datetime.now().strftime('%H:%M:%S')}
 """
-        send_to_me(status_msg)
+        _reply(status_msg)
     
     elif cmd == '/pause':
-        trading_paused = True
-        send_to_me("✅ Торговля приостановлена")
+        _set_control(paused=True)
+        _reply("✅ Торговля приостановлена")
     
     elif cmd == '/resume':
-        trading_paused = False
-        send_to_me("✅ Торговля возобновлена")
+        _set_control(paused=False)
+        _reply("✅ Торговля возобновлена")
     
     elif cmd == '/auto_on':
-        auto_trading = True
-        send_to_me("🤖 Автоторговля ВКЛЮЧЕНА")
+        _set_control(auto_trading=True)
+        _reply("🤖 Автоторговля ВКЛЮЧЕНА")
     
     elif cmd == '/auto_off':
-        auto_trading = False
-        send_to_me("👤 Ручной режим ВКЛЮЧЕН")
+        _set_control(auto_trading=False)
+        _reply("👤 Ручной режим ВКЛЮЧЕН")
     
     elif cmd == '/emergency':
-        emergency_stop = True
-        trading_paused = True
-        send_to_me("🚨 АВАРИЙНАЯ ОСТАНОВКА АКТИВИРОВАНА!")
+        _set_control(emergency_stop=True, paused=True)
+        _reply("🚨 АВАРИЙНАЯ ОСТАНОВКА АКТИВИРОВАНА!")
     
     elif cmd == '/reset':
-        emergency_stop = False
-        send_to_me("✅ Аварийная остановка отключена")
+        _set_control(emergency_stop=False)
+        _reply("✅ Аварийная остановка отключена")
     
     elif cmd == '/stats':
         # Получаем подробную статистику
         pnl_data = get_real_pnl()
         positions = get_real_positions()
         current_balance = get_real_balance()
+        trades = trade_stats.summary()
         
         stats_msg = f"""
 📈 *СТАТИСТИКА ТОРГОВЛИ*
@@ -739,13 +719,19 @@ def _process_command(chat_id: str, command: str):
 • Незакрытый: {pnl_data['unrealized']:+.2f} USDT
 • Общий: {pnl_data['total']:+.2f} USDT
 
+📉 *Сделки:*
+• Закрыто: {trades['trades']} (win rate {trades['win_rate']:.1f}%)
+• Sharpe (на сделку): {trades['sharpe']:.2f}
+• Profit factor: {trades['profit_factor']:.2f}
+• Макс. просадка: {trades['max_drawdown']:.2f} USDT ({trades['max_drawdown_pct']:.1f}%)
+
 📊 *Режим:* {TRADING_MODE.upper()}
 ⚡ *Статус:* {'АКТИВЕН' if not trading_paused else 'НА ПАУЗЕ'}
 🤖 *Автоторговля:* {'ВКЛ' if auto_trading else 'ВЫКЛ'}
 
 🕐 *Отчет:* {datetime.now().strftime('%H:%M:%S')}
 """
-        send_to_me(stats_msg)
+        _reply(stats_msg)
     
     elif cmd == '/settings':
         current_balance = get_real_balance()
@@ -768,10 +754,10 @@ def _process_command(chat_id: str, command: str):
 
 🕐 *Обновлено:* {datetime.now().strftime('%H:%M:%S')}
 """
-        send_to_me(settings_msg)
+        _reply(settings_msg)
     
     elif cmd == '/help':
-        send_to_me("""
+        _reply("""
 📋 *ВСЕ КОМАНДЫ*
 
 /start - Начало работы
@@ -784,21 +770,39 @@ def _process_command(chat_id: str, command: str):
 /reset - Сброс аварии
 /stats - Статистика торговли
 /settings - Настройки бота
+/logs [N] - Журнал сделок, страница N с конца
 /help - Эта справка
 
 ⚠️ *Только вы можете управлять ботом*
 """)
     
+    elif cmd.split()[:1] == ['/logs']:
+        # Страница журнала с конца: индекс смещений, без чтения всего файла
+        from logger import get_logs_page
+        parts = cmd.split()
+        page = int(parts[1]) - 1 if len(parts) > 1 and parts[1].isdigit() and int(parts[1]) > 0 else 0
+        entries, pages = get_logs_page(page, 10)
+        if not entries:
+            _reply(f"📭 Записей нет (страниц: {pages})")
+        else:
+            lines = [f"📒 *Журнал сделок* - страница {page + 1}/{pages}\n"]
+            for e in entries:
+                lines.append(f"`{str(e.get('timestamp', ''))[5:19]}` {e.get('action')} {e.get('side')} "
+                             f"{e.get('symbol')} @ {e.get('price')} PnL {float(e.get('pnl') or 0):+.2f}")
+            _reply("\n".join(lines))
+    
     else:
-        send_to_me("❓ Неизвестная команда. Используйте /help")
+        _reply("❓ Неизвестная команда. Используйте /help")
 
 # ========== ИНТЕГРАЦИОННЫЕ ФУНКЦИИ ==========
 def should_trade() -> bool:
     """Проверка, можно ли торговать"""
+    trading_paused, auto_trading, emergency_stop = _control_flags()
     return not trading_paused and not emergency_stop and auto_trading
 
 def get_trading_status() -> Dict:
     """Получение статуса торговли"""
+    trading_paused, auto_trading, emergency_stop = _control_flags()
     return {
         "paused": trading_paused,
         "active": not emergency_stop,
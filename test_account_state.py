@@ -0,0 +1,135 @@
+"""Применение событий user-data stream и сверка с REST (account_state.py)"""
+import time
+
+from account_state import AccountState
+
+
+def _account_update(event_ms, amt, entry="30000", up="0", wb="100", cw="100", symbol="BTCUSDT"):
+    return {"e": "ACCOUNT_UPDATE", "E": event_ms, "a": {
+        "m": "ORDER",
+        "B": [{"a": "USDT", "wb": wb, "cw": cw, "bc": "0"}],
+        "P": [{"s": symbol, "pa": amt, "ep": entry, "up": up, "mt": "cross", "ps": "BOTH"}],
+    }}
+
+
+class _FakeClient:
+    def __init__(self, account, open_orders=()):
+        self.account = account
+        self.client = self
+        self._open_orders = list(open_orders)
+
+    def get_account_info(self):
+        return self.account
+
+    def futures_get_open_orders(self):
+        return self._open_orders
+
+
+def test_account_update_keeps_bot_metadata():
+    cache = {"positions": {"BTCUSDT": {"source": "binance_real_pending", "status": "PENDING",
+                                        "tp_price": 31000.0, "sl_price": 29500.0}}}
+    state = AccountState(cache)
+    state.apply_account_update(_account_update(1000, "0.01", up="5"))
+
+    pos = state.get_position("BTCUSDT")
+    assert pos["side"] == "BUY" and pos["quantity"] == 0.01
+    assert abs(pos["mark_price"] - 30500.0) < 1e-6
+
+    bot_pos = cache["positions"]["BTCUSDT"]
+    assert bot_pos["status"] == "OPEN" and bot_pos["qty"] == 0.01
+    assert bot_pos["tp_price"] == 31000.0 and bot_pos["sl_price"] == 29500.0
+
+    # Устаревшее событие не перетирает более новое
+    state.apply_account_update(_account_update(900, "0.02"))
+    assert state.get_position("BTCUSDT")["quantity"] == 0.01
+
+    state.apply_account_update(_account_update(1100, "0"))
+    assert state.get_position("BTCUSDT") is None
+    assert "BTCUSDT" not in cache["positions"]
+
+
+def test_balance_follows_wallet_changes():
+    state = AccountState({})
+    client = _FakeClient({"assets": [{"asset": "USDT", "walletBalance": "100",
+                                      "crossWalletBalance": "100", "availableBalance": "80"}],
+                          "positions": []})
+    assert state.reconcile(client)
+    state.apply_account_update({"E": int(time.time() * 1000) + 1000,
+                                "a": {"B": [{"a": "USDT", "wb": "95", "cw": "95"}], "P": []}})
+    assert state.get_balance("USDT") == 75.0
+
+
+def test_reconcile_and_liveness():
+    state = AccountState({})
+    state.apply_account_update(_account_update(1, "0.5", symbol="ETHUSDT"))
+    client = _FakeClient(
+        {"assets": [], "positions": [
+            {"symbol": "BTCUSDT", "positionAmt": "-0.1", "entryPrice": "30000",
+             "unrealizedProfit": "10", "notional": "-2900", "leverage": "10", "positionSide": "BOTH"},
+        ]},
+        open_orders=[{"symbol": "BTCUSDT", "orderId": 7, "side": "BUY", "type": "STOP_MARKET",
+                      "status": "NEW", "origQty": "0.1", "stopPrice": "31000", "reduceOnly": True}],
+    )
+    assert not state.is_live()
+    state.set_stream_alive(True)
+    assert state.reconcile(client)
+    assert state.is_live()
+
+    assert state.get_position("ETHUSDT") is None
+    pos = state.get_position("BTCUSDT")
+    assert pos["side"] == "SELL" and pos["mark_price"] == 29000.0 and pos["leverage"] == 10
+    assert [o["orderId"] for o in state.get_open_orders("BTCUSDT")] == [7]
+
+    state.set_stream_alive(False)
+    assert not state.is_live()
+
+
+def test_snapshot_is_fetched_without_touching_state():
+    cache = {"positions": {"BTCUSDT": {"source": "binance_real", "status": "OPEN", "qty": 0.01}}}
+    state = AccountState(cache)
+    state.apply_account_update(_account_update(1, "0.01"))
+    client = _FakeClient({"assets": [], "positions": []})
+
+    # Снимок читается в потоке - позиции бота и счёта там не меняются
+    snapshot = state.fetch_snapshot(client)
+    assert state.get_position("BTCUSDT") is not None and "BTCUSDT" in cache["positions"]
+    assert state.last_reconcile == 0.0
+
+    state.apply_snapshot(snapshot)
+    assert state.get_position("BTCUSDT") is None and "BTCUSDT" not in cache["positions"]
+    assert state.last_reconcile > 0
+    assert state.fetch_snapshot(_FakeClient(None)) is None
+
+    state.update_mark("BTCUSDT", 31000.0)  # позиции уже нет
+
+
+def test_external_close_goes_to_close_listeners():
+    cache = {"positions": {
+        "BTCUSDT": {"source": "binance_real", "status": "OPEN", "side": "BUY", "qty": 0.01,
+                    "entry": 30000.0, "strategy": "bb_rsi"},
+        "ETHUSDT": {"source": "binance_real", "status": "OPEN", "closing": True},
+        "SOLUSDT": {"source": "binance_real", "status": "OPEN", "protective_orders": {"SL": {}}},
+    }}
+    state = AccountState(cache)
+    closed = []
+    state.add_close_listener(lambda symbol, pos, mark: closed.append((symbol, pos["strategy"], mark)))
+    for i, symbol in enumerate(("BTCUSDT", "ETHUSDT", "SOLUSDT")):
+        state.apply_account_update(_account_update(1000 + i, "0.01", up="5", symbol=symbol))
+    state.update_mark("BTCUSDT", 30200.0)
+    assert closed == []
+
+    for i, symbol in enumerate(("BTCUSDT", "ETHUSDT", "SOLUSDT")):
+        state.apply_account_update(_account_update(2000 + i, "0", symbol=symbol))
+
+    # CLOSE пишется только за позицию, закрытую в обход бота, по последнему mark price
+    assert closed == [("BTCUSDT", "bb_rsi", 30200.0)]
+    assert sorted(cache["positions"]) == ["ETHUSDT", "SOLUSDT"]
+
+
+if __name__ == "__main__":
+    test_account_update_keeps_bot_metadata()
+    test_balance_follows_wallet_changes()
+    test_reconcile_and_liveness()
+    test_snapshot_is_fetched_without_touching_state()
+    test_external_close_goes_to_close_listeners()
+    print("✅ Состояние счёта обновляется корректно")
@@ -0,0 +1,87 @@
+"""Асинхронный REST-клиент (async_binance_client.py): подпись, общий пул, лимиты"""
+import asyncio
+import hashlib
+import hmac
+from urllib.parse import parse_qsl
+
+import httpx
+
+from async_binance_client import AsyncBinanceClient
+from rate_limiter import RateLimiter
+
+
+def _client(handler, limiter=None):
+    return AsyncBinanceClient("key", "secret", testnet=True,
+                              limiter=limiter or RateLimiter(weight_limit=2400),
+                              transport=httpx.MockTransport(handler))
+
+
+def test_signed_request():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json=[{
+            "symbol": "BTCUSDT", "positionAmt": "-0.010", "entryPrice": "50000",
+            "markPrice": "49000", "unRealizedProfit": "10", "leverage": "5",
+        }, {
+            "symbol": "ETHUSDT", "positionAmt": "0", "entryPrice": "0",
+            "markPrice": "3000", "unRealizedProfit": "0", "leverage": "5",
+        }])
+
+    client = _client(handler)
+    positions = asyncio.run(client.get_positions(fresh=True))
+    assert positions == [{
+        'symbol': 'BTCUSDT', 'side': 'SELL', 'quantity': 0.01, 'entry_price': 50000.0,
+        'mark_price': 49000.0, 'unrealized_pnl': 10.0, 'leverage': 5,
+    }]
+
+    request = seen[0]
+    assert request.headers["X-MBX-APIKEY"] == "key"
+    query = request.url.query.decode()
+    payload, signature = query.rsplit("&signature=", 1)
+    assert signature == hmac.new(b"secret", payload.encode(), hashlib.sha256).hexdigest()
+    assert "timestamp" in dict(parse_qsl(payload))
+
+
+def test_concurrent_calls_share_pool_and_limiter():
+    limiter = RateLimiter(weight_limit=2400)
+
+    def handler(request):
+        return httpx.Response(200, json=[[0, "1", "2", "0.5", "1.5", "10"]],
+                              headers={"X-MBX-USED-WEIGHT-1M": "42"})
+
+    client = _client(handler, limiter)
+
+    async def main():
+        results = await asyncio.gather(*(client.get_klines(s, limit=500)
+                                         for s in ("BTCUSDT", "ETHUSDT", "BNBUSDT")))
+        session = client._session()
+        await client.close()
+        return results, session
+
+    results, session = asyncio.run(main())
+    assert all(len(r) == 1 for r in results)
+    assert client.requests == 3
+    assert session.is_closed
+    assert limiter.acquired == 3
+    assert limiter.server_weight == 42
+
+
+def test_api_error_backoff():
+    limiter = RateLimiter(weight_limit=2400)
+
+    def handler(request):
+        return httpx.Response(429, json={"code": -1003, "msg": "Too many requests"},
+                              headers={"Retry-After": "7"})
+
+    client = _client(handler, limiter)
+    assert asyncio.run(client.get_ticker_price("BTCUSDT")) == 0.0
+    assert limiter._poll(0, 0, 0) > 5
+
+
+if __name__ == "__main__":
+    test_signed_request()
+    test_concurrent_calls_share_pool_and_limiter()
+    test_api_error_backoff()
+    print("✅ Асинхронный клиент работает")
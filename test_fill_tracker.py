@@ -0,0 +1,55 @@
+"""Подтверждение исполнения ордеров (fill_tracker.py) без обращения к Binance"""
+import threading
+
+from fill_tracker import FillTracker, confirm_fill
+
+
+class _FakeClient:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def get_order_status(self, symbol, order_id):
+        self.calls += 1
+        return self.statuses.pop(0) if self.statuses else None
+
+
+def _order(status, qty="0", price="0", client_id="bot-1"):
+    return {"symbol": "BTCUSDT", "side": "BUY", "status": status, "orderId": 1,
+            "clientOrderId": client_id, "executedQty": qty, "avgPrice": price}
+
+
+def test_result_response_needs_no_requests():
+    client = _FakeClient([])
+    fill = confirm_fill(client, "BTCUSDT", _order("FILLED", "0.01", "30000"), tracker=FillTracker())
+    assert fill["source"] == "response"
+    assert fill["executed_qty"] == 0.01 and fill["avg_price"] == 30000.0
+    assert client.calls == 0
+
+
+def test_stream_event_confirms_fill():
+    tracker = FillTracker()
+    tracker.stream_alive = True
+    client = _FakeClient([])
+
+    event = {"s": "BTCUSDT", "S": "BUY", "X": "FILLED", "i": 1, "c": "bot-1", "z": "0.01", "ap": "30010"}
+    threading.Timer(0.05, tracker.on_order_update, args=(event,)).start()
+
+    fill = confirm_fill(client, "BTCUSDT", _order("NEW"), tracker=tracker, timeout=2)
+    assert fill["source"] == "stream"
+    assert fill["avg_price"] == 30010.0
+    assert client.calls == 0
+
+
+def test_poll_fallback_without_stream():
+    client = _FakeClient([_order("NEW"), _order("FILLED", "0.01", "29990")])
+    fill = confirm_fill(client, "BTCUSDT", _order("NEW"), tracker=FillTracker())
+    assert fill["source"] == "poll" and fill["status"] == "FILLED"
+    assert client.calls == 2
+
+
+if __name__ == "__main__":
+    test_result_response_needs_no_requests()
+    test_stream_event_confirms_fill()
+    test_poll_fallback_without_stream()
+    print("✅ Подтверждение исполнения работает")
@@ -0,0 +1,103 @@
+"""Сверка потоковых индикаторов (indicators.py) с pandas-версиями из utils.py"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from data_store import KlineStore
+from indicators import IndicatorEngine, SymbolIndicators
+from utils import bol_h, bol_l, rsi, ema200, atr
+
+TOLERANCE = 1e-7
+
+
+def _random_klines(n=700, seed=42, base=30000.0):
+    rng = np.random.default_rng(seed)
+    close = base + np.cumsum(rng.normal(0, base * 0.002, n))
+    high = close + rng.random(n) * base * 0.001
+    low = close - rng.random(n) * base * 0.001
+    times = np.arange(n, dtype=np.int64) * 300_000
+    return times, high, low, close
+
+
+def _expected(high, low, close):
+    return {
+        "bol_upper": bol_h(close).iloc[-1],
+        "bol_lower": bol_l(close).iloc[-1],
+        "rsi": rsi(close).iloc[-1],
+        "ema200": ema200(close).iloc[-1],
+        "atr": atr(high, low, close).iloc[-1],
+    }
+
+
+def _assert_close(actual, expected, where=""):
+    for key, exp in expected.items():
+        got = actual[key]
+        if math.isnan(exp):
+            assert math.isnan(got), f"{key} {where}: ожидали NaN, получили {got}"
+        else:
+            assert math.isclose(got, exp, rel_tol=TOLERANCE, abs_tol=1e-9), \
+                f"{key} {where}: {got} != {exp}"
+
+
+def test_seed_matches_pandas():
+    """Инициализация по истории даёт те же значения, что и pandas"""
+    times, high, low, close = _random_klines()
+    for n in (1, 2, 14, 15, 39, 40, 41, 200, 700):
+        state = SymbolIndicators()
+        snap = state.seed(times[:n], high[:n], low[:n], close[:n])
+        _assert_close(snap, _expected(high[:n], low[:n], close[:n]), f"n={n}")
+
+
+def test_streaming_matches_pandas():
+    """Потоковые обновления (включая формирующуюся свечу) совпадают с pandas"""
+    times, high, low, close = _random_klines()
+    rng = np.random.default_rng(7)
+
+    state = SymbolIndicators()
+    state.seed(times[:300], high[:300], low[:300], close[:300])
+
+    for i in range(300, len(close)):
+        # Несколько промежуточных обновлений формирующейся свечи
+        for _ in range(3):
+            c = close[i] + rng.normal(0, 5)
+            h = max(high[i], c)
+            l = min(low[i], c)
+            snap = state.update(times[i], h, l, c)
+            hh = np.append(high[:i], h)
+            ll = np.append(low[:i], l)
+            cc = np.append(close[:i], c)
+            if i % 50 == 0:
+                _assert_close(snap, _expected(hh, ll, cc), f"i={i} forming")
+        snap = state.update(times[i], high[i], low[i], close[i])
+        _assert_close(snap, _expected(high[:i + 1], low[:i + 1], close[:i + 1]), f"i={i}")
+
+
+def test_engine_reseeds_after_history_reload():
+    """IndicatorEngine подхватывает перезагрузку истории в KlineStore"""
+    times, high, low, close = _random_klines(n=400)
+    store = KlineStore(capacity=500)
+    engine = IndicatorEngine(store)
+
+    df = pd.DataFrame(
+        {"Open": close, "High": high, "Low": low, "Close": close, "Volume": np.ones(len(close))},
+        index=pd.to_datetime(times[:len(close)], unit="ms"),
+    )
+    store.load_frame("BTCUSDT", df.iloc[:350])
+    engine.on_kline("BTCUSDT", times[349], high[349], low[349], close[349])
+
+    for i in range(350, 400):
+        store.update("BTCUSDT", int(times[i]), close[i], high[i], low[i], close[i], 1.0)
+        snap = engine.on_kline("BTCUSDT", times[i], high[i], low[i], close[i])
+    _assert_close(snap, _expected(high, low, close), "after stream")
+
+    store.load_frame("BTCUSDT", df.iloc[:200])
+    snap = engine.on_kline("BTCUSDT", times[199], high[199], low[199], close[199])
+    _assert_close(snap, _expected(high[:200], low[:200], close[:200]), "after reload")
+
+
+if __name__ == "__main__":
+    test_seed_matches_pandas()
+    test_streaming_matches_pandas()
+    test_engine_reseeds_after_history_reload()
+    print("✅ Потоковые индикаторы совпадают с pandas")
@@ -0,0 +1,67 @@
+"""Фоновая запись журнала сделок (journal.py)"""
+import json
+import os
+import tempfile
+
+import pytest
+
+import journal as journal_module
+from journal import Journal
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batches_flush_and_close():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "positions_log.json")
+        journal = Journal(path, batch_size=10, flush_interval=60, fsync_interval=3600)
+
+        for i in range(25):
+            journal.append({"action": "OPEN", "symbol": "BTCUSDT", "price": float(i)})
+        assert journal.flush(timeout=5)
+        assert [e["price"] for e in _read(path)] == [float(i) for i in range(25)]
+        # fsync_interval не истёк - синхронизирует только flush()
+        assert journal.batches >= 3 and journal.fsyncs == 1
+
+        # Хвост очереди пишется при остановке, даже без flush
+        journal.append({"action": "CLOSE", "symbol": "BTCUSDT", "pnl": 1.5})
+        journal.close()
+        assert _read(path)[-1] == {"action": "CLOSE", "symbol": "BTCUSDT", "pnl": 1.5}
+        assert journal.written == journal.enqueued == 26
+
+
+
+def test_flush_fsyncs_the_last_batch(monkeypatch):
+    synced_sizes = []
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        synced_sizes.append(os.fstat(fd).st_size)
+        real_fsync(fd)
+
+    monkeypatch.setattr(journal_module.os, "fsync", fsync)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "positions_log.json")
+        journal = Journal(path, batch_size=4, flush_interval=60, fsync_interval=3600)
+
+        for round_ in range(20):
+            for i in range(7):
+                journal.append({"round": round_, "i": i})
+            if round_ % 2:
+                assert journal.flush(timeout=5, fsync=False)
+            else:
+                assert journal.flush(timeout=5)
+                # Всё, что было в очереди до flush, уже на диске и синхронизировано
+                assert synced_sizes[-1] == os.path.getsize(path)
+        assert journal.fsyncs == 10 and journal.written == 140
+        journal.close()
+
+
+if __name__ == "__main__":
+    test_batches_flush_and_close()
+    with pytest.MonkeyPatch.context() as mp:
+        test_flush_fsyncs_the_last_batch(mp)
+    print("✅ Все тесты journal пройдены")
@@ -0,0 +1,89 @@
+"""Кольцевой буфер свечей и совместимый с dict klines_cache (data_store.py)"""
+import numpy as np
+import pandas as pd
+
+from data_store import KlineStore, KlinesCacheFacade
+
+MINUTE = 60_000
+
+
+def _candle(i, close=None):
+    close = 100.0 + i if close is None else close
+    return i * MINUTE, close - 1, close + 1, close - 2, close, 10.0 + i
+
+
+def test_append_and_update_forming_candle():
+    store = KlineStore(capacity=8)
+    assert store.update("BTCUSDT", *_candle(0)) == "append"
+    assert store.update("BTCUSDT", *_candle(1)) == "append"
+
+    # Формирующаяся свеча перезаписывается на месте
+    assert store.update("BTCUSDT", *_candle(1, close=150.0)) == "update"
+    assert store.update("BTCUSDT", *_candle(0)) == "stale"
+    arrays = store.arrays("BTCUSDT")
+    assert arrays["Close"].tolist() == [100.0, 150.0]
+    assert arrays["Time"].tolist() == [0, MINUTE]
+    assert store.length("BTCUSDT") == 2 and store.closed_count("BTCUSDT") == 1
+    assert not arrays["Close"].flags.writeable
+
+
+def test_wraparound_keeps_last_candles_contiguous():
+    store = KlineStore(capacity=4)
+    for i in range(11):
+        store.update("ETHUSDT", *_candle(i))
+
+    arrays = store.arrays("ETHUSDT")
+    assert store.length("ETHUSDT") == 4
+    assert arrays["Close"].tolist() == [107.0, 108.0, 109.0, 110.0]
+    assert arrays["Time"].tolist() == [i * MINUTE for i in range(7, 11)]
+    # Срез без копирования поверх зеркального буфера
+    assert np.shares_memory(arrays["Close"], store._symbols["ETHUSDT"].data)
+
+    store.update("ETHUSDT", *_candle(10, close=99.0))
+    assert store.arrays("ETHUSDT")["Close"][-1] == 99.0
+
+
+def test_frame_view_is_rebuilt_only_after_changes():
+    store = KlineStore(capacity=16)
+    for i in range(5):
+        store.update("BTCUSDT", *_candle(i))
+
+    df = store.frame("BTCUSDT")
+    assert list(df.columns) == ["Open", "High", "Low", "Close", "Volume"]
+    assert df.index[0] == pd.Timestamp(0, unit="ms") and len(df) == 5
+    assert store.frame("BTCUSDT") is df
+
+    store.update("BTCUSDT", *_candle(4, close=200.0))
+    df2 = store.frame("BTCUSDT")
+    assert df2 is not df and df2["Close"].iloc[-1] == 200.0
+    assert store.frame("SOLUSDT") is None
+
+
+def test_dict_facade():
+    store = KlineStore(capacity=3)
+    cache = KlinesCacheFacade(store)
+    index = pd.date_range("2024-01-01", periods=5, freq="min")
+    df = pd.DataFrame({"Open": range(5), "High": range(5), "Low": range(5),
+                       "Close": [float(x) for x in range(5)], "Volume": range(5)}, index=index)
+
+    cache["BTCUSDT"] = df
+    assert "BTCUSDT" in cache and len(cache) == 1 and list(cache) == ["BTCUSDT"]
+    assert cache["BTCUSDT"]["Close"].tolist() == [2.0, 3.0, 4.0]  # хвост по ёмкости
+    assert cache.get("ETHUSDT") is None
+    assert store.generation("BTCUSDT") == 1 and store.closed_count("BTCUSDT") == 0
+
+    del cache["BTCUSDT"]
+    assert "BTCUSDT" not in cache and len(cache) == 0
+    try:
+        cache["BTCUSDT"]
+        assert False, "ожидался KeyError"
+    except KeyError:
+        pass
+
+
+if __name__ == "__main__":
+    test_append_and_update_forming_candle()
+    test_wraparound_keeps_last_candles_contiguous()
+    test_frame_view_is_rebuilt_only_after_changes()
+    test_dict_facade()
+    print("✅ Все тесты kline store пройдены")
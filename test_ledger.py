@@ -0,0 +1,71 @@
+"""Журнал сделок в SQLite (ledger.py)"""
+import json
+import os
+import tempfile
+
+from journal import Journal
+from ledger import Ledger
+
+
+def _entry(i, action, symbol="BTCUSDT", pnl=0.0):
+    return {"timestamp": f"2024-01-01T00:00:{i:02d}.000000", "action": action, "symbol": symbol,
+            "side": "BUY", "price": 100.0 + i, "qty": 1.0, "pnl": pnl}
+
+
+def _append(path, entries, tail=""):
+    with open(path, "a", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+        f.write(tail)
+
+
+def test_ingest_once_and_running_totals():
+    with tempfile.TemporaryDirectory() as tmp:
+        source, db = os.path.join(tmp, "positions_log.json"), os.path.join(tmp, "ledger.db")
+        _append(source, [_entry(1, "OPEN"), _entry(2, "CLOSE", pnl=5.0),
+                         _entry(3, "OPEN", "ETHUSDT"), _entry(4, "CLOSE", "ETHUSDT", pnl=-2.0)],
+                tail="{\n")  # мусор от перезаписи файла JSON-документом
+        ledger = Ledger(db, source)
+
+        assert [e["price"] for e in ledger.recent(2)] == [103.0, 104.0]
+        totals = ledger.totals()
+        assert (totals["total_trades"], totals["winning_trades"], totals["total_pnl"]) == (2, 1, 3.0)
+        assert ledger.totals("ETHUSDT")["win_rate"] == 0
+        assert [e["symbol"] for e in ledger.history(action="close")] == ["BTCUSDT", "ETHUSDT"]
+
+        # Незаконченная строка дочитывается, когда допишется
+        _append(source, [], tail=json.dumps(_entry(5, "CLOSE", pnl=1.0)))
+        assert ledger.catch_up() == 0
+        _append(source, [], tail="\n")
+        assert ledger.catch_up() == 1
+        assert ledger.catch_up() == 0
+
+        # Пересозданный файл с уже загруженными записями не дублирует сделки
+        os.remove(source)
+        _append(source, [_entry(5, "CLOSE", pnl=1.0)])
+        assert ledger.catch_up() == 0
+        assert ledger.totals()["total_trades"] == 3
+        ledger.close()
+
+        # Итоги переживают перезапуск
+        assert Ledger(db, source).totals()["total_pnl"] == 4.0
+
+
+def test_follows_journal_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "positions_log.json")
+        ledger = Ledger(os.path.join(tmp, "ledger.db"), source)
+        journal = Journal(source, flush_interval=60)
+        journal.add_listener(ledger.on_journal_batch)
+
+        for i in range(5):
+            journal.append(_entry(i, "CLOSE", pnl=1.0))
+        assert journal.flush(timeout=5)
+        assert ledger.totals()["total_trades"] == 5
+        journal.close()
+
+
+if __name__ == "__main__":
+    test_ingest_once_and_running_totals()
+    test_follows_journal_batches()
+    print("✅ Все тесты ledger пройдены")
@@ -0,0 +1,59 @@
+"""Хвост и страницы журнала сделок без чтения всего файла (log_reader.py)"""
+import json
+import os
+import tempfile
+
+from log_reader import LineIndex, read_tail, tail_lines
+
+
+def _write(path, start, stop, mode="a"):
+    with open(path, mode, encoding="utf-8") as f:
+        for i in range(start, stop):
+            f.write(json.dumps({"n": i, "action": "OPEN"}) + "\n")
+
+
+def test_tail_reads_backwards_in_blocks():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "positions_log.json")
+        _write(path, 0, 500)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"trading_mode": "real",\n')  # обрывок JSON-документа
+        _write(path, 500, 503)
+
+        assert [e["n"] for e in read_tail(path, 5)] == [499, 500, 501, 502]
+        # Маленький блок: строки собираются через границы блоков
+        assert [json.loads(l)["n"] for l in tail_lines(path, 3, block_size=7)] == [500, 501, 502]
+        assert len(read_tail(path, 10_000)) == 503
+        assert read_tail(os.path.join(tmp, "missing.json"), 5) == []
+
+
+def test_line_index_pages_and_appends():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "positions_log.json")
+        _write(path, 0, 95)
+        index = LineIndex(path, every=8)
+
+        entries, pages = index.page(0, 10)
+        assert pages == 10 and [e["n"] for e in entries] == list(range(85, 95))
+        assert [e["n"] for e in index.page(9, 10)[0]] == list(range(0, 5))
+        assert index.page(10, 10)[0] == []
+
+        # Дозапись досчитывается с прежней позиции; индекс переживает перезапуск
+        _write(path, 95, 100)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"n": 100')  # незаконченная запись
+        assert index.refresh() == 100
+        restarted = LineIndex(path, every=8)
+        restarted._load()
+        assert restarted.lines == 100 and len(restarted.offsets) == 13
+        assert [e["n"] for e in restarted.page(0, 3)[0]] == [97, 98, 99]
+
+        # Пересозданный файл - индекс строится заново
+        _write(path, 0, 3, mode="w")
+        assert index.refresh() == 3 and [e["n"] for e in index.page(0, 10)[0]] == [0, 1, 2]
+
+
+if __name__ == "__main__":
+    test_tail_reads_backwards_in_blocks()
+    test_line_index_pages_and_appends()
+    print("✅ Все тесты log_reader пройдены")
@@ -0,0 +1,73 @@
+"""Типизированные записи и хранилище позиций (models.py)"""
+import threading
+
+from models import Fill, Order, Position, PositionStore
+
+
+def test_position_legacy_access_and_store():
+    store = PositionStore()
+    store["AUSDT"] = {"side": "SELL", "quantity": 2.0, "entry_price": 50.0, "tp": 45.0,
+                      "source": "binance_real", "note": "manual"}
+    pos = store["AUSDT"]
+    assert isinstance(pos, Position) and pos.symbol == "AUSDT"
+    assert (pos.qty, pos.entry, pos.tp_price) == (2.0, 50.0, 45.0)
+    assert pos["qty"] == pos.get("quantity") == 2.0 and pos["note"] == "manual"
+    assert pos.is_real and pos.direction == -1 and pos.pnl_at(48.0) == 4.0
+
+    # Пустое значение - отсутствующий ключ, как у словарей прежнего формата
+    assert "sl_price" not in pos and pos.get("sl_price", 1.0) == 1.0
+    pos.update({"sl_price": 52.0, "trailing_active": True})
+    assert pos.pop("sl_price") == 52.0 and pos.sl_price is None
+    assert pos.pop("trailing_active") is True and pos.trailing_active is False
+    assert {**pos}["entry"] == 50.0 and "tp_price" in dict(pos.items())
+
+    # Объект хранится как есть: ссылки trigger_engine остаются валидными
+    opened = Position(symbol="BUSDT", qty=1.0, entry=10.0)
+    store["BUSDT"] = opened
+    assert store["BUSDT"] is opened
+    assert [p.symbol for p in store.real_positions()] == ["AUSDT"]
+    assert len(store.open_positions()) == 2
+
+
+def test_order_and_fill_records():
+    event = {"s": "BTCUSDT", "i": 7, "c": "sl-1", "S": "SELL", "o": "STOP_MARKET", "X": "NEW",
+             "q": "0.1", "z": "0", "p": "0", "sp": "29000", "R": True, "ap": "0"}
+    order = Order.from_event(event)
+    assert order["orderId"] == 7 and order.stop_price == 29000.0
+    assert order.to_rest()["stopPrice"] == 29000.0 and order.to_rest()["reduceOnly"] is True
+
+    fill = Fill.from_rest({"symbol": "BTCUSDT", "status": "FILLED", "orderId": 1,
+                           "executedQty": "0.01", "avgPrice": "30000"})
+    assert fill["executed_qty"] == 0.01 and fill.avg_price == 30000.0 and fill.source == "response"
+    assert Fill.from_event(event).status == "NEW"
+    assert not hasattr(fill, "__dict__")
+
+
+
+def test_store_iterates_over_snapshot_while_threads_write():
+    store = PositionStore({f"S{i}USDT": Position(symbol=f"S{i}USDT", qty=1.0) for i in range(50)})
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            store[f"W{i % 20}USDT"] = Position(symbol=f"W{i % 20}USDT", qty=1.0)
+            store.pop(f"W{(i + 10) % 20}USDT", None)
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            # Без блокировки перебор падал бы с "dictionary changed size during iteration"
+            for symbol, pos in store.items():
+                assert pos.symbol == symbol
+            assert len(list(store)) >= 50 and len(store.open_positions()) >= 50
+    finally:
+        stop.set()
+        thread.join()
+if __name__ == "__main__":
+    test_position_legacy_access_and_store()
+    test_order_and_fill_records()
+    test_store_iterates_over_snapshot_while_threads_write()
+    print("✅ Все тесты models пройдены")
@@ -0,0 +1,191 @@
+"""Combined-stream свечей (multiplex_stream.py) на поддельном WebSocket"""
+import asyncio
+import json
+
+import pytest
+
+import multiplex_stream
+from multiplex_stream import (FUTURES_STREAM_URL, FUTURES_TESTNET_STREAM_URL, MultiplexKlineStream,
+                              StreamShard, combined_stream_url, kline_stream_name, reconnect_delay,
+                              stream_base_url)
+
+
+class FakeSocket:
+    def __init__(self, messages=()):
+        self.messages = list(messages)
+        self.sent = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def send(self, raw):
+        self.sent.append(json.loads(raw))
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for msg in self.messages:
+            yield json.dumps(msg)
+
+
+class FakeConnect:
+    """websockets.connect: по очереди отдаёт сокеты или бросает исключения"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.urls = []
+
+    def __call__(self, url, **kwargs):
+        self.urls.append(url)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _fake_sleep(monkeypatch, stop_after):
+    """asyncio.sleep без ожидания; после stop_after пауз переподключения - отмена"""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+        if len(delays) >= stop_after:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(multiplex_stream.asyncio, "sleep", sleep)
+    return delays
+
+
+def test_stream_names_and_urls():
+    assert kline_stream_name("BTCUSDT", "5m") == "btcusdt@kline_5m"
+    assert stream_base_url("real") == FUTURES_STREAM_URL == "wss://fstream.binance.com/stream"
+    assert stream_base_url("test") == FUTURES_TESTNET_STREAM_URL
+    assert combined_stream_url(FUTURES_STREAM_URL) == FUTURES_STREAM_URL
+    assert (combined_stream_url(FUTURES_STREAM_URL, {"ethusdt@kline_5m", "btcusdt@kline_5m"})
+            == FUTURES_STREAM_URL + "?streams=btcusdt@kline_5m/ethusdt@kline_5m")
+    assert [reconnect_delay(i) for i in range(7)] == [1, 2, 5, 10, 30, 30, 30]
+
+
+def test_messages_are_routed_by_symbol(monkeypatch):
+    received = []
+
+    async def on_btc(data):
+        received.append(data["k"]["c"])
+
+    async def broken(data):
+        raise ValueError("ошибка обработчика")
+
+    socket = FakeSocket([
+        {"result": None, "id": 1},
+        {"error": {"code": 2, "msg": "Invalid request"}, "id": 2},
+        {"stream": "btcusdt@kline_1m", "data": {"s": "BTCUSDT", "k": {"c": "100.5"}}},
+        {"stream": "ethusdt@kline_1m", "data": {"s": "ETHUSDT", "k": {"c": "1"}}},
+        {"stream": "xrpusdt@kline_1m", "data": {"s": "XRPUSDT", "k": {"c": "0.5"}}},
+        {"stream": "btcusdt@kline_1m", "data": {"s": "BTCUSDT", "k": {"c": "101.0"}}},
+    ])
+    connect = FakeConnect([socket])
+    _fake_sleep(monkeypatch, stop_after=1)
+
+    async def scenario():
+        stream = MultiplexKlineStream(interval="1m", handler=on_btc)
+        await stream.add_symbols(["BTCUSDT"])
+        await stream.add_symbols(["ETHUSDT"], handler=broken)
+        shard = stream.shards[0]
+        shard.connect = connect
+        with pytest.raises(asyncio.CancelledError):
+            await shard._run()
+
+    asyncio.run(scenario())
+    # Ошибка обработчика ETH и чужой символ не прерывают приём
+    assert received == ["100.5", "101.0"]
+    # Подписки переданы в URL, отдельных SUBSCRIBE нет
+    assert connect.urls[0].endswith("?streams=btcusdt@kline_1m/ethusdt@kline_1m")
+    assert socket.sent == []
+
+
+def test_reconnect_backoff_and_resubscribe(monkeypatch):
+    connect = FakeConnect([OSError("refused"), OSError("refused"), OSError("refused"),
+                           FakeSocket(), OSError("refused"), OSError("refused")])
+    delays = _fake_sleep(monkeypatch, stop_after=6)
+
+    async def dispatch(data):
+        pass
+
+    async def scenario():
+        shard = StreamShard(FUTURES_STREAM_URL, dispatch, connect=connect)
+        shard.streams.update({"btcusdt@kline_5m", "ethusdt@kline_5m"})
+        with pytest.raises(asyncio.CancelledError):
+            await shard._run()
+        return shard
+
+    shard = asyncio.run(scenario())
+    # Удачное подключение сбрасывает паузу к началу
+    assert delays == [1, 2, 5, 1, 2, 5]
+    assert len(connect.urls) == 6
+    assert all(url == combined_stream_url(FUTURES_STREAM_URL, shard.streams) for url in connect.urls)
+    assert not shard.connected.is_set()
+
+
+def test_subscriptions_are_batched_within_rate_limit(monkeypatch):
+    real_sleep = asyncio.sleep
+    pauses = []
+
+    async def sleep(delay):
+        pauses.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(multiplex_stream.asyncio, "sleep", sleep)
+
+    async def dispatch(data):
+        pass
+
+    async def scenario():
+        shard = StreamShard(FUTURES_STREAM_URL, dispatch)
+        shard._ws = FakeSocket()
+        # Символы готовы по одному, как после warm_up
+        await asyncio.gather(*(shard.subscribe([f"s{i}@kline_5m"]) for i in range(30)))
+        await shard.subscribe([f"b{i}@kline_5m" for i in range(120)])
+        await shard.unsubscribe(["s0@kline_5m"])
+        return shard._ws.sent
+
+    sent = asyncio.run(scenario())
+    assert [(m["method"], len(m["params"])) for m in sent] == [
+        ("SUBSCRIBE", 1), ("SUBSCRIBE", 29), ("SUBSCRIBE", 50), ("SUBSCRIBE", 50),
+        ("SUBSCRIBE", 20), ("UNSUBSCRIBE", 1)]
+    assert [m["id"] for m in sent] == list(range(1, 7))
+    # Пауза только между сообщениями, а не после каждого символа
+    assert len(pauses) == len(sent) - 1
+    assert all(0 < p <= multiplex_stream.SUBSCRIBE_PAUSE for p in pauses)
+
+
+def test_symbols_are_sharded_and_removed():
+    async def handler(data):
+        pass
+
+    async def scenario():
+        stream = MultiplexKlineStream(interval="5m", handler=handler, streams_per_connection=2)
+        await stream.add_symbols(["AUSDT", "BUSDT", "CUSDT", "DUSDT", "EUSDT"])
+        assert [len(shard) for shard in stream.shards] == [2, 2, 1]
+        await stream.remove_symbols(["BUSDT", "EUSDT"])
+        assert [len(shard) for shard in stream.shards] == [1, 2, 0]
+        # Освободившееся место занимается без нового соединения
+        await stream.add_symbols(["FUSDT"])
+        return stream
+
+    stream = asyncio.run(scenario())
+    assert len(stream.shards) == 3 and sorted(stream.symbols()) == ["AUSDT", "CUSDT", "DUSDT", "FUSDT"]
+    assert "fusdt@kline_5m" in stream.shards[0].streams
+
+
+if __name__ == "__main__":
+    test_stream_names_and_urls()
+    for test in (test_messages_are_routed_by_symbol, test_reconnect_backoff_and_resubscribe,
+                 test_subscriptions_are_batched_within_rate_limit):
+        with pytest.MonkeyPatch.context() as mp:
+            test(mp)
+    test_symbols_are_sharded_and_removed()
+    print("✅ Все тесты multiplex_stream пройдены")
@@ -0,0 +1,129 @@
+"""Неблокирующая очередь уведомлений Telegram (notifier.py)"""
+import threading
+import time
+
+from notifier import MAX_MESSAGE_LENGTH, Notifier
+
+
+class FakeTelegram:
+    """Записывает отправки; replies - заранее заданные ответы (True/False/retry_after)"""
+
+    def __init__(self, replies=(), on_send=None):
+        self.replies = list(replies)
+        self.on_send = on_send
+        self.calls = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, chat_id, text, parse_mode):
+        with self.lock:
+            self.calls.append((time.monotonic(), chat_id, text, parse_mode))
+            self.threads.add(threading.current_thread().name)
+            reply = self.replies.pop(0) if self.replies else True
+        if self.on_send:
+            self.on_send(len(self.calls))
+        return reply
+
+
+def test_burst_is_coalesced_without_blocking():
+    telegram = FakeTelegram()
+    # Окно склейки не истекает само - отправку запускает только flush()
+    notifier = Notifier(telegram, window=60, chat_interval=0.0, channel_interval=0.0)
+
+    for i in range(20):
+        assert notifier.enqueue(1, f"сигнал {i}")
+    notifier.enqueue("-1001", "канал")
+    assert telegram.calls == [] and notifier.pending() == 21
+
+    assert notifier.flush(timeout=5)
+    texts = {chat: text for _, chat, text, _ in telegram.calls}
+    assert len(telegram.calls) == 2
+    # HTTP-запросы только в потоке notifier, вызывающие их не ждут
+    assert telegram.threads == {"notifier"}
+    assert texts["1"] == "\n\n".join(f"сигнал {i}" for i in range(20))
+    assert texts["-1001"] == "канал"
+    assert (notifier.sent, notifier.merged) == (2, 20)
+    notifier.close()
+
+
+def test_duplicates_parse_mode_and_length():
+    telegram = FakeTelegram()
+    notifier = Notifier(telegram, window=60, chat_interval=0.0, dedup_ttl=60)
+
+    assert notifier.enqueue(1, "⚠️ ошибка")
+    assert not notifier.enqueue(1, "⚠️ ошибка")
+    assert notifier.enqueue(2, "⚠️ ошибка")  # другой чат - не повтор
+    notifier.enqueue(1, "html", parse_mode="HTML")
+    long_text = "x" * (MAX_MESSAGE_LENGTH - 4)  # с "html" в одно сообщение не влезает
+    notifier.enqueue(1, long_text, parse_mode="HTML")
+    assert notifier.flush(timeout=5)
+
+    chat1 = [(text, mode) for _, chat, text, mode in telegram.calls if chat == "1"]
+    assert chat1 == [("⚠️ ошибка", "Markdown"), ("html", "HTML"), (long_text, "HTML")]
+    assert notifier.duplicates == 1
+    notifier.close()
+
+
+def test_command_replies_are_not_deduplicated():
+    telegram = FakeTelegram()
+    notifier = Notifier(telegram, window=0.0, chat_interval=0.0, dedup_ttl=60)
+
+    # Повторный /pause должен получить ответ
+    for _ in range(2):
+        assert notifier.enqueue(1, "✅ Торговля приостановлена", dedup=False)
+        assert notifier.flush(timeout=5)
+    # Ответы не мешают первому такому же уведомлению
+    assert notifier.enqueue(1, "✅ Торговля приостановлена")
+    assert notifier.flush(timeout=5)
+
+    assert [text for _, _, text, _ in telegram.calls] == ["✅ Торговля приостановлена"] * 3
+    assert notifier.duplicates == 0
+    notifier.close()
+
+
+def test_rate_limits_and_retry_after():
+    notifier = None
+
+    def second_during_first(call):
+        if call == 1:
+            notifier.enqueue(1, "второе")
+
+    # Первый ответ - 429 с retry_after; пока он идёт, приходит второе сообщение
+    telegram = FakeTelegram(replies=[0.2], on_send=second_during_first)
+    notifier = Notifier(telegram, window=0.0, chat_interval=0.1, global_rate=1000)
+
+    notifier.enqueue(1, "первое")
+    assert notifier.flush(timeout=5)
+
+    times = [t for t, *_ in telegram.calls]
+    assert [text for _, _, text, _ in telegram.calls] == ["первое", "первое\n\nвторое"]
+    assert times[1] - times[0] >= 0.2
+    assert notifier.sent == 1 and notifier.errors == 0
+
+    # Отправки в один чат не чаще chat_interval
+    for i in range(3):
+        notifier.enqueue(1, f"m{i}")
+        notifier.flush(timeout=5)
+    times = [t for t, *_ in telegram.calls[2:]]
+    assert all(b - a >= 0.1 for a, b in zip(times, times[1:]))
+    notifier.close()
+
+
+def test_queue_is_bounded():
+    telegram = FakeTelegram()
+    notifier = Notifier(telegram, window=60, max_pending=5)
+    for i in range(8):
+        notifier.enqueue(1, f"m{i}")
+    assert notifier.pending() == 5 and notifier.dropped == 3
+    assert notifier.flush(timeout=5)
+    assert telegram.calls[0][2] == "\n\n".join(f"m{i}" for i in range(3, 8))
+    notifier.close()
+
+
+if __name__ == "__main__":
+    test_burst_is_coalesced_without_blocking()
+    test_duplicates_parse_mode_and_length()
+    test_command_replies_are_not_deduplicated()
+    test_rate_limits_and_retry_after()
+    test_queue_is_bounded()
+    print("✅ Все тесты notifier пройдены")
@@ -0,0 +1,93 @@
+"""Кеш оптимизации (optimization_cache.py): отпечаток данных, TTL, вытеснение"""
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import optimizer
+from optimization_cache import OptimizationCache
+
+GRID = [{"period": p} for p in (10, 20)]
+
+
+def _frame(n: int = 200, start: str = "2024-01-01", drift: float = 0.0) -> pd.DataFrame:
+    close = 100 + np.sin(np.arange(n) / 5) + drift
+    return pd.DataFrame({"Open": close, "High": close + 0.5, "Low": close - 0.5,
+                         "Close": close, "Volume": 1.0},
+                        index=pd.date_range(start, periods=n, freq="5min"))
+
+
+def test_lookup_follows_data_movement():
+    cache = OptimizationCache(path=None, max_new_bars=3, max_price_move=0.01)
+    df = _frame()
+    cache.store("BTCUSDT", "breakout", GRID, df, {"period": 10}, 510.0)
+
+    assert cache.lookup("BTCUSDT", "breakout", GRID, df) == {"params": {"period": 10}, "equity": 510.0}
+    # Другая сетка - другой ключ
+    assert cache.lookup("BTCUSDT", "breakout", GRID[:1], df) is None
+    # Два новых бара и небольшой сдвиг цены - берём из кеша
+    moved = _frame(start="2024-01-01 00:10")
+    assert cache.lookup("BTCUSDT", "breakout", GRID, moved) is not None
+    # Много новых баров или сильный сдвиг цены - переоптимизация
+    assert cache.lookup("BTCUSDT", "breakout", GRID, _frame(start="2024-01-02")) is None
+    assert cache.lookup("BTCUSDT", "breakout", GRID, _frame(drift=5.0)) is None
+
+
+def test_ttl_lru_and_disk():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "opt.json")
+        cache = OptimizationCache(path=path, max_entries=2)
+        df = _frame()
+        for symbol in ("A", "B"):
+            cache.store(symbol, "breakout", GRID, df, {"period": 20}, 500.0)
+        assert cache.lookup("A", "breakout", GRID, df) is not None   # A свежее B
+        cache.store("C", "breakout", GRID, df, {"period": 20}, 500.0)
+        assert cache.lookup("B", "breakout", GRID, df) is None        # B вытеснен
+        cache.save()
+
+        reloaded = OptimizationCache(path=path, max_entries=2)
+        assert reloaded.lookup("A", "breakout", GRID, df) is not None
+        assert reloaded.lookup("C", "breakout", GRID, df) is not None
+
+        expired = OptimizationCache(path=path, ttl=0)
+        time.sleep(0.01)
+        assert expired.lookup("A", "breakout", GRID, df) is None
+
+
+def test_optimizer_skips_cached_symbols():
+    cache = OptimizationCache(path=None)
+    frames = {"AUSDT": _frame(), "BUSDT": _frame(drift=1.0)}
+    grids = {"breakout": GRID}
+    calls = []
+    original = optimizer.run_backtest
+
+    def counting(df, strategy, params):
+        calls.append(params["period"])
+        return 500.0 + params["period"]
+
+    optimizer.run_backtest = counting
+    try:
+        with ThreadPoolExecutor(2) as pool:
+            first = asyncio.run(optimizer.optimize_symbols(
+                list(frames), grids, executor=pool, frames=frames, vectorized=False, cache=cache))
+            n_first = len(calls)
+            frames["BUSDT"] = _frame(drift=10.0)
+            second = asyncio.run(optimizer.optimize_symbols(
+                list(frames), grids, executor=pool, frames=frames, vectorized=False, cache=cache))
+    finally:
+        optimizer.run_backtest = original
+
+    assert n_first == 4
+    assert len(calls) - n_first == 2    # только BUSDT
+    assert first["AUSDT"] == second["AUSDT"] == {"breakout": {"params": {"period": 20}, "equity": 520.0}}
+
+
+if __name__ == "__main__":
+    test_lookup_follows_data_movement()
+    test_ttl_lru_and_disk()
+    test_optimizer_skips_cached_symbols()
+    print("✅ Кеш оптимизации работает")
@@ -0,0 +1,57 @@
+"""Оптимизация параметров (optimizer.py): пул процессов, результаты как данные"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from optimizer import optimize_symbols, rank_symbols, run_backtest, best_results
+from strategies import BBRSI_EMA_Strategy, Breakout_Strategy
+
+GRIDS = {
+    "bbrsi": [{"bol_period": p, "bol_dev": 2, "rsi_period": 14} for p in (20, 30)],
+    "breakout": [{"period": p} for p in (10, 20)],
+}
+
+
+def _frame(seed: int, n: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    spread = np.abs(rng.normal(0, 0.004, n)) * close
+    return pd.DataFrame({
+        "Open": close, "High": close + spread, "Low": close - spread,
+        "Close": close, "Volume": rng.uniform(1, 10, n),
+    }, index=pd.date_range("2024-01-01", periods=n, freq="5min"))
+
+
+def test_pool_matches_sequential_and_keeps_classes():
+    frames = {"AUSDT": _frame(1), "BUSDT": _frame(2), "SHORTUSDT": _frame(3, n=50)}
+    defaults = (BBRSI_EMA_Strategy.bol_period, Breakout_Strategy.period)
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        results = asyncio.run(optimize_symbols(list(frames), GRIDS, executor=pool, frames=frames,
+                                                 vectorized=False, cache=None))
+
+    jobs = [(s, strategy, p) for s in ("AUSDT", "BUSDT")
+            for strategy, grid in GRIDS.items() for p in grid]
+    expected = best_results(jobs, [run_backtest(frames[s], strategy, p) for s, strategy, p in jobs])
+
+    assert results == expected
+    assert set(results) == {"AUSDT", "BUSDT"}   # короткая история пропущена
+    assert (BBRSI_EMA_Strategy.bol_period, Breakout_Strategy.period) == defaults
+
+    top = rank_symbols(results, top_n=1)
+    assert len(top) == 1 and top[0][0] in results
+
+
+def test_best_results_first_wins_on_tie():
+    jobs = [("X", "breakout", {"period": 10}), ("X", "breakout", {"period": 20}),
+            ("X", "breakout", {"period": 30})]
+    results = best_results(jobs, [5.0, 5.0, None])
+    assert results["X"]["breakout"] == {"params": {"period": 10}, "equity": 5.0}
+
+
+if __name__ == "__main__":
+    test_pool_matches_sequential_and_keeps_classes()
+    test_best_results_first_wins_on_tie()
+    print("✅ Оптимизация работает")
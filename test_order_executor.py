@@ -0,0 +1,96 @@
+"""Очередь намерений и пул исполнителя ордеров (order_executor.py)"""
+import asyncio
+import threading
+
+from order_executor import OrderExecutor, OrderIntent
+
+
+def _intent(symbol, job, action="OPEN"):
+    return OrderIntent(action, symbol, job=job, side="BUY", price=1.0)
+
+
+async def _until_taken(executor):
+    """Дождаться, пока воркеры разберут очередь"""
+    while executor.queue.qsize():
+        await asyncio.sleep(0)
+
+
+def test_dedup_per_symbol_and_bounded_queue():
+    gate = threading.Event()
+    done = []
+
+    def job(symbol):
+        def run():
+            gate.wait(5)
+            done.append(symbol)
+            return symbol
+        return run
+
+    async def scenario():
+        executor = OrderExecutor(max_queue=2, workers=1)
+        assert executor.submit(_intent("AUSDT", job("AUSDT")))
+        await _until_taken(executor)
+
+        # По символу уже есть необработанное намерение
+        assert not executor.submit(_intent("AUSDT", job("AUSDT"), action="CLOSE"))
+        assert executor.submit(_intent("BUSDT", job("BUSDT")))
+        assert executor.submit(_intent("CUSDT", job("CUSDT")))
+        # Очередь заполнена - намерение отбрасывается, вызывающий не ждёт
+        assert not executor.submit(_intent("DUSDT", job("DUSDT")))
+        assert executor.dropped == 1 and executor.stats()["queue_depth"] == 2
+
+        gate.set()
+        await executor.stop(timeout=5)
+        executor.pool.shutdown(wait=True)
+        return executor
+
+    executor = asyncio.run(scenario())
+    assert done == ["AUSDT", "BUSDT", "CUSDT"]
+    assert (executor.submitted, executor.completed, executor.failed) == (3, 3, 0)
+    assert executor.stats()["in_flight"] == 0
+
+
+def test_stop_drains_accepted_intents():
+    order = []
+
+    async def scenario():
+        executor = OrderExecutor(max_queue=10, workers=2)
+        waiters = [asyncio.ensure_future(executor.execute(_intent(s, lambda s=s: order.append(s) or s)))
+                   for s in ("AUSDT", "BUSDT", "CUSDT")]
+        await asyncio.sleep(0)
+        await executor.stop(timeout=5)
+        results = await asyncio.gather(*waiters)
+        executor.pool.shutdown(wait=True)
+        return executor, results
+
+    executor, results = asyncio.run(scenario())
+    assert results == ["AUSDT", "BUSDT", "CUSDT"] and sorted(order) == results
+    assert executor.completed == 3 and executor.dropped == 0
+
+
+def test_stop_releases_waiters_after_timeout():
+    gate = threading.Event()
+
+    async def scenario():
+        executor = OrderExecutor(max_queue=10, workers=1)
+        assert executor.submit(_intent("AUSDT", lambda: gate.wait(5)))
+        await _until_taken(executor)
+        waiter = asyncio.ensure_future(executor.execute(_intent("BUSDT", lambda: "never")))
+        await asyncio.sleep(0)
+
+        await executor.stop(timeout=0.05)
+        result = await waiter
+        gate.set()
+        executor.pool.shutdown(wait=True)
+        return executor, result
+
+    executor, result = asyncio.run(scenario())
+    assert result is None
+    assert executor.dropped == 1 and executor.stats()["in_flight"] == 0
+
+
+if __name__ == "__main__":
+    test_dedup_per_symbol_and_bounded_queue()
+    test_stop_drains_accepted_intents()
+    test_stop_releases_waiters_after_timeout()
+    print("✅ Все тесты order_executor пройдены")
@@ -0,0 +1,97 @@
+"""Симуляция PnL (pnl_utils.py): векторная версия совпадает с проходом по ценам"""
+import numpy as np
+import pandas as pd
+
+from data_store import kline_store, user_data_cache
+from pnl_utils import simulate_positions_pnl, simulate_realtime_pnl, simulate_realtime_pnl_many, _position_params
+
+
+def _reference_pnl(prices, pos):
+    """Прежняя реализация simulate_realtime_pnl: цикл по ценам"""
+    entry, qty, side = pos["entry"], pos["qty"], pos["side"]
+    tp = pos.get("tp", entry * (1.01 if side == "BUY" else 0.99))
+    sl = pos.get("sl", entry * (0.98 if side == "BUY" else 1.02))
+    trail_percent = pos.get("trail_percent", 0.5) / 100.0
+    trailing_active = False
+    if side == "BUY":
+        max_price = entry
+        for price in prices:
+            max_price = max(max_price, price)
+            if not trailing_active and price >= entry * (1 + 0.002):
+                trailing_active = True
+            if tp is not None and price >= tp:
+                return (tp - entry) * qty
+            if sl is not None and price <= sl:
+                return (sl - entry) * qty
+            if trailing_active and price < max_price * (1 - trail_percent):
+                pnl = (price - entry) * qty
+                if pnl > 0:
+                    return pnl
+        return (prices[-1] - entry) * qty
+    min_price = entry
+    for price in prices:
+        min_price = min(min_price, price)
+        if not trailing_active and price <= entry * (1 - 0.002):
+            trailing_active = True
+        if tp is not None and tp <= price:
+            return (entry - tp) * qty
+        if sl is not None and price >= sl:
+            return (entry - sl) * qty
+        if trailing_active and price > min_price * (1 + trail_percent):
+            pnl = (entry - price) * qty
+            if pnl > 0:
+                return pnl
+    return (entry - prices[-1]) * qty
+
+
+def _random_position(rng, prices):
+    entry = float(prices[0] * rng.uniform(0.99, 1.01))
+    side = "BUY" if rng.random() < 0.5 else "SELL"
+    pos = {"entry": entry, "qty": float(rng.uniform(0.01, 2)), "side": side}
+    sign = 1 if side == "BUY" else -1
+    choice = rng.integers(4)
+    if choice == 1:
+        pos["tp"], pos["sl"] = None, None
+    elif choice == 2:
+        pos["tp"] = entry * (1 + sign * rng.uniform(0.001, 0.05))
+        pos["sl"] = entry * (1 - sign * rng.uniform(0.001, 0.05))
+    elif choice == 3:
+        pos["tp"] = None
+        pos["trail_percent"] = float(rng.uniform(0.1, 2.0))
+    return pos
+
+
+def test_matches_reference_loop():
+    rng = np.random.default_rng(42)
+    rows, positions = [], []
+    for _ in range(300):
+        n = int(rng.integers(1, 400))
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+        rows.append(prices)
+        positions.append(_random_position(rng, prices))
+
+    batched = simulate_positions_pnl(rows, [_position_params(p) for p in positions])
+    expected = [_reference_pnl(r, p) for r, p in zip(rows, positions)]
+    assert np.array_equal(batched, np.array(expected))
+
+
+def test_cache_api():
+    close = np.linspace(100, 103, 50)
+    df = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1.0},
+                      index=pd.date_range("2024-01-01", periods=50, freq="5min"))
+    kline_store.load_frame("PNLTESTUSDT", df)
+    user_data_cache["positions"]["PNLTESTUSDT"] = {"entry": 100.0, "qty": 2.0, "side": "BUY",
+                                                  "tp": 102.0, "sl": 99.0}
+    try:
+        assert simulate_realtime_pnl("PNLTESTUSDT") == 4.0
+        assert simulate_realtime_pnl_many()["PNLTESTUSDT"] == 4.0
+        assert simulate_realtime_pnl("NOPOSUSDT") is None
+    finally:
+        user_data_cache["positions"].pop("PNLTESTUSDT", None)
+        kline_store.remove("PNLTESTUSDT")
+
+
+if __name__ == "__main__":
+    test_matches_reference_loop()
+    test_cache_api()
+    print("✅ Симуляция PnL работает")
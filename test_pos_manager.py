@@ -0,0 +1,127 @@
+"""Поиск открытой позиции (pos_manager.get_open_position) без обращения к Binance"""
+import asyncio
+
+import pytest
+
+import pos_manager
+from data_store import user_data_cache
+from models import Position, SOURCE_REAL
+
+
+class _FakeClient:
+    def __init__(self, positions):
+        self.positions = positions
+
+    def is_connected(self):
+        return True
+
+    def get_positions(self, fresh=False, strict=False):
+        if isinstance(self.positions, Exception):
+            if strict:
+                raise self.positions
+            return []
+        return list(self.positions)
+
+
+class _FakeAsyncClient:
+    def __init__(self, positions):
+        self.positions = positions
+
+    async def get_positions(self, fresh=False, strict=False):
+        return list(self.positions)
+
+
+class _SyncForbidden(_FakeClient):
+    def get_positions(self, fresh=False, strict=False):
+        raise AssertionError("синхронный REST из event loop")
+
+
+def _exchange(symbol, side="BUY", qty=0.5, entry=100.0):
+    return {"symbol": symbol, "side": side, "quantity": qty, "entry_price": entry,
+            "mark_price": entry, "unrealized_pnl": 0.0, "leverage": 10}
+
+
+def _real_mode(monkeypatch, positions):
+    closed = []
+    monkeypatch.setattr(pos_manager, "log_external_close", lambda symbol, pos: closed.append(symbol))
+    monkeypatch.setattr(pos_manager, "TRADING_MODE", "real")
+    monkeypatch.setattr(pos_manager, "global_client", _FakeClient(positions))
+    monkeypatch.setitem(user_data_cache, "positions", type(user_data_cache["positions"])())
+    return closed
+
+
+def test_real_mode_prefers_stored_position(monkeypatch):
+    _real_mode(monkeypatch, [_exchange("BTCUSDT")])
+    stored = Position(symbol="BTCUSDT", side="BUY", qty=0.5, entry=100.0, status="OPEN",
+                      source=SOURCE_REAL, tp_price=104.0, sl_price=98.0)
+    user_data_cache["positions"]["BTCUSDT"] = stored
+
+    assert pos_manager.get_open_position("BTCUSDT") is stored
+
+
+def test_real_mode_falls_back_to_exchange_snapshot(monkeypatch):
+    _real_mode(monkeypatch, [_exchange("ETHUSDT", side="SELL", qty=2.0, entry=50.0)])
+
+    pos = pos_manager.get_open_position("ETHUSDT")
+    assert isinstance(pos, Position)
+    assert (pos.side, pos.qty, pos.entry, pos.source) == ("SELL", 2.0, 50.0, SOURCE_REAL)
+
+
+def test_real_mode_drops_position_missing_on_exchange(monkeypatch):
+    closed = _real_mode(monkeypatch, [])
+    user_data_cache["positions"]["SOLUSDT"] = Position(
+        symbol="SOLUSDT", side="BUY", qty=1.0, entry=20.0, status="OPEN", source=SOURCE_REAL)
+
+    assert pos_manager.get_open_position("SOLUSDT") is None
+    assert "SOLUSDT" not in user_data_cache["positions"]
+    assert closed == ["SOLUSDT"]
+
+
+def test_real_mode_keeps_positions_it_cannot_confirm(monkeypatch):
+    closed = _real_mode(monkeypatch, ConnectionError("timeout"))
+    positions = user_data_cache["positions"]
+    positions["SOLUSDT"] = Position(symbol="SOLUSDT", side="BUY", qty=1.0, entry=20.0,
+                                    status="OPEN", source=SOURCE_REAL)
+    # Ошибка запроса - не пустой снимок: позиция не закрывается
+    assert pos_manager.get_open_position("SOLUSDT") is None
+    assert "SOLUSDT" in positions
+
+    # Закрытие самого бота и защитного ордера записывают их владельцы
+    monkeypatch.setattr(pos_manager, "global_client", _FakeClient([]))
+    positions["SOLUSDT"]["closing"] = True
+    positions["ADAUSDT"] = Position(symbol="ADAUSDT", side="BUY", qty=1.0, entry=1.0, status="OPEN",
+                                    source=SOURCE_REAL, protective_orders={"SL": {}})
+    assert pos_manager.get_open_position("SOLUSDT") is None
+    assert pos_manager.get_open_position("ADAUSDT") is None
+    assert sorted(positions) == ["ADAUSDT", "SOLUSDT"] and closed == []
+
+
+def test_async_lookup_skips_sync_client(monkeypatch):
+    _real_mode(monkeypatch, [])
+    monkeypatch.setattr(pos_manager, "global_client", _SyncForbidden([]))
+    monkeypatch.setattr(pos_manager, "async_client",
+                        _FakeAsyncClient([_exchange("BTCUSDT", side="SELL", qty=1.5)]))
+
+    pos = asyncio.run(pos_manager.get_open_position_async("BTCUSDT"))
+    assert (pos.side, pos.qty, pos.source) == ("SELL", 1.5, SOURCE_REAL)
+    assert asyncio.run(pos_manager.get_open_position_async("ETHUSDT")) is None
+
+
+def test_dryrun_reads_cache(monkeypatch):
+    monkeypatch.setattr(pos_manager, "TRADING_MODE", "dryrun")
+    monkeypatch.setitem(user_data_cache, "positions", type(user_data_cache["positions"])())
+    pos = Position(symbol="BTCUSDT", side="BUY", qty=1.0, entry=100.0, status="OPEN")
+    user_data_cache["positions"]["BTCUSDT"] = pos
+
+    assert pos_manager.get_open_position("BTCUSDT") is pos
+    assert pos_manager.get_open_position("ETHUSDT") is None
+
+
+if __name__ == "__main__":
+    for test in (test_real_mode_prefers_stored_position, test_real_mode_falls_back_to_exchange_snapshot,
+                 test_real_mode_drops_position_missing_on_exchange,
+                 test_real_mode_keeps_positions_it_cannot_confirm, test_async_lookup_skips_sync_client,
+                 test_dryrun_reads_cache):
+        with pytest.MonkeyPatch.context() as mp:
+            test(mp)
+    print("✅ Все тесты pos_manager пройдены")
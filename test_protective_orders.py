@@ -0,0 +1,127 @@
+"""Защитные ордера на бирже (protective_orders.py) без обращения к Binance"""
+import itertools
+
+import pytest
+
+import protective_orders as protective_module
+from account_state import AccountState
+from protective_orders import ProtectiveOrders
+from trigger_engine import TriggerEngine
+
+
+class _FakeClient:
+    def __init__(self, open_orders=()):
+        self.open_orders = list(open_orders)
+        self.placed = []
+        self.cancelled = []
+        self._ids = itertools.count(100)
+
+    def place_stop_order(self, symbol, side, order_type, quantity, stop_price=None,
+                         callback_rate=None, activation_price=None, client_order_id=None):
+        self.placed.append((symbol, side, order_type, stop_price))
+        return {"orderId": next(self._ids), "clientOrderId": client_order_id}
+
+    def cancel_order(self, symbol, order_id):
+        self.cancelled.append((symbol, order_id))
+        return {"orderId": order_id}
+
+    def get_open_orders(self, symbol=None):
+        return list(self.open_orders)
+
+
+class _InlinePool:
+    def submit(self, func, *args):
+        return func(*args)
+
+
+def _position(symbol="PROTUSDT"):
+    return {"symbol": symbol, "side": "BUY", "qty": 1.0, "entry": 100.0, "status": "OPEN",
+            "tp_price": 103.0, "sl_price": 99.0, "trail_percent": 0.005,
+            "highest_price": 100.0, "lowest_price": 100.0, "trailing_active": False}
+
+
+def test_protect_amend_and_dropped_order():
+    client, engine = _FakeClient(), TriggerEngine(activation=0.01)
+    pos = _position()
+    manager = ProtectiveOrders(client=client, enabled=True, min_step=0.001, engine=engine,
+                               cache={"positions": {"PROTUSDT": pos}}, pool=_InlinePool())
+
+    manager.protect("PROTUSDT", pos)
+    engine.track("PROTUSDT", pos)
+    assert [(side, t) for _, side, t, _ in client.placed] == [("SELL", "STOP_MARKET"),
+                                                             ("SELL", "TAKE_PROFIT_MARKET")]
+    assert set(pos["protective_orders"]) == {"SL", "TP"}
+
+    # TP/SL исполняет биржа: локально уровни не срабатывают, трейлинг переносит стоп
+    assert engine.on_price("PROTUSDT", 102.0) == []
+    old_sl = client.placed[0]
+    assert client.placed[-1][2] == "STOP_MARKET" and float(client.placed[-1][3]) > 101
+    assert len(client.cancelled) == 1 and manager.amended == 1
+    assert pos["protective_orders"]["SL"]["stop_price"] != float(old_sl[3])
+
+    # Сдвиг меньше min_step не двигает ордер
+    engine.on_price("PROTUSDT", 102.05)
+    assert manager.amended == 1
+
+    # Биржа сняла TP - уровень снова проверяет trigger_engine
+    tp = pos["protective_orders"]["TP"]
+    manager.on_order_update({"o": {"c": tp["client_order_id"], "X": "EXPIRED"}})
+    assert set(pos["protective_orders"]) == {"SL"}
+    assert [f.reason for f in engine.on_price("PROTUSDT", 103.5)] == ["TAKE_PROFIT"]
+
+
+def test_fill_after_account_update_is_logged(monkeypatch):
+    closes = []
+    monkeypatch.setattr(protective_module, "log_position", lambda **kw: closes.append(kw))
+    client, engine = _FakeClient(), TriggerEngine()
+    pos = dict(_position(), source="binance_real", strategy="bb_rsi")
+    cache = {"positions": {"PROTUSDT": pos}}
+    manager = ProtectiveOrders(client=client, enabled=True, engine=engine, cache=cache,
+                               pool=_InlinePool())
+    account = AccountState(cache)
+    manager.protect("PROTUSDT", pos)
+    tp, sl = pos["protective_orders"]["TP"], pos["protective_orders"]["SL"]
+
+    # Биржа закрыла позицию по TP: ACCOUNT_UPDATE (pa=0) приходит раньше исполнения
+    account.apply_account_update({"E": 1000, "a": {"B": [], "P": [
+        {"s": "PROTUSDT", "pa": "0", "ep": "0", "up": "0", "ps": "BOTH"}]}})
+    assert "PROTUSDT" in cache["positions"]
+
+    manager.on_order_update({"o": {"s": "PROTUSDT", "c": tp["client_order_id"], "i": tp["order_id"],
+                                   "X": "FILLED", "ap": "103.0", "z": "1.0"}})
+    assert "PROTUSDT" not in cache["positions"]
+    assert [(c["action"], c["price"], c["pnl"], c["exit_reason"], c["strategy"]) for c in closes] == [
+        ("CLOSE", 103.0, 3.0, "TAKE_PROFIT", "bb_rsi")]
+    # Оставшийся SL отменён, повторное событие ничего не пишет
+    assert client.cancelled == [("PROTUSDT", sl["order_id"])]
+    account.apply_account_update({"E": 1001, "a": {"B": [], "P": [
+        {"s": "PROTUSDT", "pa": "0", "ep": "0", "up": "0", "ps": "BOTH"}]}})
+    assert len(closes) == 1 and manager.exits == 1
+
+
+def test_reconcile_after_restart():
+    open_orders = [
+        {"symbol": "PROTUSDT", "orderId": 1, "clientOrderId": "sl-a", "stopPrice": "98.5", "updateTime": 1},
+        {"symbol": "PROTUSDT", "orderId": 2, "clientOrderId": "sl-b", "stopPrice": "99.5", "updateTime": 2},
+        {"symbol": "GONEUSDT", "orderId": 3, "clientOrderId": "tp-c", "stopPrice": "5", "updateTime": 1},
+        {"symbol": "PROTUSDT", "orderId": 4, "clientOrderId": "manual-1", "stopPrice": "90", "updateTime": 1},
+    ]
+    client, engine = _FakeClient(open_orders), TriggerEngine()
+    pos = _position()
+    manager = ProtectiveOrders(client=client, enabled=True, engine=engine,
+                               cache={"positions": {"PROTUSDT": pos}}, pool=_InlinePool())
+
+    stats = manager.reconcile()
+    assert stats == {"attached": 1, "placed": 1, "cancelled": 2}
+    assert sorted(client.cancelled) == [("GONEUSDT", 3), ("PROTUSDT", 1)]
+    assert pos["protective_orders"]["SL"]["order_id"] == 2
+    assert [t for _, _, t, _ in client.placed] == ["TAKE_PROFIT_MARKET"]
+    assert engine.symbols() == ["PROTUSDT"]
+
+
+if __name__ == "__main__":
+    test_protect_amend_and_dropped_order()
+    with pytest.MonkeyPatch.context() as mp:
+        test_fill_after_account_update_is_logged(mp)
+    test_reconcile_after_restart()
+    print("✅ Все тесты protective_orders пройдены")
@@ -0,0 +1,80 @@
+"""Лимитер запросов (rate_limiter.py): веса, резерв для закрытий, синхронизация с сервером"""
+import asyncio
+import time
+
+from rate_limiter import (
+    RateLimiter, endpoint_weight, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW,
+)
+
+
+def test_endpoint_weights():
+    assert endpoint_weight("futures_exchange_info") == 1
+    assert endpoint_weight("futures_position_information") == 5
+    assert endpoint_weight("futures_klines", limit=500) == 5
+    assert endpoint_weight("futures_klines", limit=99) == 1
+    assert endpoint_weight("futures_ticker") == 40
+    assert endpoint_weight("futures_ticker", symbol="BTCUSDT") == 1
+
+
+def test_reserve_keeps_room_for_closes():
+    limiter = RateLimiter(weight_limit=100, orders_per_10s=10, orders_per_min=100)
+    # Справочные запросы выбирают вес только до резерва (25%)
+    for _ in range(75):
+        assert limiter._poll(1, 0, PRIORITY_LOW) == 0
+    assert limiter._poll(1, 0, PRIORITY_LOW) > 0
+    # Обычные - до 10%, закрытия - до нуля
+    for _ in range(15):
+        assert limiter._poll(1, 0, PRIORITY_NORMAL) == 0
+    assert limiter._poll(1, 0, PRIORITY_NORMAL) > 0
+    assert limiter._poll(0, 1, PRIORITY_HIGH) == 0
+    assert limiter.acquire_sync(5, PRIORITY_HIGH) < 1.0
+
+
+def test_headers_sync_and_backoff():
+    limiter = RateLimiter(weight_limit=100)
+    limiter.update_from_headers({"X-MBX-USED-WEIGHT-1M": "90"})
+    assert limiter.weight.tokens <= 10
+    assert limiter._poll(1, 0, PRIORITY_LOW) > 0
+
+    limiter.backoff(30)
+    assert limiter._poll(0, 0, PRIORITY_HIGH) > 25
+
+
+def test_async_acquire_does_not_block_loop():
+    limiter = RateLimiter(weight_limit=60)   # 1 единица веса в секунду
+    limiter.update_from_headers({"X-MBX-USED-WEIGHT-1M": "60"})
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+    async def main():
+        waited, _ = await asyncio.gather(limiter.acquire(1, PRIORITY_HIGH), ticker())
+        return waited
+
+    waited = asyncio.run(main())
+    assert waited > 0.5
+    assert len(ticks) == 5
+
+
+def test_sync_wait_on_event_loop_is_counted():
+    limiter = RateLimiter(weight_limit=600)   # 10 единиц веса в секунду
+    limiter.update_from_headers({"X-MBX-USED-WEIGHT-1M": "600"})
+
+    async def main():
+        limiter.acquire_sync(1, PRIORITY_HIGH)
+
+    asyncio.run(main())
+    limiter.acquire_sync(1, PRIORITY_HIGH)  # из обычного потока - штатно
+    assert limiter.stats()["loop_blocked"] == 1
+
+
+if __name__ == "__main__":
+    test_endpoint_weights()
+    test_reserve_keeps_room_for_closes()
+    test_headers_sync_and_backoff()
+    test_async_acquire_does_not_block_loop()
+    test_sync_wait_on_event_loop_is_counted()
+    print("✅ Лимитер запросов работает")
@@ -0,0 +1,89 @@
+"""Сверка позиций с биржей (reconciler.py) без обращения к Binance"""
+import asyncio
+import time
+
+import pytest
+
+from reconciler import PositionReconciler, CHANGED, CLOSED, OPENED
+from trigger_engine import TriggerEngine
+
+
+class _FakeClient:
+    def __init__(self, positions=None, error=None):
+        self.positions = positions or []
+        self.error = error
+        self.calls = 0
+
+    async def get_positions(self, fresh=False, strict=False):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return list(self.positions)
+
+
+def _exchange(symbol, amt, entry, mark):
+    return {"symbol": symbol, "side": "BUY" if amt > 0 else "SELL", "quantity": abs(amt),
+            "entry_price": entry, "mark_price": mark, "unrealized_pnl": (mark - entry) * amt,
+            "leverage": 10}
+
+
+def test_merge_keeps_local_fields_and_publishes_events():
+    old = time.time() - 60
+    local = {
+        "AUSDT": {"symbol": "AUSDT", "side": "BUY", "qty": 1.0, "entry": 100.0, "status": "OPEN",
+                  "source": "binance_real", "timestamp": old, "tp_price": 104.0, "sl_price": 99.0,
+                  "trailing_active": True, "order_id": 7},
+        "BUSDT": {"symbol": "BUSDT", "side": "SELL", "qty": 2.0, "entry": 50.0, "status": "OPEN",
+                  "source": "binance_real", "timestamp": old},
+        # Открыта после запроса снимка - не удаляется
+        "CUSDT": {"symbol": "CUSDT", "side": "BUY", "qty": 1.0, "entry": 10.0, "status": "OPEN",
+                  "source": "binance_real", "timestamp": time.time() + 5},
+        "VUSDT": {"symbol": "VUSDT", "side": "BUY", "qty": 1.0, "entry": 1.0, "status": "OPEN",
+                  "source": "dryrun"},
+        # Закрывается самим ботом - CLOSE запишет close_position
+        "EUSDT": {"symbol": "EUSDT", "side": "BUY", "qty": 1.0, "entry": 5.0, "status": "OPEN",
+                  "source": "binance_real", "timestamp": old, "closing": True},
+    }
+    local["BUSDT"]["current_price"] = 48.0
+    cache = {"positions": local}
+    events_seen = []
+    closed = []
+    client = _FakeClient([_exchange("AUSDT", 0.5, 100.0, 101.0), _exchange("DUSDT", -3, 20.0, 19.5)])
+    rec = PositionReconciler(client=client, cache=cache, engine=TriggerEngine(),
+                             closer=lambda *args: closed.append(args))
+    rec.add_listener(events_seen.append)
+    a, local_b = local["AUSDT"], local["BUSDT"]
+
+    events = asyncio.run(rec.reconcile_once())
+
+    assert client.calls == 1
+    assert [(e.kind, e.symbol) for e in events] == [(CHANGED, "AUSDT"), (OPENED, "DUSDT"),
+                                                    (CLOSED, "BUSDT")]
+    assert events_seen == events
+    assert closed == [("BUSDT", local_b, 48.0, "RECONCILED")]
+    assert cache["positions"] is local and local["AUSDT"] is a
+    assert a["qty"] == 0.5 and a["current_price"] == 101.0
+    assert (a["tp_price"], a["sl_price"], a["trailing_active"], a["order_id"]) == (104.0, 99.0, True, 7)
+    assert [e.changes for e in events if e.kind == CHANGED] == [{"qty": (1.0, 0.5)}]
+    assert sorted(local) == ["AUSDT", "CUSDT", "DUSDT", "EUSDT", "VUSDT"]
+    assert local["DUSDT"]["side"] == "SELL" and local["DUSDT"]["source"] == "binance_real"
+    assert sorted(rec.engine.symbols()) == ["AUSDT", "CUSDT", "DUSDT", "EUSDT", "VUSDT"]
+
+    # Повторная сверка без изменений событий не даёт
+    assert asyncio.run(rec.reconcile_once()) == []
+
+
+def test_failed_fetch_keeps_positions():
+    local = {"AUSDT": {"symbol": "AUSDT", "side": "BUY", "qty": 1.0, "entry": 100.0,
+                       "status": "OPEN", "source": "binance_real", "timestamp": 0}}
+    rec = PositionReconciler(client=_FakeClient(error=ConnectionError("timeout")),
+                             cache={"positions": local}, engine=TriggerEngine(),
+                             closer=lambda *args: pytest.fail("закрытие без снимка"))
+    assert asyncio.run(rec.reconcile_once()) is None
+    assert rec.failures == 1 and "AUSDT" in local
+
+
+if __name__ == "__main__":
+    test_merge_keeps_local_fields_and_publishes_events()
+    test_failed_fetch_keeps_positions()
+    print("✅ Все тесты reconciler пройдены")
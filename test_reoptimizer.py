@@ -0,0 +1,73 @@
+"""Фоновая переоптимизация (reoptimizer.py): очередь по новым барам, публикация топа"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_store import kline_store, strategy_params, trading_state
+from reoptimizer import ReOptimizer
+
+GRIDS = {"breakout": [{"period": p} for p in (10, 20)]}
+SYMBOLS = ("REOPTAUSDT", "REOPTBUSDT")
+
+
+def _load(symbol: str, seed: int, n: int = 200):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    df = pd.DataFrame({"Open": close, "High": close * 1.002, "Low": close * 0.998,
+                       "Close": close, "Volume": 1.0},
+                      index=pd.date_range("2024-01-01", periods=n, freq="5min"))
+    kline_store.load_frame(symbol, df)
+    return int(df.index[-1].value // 1_000_000), float(close[-1])
+
+
+def _add_bars(symbol: str, last_ts: int, price: float, count: int) -> int:
+    for _ in range(count):
+        last_ts += 300_000
+        kline_store.update(symbol, last_ts, price, price, price, price, 1.0)
+    return last_ts
+
+
+def test_due_after_new_bars_and_publish():
+    last = {s: _load(s, seed) for seed, s in enumerate(SYMBOLS)}
+    published = []
+
+    with ThreadPoolExecutor(1) as pool:
+        reopt = ReOptimizer(SYMBOLS, top_n=1, every_bars=3, executor=pool, cache=None,
+                            grids=GRIDS, on_publish=published.append)
+        assert reopt.due() == []
+
+        ts, price = last["REOPTBUSDT"]
+        ts = _add_bars("REOPTBUSDT", ts, price, 2)
+        assert reopt.due() == []
+        _add_bars("REOPTBUSDT", ts, price, 2)   # 3 закрытых бара
+        assert reopt.due() == ["REOPTBUSDT"]
+
+        asyncio.run(reopt.reoptimize("REOPTBUSDT"))
+
+    assert reopt.due() == []
+    assert set(strategy_params["REOPTBUSDT"]) == {"breakout"}
+    assert trading_state["top_symbols"] == ("REOPTBUSDT",)
+    assert published == [("REOPTBUSDT",)]
+
+    # Перезагрузка истории - символ снова в очереди
+    _load("REOPTBUSDT", 5)
+    assert reopt.due() == ["REOPTBUSDT"]
+
+    for symbol in SYMBOLS:
+        kline_store.remove(symbol)
+        strategy_params.pop(symbol, None)
+    trading_state["top_symbols"] = ()
+
+
+def test_cpu_budget_pause():
+    reopt = ReOptimizer([], cpu_budget=0.25, poll_interval=1)
+    assert reopt.pause_after(2.0) == 6.0     # 2 сек работы из 8
+    assert reopt.pause_after(0.1) == 1       # не чаще poll_interval
+
+
+if __name__ == "__main__":
+    test_due_after_new_bars_and_publish()
+    test_cpu_budget_pause()
+    print("✅ Фоновая переоптимизация работает")
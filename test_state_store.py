@@ -0,0 +1,63 @@
+"""Снимки состояния и передача команд в event loop (state_store.py)"""
+import asyncio
+import threading
+from functools import partial
+
+from models import Position, PositionStore
+from state_store import StateStore
+
+
+def test_snapshots_are_isolated_from_writers():
+    store = StateStore(paused=False, auto_trading=True)
+    before = store.snapshot()
+    store.update_control(paused=True)
+    after = store.snapshot()
+
+    assert before.control["paused"] is False and after.control["paused"] is True
+    assert after.version == before.version + 1 and after.control["auto_trading"] is True
+    try:
+        after.control["paused"] = False
+        assert False, "снимок должен быть только для чтения"
+    except TypeError:
+        pass
+
+    positions = PositionStore({"AUSDT": Position(symbol="AUSDT", qty=1.0, entry=10.0)})
+    store.publish_positions(positions)
+    live = positions["AUSDT"]
+    live.qty = 5.0
+    del positions["AUSDT"]
+    snap = store.positions["AUSDT"]
+    assert snap is not live and snap.qty == 1.0 and snap.get("entry") == 10.0
+
+
+def test_commands_run_in_loop_thread():
+    store = StateStore(paused=False)
+    seen = []
+
+    def command():
+        seen.append(threading.current_thread())
+        store.update_control(paused=True)
+
+    async def main():
+        store.bind_loop(asyncio.get_running_loop())
+        worker = threading.Thread(target=partial(store.call_in_loop, command))
+        worker.start()
+        worker.join()
+        for _ in range(10):
+            if seen:
+                break
+            await asyncio.sleep(0.01)
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(main())
+    assert seen == [loop_thread] and store.control["paused"] is True
+
+    # Без запущенного loop команда выполняется сразу
+    store.call_in_loop(partial(store.update_control, paused=False))
+    assert store.control["paused"] is False
+
+
+if __name__ == "__main__":
+    test_snapshots_are_isolated_from_writers()
+    test_commands_run_in_loop_thread()
+    print("✅ Все тесты state_store пройдены")
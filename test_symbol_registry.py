@@ -0,0 +1,65 @@
+"""Реестр фильтров символов (symbol_registry.py) на фиктивном exchange info"""
+from symbol_registry import SymbolRegistry
+
+EXCHANGE_INFO = {"symbols": [
+    {"symbol": "BTCUSDT", "status": "TRADING", "baseAsset": "BTC", "quoteAsset": "USDT", "filters": [
+        {"filterType": "PRICE_FILTER", "minPrice": "556.80", "maxPrice": "4529764", "tickSize": "0.10"},
+        {"filterType": "LOT_SIZE", "minQty": "0.001", "maxQty": "1000", "stepSize": "0.001"},
+        {"filterType": "MARKET_LOT_SIZE", "minQty": "0.001", "maxQty": "120", "stepSize": "0.001"},
+        {"filterType": "MIN_NOTIONAL", "notional": "100"},
+    ]},
+    {"symbol": "DOGEUSDT", "status": "TRADING", "baseAsset": "DOGE", "quoteAsset": "USDT", "filters": [
+        {"filterType": "PRICE_FILTER", "minPrice": "0.002440", "maxPrice": "30", "tickSize": "0.000010"},
+        {"filterType": "LOT_SIZE", "minQty": "1", "maxQty": "50000000", "stepSize": "1"},
+        {"filterType": "MIN_NOTIONAL", "notional": "5"},
+    ]},
+]}
+
+
+def _registry():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return EXCHANGE_INFO
+
+    return SymbolRegistry(loader=loader, ttl=3600), calls
+
+
+def test_loaded_once_and_indexed():
+    registry, calls = _registry()
+    for _ in range(100):
+        assert registry.get("BTCUSDT").step_size == 0.001
+        assert registry.get("DOGEUSDT").min_notional == 5.0
+    assert registry.get("XRPUSDT") is None
+    assert len(calls) == 1
+
+
+def test_precision_and_quantization():
+    registry, _ = _registry()
+    btc = registry.get("BTCUSDT")
+    doge = registry.get("DOGEUSDT")
+    assert (btc.qty_precision, btc.price_precision) == (3, 1)
+    assert (doge.qty_precision, doge.price_precision) == (0, 5)
+
+    assert btc.format_qty(0.0129) == "0.012"
+    assert btc.format_qty(0.1 + 0.2) == "0.300"   # погрешность float не теряет шаг
+    assert doge.format_qty(57.9) == "57"
+    assert btc.format_price(30123.456) == "30123.4"
+    assert btc.min_qty_for_notional(30000) == 0.004   # 100 USDT / 30000 -> вверх до шага
+
+
+def test_validate():
+    registry, _ = _registry()
+    btc = registry.get("BTCUSDT")
+    assert btc.validate(30000, 0.004) == (True, "")
+    assert not btc.validate(30000, 0.003)[0]      # номинал 90 < 100
+    assert not btc.validate(30000, 0.0045)[0]     # не по шагу
+    assert not btc.validate(30000, 0.0001)[0]     # меньше minQty
+
+
+if __name__ == "__main__":
+    test_loaded_once_and_indexed()
+    test_precision_and_quantization()
+    test_validate()
+    print("✅ Реестр символов работает")
@@ -0,0 +1,91 @@
+"""Накопленная статистика сделок (trade_stats.py)"""
+import math
+import os
+import tempfile
+
+import numpy as np
+
+from trade_stats import TradeStats
+
+
+PNLS = [10.0, -5.0, 20.0, -30.0, -10.0, 15.0, 40.0, -2.5]
+
+
+def _filled():
+    stats = TradeStats(path=None, initial_equity=1000.0)
+    for i, pnl in enumerate(PNLS):
+        stats.on_close(pnl, "BTCUSDT" if i % 2 else "ETHUSDT",
+                       strategy="breakout" if i < 3 else "bb_rsi")
+    return stats
+
+
+def test_moments_match_numpy():
+    stats = _filled()
+    s = stats.summary()
+    pnls = np.array(PNLS)
+
+    assert s["trades"] == len(PNLS) and s["wins"] == 4
+    assert s["win_rate"] == 50.0
+    assert math.isclose(s["avg_pnl"], pnls.mean())
+    assert math.isclose(s["std_pnl"], pnls.std(ddof=1))
+    assert math.isclose(s["sharpe"], pnls.mean() / pnls.std(ddof=1))
+    assert math.isclose(s["profit_factor"], 85.0 / 47.5)
+    assert math.isclose(s["equity"], 1000.0 + pnls.sum())
+
+
+def test_equity_curve_and_drawdown():
+    stats = _filled()
+    curve = stats.equity_curve()
+    assert np.allclose(curve, 1000.0 + np.concatenate([[0.0], np.cumsum(PNLS)]))
+
+    # Просадка 40 от пика 1025 (третья сделка) до 985 (пятая)
+    s = stats.summary()
+    assert s["peak_equity"] == 1040.0
+    assert s["max_drawdown"] == 40.0
+    assert math.isclose(s["max_drawdown_pct"], 40.0 / 1025.0 * 100)
+    assert s["drawdown"] == 2.5
+
+    # Рост массива по удвоению не теряет точки
+    for _ in range(1000):
+        stats.on_close(1.0, "BTCUSDT")
+    assert len(stats.equity_curve()) == len(PNLS) + 1001
+    assert stats.equity == 1037.5 + 1000
+
+
+def test_breakdown_by_symbol_and_strategy():
+    stats = _filled()
+    by_symbol = stats.breakdown()
+    assert by_symbol["ETHUSDT"]["total_pnl"] == 10.0 + 20.0 - 10.0 + 40.0
+    assert by_symbol["BTCUSDT"]["trades"] == 4
+
+    by_strategy = stats.breakdown(by="strategy")
+    assert by_strategy["breakout"]["trades"] == 3
+    assert math.isclose(by_strategy["bb_rsi"]["total_pnl"], sum(PNLS[3:]))
+
+    stats.on_close(1.0, "SOLUSDT")
+    assert stats.breakdown(by="strategy")["unknown"]["trades"] == 1
+
+
+def test_save_and_restore():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trade_stats.json")
+        stats = _filled()
+        stats.path = path
+        assert stats.save()
+
+        restored = TradeStats(path=path, initial_equity=1000.0)
+        assert restored.summary() == stats.summary()
+        assert restored.breakdown(by="strategy") == stats.breakdown(by="strategy")
+        assert np.array_equal(restored.equity_curve(), stats.equity_curve())
+
+        # После загрузки статистика продолжает накапливаться
+        restored.on_close(5.0, "BTCUSDT")
+        assert restored.summary()["trades"] == len(PNLS) + 1
+
+
+if __name__ == "__main__":
+    test_moments_match_numpy()
+    test_equity_curve_and_drawdown()
+    test_breakdown_by_symbol_and_strategy()
+    test_save_and_restore()
+    print("✅ Все тесты trade_stats пройдены")
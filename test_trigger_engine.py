@@ -0,0 +1,97 @@
+"""Индекс уровней TP/SL/трейлинга (trigger_engine.py)"""
+import numpy as np
+
+from trigger_engine import TriggerEngine
+
+
+def _position(side: str, entry: float = 100.0):
+    buy = side == "BUY"
+    return {
+        "symbol": "TRIGUSDT", "side": side, "qty": 1.0, "entry": entry, "status": "OPEN",
+        "tp_price": entry * (1.03 if buy else 0.97),
+        "sl_price": entry * (0.99 if buy else 1.01),
+        "trail_percent": 0.005,
+        "highest_price": entry, "lowest_price": entry, "trailing_active": False,
+    }
+
+
+def _reference(pos: dict, prices, activation: float = 0.01):
+    """Прежний опрос auto_close_positions: (номер тика, причина) или None"""
+    entry, trail = pos["entry"], pos["trail_percent"]
+    for i, price in enumerate(prices):
+        if pos["side"] == "BUY":
+            pos["highest_price"] = max(pos["highest_price"], price)
+            if price >= entry * (1 + activation):
+                pos["trailing_active"] = True
+            if pos["trailing_active"]:
+                pos["sl_price"] = max(pos["sl_price"], pos["highest_price"] * (1 - trail))
+            if price >= pos["tp_price"]:
+                return i, "TAKE_PROFIT"
+            if price <= pos["sl_price"]:
+                return i, "STOP_LOSS"
+        else:
+            pos["lowest_price"] = min(pos["lowest_price"], price)
+            if price <= entry * (1 - activation):
+                pos["trailing_active"] = True
+            if pos["trailing_active"]:
+                pos["sl_price"] = min(pos["sl_price"], pos["lowest_price"] * (1 + trail))
+            if price <= pos["tp_price"]:
+                return i, "TAKE_PROFIT"
+            if price >= pos["sl_price"]:
+                return i, "STOP_LOSS"
+    return None
+
+
+def test_matches_polling_reference():
+    rng = np.random.default_rng(7)
+    for path in range(200):
+        side = "BUY" if path % 2 else "SELL"
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, 300)))
+
+        expected_pos = _position(side)
+        expected = _reference(expected_pos, prices)
+
+        engine = TriggerEngine(activation=0.01)
+        pos = _position(side)
+        engine.track("TRIGUSDT", pos)
+        result = None
+        for i, price in enumerate(prices):
+            fired = engine.on_price("TRIGUSDT", float(price))
+            if fired:
+                assert len(fired) == 1 and fired[0].position is pos
+                result = (i, fired[0].reason)
+                break
+
+        assert result == expected, (path, result, expected)
+        assert pos["sl_price"] == expected_pos["sl_price"]
+        assert pos["trailing_active"] == expected_pos["trailing_active"]
+        # Сработавшая позиция снимается с отслеживания
+        assert engine.symbols() == ([] if result else ["TRIGUSDT"])
+
+
+def test_sync_and_stale():
+    engine = TriggerEngine()
+    buy, sell = _position("BUY"), _position("SELL")
+    positions = {"AUSDT": buy, "BUSDT": sell, "CUSDT": dict(buy, status="PENDING")}
+
+    engine.sync(positions)
+    assert sorted(engine.symbols()) == ["AUSDT", "BUSDT"]
+    assert sorted(engine.stale(60)) == ["AUSDT", "BUSDT"]
+
+    assert engine.on_price("AUSDT", 100.5) == []
+    assert engine.stale(60) == ["BUSDT"]
+
+    # Изменённый SL переиндексируется, закрытая позиция убирается
+    buy["sl_price"] = 100.2
+    del positions["BUSDT"]
+    engine.sync(positions)
+    assert engine.symbols() == ["AUSDT"]
+    fired = engine.on_price("AUSDT", 100.1)
+    assert [(f.reason, f.level) for f in fired] == [("STOP_LOSS", 100.2)]
+    assert engine.on_price("AUSDT", 90.0) == []
+
+
+if __name__ == "__main__":
+    test_matches_polling_reference()
+    test_sync_and_stale()
+    print("✅ Все тесты trigger_engine пройдены")
@@ -0,0 +1,116 @@
+"""Векторный бэктест сетки (vector_backtest.py): сигналы совпадают с правилами стратегий"""
+import numpy as np
+import pytest
+import pandas as pd
+
+from config import BBRSI_PARAM_GRID, BREAKOUT_PARAM_GRID
+import vector_backtest
+from utils import bol_h, bol_l, rsi, ema200
+from vector_backtest import (
+    bbrsi_signals, breakout_signals, positions, evaluate_grid, best_params, final_equity,
+)
+
+
+def _frame(seed: int = 7, n: int = 500) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.012, n)))
+    spread = np.abs(rng.normal(0, 0.004, n)) * close
+    return pd.DataFrame({
+        "Open": np.append(close[0], close[:-1]), "High": close + spread,
+        "Low": close - spread, "Close": close, "Volume": rng.uniform(1, 10, n),
+    }, index=pd.date_range("2024-01-01", periods=n, freq="5min"))
+
+
+def _bbrsi_loop(close: pd.Series, p: int, d: int, r: int) -> np.ndarray:
+    """Правила BBRSI_EMA_Strategy.next бар за баром"""
+    lower, upper = bol_l(close, p, d).to_numpy(), bol_h(close, p, d).to_numpy()
+    rsi_val, ema = rsi(close, r).to_numpy(), ema200(close).to_numpy()
+    c = close.to_numpy()
+    out = np.zeros(len(c), dtype=np.int8)
+    for i in range(2, len(c)):
+        if c[i] > ema[i] and c[i - 2] > lower[i - 2] and c[i - 1] < lower[i - 1] and rsi_val[i] < 30:
+            out[i] = 1
+        elif c[i] < ema[i] and c[i - 2] < upper[i - 2] and c[i - 1] > upper[i - 1] and rsi_val[i] > 70:
+            out[i] = -1
+    return out
+
+
+def _breakout_loop(df: pd.DataFrame, period: int) -> np.ndarray:
+    """Правила Breakout_Strategy.next бар за баром"""
+    highest = df["High"].rolling(period).max().to_numpy()
+    lowest = df["Low"].rolling(period).min().to_numpy()
+    c = df["Close"].to_numpy()
+    out = np.zeros(len(c), dtype=np.int8)
+    for i in range(1, len(c)):
+        if c[i] > highest[i - 1]:
+            out[i] = 1
+        elif c[i] < lowest[i - 1]:
+            out[i] = -1
+    return out
+
+
+def test_bbrsi_tensor_matches_rules():
+    df = _frame()
+    periods, devs, rsi_periods = [20, 30, 40], [1, 2], [12, 14]
+    signals = bbrsi_signals(df["Close"].to_numpy(), periods, devs, rsi_periods)
+    assert signals.shape == (3, 2, 2, len(df))
+    assert np.abs(signals).sum() > 0
+    for a, p in enumerate(periods):
+        for b, d in enumerate(devs):
+            for c, r in enumerate(rsi_periods):
+                assert np.array_equal(signals[a, b, c], _bbrsi_loop(df["Close"], p, d, r)), (p, d, r)
+
+
+def test_breakout_matches_rules():
+    df = _frame(11)
+    periods = [10, 20, 30]
+    signals = breakout_signals(df["High"].to_numpy(), df["Low"].to_numpy(), df["Close"].to_numpy(), periods)
+    for k, p in enumerate(periods):
+        assert np.array_equal(signals[k], _breakout_loop(df, p))
+
+
+def test_positions_and_equity():
+    signals = np.array([0, 1, 1, -1, 0, 0], dtype=np.int8)
+    assert positions(signals).tolist() == [0, 1, 1, -1, -1, -1]
+
+    # Исполнение по Open следующего бара, последняя позиция закрывается по Close
+    open_ = np.array([100.0, 100.0, 100.0, 105.0, 110.0, 99.0])
+    close = np.array([100.0, 100.0, 100.0, 105.0, 110.0, 99.0])
+    # Лонг 100 -> 110 (+10%), шорт 110 -> 99 (+10%), без комиссии и с полной долей
+    equity = final_equity(open_, close, signals, cash=100.0, fraction=1.0, commission=0.0)
+    assert np.isclose(equity, 100 * 1.1 * 1.1)
+
+
+def test_whole_grid_in_one_pass(monkeypatch):
+    df = _frame(3)
+    calls = {"rolling": 0, "equity": 0}
+    rolling, equity_of = vector_backtest._rolling, vector_backtest.final_equity
+
+    def counted_rolling(*args):
+        calls["rolling"] += 1
+        return rolling(*args)
+
+    def counted_equity(*args, **kwargs):
+        calls["equity"] += 1
+        return equity_of(*args, **kwargs)
+
+    monkeypatch.setattr(vector_backtest, "_rolling", counted_rolling)
+    monkeypatch.setattr(vector_backtest, "final_equity", counted_equity)
+    equity = evaluate_grid(df, "bbrsi", BBRSI_PARAM_GRID)
+    assert equity.shape == (len(BBRSI_PARAM_GRID),)
+    # Индикаторы считаются по уникальным периодам (SMA/STD и gain/loss RSI),
+    # equity - один раз на всю сетку, а не на каждый набор параметров
+    bol_periods = {p["bol_period"] for p in BBRSI_PARAM_GRID}
+    rsi_periods = {p["rsi_period"] for p in BBRSI_PARAM_GRID}
+    assert calls == {"rolling": 2 * len(bol_periods) + 2 * len(rsi_periods), "equity": 1}
+    assert best_params(df, "bbrsi", BBRSI_PARAM_GRID) == BBRSI_PARAM_GRID[int(np.argmax(equity))]
+    assert best_params(df, "breakout", BREAKOUT_PARAM_GRID) in BREAKOUT_PARAM_GRID
+
+
+if __name__ == "__main__":
+    test_bbrsi_tensor_matches_rules()
+    test_breakout_matches_rules()
+    test_positions_and_equity()
+    with pytest.MonkeyPatch.context() as mp:
+        test_whole_grid_in_one_pass(mp)
+    print("✅ Векторный бэктест работает")
@@ -0,0 +1,105 @@
+"""Старт websocket_handler: ликвидные тикеры и прогрев (параллельная загрузка истории)"""
+import asyncio
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+
+import websocket_handler
+from data_store import klines_cache
+
+
+def _frame():
+    return pd.DataFrame({"Open": [1.0], "High": [1.0], "Low": [1.0], "Close": [1.0], "Volume": [1.0]},
+                        index=pd.date_range("2024-01-01", periods=1, freq="5min"))
+
+
+def test_warm_up_parallel_and_ready_order(monkeypatch):
+    symbols = ["AUSDT", "SLOWUSDT", "BUSDT", "FAILUSDT"]
+    started, finished = set(), set()
+    active = peak = 0
+
+    async def until(condition):
+        while not condition():
+            await asyncio.sleep(0)
+
+    async def fake_fetch(symbol, interval="5m", limit=500):
+        nonlocal active, peak
+        started.add(symbol)
+        active += 1
+        peak = max(peak, active)
+        # Каждая загрузка ждёт старта всех: последовательный прогрев здесь зависнет
+        await until(lambda: len(started) == len(symbols))
+        if symbol == "SLOWUSDT":
+            await until(lambda: len(finished) == len(symbols) - 1)
+        active -= 1
+        finished.add(symbol)
+        return pd.DataFrame() if symbol == "FAILUSDT" else _frame()
+
+    ready = []
+
+    async def on_ready(symbol):
+        ready.append(symbol)
+
+    monkeypatch.setattr(websocket_handler, "fetch_historical_klines", fake_fetch)
+    loaded, timings = asyncio.run(asyncio.wait_for(websocket_handler.warm_up(
+        symbols, on_ready=on_ready, concurrency=4), timeout=5))
+
+    assert peak == 4
+    assert loaded == ["AUSDT", "SLOWUSDT", "BUSDT"]
+    assert set(timings) == set(symbols)
+    # Быстрые символы готовы (и подписаны) раньше медленного
+    assert ready[-1] == "SLOWUSDT"
+    assert "FAILUSDT" not in ready
+    assert "AUSDT" in klines_cache and "FAILUSDT" not in klines_cache
+    for symbol in loaded:
+        del klines_cache[symbol]
+
+
+class _FailingTickers:
+    def __init__(self, tickers=None):
+        self.tickers = tickers
+
+    async def get_ticker_24h(self, strict=False):
+        if self.tickers is None:
+            raise ConnectionError("timeout")
+        return self.tickers
+
+
+def test_liquid_tickers_failure_is_not_silent(monkeypatch):
+    monkeypatch.setattr(websocket_handler, "TRADING_MODE", "real")
+    monkeypatch.setattr(websocket_handler, "async_client", _FailingTickers())
+    monkeypatch.setattr(websocket_handler, "_liquid_tickers_cache", {"timestamp": 0, "tickers": []})
+
+    # Кеша нет - ошибка доходит до вызывающего, а не превращается в []
+    with pytest.raises(ConnectionError):
+        asyncio.run(websocket_handler.get_liquid_tickers())
+
+    websocket_handler._liquid_tickers_cache["tickers"] = ["BTCUSDT", "ETHUSDT"]
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert asyncio.run(websocket_handler.get_liquid_tickers()) == ["BTCUSDT", "ETHUSDT"]
+    assert "Используем список" in out.getvalue()
+
+    # Пустой ответ - тоже ошибка; после восстановления список обновляется
+    monkeypatch.setattr(websocket_handler, "async_client", _FailingTickers([]))
+    assert asyncio.run(websocket_handler.get_liquid_tickers()) == ["BTCUSDT", "ETHUSDT"]
+    monkeypatch.setattr(websocket_handler, "async_client", _FailingTickers([
+        {"symbol": "SOLUSDT", "lastPrice": "20", "quoteVolume": "5000000",
+         "highPrice": "20.5", "lowPrice": "19.8"}]))
+    assert asyncio.run(websocket_handler.get_liquid_tickers()) == ["SOLUSDT"]
+
+
+def test_concurrency_follows_limiter():
+    assert 1 <= websocket_handler.warmup_concurrency(500) <= websocket_handler.WARMUP_CONCURRENCY
+    assert websocket_handler.warmup_concurrency(500, cap=1) == 1
+
+
+if __name__ == "__main__":
+    with pytest.MonkeyPatch.context() as mp:
+        test_warm_up_parallel_and_ready_order(mp)
+    with pytest.MonkeyPatch.context() as mp:
+        test_liquid_tickers_failure_is_not_silent(mp)
+    test_concurrency_follows_limiter()
+    print("✅ Прогрев работает")
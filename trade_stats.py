@@ -0,0 +1,237 @@
+# trade_stats.py
+"""
+Статистика закрытых сделок, обновляемая по одной сделке.
+
+log_position передаёт сюда каждое закрытие (CLOSE). Для всех сделок, по
+символу и по стратегии ведутся моменты PnL по Уэлфорду (число, среднее,
+сумма квадратов отклонений) и счётчики прибыльных сделок / валовой
+прибыли и убытка - запрос сводки (summary / breakdown) не перебирает
+историю.
+
+Кривая капитала (INITIAL_CASH + накопленный реализованный PnL) хранится
+в массиве numpy с удвоением ёмкости; пик и максимальная просадка
+обновляются на каждой точке.
+
+Состояние сохраняется в TRADE_STATS_FILE (JSON, кривая капитала - float64
+в base64) и подхватывается при перезапуске; если файла ещё нет, статистика
+один раз восстанавливается из закрытых сделок ledger.
+"""
+import base64
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from config import INITIAL_CASH, TRADE_STATS_FILE
+
+UNKNOWN_STRATEGY = "unknown"
+
+
+class _Moments:
+    """Моменты PnL сделок (Уэлфорд) и счётчики выигрышей"""
+
+    __slots__ = ("n", "mean", "m2", "wins", "gross_profit", "gross_loss")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0, wins=0, gross_profit=0.0, gross_loss=0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+        self.wins, self.gross_profit, self.gross_loss = wins, gross_profit, gross_loss
+
+    def add(self, pnl: float):
+        self.n += 1
+        delta = pnl - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (pnl - self.mean)
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+        else:
+            self.gross_loss -= pnl
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        std = self.std
+        return {
+            "trades": self.n,
+            "wins": self.wins,
+            "losses": self.n - self.wins,
+            "win_rate": self.wins / self.n * 100 if self.n else 0.0,
+            "total_pnl": self.mean * self.n,
+            "avg_pnl": self.mean,
+            "std_pnl": std,
+            "sharpe": self.mean / std if std > 0 else 0.0,  # на сделку, без годового пересчёта
+            "profit_factor": self.gross_profit / self.gross_loss if self.gross_loss > 0 else math.inf,
+        }
+
+    def to_list(self) -> list:
+        return [self.n, self.mean, self.m2, self.wins, self.gross_profit, self.gross_loss]
+
+
+class TradeStats:
+    """Накопленная статистика сделок: моменты, кривая капитала, просадка"""
+
+    def __init__(self, path: Optional[str] = TRADE_STATS_FILE, initial_equity: float = INITIAL_CASH):
+        self.path = path
+        self.initial_equity = initial_equity
+        self._lock = threading.RLock()
+        self._loaded = path is None
+        self._reset()
+
+    def _reset(self):
+        self.total = _Moments()
+        self.by_symbol: Dict[str, _Moments] = {}
+        self.by_strategy: Dict[str, _Moments] = {}
+        self._equity = np.empty(256)
+        self._equity[0] = self.initial_equity
+        self._points = 1
+        self.peak = self.initial_equity
+        self.max_drawdown = 0.0       # в USDT от пика
+        self.max_drawdown_pct = 0.0   # в % от пика
+        self.updated = 0.0
+
+    # ---------- Обновление ----------
+
+    def on_close(self, pnl: float, symbol: str, strategy: Optional[str] = None,
+                 timestamp: Optional[float] = None):
+        """Учёт закрытой сделки: O(1), кроме редкого расширения массива"""
+        pnl = float(pnl or 0.0)
+        with self._lock:
+            self._ensure_loaded()
+            self._add(pnl, symbol, strategy)
+            self.updated = timestamp or time.time()
+
+    def _add(self, pnl: float, symbol: str, strategy: Optional[str]):
+        self.total.add(pnl)
+        self.by_symbol.setdefault(symbol or "", _Moments()).add(pnl)
+        self.by_strategy.setdefault(strategy or UNKNOWN_STRATEGY, _Moments()).add(pnl)
+
+        equity = self._equity[self._points - 1] + pnl
+        if self._points == len(self._equity):
+            self._equity = np.concatenate([self._equity, np.empty(len(self._equity))])
+        self._equity[self._points] = equity
+        self._points += 1
+
+        self.peak = max(self.peak, equity)
+        drawdown = self.peak - equity
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+            self.max_drawdown_pct = drawdown / self.peak * 100 if self.peak > 0 else 0.0
+
+    # ---------- Запросы ----------
+
+    @property
+    def equity(self) -> float:
+        return float(self._equity[self._points - 1])
+
+    def equity_curve(self) -> np.ndarray:
+        """Кривая капитала после каждой сделки (копия)"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._equity[:self._points].copy()
+
+    def summary(self) -> Dict[str, float]:
+        """Сводка по всем сделкам с капиталом и просадкой"""
+        with self._lock:
+            self._ensure_loaded()
+            equity = self.equity
+            return {
+                **self.total.summary(),
+                "equity": equity,
+                "peak_equity": self.peak,
+                "drawdown": self.peak - equity,
+                "drawdown_pct": (self.peak - equity) / self.peak * 100 if self.peak > 0 else 0.0,
+                "max_drawdown": self.max_drawdown,
+                "max_drawdown_pct": self.max_drawdown_pct,
+            }
+
+    def breakdown(self, by: str = "symbol") -> Dict[str, Dict[str, float]]:
+        """Сводка по символам (by="symbol") или стратегиям (by="strategy")"""
+        with self._lock:
+            self._ensure_loaded()
+            groups = self.by_symbol if by == "symbol" else self.by_strategy
+            return {key: m.summary() for key, m in groups.items()}
+
+    # ---------- Сохранение ----------
+
+    def _state(self) -> dict:
+        return {
+            "initial_equity": self.initial_equity,
+            "total": self.total.to_list(),
+            "by_symbol": {k: m.to_list() for k, m in self.by_symbol.items()},
+            "by_strategy": {k: m.to_list() for k, m in self.by_strategy.items()},
+            "peak": self.peak,
+            "max_drawdown": self.max_drawdown,
+            "max_drawdown_pct": self.max_drawdown_pct,
+            "updated": self.updated,
+            "equity": base64.b64encode(self._equity[:self._points].astype("<f8").tobytes()).decode(),
+        }
+
+    def save(self) -> bool:
+        if self.path is None:
+            return False
+        with self._lock:
+            if not self._loaded:
+                return False
+            state = self._state()
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+            return True
+        except OSError as e:
+            print(f"❌ Ошибка сохранения статистики сделок: {e}")
+            return False
+
+    def _restore(self, state: dict):
+        self.initial_equity = state["initial_equity"]
+        self.total = _Moments(*state["total"])
+        self.by_symbol = {k: _Moments(*v) for k, v in state["by_symbol"].items()}
+        self.by_strategy = {k: _Moments(*v) for k, v in state["by_strategy"].items()}
+        equity = np.frombuffer(base64.b64decode(state["equity"]), dtype="<f8")
+        self._equity = np.empty(max(256, 2 * len(equity)))
+        self._equity[:len(equity)] = equity
+        self._points = len(equity)
+        self.peak = state["peak"]
+        self.max_drawdown = state["max_drawdown"]
+        self.max_drawdown_pct = state["max_drawdown_pct"]
+        self.updated = state["updated"]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self._restore(json.load(f))
+                return
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"⚠️  Статистика сделок не загружена ({e}), пересчитываю из ledger")
+                self._reset()
+        self.rebuild_from_ledger()
+
+    def rebuild_from_ledger(self) -> int:
+        """Пересчёт по всем закрытым сделкам ledger (однократно при первом запуске)"""
+        try:
+            from journal import journal
+            from ledger import ledger
+            journal.flush(fsync=False)  # записи из очереди тоже должны попасть в пересчёт
+            closes = ledger.history(action="CLOSE", limit=-1)
+        except Exception as e:
+            print(f"⚠️  Не удалось прочитать закрытые сделки из ledger: {e}")
+            return 0
+        with self._lock:
+            for entry in closes:
+                self._add(float(entry.get("pnl") or 0.0), entry.get("symbol"), entry.get("strategy"))
+        return len(closes)
+
+
+# Глобальная статистика сделок
+trade_stats = TradeStats()
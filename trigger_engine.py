@@ -0,0 +1,225 @@
+# trigger_engine.py
+"""
+Индекс ценовых уровней TP / SL / трейлинга по символам.
+
+Для каждого символа хранятся две кучи уровней: "сверху" (срабатывают, когда
+цена поднялась до уровня: TP лонга, SL шорта, новый максимум лонга) и
+"снизу" (зеркально). Тик из потока свечей проверяет только вершины куч, а
+перенос трейлинг-стопа - это O(log n): старый уровень помечается
+недействительным и выбрасывается при следующем извлечении, новый
+добавляется в кучу.
+
+Логика трейлинга та же, что была в pos_manager.auto_close_positions:
+экстремум цены обновляется на каждом новом максимуме (минимуме), трейлинг
+включается после движения на TRIGGER_TRAIL_ACTIVATION от входа, SL
+подтягивается к экстремуму * (1 -/+ trail_percent) и только в сторону
+прибыли. При одновременном пересечении TP проверяется раньше SL.
+
+Уровни, которые уже стоят ордерами на бирже (pos["protective_orders"], см.
+protective_orders.py), локально не проверяются; перенос стопа в этом
+случае передаётся подписчикам add_stop_listener.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from config import TRIGGER_TRAIL_ACTIVATION
+
+TP, SL, TRAIL = "TP", "SL", "TRAIL"
+
+
+class Fired(NamedTuple):
+    """Сработавший уровень: позицию нужно закрыть"""
+    symbol: str
+    side: str
+    reason: str      # "TAKE_PROFIT" / "STOP_LOSS"
+    price: float     # цена тика, на котором пересечён уровень
+    level: float
+    position: dict
+
+
+class _SymbolTriggers:
+    """Кучи уровней одного символа с ленивым удалением"""
+
+    def __init__(self):
+        self.above = []   # [level, seq, kind, alive] - срабатывает при price >= level
+        self.below = []   # [-level, seq, kind, alive] - срабатывает при price <= level
+        self.live: Dict[str, list] = {}
+        self.exchange = frozenset()   # уровни, которые исполняет биржа
+
+    def arm(self, kind: str, level: Optional[float], above: bool, seq: int):
+        self.disarm(kind)
+        if level is None or not math.isfinite(level) or kind in self.exchange:
+            return
+        entry = [level if above else -level, seq, kind, True]
+        heapq.heappush(self.above if above else self.below, entry)
+        self.live[kind] = entry
+
+    def disarm(self, kind: str):
+        entry = self.live.pop(kind, None)
+        if entry is not None:
+            entry[3] = False
+
+    def crossed(self, price: float) -> Dict[str, float]:
+        """Извлечение всех пересечённых уровней: {kind: level}"""
+        hits = {}
+        while self.above and (not self.above[0][3] or self.above[0][0] <= price):
+            level, _, kind, alive = heapq.heappop(self.above)
+            if alive:
+                hits[kind] = level
+                self.live.pop(kind, None)
+        while self.below and (not self.below[0][3] or -self.below[0][0] >= price):
+            level, _, kind, alive = heapq.heappop(self.below)
+            if alive:
+                hits[kind] = -level
+                self.live.pop(kind, None)
+        return hits
+
+    def level(self, kind: str) -> Optional[float]:
+        entry = self.live.get(kind)
+        if entry is None:
+            return None
+        return abs(entry[0])
+
+
+class TriggerEngine:
+    """Уровни закрытия открытых позиций, проверяемые на каждом тике"""
+
+    def __init__(self, activation: float = TRIGGER_TRAIL_ACTIVATION):
+        self.activation = activation
+        self._books: Dict[str, _SymbolTriggers] = {}
+        self._positions: Dict[str, dict] = {}
+        self._last_tick: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stop_listeners: List[Callable[[str, float], None]] = []
+        self.ticks = 0
+        self.fired = 0
+
+    # ---------- Позиции ----------
+
+    def track(self, symbol: str, pos: dict):
+        """Постановка (или переустановка) уровней позиции"""
+        with self._lock:
+            self._positions[symbol] = pos
+            book = self._books[symbol] = _SymbolTriggers()
+            book.exchange = frozenset(pos.get('protective_orders') or ())
+            buy = pos.get('side', 'BUY').upper() == 'BUY'
+            book.arm(TP, pos.get('tp_price') or None, above=buy, seq=next(self._seq))
+            book.arm(SL, pos.get('sl_price') or None, above=not buy, seq=next(self._seq))
+            self._arm_trail(book, pos, buy)
+
+    def untrack(self, symbol: str):
+        with self._lock:
+            self._positions.pop(symbol, None)
+            self._books.pop(symbol, None)
+
+    def sync(self, positions: Dict[str, dict]):
+        """Сверка с user_data_cache["positions"]: новые и изменённые позиции переиндексируются"""
+        open_positions = {s: p for s, p in positions.items() if p.get('status') == 'OPEN'}
+        for symbol in list(self._positions):
+            if symbol not in open_positions:
+                self.untrack(symbol)
+        for symbol, pos in open_positions.items():
+            if self._positions.get(symbol) is not pos or self._levels_changed(symbol, pos):
+                self.track(symbol, pos)
+
+    def _levels_changed(self, symbol: str, pos: dict) -> bool:
+        book = self._books.get(symbol)
+        if book is None or book.exchange != frozenset(pos.get('protective_orders') or ()):
+            return True
+        return ((TP not in book.exchange and book.level(TP) != (pos.get('tp_price') or None))
+                or (SL not in book.exchange and book.level(SL) != (pos.get('sl_price') or None)))
+
+    def symbols(self) -> List[str]:
+        return list(self._positions)
+
+    def add_stop_listener(self, listener: Callable[[str, float], None]):
+        """Вызывается с (symbol, new_sl) при каждом переносе трейлинг-стопа"""
+        self._stop_listeners.append(listener)
+
+    # ---------- Трейлинг ----------
+
+    def _arm_trail(self, book: _SymbolTriggers, pos: dict, buy: bool):
+        """Следующий уровень трейлинга - цена строго за текущим экстремумом"""
+        entry = pos.get('entry', 0)
+        if buy:
+            extreme = pos.get('highest_price', entry)
+            book.arm(TRAIL, math.nextafter(extreme, math.inf), above=True, seq=next(self._seq))
+        else:
+            extreme = pos.get('lowest_price', entry)
+            book.arm(TRAIL, math.nextafter(extreme, -math.inf), above=False, seq=next(self._seq))
+
+    def _trail(self, symbol: str, book: _SymbolTriggers, pos: dict, price: float, buy: bool):
+        entry = pos.get('entry', 0)
+        trail = pos.get('trail_percent', 0.005)
+        sl = pos.get('sl_price')
+        if buy:
+            pos['highest_price'] = extreme = max(pos.get('highest_price', entry), price)
+            if price >= entry * (1 + self.activation) and not pos.get('trailing_active', False):
+                pos['trailing_active'] = True
+                print(f"📈 Активирован трейлинг стоп для {symbol}")
+            stop = extreme * (1 - trail)
+            moved = pos.get('trailing_active', False) and (sl is None or stop > sl)
+        else:
+            pos['lowest_price'] = extreme = min(pos.get('lowest_price', entry), price)
+            if price <= entry * (1 - self.activation) and not pos.get('trailing_active', False):
+                pos['trailing_active'] = True
+                print(f"📉 Активирован трейлинг стоп для {symbol}")
+            stop = extreme * (1 + trail)
+            moved = pos.get('trailing_active', False) and (sl is None or stop < sl)
+
+        if moved:
+            pos['sl_price'] = stop
+            book.arm(SL, stop, above=not buy, seq=next(self._seq))
+            for listener in self._stop_listeners:
+                try:
+                    listener(symbol, stop)
+                except Exception as e:
+                    print(f"⚠️  Ошибка обработчика переноса стопа {symbol}: {e}")
+        self._arm_trail(book, pos, buy)
+
+    # ---------- Тики ----------
+
+    def on_price(self, symbol: str, price: float) -> List[Fired]:
+        """Новая цена символа; возвращает позиции, которые нужно закрыть"""
+        self._last_tick[symbol] = time.monotonic()
+        self.ticks += 1
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return []
+            pos = self._positions[symbol]
+            pos['current_price'] = price
+            hits = book.crossed(price)
+            if not hits:
+                return []
+
+            buy = pos.get('side', 'BUY').upper() == 'BUY'
+            if TRAIL in hits:
+                self._trail(symbol, book, pos, price, buy)
+            if TP in hits:
+                reason, level = "TAKE_PROFIT", hits[TP]
+            elif SL in hits:
+                reason, level = "STOP_LOSS", hits[SL]
+            else:
+                return []
+
+            # Позиция закрывается - уровни больше не нужны (при неудаче sync поставит их снова)
+            del self._positions[symbol]
+            del self._books[symbol]
+            self.fired += 1
+            return [Fired(symbol, 'BUY' if buy else 'SELL', reason, price, level, pos)]
+
+    def stale(self, max_age: float) -> List[str]:
+        """Отслеживаемые символы без тиков дольше max_age секунд"""
+        now = time.monotonic()
+        return [s for s in self._positions
+                if now - self._last_tick.get(s, -math.inf) > max_age]
+
+
+# Глобальный индекс уровней
+trigger_engine = TriggerEngine()
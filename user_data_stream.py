@@ -0,0 +1,143 @@
+# user_data_stream.py
+"""
+Futures user-data stream: события по ордерам и счёту в реальном времени.
+
+listenKey получаем через REST и продлеваем каждые LISTEN_KEY_KEEPALIVE
+секунд. ORDER_TRADE_UPDATE передаются в fill_tracker, чтобы исполнение
+ордеров было известно сразу, без sleep и повторных запросов позиций.
+ACCOUNT_UPDATE / ORDER_TRADE_UPDATE / ACCOUNT_CONFIG_UPDATE применяются к
+account_state; REST нужен только для сверки раз в ACCOUNT_RECONCILE_INTERVAL.
+"""
+import asyncio
+import json
+from typing import Callable, Dict, List
+
+import websockets
+
+from account_state import account_state
+from async_binance_client import async_client
+from binance_client import binance_client
+from config import TRADING_MODE, LISTEN_KEY_KEEPALIVE, ACCOUNT_RECONCILE_INTERVAL
+from fill_tracker import fill_tracker
+from multiplex_stream import RECONNECT_DELAYS
+
+USER_STREAM_URL = "wss://fstream.binance.com/ws/"
+USER_STREAM_TESTNET_URL = "wss://stream.binancefuture.com/ws/"
+
+
+class UserDataStream:
+    """Подключение к user-data stream с переподключением и продлением listenKey"""
+
+    def __init__(self, client=binance_client, tracker=fill_tracker, account=account_state,
+                 rest=async_client):
+        self.client = client
+        self.rest = rest
+        self.tracker = tracker
+        self.account = account
+        self.base_url = USER_STREAM_URL if TRADING_MODE == 'real' else USER_STREAM_TESTNET_URL
+        self.listen_key = None
+        self.handlers: Dict[str, List[Callable[[dict], None]]] = {}
+        self.events_received = 0
+        self._task = None
+        self.add_handler("ORDER_TRADE_UPDATE", self._on_order_update)
+        self.add_handler("ORDER_TRADE_UPDATE", account.apply_order_update)
+        self.add_handler("ACCOUNT_UPDATE", account.apply_account_update)
+        self.add_handler("ACCOUNT_CONFIG_UPDATE", account.apply_config_update)
+
+    def add_handler(self, event_type: str, handler: Callable[[dict], None]):
+        """Синхронный обработчик события (вызывается в event loop)"""
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    def _on_order_update(self, msg: dict):
+        self.tracker.on_order_update(msg.get("o", {}))
+
+    async def _new_listen_key(self) -> str:
+        return await self.rest.new_listen_key()
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE)
+            try:
+                await self.rest.keepalive_listen_key(self.listen_key)
+            except Exception as e:
+                print(f"⚠️  Не удалось продлить listenKey: {e}")
+
+    async def _reconcile_loop(self):
+        """Сверка сразу после подключения (события до него пропущены) и далее периодически"""
+        while True:
+            try:
+                # REST - в потоке, изменение состояния - в event loop вместе с событиями
+                snapshot = await asyncio.to_thread(self.account.fetch_snapshot, self.client)
+                if snapshot is None:
+                    print("⚠️  Сверка счёта с REST не удалась")
+                else:
+                    self.account.apply_snapshot(snapshot)
+            except Exception as e:
+                print(f"⚠️  Ошибка сверки счёта: {e}")
+            await asyncio.sleep(ACCOUNT_RECONCILE_INTERVAL)
+
+    def _dispatch(self, msg: dict):
+        event = msg.get("e")
+        if event == "listenKeyExpired":
+            raise ConnectionError("listenKey истёк")
+        self.events_received += 1
+        for handler in self.handlers.get(event, ()):
+            try:
+                handler(msg)
+            except Exception as e:
+                print(f"❌ Ошибка обработчика {event}: {e}")
+
+    async def _run(self):
+        attempt = 0
+        while True:
+            keepalive = reconcile = None
+            try:
+                self.listen_key = await self._new_listen_key()
+                async with websockets.connect(self.base_url + self.listen_key, max_queue=None) as ws:
+                    self.tracker.stream_alive = True
+                    self.account.set_stream_alive(True)
+                    attempt = 0
+                    keepalive = asyncio.create_task(self._keepalive())
+                    reconcile = asyncio.create_task(self._reconcile_loop())
+                    print("✅ User-data stream подключен")
+                    async for raw in ws:
+                        self._dispatch(json.loads(raw))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  User-data stream потерян: {e}")
+            finally:
+                self.tracker.stream_alive = False
+                self.account.set_stream_alive(False)
+                for task in (keepalive, reconcile):
+                    if task is not None:
+                        task.cancel()
+
+            delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+            attempt += 1
+            print(f"🔄 User-data stream: переподключение через {delay} сек...")
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self.listen_key:
+            try:
+                await self.rest.close_listen_key(self.listen_key)
+            except Exception:
+                pass
+            self.listen_key = None
+
+
+# Глобальный user-data stream
+user_data_stream = UserDataStream()
@@ -69,13 +69,12 @@ def get_symbol_step_size(symbol: str):
         return 0.001
     
     try:
-        # Пытаемся получить информацию о символе из Binance
-        from binance_client import BinanceClient
-        client = BinanceClient()
-        symbol_info = client.get_symbol_info(symbol)
+        # Фильтры символа из общего кеша exchange info
+        from symbol_registry import symbol_registry
+        filters = symbol_registry.get(symbol)
         
-        if symbol_info and 'stepSize' in symbol_info:
-            return float(symbol_info['stepSize'])
+        if filters:
+            return filters.step_size
     except Exception as e:
         print(f"⚠️  Не удалось получить шаг для {symbol}: {e}")
     
@@ -156,31 +155,17 @@ def validate_trade_params(symbol: str, price: float, qty: float) -> bool:
         return True
     
     try:
-        from binance_client import BinanceClient
-        client = BinanceClient()
-        symbol_info = client.get_symbol_info(symbol)
+        from symbol_registry import symbol_registry
+        filters = symbol_registry.get(symbol)
         
-        if not symbol_info:
+        if not filters:
             print(f"❌ Не удалось получить информацию о символе {symbol}")
             return False
         
-        # Проверка минимального количества
-        min_qty = float(symbol_info.get('minQty', 0))
-        if qty < min_qty:
-            print(f"❌ Количество {qty} меньше минимального {min_qty} для {symbol}")
-            return False
-        
-        # Проверка шага количества
-        step_size = float(symbol_info.get('stepSize', 0.001))
-        if not _is_valid_step(qty, step_size):
-            print(f"❌ Количество {qty} не соответствует шагу {step_size} для {symbol}")
-            return False
-        
-        # Проверка минимальной стоимости ордера
-        min_notional = float(symbol_info.get('minNotional', 10))
-        order_value = price * qty
-        if order_value < min_notional:
-            print(f"❌ Стоимость ордера {order_value} меньше минимальной {min_notional} для {symbol}")
+        # Минимальное/максимальное количество, шаг и минимальный номинал
+        ok, reason = filters.validate(price, qty)
+        if not ok:
+            print(f"❌ {reason} для {symbol}")
             return False
         
         return True
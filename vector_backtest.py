@@ -0,0 +1,142 @@
+# vector_backtest.py
+"""
+Векторный бэктест всей сетки параметров BBRSI и Breakout на NumPy.
+
+Индикаторы считаются один раз на всю сетку: Bollinger - тензор
+bol_period × bol_dev × bars, RSI - rsi_period × bars, сигналы BBRSI -
+bol_period × bol_dev × rsi_period × bars. Правила входа те же, что в
+BBRSI_EMA_Strategy.next / Breakout_Strategy.next: позиция переворачивается
+по сигналу, исполнение по Open следующего бара, открытая позиция
+закрывается по последнему Close.
+
+Equity упрощена (доля капитала в позиции постоянна, комиссия на каждую
+сторону), поэтому подходит для ранжирования сетки; точную equity лучших
+параметров даёт обычный FractionalBacktest (см. optimizer.py).
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import INITIAL_CASH, LEVERAGE, RISK_FRACTION
+from utils import ema200
+
+COMMISSION = 0.005
+# Доля капитала в позиции: размер equity * RISK_FRACTION * LEVERAGE, но margin=1
+POSITION_FRACTION = min(RISK_FRACTION * LEVERAGE, 1.0)
+
+
+def _rolling(values: np.ndarray, period: int, func) -> np.ndarray:
+    """Скользящая статистика окна period (NaN в начале, как у pandas rolling)"""
+    out = np.full(len(values), np.nan)
+    if 0 < period <= len(values):
+        out[period - 1:] = func(sliding_window_view(values, period), axis=-1)
+    return out
+
+
+def _shift(a: np.ndarray, k: int) -> np.ndarray:
+    """Сдвиг по последней оси на k баров вперёд (a[..., i - k]), NaN в начале"""
+    out = np.full(a.shape, np.nan)
+    out[..., k:] = a[..., :-k]
+    return out
+
+
+def bollinger_tensor(close: np.ndarray, periods: List[int], devs: List[float]):
+    """Нижняя и верхняя полосы: bol_period × bol_dev × bars"""
+    sma = np.stack([_rolling(close, p, np.mean) for p in periods])
+    std = np.stack([_rolling(close, p, lambda w, axis: np.std(w, axis=axis, ddof=1)) for p in periods])
+    dev = np.asarray(devs, dtype=float)[None, :, None]
+    return sma[:, None, :] - dev * std[:, None, :], sma[:, None, :] + dev * std[:, None, :]
+
+
+def rsi_matrix(close: np.ndarray, periods: List[int]) -> np.ndarray:
+    """RSI как utils.rsi: rsi_period × bars"""
+    delta = np.diff(close, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    out = []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p in periods:
+            rs = _rolling(gain, p, np.mean) / _rolling(loss, p, np.mean)
+            out.append(100 - 100 / (1 + rs))
+    return np.stack(out)
+
+
+def bbrsi_signals(close: np.ndarray, periods: List[int], devs: List[float],
+                  rsi_periods: List[int]) -> np.ndarray:
+    """Сигналы BBRSI (+1 BUY, -1 SELL, 0): bol_period × bol_dev × rsi_period × bars"""
+    ema = ema200(close).to_numpy()
+    lower, upper = bollinger_tensor(close, periods, devs)
+    rsi = rsi_matrix(close, rsi_periods)[None, None, :, :]
+
+    c1, c2 = _shift(close, 1), _shift(close, 2)
+    with np.errstate(invalid="ignore"):
+        cross_down = ((c2 > _shift(lower, 2)) & (c1 < _shift(lower, 1)))[:, :, None, :]
+        cross_up = ((c2 < _shift(upper, 2)) & (c1 > _shift(upper, 1)))[:, :, None, :]
+        buy = (close > ema) & cross_down & (rsi < 30)
+        sell = (close < ema) & cross_up & (rsi > 70)
+    return buy.astype(np.int8) - sell.astype(np.int8)
+
+
+def breakout_signals(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                     periods: List[int]) -> np.ndarray:
+    """Сигналы пробоя (+1 / -1 / 0): period × bars"""
+    highest = _shift(np.stack([_rolling(high, p, np.max) for p in periods]), 1)
+    lowest = _shift(np.stack([_rolling(low, p, np.min) for p in periods]), 1)
+    with np.errstate(invalid="ignore"):
+        buy = close > highest
+        sell = ~buy & (close < lowest)
+    return buy.astype(np.int8) - sell.astype(np.int8)
+
+
+def positions(signals: np.ndarray) -> np.ndarray:
+    """Направление позиции после бара: последний сигнал (повторный в ту же сторону игнорируется)"""
+    idx = np.arange(signals.shape[-1])
+    last = np.maximum.accumulate(np.where(signals != 0, idx, -1), axis=-1)
+    held = np.take_along_axis(signals, np.maximum(last, 0), axis=-1)
+    return np.where(last >= 0, held, 0).astype(np.int8)
+
+
+def final_equity(open_: np.ndarray, close: np.ndarray, signals: np.ndarray,
+                 cash: float = INITIAL_CASH, fraction: float = POSITION_FRACTION,
+                 commission: float = COMMISSION) -> np.ndarray:
+    """Итоговая equity по каждому набору параметров (любое число осей перед bars)"""
+    pos = positions(signals).astype(float)
+    # Сигнал бара i исполняется по Open бара i + 1; сигнал последнего бара не исполняется
+    held = np.zeros_like(pos)
+    held[..., 1:] = pos[..., :-1]
+    exit_px = np.append(open_[1:], close[-1])
+    ret = fraction * held * (exit_px / open_ - 1)
+    turnover = np.abs(np.diff(held, axis=-1, prepend=0.0))
+    growth = np.prod(1 + ret - commission * fraction * turnover, axis=-1)
+    # finalize_trades: последняя позиция закрывается с комиссией
+    return cash * growth * (1 - commission * fraction * np.abs(held[..., -1]))
+
+
+def _columns(df: pd.DataFrame):
+    return (df["Open"].to_numpy(float), df["High"].to_numpy(float),
+            df["Low"].to_numpy(float), df["Close"].to_numpy(float))
+
+
+def evaluate_grid(df: pd.DataFrame, strategy: str, grid: List[Dict]) -> np.ndarray:
+    """Итоговая equity для каждого элемента сетки (в порядке grid)"""
+    open_, high, low, close = _columns(df)
+    if strategy == "bbrsi":
+        periods = sorted({p["bol_period"] for p in grid})
+        devs = sorted({p["bol_dev"] for p in grid})
+        rsi_periods = sorted({p["rsi_period"] for p in grid})
+        equity = final_equity(open_, close, bbrsi_signals(close, periods, devs, rsi_periods))
+        return np.array([equity[periods.index(p["bol_period"]), devs.index(p["bol_dev"]),
+                                rsi_periods.index(p["rsi_period"])] for p in grid])
+    if strategy == "breakout":
+        periods = sorted({p["period"] for p in grid})
+        equity = final_equity(open_, close, breakout_signals(high, low, close, periods))
+        return np.array([equity[periods.index(p["period"])] for p in grid])
+    raise ValueError(f"Неизвестная стратегия: {strategy}")
+
+
+def best_params(df: pd.DataFrame, strategy: str, grid: List[Dict]) -> Dict:
+    """Лучший набор параметров сетки (при равенстве - первый)"""
+    equity = evaluate_grid(df, strategy, grid)
+    return dict(grid[int(np.argmax(equity))])
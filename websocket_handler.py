@@ -2,14 +2,21 @@
 import asyncio
 import pandas as pd
 import time
-from typing import List
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from binance import AsyncClient, BinanceSocketManager
-from config import API_KEY, API_SECRET, TIMEFRAME, TRADING_MODE
-from data_store import klines_cache
-from utils import bol_h, bol_l, rsi
-from pos_manager import get_open_position, open_position, close_position
+from config import API_KEY, API_SECRET, TIMEFRAME, TRADING_MODE, WS_MULTIPLEX, WARMUP_CONCURRENCY
+from data_store import kline_store, klines_cache
+from account_state import account_state
+from indicators import indicator_engine
+from pos_manager import get_open_position_async, open_position, close_position, close_triggered_position
 from telegram_bot import send_error as send_telegram_message
 from logger import log_position
+from multiplex_stream import MultiplexKlineStream
+from order_executor import order_executor, OrderIntent
+from async_binance_client import async_client
+from rate_limiter import rate_limiter, klines_weight, PRIORITY_LOW
+from trigger_engine import trigger_engine, Fired
 
 # ---------- fetch_historical_klines ----------
 async def fetch_historical_klines(symbol: str, interval="5m", limit=500):
@@ -19,9 +26,11 @@ async def fetch_historical_klines(symbol: str, interval="5m", limit=500):
         df.index = pd.date_range(end=pd.Timestamp.now(), periods=limit, freq=interval)
         return df
 
-    client = await AsyncClient.create(API_KEY, API_SECRET)
     try:
-        raw = await client.futures_klines(symbol=symbol, interval=interval, limit=limit)
+        # Общий пул соединений вместо AsyncClient.create() на каждый символ
+        raw = await async_client.get_klines(symbol, interval=interval, limit=limit)
+        if not raw:
+            return pd.DataFrame()
         df = pd.DataFrame(raw, columns=[
             "Open time", "Open", "High", "Low", "Close", "Volume",
             "Close time", "Quote asset volume", "Number of trades",
@@ -36,8 +45,114 @@ async def fetch_historical_klines(symbol: str, interval="5m", limit=500):
     except Exception as e:
         print(f"❌ Ошибка загрузки {symbol}: {e}")
         return pd.DataFrame()
-    finally:
-        await client.close_connection()
+
+
+# ---------- Прогрев: параллельная загрузка истории ----------
+def warmup_concurrency(limit: int, cap: int = WARMUP_CONCURRENCY) -> int:
+    """Сколько загрузок истории можно пустить сразу, не упираясь в резерв веса"""
+    stats = rate_limiter.stats()
+    free = stats["weight_available"] - stats["weight_limit"] * rate_limiter.reserve[PRIORITY_LOW]
+    return max(1, min(cap, int(free // klines_weight(limit))))
+
+
+async def warm_up(symbols: List[str], interval: str = TIMEFRAME, limit: int = 500,
+                  on_ready: Optional[Callable[[str], Awaitable[None]]] = None,
+                  concurrency: Optional[int] = None) -> Tuple[List[str], Dict[str, float]]:
+    """
+    Параллельная загрузка истории через общий async_client.
+
+    Символ попадает в klines_cache и передаётся в on_ready сразу, как только
+    загружена его история, не дожидаясь остальных. Возвращает загруженные
+    символы (в исходном порядке) и время загрузки каждого символа.
+    """
+    concurrency = concurrency or warmup_concurrency(limit)
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: Dict[str, float] = {}
+    loaded = set()
+    started = time.monotonic()
+
+    async def load(symbol: str):
+        async with semaphore:
+            t0 = time.monotonic()
+            df = await fetch_historical_klines(symbol, interval=interval, limit=limit)
+            timings[symbol] = time.monotonic() - t0
+        if df.empty:
+            print(f"   ❌ {symbol}: не удалось загрузить ({timings[symbol]:.2f} сек)")
+            return
+        klines_cache[symbol] = df
+        loaded.add(symbol)
+        print(f"   ✅ {symbol}: {len(df)} свечей за {timings[symbol]:.2f} сек")
+        if on_ready is not None:
+            try:
+                await on_ready(symbol)
+            except Exception as e:
+                print(f"⚠️  {symbol}: ошибка подписки после загрузки: {e}")
+
+    await asyncio.gather(*(load(s) for s in symbols))
+
+    elapsed = time.monotonic() - started
+    print(f"📥 История загружена: {len(loaded)}/{len(symbols)} символов за {elapsed:.2f} сек "
+          f"(сумма загрузок {sum(timings.values()):.2f} сек, параллельно {concurrency})")
+    return [s for s in symbols if s in loaded], timings
+
+
+async def subscribe_when_ready(symbol: str, interval: str = TIMEFRAME):
+    """on_ready для warm_up: подписка на свечи символа в общем combined stream"""
+    if TRADING_MODE == 'dryrun' or not WS_MULTIPLEX:
+        return
+    # start() идемпотентен: добавляет подписку и поднимает соединения, если их ещё нет
+    await get_kline_stream(interval).start([symbol])
+
+# ---------- Исполнение ордеров (в пуле order_executor) ----------
+def _close_position_job(symbol: str, price_last: float, close_reason: str):
+    """Закрытие позиции; close_position сам пишет CLOSE в журнал"""
+    result = close_position(symbol, price_last, exit_reason=close_reason)
+    if not result:
+        print(f"❌ Ошибка при закрытии позиции {symbol}")
+    return result
+
+
+def submit_trigger_close(fired: Fired) -> bool:
+    """Намерение закрыть позицию по сработавшему уровню TP/SL"""
+    submitted = order_executor.submit(OrderIntent(
+        "CLOSE", fired.symbol,
+        job=partial(close_triggered_position, fired.symbol, fired.price, fired.reason),
+        side=fired.side, price=fired.price, reason=fired.reason,
+    ))
+    if not submitted:
+        # Намерение не принято - уровни возвращаются, следующий тик повторит попытку
+        trigger_engine.track(fired.symbol, fired.position)
+    return submitted
+
+
+def _open_position_job(symbol: str, signal: str, price_last: float, strategy: Optional[str] = None):
+    """Открытие позиции и запись OPEN в журнал"""
+    pos_data = open_position(symbol, signal)
+
+    if pos_data:
+        pos_data["strategy"] = strategy  # для статистики по стратегиям при закрытии
+        # Получаем TP/SL из данных позиции или рассчитываем
+        tp = pos_data.get("tp")
+        sl = pos_data.get("sl")
+        entry = pos_data.get("entry", price_last)
+        quantity = pos_data.get("qty", 0)
+
+        # Если нет TP/SL в данных, рассчитываем
+        if tp is None:
+            if signal == "BUY":
+                tp = entry * 1.02
+            else:
+                tp = entry * 0.98
+
+        if sl is None:
+            if signal == "BUY":
+                sl = entry * 0.98
+            else:
+                sl = entry * 1.02
+
+        log_position("OPEN", symbol, signal, entry, quantity,
+                     tp=tp, sl=sl, reason=f"Сигнал {signal}", strategy=strategy)
+    return pos_data
 
 # ---------- WebSocket handler ----------
 async def handle_kline(msg):
@@ -45,159 +160,91 @@ async def handle_kline(msg):
         print(f"🔍 DEBUG: handle_kline вызван для символа: {msg.get('s', 'unknown')}")
         k = msg["k"]
         symbol = msg["s"]
-        row = {
-            "Open": float(k["o"]),
-            "High": float(k["h"]),
-            "Low": float(k["l"]),
-            "Close": float(k["c"]),
-            "Volume": float(k["v"]),
-        }
-        idx = pd.to_datetime(k["t"], unit="ms")
-
-        # Обновляем кэш свечей
-        df = klines_cache.get(symbol)
-        if df is None or df.empty:
-            df = pd.DataFrame([row], index=[idx])
-        else:
-            if idx in df.index:
-                df.loc[idx] = row
-            else:
-                df = pd.concat([df, pd.DataFrame([row], index=[idx])])
-                df = df.tail(500)
-        klines_cache[symbol] = df
 
-        # Проверка открытой позиции
-        pos = get_open_position(symbol)
-        price_last = row["Close"]
+        # Обновляем кэш свечей: O(1) запись в кольцевой буфер
+        ts = int(k["t"])
+        high, low, last = float(k["h"]), float(k["l"]), float(k["c"])
+        if kline_store.update(symbol, ts, float(k["o"]), high, low, last, float(k["v"])) == "stale":
+            return
+        bars = kline_store.arrays(symbol)
+        close = bars["Close"]
+        ind = indicator_engine.on_kline(symbol, ts, high, low, last)
+
+        # Проверка открытой позиции (из памяти, пока user-data stream жив)
+        account_state.update_mark(symbol, last)
+
+        # TP/SL/трейлинг: пересечение уровня закрывает позицию сразу на этом тике
+        fired = trigger_engine.on_price(symbol, last)
+        for f in fired:
+            print(f"🎯 {symbol}: {f.reason} на {f.price} (уровень {f.level:.4f})")
+            submit_trigger_close(f)
+        if fired:
+            return
+
+        pos = await get_open_position_async(symbol)
+        price_last = float(close[-1])
         signal = None
+        strategy = None
 
         # --- сигналы по индикаторам ---
-        if len(df) > 2:
-            lower = bol_l(df["Close"]).iloc[-1]
-            upper = bol_h(df["Close"]).iloc[-1]
-            rsi_val = rsi(df["Close"]).iloc[-1]
-            if df["Close"].iloc[-2] > lower and df["Close"].iloc[-1] < lower and rsi_val < 30:
-                signal = "BUY"
-            elif df["Close"].iloc[-2] < upper and df["Close"].iloc[-1] > upper and rsi_val > 70:
-                signal = "SELL"
+        if len(close) > 2:
+            lower = ind["bol_lower"]
+            upper = ind["bol_upper"]
+            rsi_val = ind["rsi"]
+            if close[-2] > lower and close[-1] < lower and rsi_val < 30:
+                signal, strategy = "BUY", "bb_rsi"
+            elif close[-2] < upper and close[-1] > upper and rsi_val > 70:
+                signal, strategy = "SELL", "bb_rsi"
 
         # --- сигналы по пробою ---
         period = 20
-        if len(df) > period + 2:
-            highest = df["High"].iloc[-period-1:-1].max()
-            lowest = df["Low"].iloc[-period-1:-1].min()
+        if len(close) > period + 2:
+            highest = bars["High"][-period-1:-1].max()
+            lowest = bars["Low"][-period-1:-1].min()
             if price_last > highest:
-                signal = "BUY"
+                signal, strategy = "BUY", "breakout"
             elif price_last < lowest:
-                signal = "SELL"
+                signal, strategy = "SELL", "breakout"
 
         # --- если есть открытая позиция ---
+        # TP/SL/трейлинг исполняют trigger_engine (выше) и защитные ордера на бирже;
+        # здесь позиция закрывается только по обратному сигналу стратегии
         if pos:
-            # ИСПРАВЛЯЕМ КЛЮЧИ!
-            side = pos.get("side", "BUY")
-            
-            # Используем правильные ключи из get_positions()
-            entry = pos.get("entry_price", pos.get("entry", 0))  # entry_price из get_positions()
-            quantity = pos.get("quantity", pos.get("qty", 0))
-            
-            # TP и SL должны быть рассчитаны, т.к. Binance их не предоставляет
-            # Рассчитываем их если нет в данных
-            if "tp" not in pos or pos["tp"] is None:
-                if side == "BUY":
-                    tp = entry * 1.02  # +2%
-                else:
-                    tp = entry * 0.98  # -2%
-            else:
-                tp = pos.get("tp")
-                
-            if "sl" not in pos or pos["sl"] is None:
-                if side == "BUY":
-                    sl = entry * 0.98  # -2%
-                else:
-                    sl = entry * 1.02  # +2%
-            else:
-                sl = pos.get("sl")
-
-            # проверка TP / SL и обратного сигнала через logger
+            side, entry, quantity = pos.side, pos.entry, pos.qty
             close_reason = None
-            
-            if side == "BUY":
-                if signal == "SELL":
-                    close_reason = "Обратный сигнал SELL"
-                elif sl is not None and price_last <= sl:
-                    close_reason = "Stop Loss достигнут"
-                elif tp is not None and price_last >= tp:
-                    close_reason = "Take Profit достигнут"
-                    
-            elif side == "SELL":
-                if signal == "BUY":
-                    close_reason = "Обратный сигнал BUY"
-                elif sl is not None and price_last >= sl:
-                    close_reason = "Stop Loss достигнут"
-                elif tp is not None and price_last <= tp:
-                    close_reason = "Take Profit достигнут"
-            
-            # Если есть причина для закрытия
+            if side == "BUY" and signal == "SELL":
+                close_reason = "Обратный сигнал SELL"
+            elif side == "SELL" and signal == "BUY":
+                close_reason = "Обратный сигнал BUY"
+
             if close_reason:
                 print(f"🚨 Закрытие позиции {symbol}: {close_reason}")
-                print(f"   Entry: {entry}, Last: {price_last}, TP: {tp}, SL: {sl}")
-                
-                # Рассчитываем PnL
-                if side == "BUY":
-                    pnl = (price_last - entry) * quantity
-                else:
-                    pnl = (entry - price_last) * quantity
+                print(f"   Entry: {entry}, Last: {price_last}, TP: {pos.tp_price}, SL: {pos.sl_price}")
                 
-                # Закрываем позицию
-                result = close_position(symbol, price_last, reason=close_reason)
-                
-                if result:
-                    log_position("CLOSE", symbol, side, price_last, quantity, 
-                                 pnl=pnl, tp=tp, sl=sl, exit_reason=close_reason)
-                else:
-                    print(f"❌ Ошибка при закрытии позиции {symbol}")
+                # Закрываем позицию вне event loop: поток свечей не ждёт REST
+                order_executor.submit(OrderIntent(
+                    "CLOSE", symbol,
+                    job=partial(_close_position_job, symbol, price_last, close_reason),
+                    side=side, price=price_last, reason=close_reason,
+                ))
             else:
                 # Показываем текущее состояние
-                current_pnl = 0
-                if side == "BUY":
-                    current_pnl = (price_last - entry) * quantity
-                else:
-                    current_pnl = (entry - price_last) * quantity
-                    
+                current_pnl = pos.pnl_at(price_last)
                 print(f"⏳ Ожидаем: {symbol} {side}")
                 print(f"   Entry: {entry}, Last: {price_last}")
-                print(f"   TP: {tp:.2f}, SL: {sl:.2f}")
+                print(f"   TP: {pos.tp_price}, SL: {pos.sl_price}")
                 print(f"   PnL: {current_pnl:+.2f} ({((price_last/entry - 1)*100):+.2f}%)")
 
         # --- если позиции нет и появился сигнал ---
         elif signal:
             print(f"🚀 Сигнал на открытие: {symbol} {signal}")
             
-            # Открываем позицию
-            pos_data = open_position(symbol, signal)
-            
-            if pos_data:
-                # Получаем TP/SL из данных позиции или рассчитываем
-                tp = pos_data.get("tp")
-                sl = pos_data.get("sl")
-                entry = pos_data.get("entry", price_last)
-                quantity = pos_data.get("qty", 0)
-                
-                # Если нет TP/SL в данных, рассчитываем
-                if tp is None:
-                    if signal == "BUY":
-                        tp = entry * 1.02
-                    else:
-                        tp = entry * 0.98
-                        
-                if sl is None:
-                    if signal == "BUY":
-                        sl = entry * 0.98
-                    else:
-                        sl = entry * 1.02
-                
-                log_position("OPEN", symbol, signal, entry, quantity, 
-                             tp=tp, sl=sl, reason=f"Сигнал {signal}")
+            # Открываем позицию вне event loop: поток свечей не ждёт REST
+            order_executor.submit(OrderIntent(
+                "OPEN", symbol,
+                job=partial(_open_position_job, symbol, signal, price_last, strategy),
+                side=signal, price=price_last, reason=f"Сигнал {signal}",
+            ))
 
     except Exception as e:
         print("Ошибка в обработчике kline:", e)
@@ -205,11 +252,35 @@ async def handle_kline(msg):
         traceback.print_exc()
         
 # ---------- start websockets ----------
+# Общий multiplex-поток; через него можно добавлять/убирать символы на лету
+kline_stream = None
+
+
+def get_kline_stream(interval: str = TIMEFRAME) -> MultiplexKlineStream:
+    """Глобальный combined-stream для свечей"""
+    global kline_stream
+    if kline_stream is None:
+        kline_stream = MultiplexKlineStream(interval=interval, handler=handle_kline)
+    return kline_stream
+
+
 async def start_websockets(symbols: List[str], interval: str = TIMEFRAME):
     if TRADING_MODE == 'dryrun':
         print("[DRY_RUN] WebSockets не запущены")
         return
 
+    mode_indicator = "🔴 РЕАЛЬНАЯ" if TRADING_MODE == 'real' else "🟡 ТЕСТОВАЯ"
+
+    if WS_MULTIPLEX:
+        stream = get_kline_stream(interval)
+        await stream.start(symbols)
+        print(f"✅ WebSockets запущены ({mode_indicator}, combined stream, "
+              f"{len(stream.shards)} соединений):", symbols)
+        if TRADING_MODE == 'real':
+            print("🚨 ВНИМАНИЕ: Бот подключен к реальной торговле!")
+        await stream.run_forever()
+        return
+
     client = await AsyncClient.create(API_KEY, API_SECRET)
     bm = BinanceSocketManager(client)
     sockets = [bm.kline_socket(symbol=s, interval=interval) for s in symbols]
@@ -222,7 +293,6 @@ async def start_websockets(symbols: List[str], interval: str = TIMEFRAME):
 
     tasks = [asyncio.create_task(listen(sock)) for sock in sockets]
     
-    mode_indicator = "🔴 РЕАЛЬНАЯ" if TRADING_MODE == 'real' else "🟡 ТЕСТОВАЯ"
     print(f"✅ WebSockets запущены ({mode_indicator}):", symbols)
     
     # Добавляем предупреждение для реальной торговли
@@ -235,6 +305,13 @@ async def start_websockets(symbols: List[str], interval: str = TIMEFRAME):
 _liquid_tickers_cache = {"timestamp": 0, "tickers": []}
 
 async def get_liquid_tickers(top_n=10, min_price=0.1, min_volume=1_000_000, max_spread_percent=5.0):
+    """
+    Самые ликвидные USDT-фьючерсы (кеш на час).
+
+    Если обновить список не удалось, возвращается прошлый список с
+    предупреждением о его возрасте; если прошлого списка нет - ошибка
+    поднимается вызывающему.
+    """
     global _liquid_tickers_cache
     
     if TRADING_MODE == 'dryrun':
@@ -242,40 +319,49 @@ async def get_liquid_tickers(top_n=10, min_price=0.1, min_volume=1_000_000, max_
             _liquid_tickers_cache["tickers"] = ["BTCUSDT", "ETHUSDT", "BNBUSDT"]
         return _liquid_tickers_cache["tickers"]
 
-    client = await AsyncClient.create(API_KEY, API_SECRET)
     now = time.time()
     if now - _liquid_tickers_cache["timestamp"] < 3600:
-        await client.close_connection()
         return _liquid_tickers_cache["tickers"]
 
     try:
-        tickers = await client.futures_ticker()
-        filtered = []
-        for t in tickers:
-            symbol = t.get("symbol")
-            if not symbol or "USDT" not in symbol:
-                continue
-            try:
-                price = float(t.get("lastPrice", 0))
-                volume = float(t.get("quoteVolume", 0))
-                high = float(t.get("highPrice", 0))
-                low = float(t.get("lowPrice", 0))
-                spread_percent = ((high - low) / price) * 100 if price else 100
-                if price >= min_price and volume >= min_volume and spread_percent <= max_spread_percent:
-                    filtered.append({"symbol": symbol, "volume": volume})
-            except Exception:
-                continue
-
-        filtered.sort(key=lambda x: x["volume"], reverse=True)
-        top_symbols = [x["symbol"] for x in filtered[:top_n]]
-        _liquid_tickers_cache = {"timestamp": now, "tickers": top_symbols}
-        
-        # Логируем найденные тикеры
-        print(f"📊 Найдено ликвидных тикеров: {len(top_symbols)}")
-        if TRADING_MODE == 'real' and top_symbols:
-            print(f"🔍 Торгуем в реальном режиме: {top_symbols[:3]}...")
-        
-        return top_symbols
-    finally:
-        await client.close_connection()
+        tickers = await async_client.get_ticker_24h(strict=True)
+        if not tickers:
+            raise ValueError("пустой ответ /fapi/v1/ticker/24hr")
+    except Exception as e:
+        stale = _liquid_tickers_cache["tickers"]
+        if not stale:
+            print(f"❌ Не удалось получить ликвидные тикеры: {e}")
+            raise
+        # Время кеша не обновляем - следующий вызов снова попробует REST
+        age_min = (now - _liquid_tickers_cache["timestamp"]) / 60
+        print(f"⚠️  Не удалось обновить ликвидные тикеры: {e}. "
+              f"Используем список {age_min:.0f} мин назад: {stale}")
+        return list(stale)
+
+    filtered = []
+    for t in tickers:
+        symbol = t.get("symbol")
+        if not symbol or "USDT" not in symbol:
+            continue
+        try:
+            price = float(t.get("lastPrice", 0))
+            volume = float(t.get("quoteVolume", 0))
+            high = float(t.get("highPrice", 0))
+            low = float(t.get("lowPrice", 0))
+            spread_percent = ((high - low) / price) * 100 if price else 100
+            if price >= min_price and volume >= min_volume and spread_percent <= max_spread_percent:
+                filtered.append({"symbol": symbol, "volume": volume})
+        except Exception:
+            continue
+
+    filtered.sort(key=lambda x: x["volume"], reverse=True)
+    top_symbols = [x["symbol"] for x in filtered[:top_n]]
+    _liquid_tickers_cache = {"timestamp": now, "tickers": top_symbols}
+    
+    # Логируем найденные тикеры
+    print(f"📊 Найдено ликвидных тикеров: {len(top_symbols)}")
+    if TRADING_MODE == 'real' and top_symbols:
+        print(f"🔍 Торгуем в реальном режиме: {top_symbols[:3]}...")
+    
+    return top_symbols
 